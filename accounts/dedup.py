@@ -0,0 +1,244 @@
+"""
+Давхардсан хэрэглэгч илрүүлэх blocking engine (detect_duplicate_users, automerge_users).
+
+Бүх хэрэглэгчийг хоорондоо харьцуулахын оронд хэрэглэгч бүрт blocking түлхүүрүүд
+үүсгэж, зөвхөн нэг block-д орсон хэрэглэгчдийг харьцуулна:
+    reg         - нормчилсон регистрийн дугаар
+    name_year   - латинчилсан овог нэр (үгсийг эрэмбэлсэн) + төрсөн оны 2 орон
+    school_name - сургууль + нэрийн эхний үсгүүд
+
+Block бүрийн хосуудыг rapidfuzz.process.cdist-ээр мөрийн багцаар (BLOCK_CHUNK) оноолж,
+босго давсан хосуудыг UserMergeRequest болгон бичнэ. Харьцуулалтын тоо нь block-уудын
+хэмжээний квадратын нийлбэртэй пропорциональ тул ~500k хэрэглэгчид шөнийн Celery task-д багтана.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+from django.contrib.auth.models import User
+from rapidfuzz import fuzz, process
+
+from .models import UserMergeRequest, UserMeta
+
+# Кирилл → Латин хөрвүүлэлтийн толь бичиг
+CYR_TO_LAT = {
+    'а':'a','б':'b','в':'v','г':'g','д':'d','е':'e','ё':'yo','ж':'j','з':'z',
+    'и':'i','й':'i','к':'k','л':'l','м':'m','н':'n','о':'o','ө':'o','п':'p',
+    'р':'r','с':'s','т':'t','у':'u','ү':'u','ф':'f','х':'kh','ц':'ts','ч':'ch',
+    'ш':'sh','щ':'sh','ъ':'','ы':'i','ь':'','э':'e','ю':'yu','я':'ya'
+}
+
+REG_PATTERN = re.compile(r'^[a-z]{2,3}\d{8}$')
+
+FETCH_CHUNK = 5000
+BLOCK_CHUNK = 1000      # cdist-ийн нэг багц дахь мөрийн тоо
+MAX_BLOCK_SIZE = 5000   # үүнээс том block нь ялгах чадваргүй (жиш: хоосон нэр) тул алгасна
+NAME_PREFIX = 3
+CREATE_BATCH_SIZE = 500
+
+
+def normalize_fullname(last_name: str, first_name: str) -> str:
+    """
+    Овог нэрийг нормчилж, кирилл үсгийг латин болгоно.
+    Жишээ: "Баярсайхан Дорж" → "bayarsaikhan dorj"
+    """
+    fullname = f"{(last_name or '').strip()} {(first_name or '').strip()}"
+    fullname = unicodedata.normalize('NFKD', fullname)
+    fullname = ''.join(ch for ch in fullname if not unicodedata.combining(ch))
+    fullname = fullname.lower()
+    fullname = ''.join(CYR_TO_LAT.get(ch, ch) for ch in fullname)
+    fullname = re.sub(r'\s+', ' ', fullname).strip()
+    return fullname
+
+
+def normalize_reg_num(reg_num: str) -> str:
+    """
+    Регистрийн дугаарыг нормчилно.
+    Жишээ: "АБ12345678" → "ab12345678"
+    """
+    if not reg_num:
+        return ''
+    reg_num = reg_num.strip().lower()
+    prefix = reg_num[:2]
+    suffix = reg_num[2:]
+    normalized_prefix = ''.join(CYR_TO_LAT.get(ch, ch) for ch in prefix)
+    return normalized_prefix + suffix
+
+
+def reg_num_groups():
+    """Нормчилсон регистрээр давхардсан хэрэглэгчид: {normalized_reg: [user_id, ...]}.
+
+    Зөвхөн (user_id, reg_num) хосыг урсгалаар уншина.
+    """
+    groups = defaultdict(list)
+    rows = (
+        UserMeta.objects.exclude(reg_num__isnull=True).exclude(reg_num='')
+        .values_list('user_id', 'reg_num').iterator(chunk_size=FETCH_CHUNK)
+    )
+    for user_id, reg_num in rows:
+        groups[normalize_reg_num(reg_num)].append(user_id)
+    return {reg: user_ids for reg, user_ids in groups.items() if len(user_ids) > 1}
+
+
+class DuplicateIndex:
+    """Хэрэглэгчдийн нормчилсон нэр, регистр ба blocking түлхүүрүүд."""
+
+    def __init__(self):
+        self.user_ids = []
+        self.names = []
+        self.regs = []
+        self.blocks = {'reg': defaultdict(list), 'name_year': defaultdict(list), 'school_name': defaultdict(list)}
+
+        rows = (
+            UserMeta.objects.filter(user__is_active=True)
+            .values_list('user_id', 'reg_num', 'school_id', 'user__last_name', 'user__first_name')
+            .iterator(chunk_size=FETCH_CHUNK)
+        )
+        for user_id, reg_num, school_id, last_name, first_name in rows:
+            self.add(user_id, reg_num, school_id, last_name, first_name)
+
+    def add(self, user_id, reg_num, school_id, last_name, first_name):
+        index = len(self.user_ids)
+        reg = normalize_reg_num(reg_num)
+        if not REG_PATTERN.match(reg):
+            reg = ''
+        name = normalize_fullname(last_name, first_name)
+
+        self.user_ids.append(user_id)
+        self.names.append(name)
+        self.regs.append(reg)
+
+        if reg:
+            self.blocks['reg'][reg].append(index)
+        if name:
+            # Үгсийг эрэмбэлснээр овог нэр солигдсон хэрэглэгчид нэг block-д орно
+            sorted_name = ' '.join(sorted(name.split()))
+            birth_year = reg[-8:-6] if reg else ''
+            self.blocks['name_year'][f'{sorted_name}|{birth_year}'].append(index)
+            if school_id:
+                first = normalize_fullname('', first_name).replace(' ', '')
+                self.blocks['school_name'][f'{school_id}|{first[:NAME_PREFIX]}'].append(index)
+
+    def iter_blocks(self):
+        """(block_type, индексүүд) - 2-оос бага, MAX_BLOCK_SIZE-аас их block-уудыг алгасна."""
+        for block_type, blocks in self.blocks.items():
+            for indexes in blocks.values():
+                if 2 <= len(indexes) <= MAX_BLOCK_SIZE:
+                    yield block_type, indexes
+
+    def oversized_blocks(self):
+        return sum(
+            1 for blocks in self.blocks.values() for indexes in blocks.values()
+            if len(indexes) > MAX_BLOCK_SIZE
+        )
+
+
+def score_block(index, indexes, threshold):
+    """Нэг block доторх хосуудыг оноолно: (i, j, score, name_score, reg_score) урсгал.
+
+    Оноо = нэрийн token_sort_ratio ба регистрийн ratio-гийн дундаж. Аль нэгнийх нь
+    регистр хоосон бол зөвхөн нэрийн оноо.
+    """
+    names = [index.names[i] for i in indexes]
+    regs = [index.regs[i] for i in indexes]
+    has_reg = np.array([bool(r) for r in regs])
+
+    for start in range(0, len(indexes), BLOCK_CHUNK):
+        stop = min(start + BLOCK_CHUNK, len(indexes))
+        name_scores = process.cdist(
+            names[start:stop], names, scorer=fuzz.token_sort_ratio, processor=None, dtype=np.uint8, workers=-1
+        ).astype(np.float32)
+        reg_scores = process.cdist(
+            regs[start:stop], regs, scorer=fuzz.ratio, processor=None, dtype=np.uint8, workers=-1
+        ).astype(np.float32)
+
+        both_reg = has_reg[start:stop, None] & has_reg[None, :]
+        scores = np.where(both_reg, (name_scores + reg_scores) / 2, name_scores)
+
+        # Зөвхөн дээд гурвалжин (i < j) - хос бүрийг нэг удаа
+        rows, cols = np.nonzero(scores >= threshold)
+        rows = rows + start
+        keep = rows < cols
+        for row, col in zip(rows[keep], cols[keep]):
+            local = row - start
+            yield (
+                indexes[row], indexes[col], int(round(scores[local, col])),
+                int(name_scores[local, col]), int(reg_scores[local, col]) if both_reg[local, col] else None,
+            )
+
+
+def find_duplicate_pairs(threshold=90, index=None):
+    """Босго давсан хосууд: {(user_id_a, user_id_b): {'score', 'name_score', 'reg_score', 'blocks'}}."""
+    index = index or DuplicateIndex()
+    pairs = {}
+    for block_type, indexes in index.iter_blocks():
+        for i, j, score, name_score, reg_score in score_block(index, indexes, threshold):
+            key = tuple(sorted((index.user_ids[i], index.user_ids[j])))
+            pair = pairs.get(key)
+            if pair is None:
+                pairs[key] = {'score': score, 'name_score': name_score, 'reg_score': reg_score, 'blocks': [block_type]}
+            elif block_type not in pair['blocks']:
+                pair['blocks'].append(block_type)
+    return pairs
+
+
+def _existing_pairs():
+    """Өмнө нь (ямар ч төлөвтэй) хүсэлт үүссэн хэрэглэгчийн хосууд."""
+    existing = set()
+    for user_ids in UserMergeRequest.objects.values_list('user_ids', flat=True).iterator(chunk_size=FETCH_CHUNK):
+        ids = sorted(set(user_ids or []))
+        existing.update((a, b) for n, a in enumerate(ids) for b in ids[n + 1:])
+    return existing
+
+
+def create_merge_requests(pairs, requesting_user):
+    """Шинэ хосуудыг UserMergeRequest болгон багцаар бичнэ. Үүссэн хүсэлтийн тоог буцаана."""
+    existing = _existing_pairs()
+    batch, created = [], 0
+    for (user_a, user_b), pair in sorted(pairs.items(), key=lambda item: -item[1]['score']):
+        if (user_a, user_b) in existing:
+            continue
+        batch.append(UserMergeRequest(
+            requesting_user=requesting_user,
+            user_ids=[user_a, user_b],
+            primary_user_id=user_a,
+            reason=f"Давхардал автоматаар илэрсэн ({', '.join(pair['blocks'])}, {pair['score']}%).",
+            status=UserMergeRequest.Status.PENDING,
+            conflicts_data={'duplicate_detection': pair},
+            requires_user_confirmation=False,
+        ))
+        if len(batch) >= CREATE_BATCH_SIZE:
+            UserMergeRequest.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        UserMergeRequest.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def detect_duplicate_users(threshold=90, requesting_user=None, dry_run=False):
+    """Давхардсан хэрэглэгчдийг илрүүлж merge хүсэлт үүсгэнэ.
+
+    requesting_user: өгөөгүй бол хамгийн эхний superuser.
+    Буцаана: {'users', 'blocks', 'oversized_blocks', 'pairs', 'created'}.
+    """
+    index = DuplicateIndex()
+    pairs = find_duplicate_pairs(threshold, index=index)
+
+    created = 0
+    if not dry_run and pairs:
+        if requesting_user is None:
+            requesting_user = User.objects.filter(is_superuser=True).order_by('id').first()
+        if requesting_user is None:
+            raise ValueError('Merge хүсэлт үүсгэх superuser олдсонгүй.')
+        created = create_merge_requests(pairs, requesting_user)
+
+    return {
+        'users': len(index.user_ids),
+        'blocks': sum(1 for _ in index.iter_blocks()),
+        'oversized_blocks': index.oversized_blocks(),
+        'pairs': len(pairs),
+        'created': created,
+    }
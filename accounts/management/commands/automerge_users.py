@@ -1,50 +1,16 @@
 import re
 import sys
 import datetime
-import unicodedata
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from django.db import transaction, models
 from django.utils import timezone
 from accounts.models import UserMeta
+from accounts.dedup import normalize_fullname, normalize_reg_num, reg_num_groups
 from olympiad.models import Result, Award, Comment, ScoreSheet
 from schools.models import School
 from rapidfuzz import fuzz
 
-# Кирилл → Латин хөрвүүлэлтийн толь бичиг
-CYR_TO_LAT = {
-    'а':'a','б':'b','в':'v','г':'g','д':'d','е':'e','ё':'yo','ж':'j','з':'z',
-    'и':'i','й':'i','к':'k','л':'l','м':'m','н':'n','о':'o','ө':'o','п':'p',
-    'р':'r','с':'s','т':'t','у':'u','ү':'u','ф':'f','х':'kh','ц':'ts','ч':'ch',
-    'ш':'sh','щ':'sh','ъ':'','ы':'i','ь':'','э':'e','ю':'yu','я':'ya'
-}
-
-def normalize_fullname(last_name: str, first_name: str) -> str:
-    """
-    Овог нэрийг нормчлож, кирилл үсгийг латин болгоно.
-    Жишээ: "Баярсайхан Дорж" → "bayarsaikhan dorj"
-    """
-    fullname = f"{last_name.strip()} {first_name.strip()}"
-    fullname = unicodedata.normalize('NFKD', fullname)
-    fullname = ''.join(ch for ch in fullname if not unicodedata.combining(ch))
-    fullname = fullname.lower()
-    fullname = ''.join(CYR_TO_LAT.get(ch, ch) for ch in fullname)
-    fullname = re.sub(r'\s+', ' ', fullname).strip()
-    return fullname
-
-def normalize_reg_num(reg_num: str) -> str:
-    """
-    Регистрийн дугаарыг нормчилно.
-    Жишээ: "АБ12345678" → "ab12345678"
-    """
-    if not reg_num:
-        return ''
-    reg_num = reg_num.strip().lower()
-    prefix = reg_num[:2]
-    suffix = reg_num[2:]
-    normalized_prefix = ''.join(CYR_TO_LAT.get(ch, ch) for ch in prefix)
-    return normalized_prefix + suffix
-
 def names_are_similar(name1: str, name2: str, threshold: int = 90) -> tuple:
     """Хоёр нэрийг fuzzy matching ашиглан харьцуулна."""
     if name1 == name2:
@@ -84,15 +50,15 @@ class Command(BaseCommand):
     def _handle_all_duplicates(self, options):
         self.stdout.write(self.style.NOTICE(f'Систем дэх бүх давхардлыг шалгаж байна... (Fuzzy threshold: {self.similarity_threshold})'))
 
-        all_user_metas = UserMeta.objects.exclude(reg_num__isnull=True).exclude(reg_num='')
-        normalized_reg_groups = {}
-        for meta in all_user_metas:
-            normalized = normalize_reg_num(meta.reg_num)
-            if normalized not in normalized_reg_groups:
-                normalized_reg_groups[normalized] = []
-            normalized_reg_groups[normalized].append(meta)
-
-        duplicate_groups = {k: v for k, v in normalized_reg_groups.items() if len(v) > 1}
+        # Зөвхөн (user_id, reg_num)-ыг уншиж бүлэглээд, давхардсан бүлгийн UserMeta-г л ачаална
+        reg_groups = reg_num_groups()
+        metas = UserMeta.objects.select_related('user').in_bulk(
+            [user_id for user_ids in reg_groups.values() for user_id in user_ids]
+        )
+        duplicate_groups = {
+            reg: [metas[user_id] for user_id in user_ids if user_id in metas]
+            for reg, user_ids in reg_groups.items()
+        }
 
         if not duplicate_groups:
             self.stdout.write(self.style.SUCCESS('Боловсруулах давхардал олдсонгүй.'))
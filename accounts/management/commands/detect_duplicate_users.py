@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.dedup import detect_duplicate_users
+
+
+class Command(BaseCommand):
+    help = 'Blocking түлхүүрээр давхардсан хэрэглэгчдийг илрүүлж, нэгтгэх хүсэлт (UserMergeRequest) үүсгэнэ.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int, default=90, help='Хосын доод оноо (0-100)')
+        parser.add_argument('--requesting-user', type=str, help='Хүсэлт үүсгэгчийн username (анхдагч: эхний superuser)')
+        parser.add_argument('--dry-run', action='store_true', help='Хүсэлт үүсгэхгүй, зөвхөн тоолох')
+
+    def handle(self, *args, **options):
+        requesting_user = None
+        if options['requesting_user']:
+            requesting_user = User.objects.filter(username=options['requesting_user']).first()
+            if requesting_user is None:
+                raise CommandError(f"'{options['requesting_user']}' хэрэглэгч олдсонгүй.")
+
+        self.stdout.write(self.style.NOTICE(f"Давхардал хайж байна... (threshold: {options['threshold']})"))
+        try:
+            stats = detect_duplicate_users(options['threshold'], requesting_user, dry_run=options['dry_run'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Хэрэглэгч: {stats['users']}, block: {stats['blocks']}, давхардсан хос: {stats['pairs']}")
+        if stats['oversized_blocks']:
+            self.stdout.write(self.style.WARNING(f"Хэт том {stats['oversized_blocks']} block алгасагдлаа."))
+        self.stdout.write(self.style.SUCCESS(f"Шинээр {stats['created']} нэгтгэх хүсэлт үүслээ."))
@@ -21,13 +21,11 @@ class Command(BaseCommand):
         # Монгол регистрийн дугаарын зөв загвар (2 крилл үсэг, 8 тоо)
         reg_pattern = re.compile(r'^[А-ЯӨҮ]{2}\d{8}$')
 
-        # Хоосон биш боловч буруу форматтай регистртэй хэрэглэгчдийг олох
-        invalid_format_users = []
-        all_metas = UserMeta.objects.exclude(reg_num__isnull=True).exclude(reg_num='').select_related('user')
-
-        for meta in all_metas:
-            if not reg_pattern.match(meta.reg_num):
-                invalid_format_users.append(meta)
+        # Хоосон биш боловч буруу форматтай регистртэй хэрэглэгчдийг DB талд шүүх
+        invalid_format_users = list(
+            UserMeta.objects.exclude(reg_num__isnull=True).exclude(reg_num='')
+            .exclude(reg_num__regex=reg_pattern.pattern).select_related('user')
+        )
 
         if invalid_format_users:
             self.stdout.write(self.style.WARNING(f'Нийт {len(invalid_format_users)} хэрэглэгчийн регистрийн дугаар буруу форматтай байна:'))
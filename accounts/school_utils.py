@@ -1,7 +1,7 @@
 import re
 import unicodedata
-from rapidfuzz import fuzz
 from schools.models import School
+from schools.matcher import get_school_matcher
 from accounts.models import UserMeta
 
 CYR_TO_LAT = {
@@ -79,64 +79,34 @@ def normalize_name(name: str) -> str:
     n = re.sub(r'\s+', ' ', n).strip()
     return n
 
-def find_best_match(target_name: str, queryset):
-    """
-    queryset доторх School-уудын name болон alias бүрийг харьцуулж хамгийн өндөр оноотойг буцаана.
-    alias нь таслалаар тусгаарлагдсан олон нэр байж болно.
-    """
-    best, best_score = None, 0
-    n1 = normalize_name(target_name)
-    n1_joined = n1.replace(' ', '')
-
-    for s in queryset:
-        # name талбар
-        name_norm = normalize_name(s.name)
-        score_name = max(
-            fuzz.token_sort_ratio(n1, name_norm),
-            fuzz.ratio(n1_joined, name_norm.replace(' ', ''))
-        )
-
-        # alias талбар (олон утгатай)
-        score_alias = 0
-        if s.alias:
-            # таслалаар заагласан бүх алиасыг шалгах
-            aliases = [a.strip() for a in s.alias.split(',') if a.strip()]
-            for a in aliases:
-                a_norm = normalize_name(a)
-                score_alias = max(
-                    score_alias,
-                    fuzz.token_sort_ratio(n1, a_norm),
-                    fuzz.ratio(n1_joined, a_norm.replace(' ', ''))
-                )
-
-        # name болон alias дундаас хамгийн өндөр оноог сонгох
-        score = max(score_name, score_alias)
-        if score > best_score:
-            best, best_score = s, score
-
-    return best, best_score
-
 def guess_school(user_meta) -> School | None:
     """
     1. province_id >21 (УБ дүүрэг) бол тухайн дүүрэг → УБ бүх дүүрэг → бусад аймаг.
     2. province_id ≤21 (аймаг) бол тухайн аймаг → бусад аймаг.
+    3. province_id хоосон бол None: School.province заавал утгатай тул аймаггүй
+       сургууль байхгүй, хуучин province_id=None шүүлт ч үргэлж хоосон байсан.
     """
     if not user_meta.user_school_name:
         return None
 
     pid = user_meta.province_id
     target_name = user_meta.user_school_name
+    if pid is None:
+        return None
+
+    # name + alias-уудыг нэг удаа хэвшүүлсэн индекс (name, alias, зайгүй хэлбэрийн хамгийн их оноо)
+    matcher = get_school_matcher(normalize_name, include_aliases=True, join_spaces=True)
+    n1 = normalize_name(target_name)
 
     # 1-р шат: тухайн province дотор
-    qs = School.objects.filter(province_id=pid)
-    best, score = find_best_match(target_name, qs)
+    best, score = matcher.match(n1, pid, normalized=True)
     if best and score >= 75:
         return best
 
     if pid and pid > 21:
         # УБ-ийн бүх дүүрэг дотроос хайх
-        qs = School.objects.filter(province_id__gt=21)
-        best, score = find_best_match(target_name, qs)
+        ub_ids = [p for p in matcher.province_ids() if p > 21]
+        best, score = matcher.match(n1, ub_ids, normalized=True)
         if best and score >= 90:
             return best
 
@@ -8,6 +8,12 @@ def run_automerge_all_task():
     """--all горимд automerge коммандыг ажиллуулах Celery task."""
     call_command('automerge_users', all=True, no_input=True)
 
+@shared_task
+def detect_duplicate_users_task():
+    """Давхардсан хэрэглэгчдийг илрүүлж нэгтгэх хүсэлт үүсгэх шөнийн task."""
+    from .dedup import detect_duplicate_users
+    return detect_duplicate_users()
+
 @shared_task
 def run_advance_grades_task():
     """advance_grades коммандыг ажиллуулах Celery task."""
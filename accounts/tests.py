@@ -1,3 +1,27 @@
 from django.test import TestCase
 
-# Create your tests here.
+from schools.models import School
+
+from .models import Province, UserMeta, Zone
+from .school_utils import guess_school
+
+
+class GuessSchoolTests(TestCase):
+    """school_utils.guess_school: аймаг доторх хайлт ба аймаггүй хэрэглэгч."""
+
+    @classmethod
+    def setUpTestData(cls):
+        zone = Zone.objects.create(name='Төв')
+        cls.province = Province.objects.create(name='Аймаг', zone=zone)
+        cls.school = School.objects.create(name='12 дугаар сургууль', province=cls.province, alias='Арван хоёр')
+
+    def test_matches_within_province(self):
+        meta = UserMeta(province=self.province, user_school_name='12-р сургууль')
+        self.assertEqual(guess_school(meta), self.school)
+        meta.user_school_name = 'Арван хоёр'
+        self.assertEqual(guess_school(meta), self.school)
+
+    def test_no_province_returns_none(self):
+        # Бүх сургууль аймагтай тул аймаггүй хэрэглэгчид таамаглахгүй (өмнөх үйлдэлтэй ижил)
+        self.assertIsNone(guess_school(UserMeta(province=None, user_school_name='12 дугаар сургууль')))
+        self.assertIsNone(guess_school(UserMeta(province=self.province, user_school_name='')))
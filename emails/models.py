@@ -66,6 +66,8 @@ class EmailCampaign(models.Model):
     daily_limit = models.IntegerField(default=50000)
     emails_sent_today = models.IntegerField(default=0)
     last_reset_date = models.DateField(auto_now_add=True)
+    # Илгээж буй driver-ийн сүүлийн ээлж (emails.scheduler.claim_stalled_campaigns)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -79,9 +81,11 @@ class EmailRecipient(models.Model):
     is_test = models.BooleanField(default=False, null=True, blank=True)
 
     STATUS_CHOICES = [
-        ('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('bounced', 'Bounced'),
+        ('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'),
+        ('bounced', 'Bounced'),
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    claimed_at = models.DateTimeField(null=True, blank=True)  # driver 'sending' болгон эзэмшсэн хугацаа
     sent_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True, null=True)
     message_id = models.CharField(max_length=255, blank=True, null=True)
@@ -0,0 +1,98 @@
+# emails/recipients.py
+"""
+Campaign-ийн recipient-уудыг нэг INSERT ... SELECT-ээр үүсгэх.
+
+Хэрэглэгчдийг Python руу уншиж bulk_create хийхийн оронд шүүлтүүрийн queryset-ийг дэд
+query болгон DB дотор шууд EmailRecipient руу хуулна. Татгалзсан хэрэглэгчид, hard
+bounce/complaint хаягууд болон unique_per_email (DISTINCT ON lower(email)) SQL дотор
+хасагдана. 300k хэрэглэгчтэй campaign хэдэн секундэд, worker-ийн тогтмол санах ойгоор үүснэ.
+"""
+from django.contrib.auth.models import User
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Lower
+
+from .models import EmailBounce, EmailRecipient, EmailUnsubscribe
+
+SUPPRESSED_BOUNCES = ['hard', 'complaint']
+
+# user.get_full_name() or user.username (name талбар 100 тэмдэгт)
+NAME_SQL = "LEFT(COALESCE(NULLIF(TRIM(CONCAT({t}.first_name, ' ', {t}.last_name)), ''), {t}.username), 100)"
+
+
+def _bounced(email_ref):
+    return EmailBounce.objects.filter(email=email_ref, bounce_type__in=SUPPRESSED_BOUNCES)
+
+
+def _insert(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def materialize_from_users(campaign, users):
+    """users queryset-ээс recipient-уудыг үүсгэнэ. Шинээр нэмэгдсэн тоог буцаана."""
+    users = (
+        users.order_by()
+        .exclude(Exists(EmailUnsubscribe.objects.filter(user_id=OuterRef('pk'))))
+        .exclude(Exists(_bounced(OuterRef('email'))))
+        .annotate(email_key=Lower('email'))
+    )
+    if campaign.unique_per_email:
+        # Өмнө нь энэ campaign-д орсон хаягуудыг дахин нэмэхгүй
+        users = users.exclude(Exists(
+            EmailRecipient.objects.filter(campaign_id=campaign.id, email__iexact=OuterRef('email'))
+        ))
+    try:
+        inner_sql, inner_params = users.values_list(
+            'id', 'email', 'first_name', 'last_name', 'username', 'email_key'
+        ).query.sql_with_params()
+    except EmptyResultSet:
+        # User.objects.none(), id__in=[] гэх мэт: SQL үүсэхгүй, нэмэх хэрэглэгч байхгүй
+        return 0
+
+    distinct, order = '', ''
+    if campaign.unique_per_email:
+        # Нэг хаягт нэг recipient - хамгийн бага ID-тай хэрэглэгч
+        distinct, order = 'DISTINCT ON (s.email_key)', 'ORDER BY s.email_key, s.id'
+
+    table = EmailRecipient._meta.db_table
+    sql = f"""
+        INSERT INTO {table} (campaign_id, email, name, user_id, is_test, status)
+        SELECT {distinct} %s, s.email, {NAME_SQL.format(t='s')}, s.id, false, 'pending'
+        FROM ({inner_sql}) s
+        {order}
+        ON CONFLICT DO NOTHING
+    """
+    return _insert(sql, [campaign.id, *inner_params])
+
+
+def materialize_from_emails(campaign, emails):
+    """Имэйл хаягуудын жагсаалтаас recipient-уудыг үүсгэнэ (хэрэглэгчтэй бол холбоно).
+
+    emails: жижиг үсгээр, давхардалгүй. Шинээр нэмэгдсэн тоог буцаана.
+    """
+    if not emails:
+        return 0
+    table = EmailRecipient._meta.db_table
+    bounce_table = EmailBounce._meta.db_table
+    unsubscribe_table = EmailUnsubscribe._meta.db_table
+    user_table = User._meta.db_table
+    sql = f"""
+        INSERT INTO {table} (campaign_id, email, name, user_id, is_test, status)
+        SELECT %s, e.email, COALESCE({NAME_SQL.format(t='u')}, LEFT(split_part(e.email, '@', 1), 100)),
+               u.id, false, 'pending'
+        FROM unnest(%s::text[]) AS e(email)
+        LEFT JOIN LATERAL (
+            SELECT id, first_name, last_name, username FROM {user_table}
+            WHERE LOWER(email) = e.email ORDER BY id LIMIT 1
+        ) u ON true
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {bounce_table} b WHERE b.email = e.email AND b.bounce_type = ANY(%s)
+        )
+        AND NOT EXISTS (SELECT 1 FROM {unsubscribe_table} x WHERE x.user_id = u.id)
+        AND NOT EXISTS (SELECT 1 FROM {table} r WHERE r.campaign_id = %s AND LOWER(r.email) = e.email)
+        ON CONFLICT DO NOTHING
+    """
+    return _insert(sql, [campaign.id, list(emails), SUPPRESSED_BOUNCES, campaign.id])
@@ -0,0 +1,270 @@
+# emails/scheduler.py
+"""
+Campaign илгээх scheduler.
+
+Бүх recipient-ийг урьдчилан countdown-тай task болгон broker-т хийхийн оронд campaign бүрт
+цөөн тооны "driver" task (EMAIL_CAMPAIGN_DRIVERS) ажиллана. Driver нь:
+    1. Бүх worker-ийн хуваалцах token bucket-аас (EMAIL_SEND_RATE/сек, EMAIL_DAILY_QUOTA/өдөр)
+       зөвшөөрөл авна,
+    2. Авсан тооны pending recipient-ийг богино transaction-д select_for_update(skip_locked)-ээр
+       сонгож 'sending' (claimed_at) болгон эзэмшинэ - transaction шууд commit хийгдэнэ,
+    3. send_campaign_batch-аар transaction, мөрийн түгжээгүйгээр илгээнэ.
+Provider throttling алдаа өгвөл хуваалцсан хурдны коэффициентыг хоёр дахин бууруулж (AIMD),
+амжилттай багц бүрт аажмаар сэргээнэ. Дараалал хоосормогц campaign шууд дуусна. Driver нь
+DRIVER_TIME_SLICE секунд ажиллаад worker-ийг чөлөөлж, өөрийгөө дахин дараалалд оруулна.
+
+Driver бүр ээлж бүрдээ campaign-ийн heartbeat_at-ийг шинэчилнэ. Worker унавал (SIGKILL, deploy)
+emails.tasks.restart_stalled_campaigns (beat) нь claim_timeout()-оос удаан эзэмшигдсэн
+recipient-уудыг pending руу буцааж, heartbeat-гүй 'sending' campaign-ийн driver-уудыг дахин эхлүүлнэ.
+"""
+import logging
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailCampaign, EmailRecipient
+from .sender import send_campaign_batch
+
+logger = logging.getLogger(__name__)
+
+DRIVER_TIME_SLICE = 50      # секунд; үүний дараа driver өөрийгөө дахин дараалалд оруулна
+CHUNK_SIZE = 50             # нэг удаа түгжих recipient-ийн дээд тоо
+MIN_RATE_FACTOR = 0.05
+RATE_RECOVERY = 0.05        # амжилттай багц бүрт коэффициентыг нэмэх хэмжээ
+MAX_BACKOFF = 60
+
+RATE_FACTOR_KEY = 'email_rate_factor'
+BACKOFF_KEY = 'email_rate_backoff'
+
+
+def send_rate():
+    return getattr(settings, 'EMAIL_SEND_RATE', 14)
+
+
+def daily_quota():
+    return getattr(settings, 'EMAIL_DAILY_QUOTA', 50000)
+
+
+def driver_count():
+    return getattr(settings, 'EMAIL_CAMPAIGN_DRIVERS', 2)
+
+
+def claim_timeout():
+    """Эзэмшсэн recipient / driver-ийн heartbeat үүнээс (секунд) хуучин бол унасан гэж үзнэ."""
+    return getattr(settings, 'EMAIL_CLAIM_TIMEOUT', 300)
+
+
+def check_daily_limit(campaign):
+    """Өдрийн лимит шалгах ба reset хийх"""
+    today = date.today()
+    if campaign.last_reset_date < today:
+        campaign.emails_sent_today = 0
+        campaign.last_reset_date = today
+        campaign.save(update_fields=['emails_sent_today', 'last_reset_date'])
+    return campaign.daily_limit - campaign.emails_sent_today
+
+
+class TokenBucket:
+    """Бүх worker-ийн хуваалцах илгээлтийн лимит (Django cache дээрх атомар тоолуурууд).
+
+    Секунд бүрийн цонхонд rate * коэффициент хүртэлх token олгоно. Өдрийн тоолуур нь
+    provider-ийн өдрийн квотыг бүх campaign-д хуваалцана.
+    """
+
+    def __init__(self, rate=None, quota=None, prefix='email_bucket'):
+        self.rate = rate or send_rate()
+        self.quota = quota or daily_quota()
+        self.prefix = prefix
+
+    def _take(self, key, limit, n, timeout):
+        cache.add(key, 0, timeout)
+        try:
+            used = cache.incr(key, n)
+        except ValueError:
+            # Түлхүүр яг энэ үед хугацаа нь дууссан
+            cache.add(key, 0, timeout)
+            used = cache.incr(key, n)
+        granted = max(0, min(n, limit - (used - n)))
+        if granted < n:
+            cache.decr(key, n - granted)
+        return granted
+
+    def rate_limit(self):
+        return max(1, int(self.rate * rate_factor()))
+
+    def daily_remaining(self):
+        return self.quota - (cache.get(f'{self.prefix}_day_{date.today().isoformat()}') or 0)
+
+    def acquire(self, n, deadline):
+        """n хүртэлх token авна. Цонх дүүрсэн бол дараагийн секундийг хүлээнэ.
+
+        deadline (time.monotonic) хүртэл авч чадаагүй бол 0.
+        """
+        while time.monotonic() < deadline:
+            now = time.time()
+            granted = self._take(f'{self.prefix}_{int(now)}', self.rate_limit(), n, 5)
+            if granted:
+                return granted
+            time.sleep(1 - (now % 1))
+        return 0
+
+    def consume_daily(self, n):
+        """Өдрийн квотоос n хүртэлхийг авна (олгогдсон тоог буцаана)."""
+        return self._take(f'{self.prefix}_day_{date.today().isoformat()}', self.quota, n, 2 * 24 * 3600)
+
+    def refund_daily(self, n):
+        if n > 0:
+            try:
+                cache.decr(f'{self.prefix}_day_{date.today().isoformat()}', n)
+            except ValueError:
+                pass
+
+
+def rate_factor():
+    return cache.get(RATE_FACTOR_KEY) or 1.0
+
+
+def throttled():
+    """Provider хязгаарласан: хурдыг хоёр дахин бууруулж, backoff-ийг өсгөнө. Хүлээх секундийг буцаана."""
+    cache.set(RATE_FACTOR_KEY, max(MIN_RATE_FACTOR, rate_factor() / 2), 3600)
+    backoff = min(MAX_BACKOFF, (cache.get(BACKOFF_KEY) or 0.5) * 2)
+    cache.set(BACKOFF_KEY, backoff, 600)
+    return backoff
+
+
+def recovered():
+    factor = rate_factor()
+    if factor < 1.0:
+        cache.set(RATE_FACTOR_KEY, min(1.0, factor + RATE_RECOVERY), 3600)
+    if cache.get(BACKOFF_KEY):
+        cache.delete(BACKOFF_KEY)
+
+
+def _claim(campaign_id, limit):
+    """limit хүртэлх pending recipient-ийг 'sending' болгож эзэмшинэ (түгжээ зөвхөн энэ UPDATE-д)."""
+    with transaction.atomic():
+        ids = list(
+            EmailRecipient.objects.select_for_update(skip_locked=True)
+            .filter(campaign_id=campaign_id, status='pending', is_test=False)
+            .order_by('id').values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        EmailRecipient.objects.filter(id__in=ids).update(status='sending', claimed_at=timezone.now())
+    return list(EmailRecipient.objects.filter(id__in=ids).order_by('id'))
+
+
+def release_claims(recipient_ids=None, claimed_before=None):
+    """Илгээгдээгүй эзэмшсэн recipient-уудыг pending руу буцаана."""
+    recipients = EmailRecipient.objects.filter(status='sending')
+    if recipient_ids is not None:
+        recipients = recipients.filter(id__in=recipient_ids)
+    if claimed_before is not None:
+        recipients = recipients.filter(claimed_at__lt=claimed_before)
+    return recipients.update(status='pending')
+
+
+def _claim_and_send(campaign, limit):
+    """Pending recipient-уудыг эзэмшиж илгээнэ. Буцаана: (claimed, sent, failed, throttled)."""
+    recipients = _claim(campaign.id, limit)
+    if not recipients:
+        return 0, 0, 0, 0
+    try:
+        sent, failed, throttled_count = send_campaign_batch(campaign, recipients)
+    except Exception:
+        # Төлөв хадгалагдаагүй: watchdog-ийг хүлээлгүй шууд дараагийн ээлжид буцаана
+        release_claims([r.id for r in recipients])
+        raise
+    return len(recipients), sent, failed, throttled_count
+
+
+def complete_if_drained(campaign_id):
+    """Pending болон илгээгдэж буй recipient үлдээгүй бол campaign-ийг дууссан гэж тэмдэглэнэ."""
+    if EmailRecipient.objects.filter(
+        campaign_id=campaign_id, status__in=['pending', 'sending'], is_test=False
+    ).exists():
+        return False
+    done = EmailCampaign.objects.filter(pk=campaign_id, status='sending').update(status='sent', sent_at=timezone.now())
+    if done:
+        logger.info(f"Campaign {campaign_id} completed!")
+    return True
+
+
+def pause_campaign(campaign_id, reason):
+    EmailCampaign.objects.filter(pk=campaign_id, status='sending').update(status='paused')
+    logger.info(f"Campaign {campaign_id}: Paused ({reason}).")
+
+
+def claim_stalled_campaigns():
+    """Driver нь claim_timeout()-оос удаан heartbeat өгөөгүй 'sending' campaign-уудын ID.
+
+    Унасан driver-уудын эзэмшсэн recipient-уудыг эхлээд pending руу буцаана. Campaign бүрийн
+    heartbeat_at-ийг нөхцөлтэй UPDATE-ээр шинэчилж эзэмшдэг тул зэрэг ажилласан watchdog-ууд
+    нэг campaign-ийг давхар эхлүүлэхгүй.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=claim_timeout())
+    released = release_claims(claimed_before=cutoff)
+    if released:
+        logger.warning(f"Released {released} stale email recipient claims.")
+
+    stale = Q(status='sending') & (Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True))
+    return [
+        campaign_id
+        for campaign_id in EmailCampaign.objects.filter(stale).values_list('id', flat=True)
+        if EmailCampaign.objects.filter(stale, pk=campaign_id).update(heartbeat_at=now)
+    ]
+
+
+def run_driver(campaign_id, bucket=None):
+    """Нэг driver-ийн ээлж. Буцаана: (үр дүн, дахин эхлэх хүртэлх секунд | None).
+
+    Үр дүн: 'continue' (дахин дараалалд оруулах), 'done', 'paused', 'stopped'.
+    """
+    bucket = bucket or TokenBucket()
+    deadline = time.monotonic() + DRIVER_TIME_SLICE
+
+    while time.monotonic() < deadline:
+        campaign = EmailCampaign.objects.filter(pk=campaign_id).first()
+        if campaign is None or campaign.status != 'sending':
+            # Админ зогсоосон эсвэл өөр driver дуусгасан
+            return 'stopped', None
+        EmailCampaign.objects.filter(pk=campaign_id).update(heartbeat_at=timezone.now())
+
+        remaining = min(check_daily_limit(campaign), bucket.daily_remaining())
+        if remaining <= 0:
+            pause_campaign(campaign_id, 'daily limit')
+            return 'paused', None
+
+        tokens = bucket.acquire(min(CHUNK_SIZE, remaining), deadline)
+        if not tokens:
+            break
+        tokens = bucket.consume_daily(tokens)
+        if not tokens:
+            pause_campaign(campaign_id, 'daily quota')
+            return 'paused', None
+
+        claimed, sent, failed, throttled_count = _claim_and_send(campaign, tokens)
+        # Илгээгдээгүй (throttle болсон, илгээх зүйлгүй) token-уудыг өдрийн квотод буцаана
+        bucket.refund_daily(tokens - sent - failed)
+
+        if not claimed:
+            # Бусад driver-ууд үлдсэнийг түгжсэн байж болно - тэд дуусгана
+            complete_if_drained(campaign_id)
+            return 'done', None
+
+        if throttled_count:
+            backoff = throttled()
+            logger.warning(f"Campaign {campaign_id}: Provider throttled, backing off {backoff:.1f}s")
+            if time.monotonic() + backoff >= deadline:
+                return 'continue', backoff
+            time.sleep(backoff)
+        else:
+            recovered()
+
+    return 'continue', 0
@@ -0,0 +1,159 @@
+# emails/sender.py
+"""
+Campaign-ийн имэйлийг багцаар илгээх.
+
+Template-ууд campaign тутамд нэг удаа compile хийгдэж (CampaignRenderer), багц бүр нэг
+backend холболтоор (get_connection) илгээгдэнэ. Recipient-уудын төлөв нэг bulk_update-ээр,
+campaign-ийн тоолуурууд нэг UPDATE-ээр бичигдэнэ - 200k хүлээн авагчтай campaign-д DB-ийн
+round-trip имэйл тутамд биш, багц тутамд болно.
+"""
+import logging
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.template import Context, Template
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import EmailBounce, EmailCampaign, EmailRecipient, EmailUnsubscribe
+
+logger = logging.getLogger(__name__)
+
+TEXT_FOOTER = "\n\n---\nТатгалзах: {{ unsubscribe_url }}"
+HTML_FOOTER = '<hr><p style="font-size:12px;text-align:center;">Татгалзах: <a href="{{ unsubscribe_url }}">энд дарна уу</a></p>'
+
+RECIPIENT_FIELDS = ['status', 'sent_at', 'error_message', 'message_id']
+UNSENT = ('pending', 'sending')  # 'sending': scheduler эзэмшсэн, хараахан илгээгдээгүй
+THROTTLING_MARKERS = ('throttl', 'rate exceeded', 'too many requests')
+RENDERER_CACHE_SIZE = 32
+
+_renderers = {}
+
+
+class CampaignRenderer:
+    """Campaign-ийн compile хийсэн template-ууд ба unsubscribe холбоос үүсгэгч."""
+
+    def __init__(self, campaign, subject_prefix='', text_prefix='', html_prefix='', html_footer=HTML_FOOTER):
+        self.subject = subject_prefix + campaign.subject
+        self.from_email = campaign.from_email
+        self.text_template = Template(text_prefix + campaign.message + TEXT_FOOTER)
+        self.html_template = (
+            Template(html_prefix + campaign.html_message + html_footer) if campaign.html_message else None
+        )
+        self.signer = signing.Signer()
+        self.unsubscribe_base = f"{settings.SITE_URL}{reverse('email_unsubscribe')}?token="
+
+    def unsubscribe_url(self, recipient):
+        token_value = recipient.user_id if recipient.user_id else recipient.email
+        return self.unsubscribe_base + self.signer.sign(str(token_value))
+
+    def message(self, recipient, default_name='User'):
+        context = Context({'name': recipient.name or default_name, 'unsubscribe_url': self.unsubscribe_url(recipient)})
+        msg = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.text_template.render(context),
+            from_email=self.from_email,
+            to=[recipient.email],
+        )
+        if self.html_template:
+            msg.attach_alternative(self.html_template.render(context), "text/html")
+        return msg
+
+
+def get_renderer(campaign):
+    """Worker дотор campaign-ийн renderer-ийг дахин ашиглана (агуулга өөрчлөгдвөл шинээр)."""
+    key = (campaign.id, campaign.subject, campaign.from_email, campaign.message, campaign.html_message)
+    renderer = _renderers.get(campaign.id)
+    if renderer is None or renderer[0] != key:
+        if len(_renderers) >= RENDERER_CACHE_SIZE:
+            _renderers.clear()
+        renderer = _renderers[campaign.id] = (key, CampaignRenderer(campaign))
+    return renderer[1]
+
+
+def _mark_sent(recipient, msg, now):
+    recipient.status = 'sent'; recipient.sent_at = now
+    status = getattr(msg, 'anymail_status', None)
+    if status is not None:
+        recipient.message_id = status.message_id
+
+
+def is_throttling_error(error):
+    """Provider-ийн хурдны хязгаарлалтын алдаа эсэх (SES Throttling, HTTP 429)."""
+    if getattr(error, 'status_code', None) == 429:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in THROTTLING_MARKERS)
+
+
+def _mark_failed(recipient, error):
+    recipient.status = 'failed'; recipient.error_message = str(error)[:500]
+
+
+def send_campaign_batch(campaign, recipients):
+    """Recipient-уудад нэг холболтоор илгээж, төлвийг багцаар хадгална.
+
+    Буцаана: (sent, failed, throttled) - татгалзсан/bounce болсон хаягууд failed-д
+    тоологдохгүй. Provider хязгаарласан бол үлдсэн recipient-ууд pending (scheduler-ийн
+    эзэмшсэн 'sending' бол мөн pending руу буцаж) үлдэж, тэдгээрийн тоо throttled-д буцна.
+    """
+    recipients = list(recipients)
+    if not recipients:
+        return 0, 0, 0
+
+    # Зөвхөн энэ багцын хэрэглэгч, хаягуудыг шалгана
+    unsubscribed_user_ids = set(EmailUnsubscribe.objects.filter(
+        user_id__in=[r.user_id for r in recipients if r.user_id]
+    ).values_list('user_id', flat=True))
+    bounced_emails = set(EmailBounce.objects.filter(
+        email__in=[r.email for r in recipients], bounce_type__in=['hard', 'complaint']
+    ).values_list('email', flat=True))
+
+    renderer = get_renderer(campaign)
+    to_send = []
+    sent = failed = throttled = 0
+    for recipient in recipients:
+        if recipient.user_id in unsubscribed_user_ids or recipient.email in bounced_emails:
+            recipient.status = 'failed'; recipient.error_message = 'User unsubscribed or bounced'
+            continue
+        try:
+            to_send.append((recipient, renderer.message(recipient)))
+        except Exception as e:
+            _mark_failed(recipient, e); failed += 1
+            logger.error(f"Failed to render email for {recipient.email}: {e}")
+
+    if to_send:
+        try:
+            with get_connection() as connection:
+                for index, (recipient, msg) in enumerate(to_send):
+                    # Нэг мессежийн алдаа бусдыг зогсоохгүйн тулд нэг нэгээр, гэхдээ нэг холболтоор
+                    try:
+                        connection.send_messages([msg])
+                        _mark_sent(recipient, msg, timezone.now()); sent += 1
+                    except Exception as e:
+                        if is_throttling_error(e):
+                            # Үлдсэнийг pending хэвээр үлдээж, scheduler-т хурдаа бууруулахыг мэдэгдэнэ
+                            throttled = len(to_send) - index
+                            break
+                        _mark_failed(recipient, e); failed += 1
+                        logger.error(f"Failed to send to {recipient.email}: {e}")
+        except Exception as e:
+            # Холболт нээх/хаахад алдаа: илгээгдээгүй үлдсэн бүгд failed (throttle-оос бусад)
+            for recipient, _ in to_send[:len(to_send) - throttled]:
+                if recipient.status in UNSENT:
+                    _mark_failed(recipient, e); failed += 1
+            logger.error(f"Campaign {campaign.id}: Email connection error: {e}")
+
+    for recipient in recipients:
+        if recipient.status == 'sending':
+            recipient.status = 'pending'
+    EmailRecipient.objects.bulk_update(recipients, RECIPIENT_FIELDS)
+    if sent or failed:
+        EmailCampaign.objects.filter(pk=campaign.id).update(
+            sent_count=F('sent_count') + sent,
+            emails_sent_today=F('emails_sent_today') + sent,
+            failed_count=F('failed_count') + failed,
+        )
+    return sent, failed, throttled
@@ -1,18 +1,18 @@
 # emails/tasks.py
 from celery import shared_task
-from django.core.mail import EmailMultiAlternatives
-from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models import Q, F
-from datetime import timedelta, date
-from django.template import Template, Context
-from django.urls import reverse
-from django.core import signing
+from django.db.models import Q
+from datetime import timedelta
 import logging
 import re
 
-from .models import EmailCampaign, EmailRecipient, EmailUnsubscribe, EmailBounce
+from .models import EmailCampaign, EmailRecipient
+from .recipients import materialize_from_emails, materialize_from_users
+from .scheduler import (
+    check_daily_limit, claim_stalled_campaigns, complete_if_drained, driver_count, pause_campaign, run_driver,
+)
+from .sender import CampaignRenderer, send_campaign_batch
 from schools.models import School
 
 logger = logging.getLogger(__name__)
@@ -44,14 +44,18 @@ def get_users_by_filters(campaign):
             logger.warning(f"School {campaign.specific_school.id} has no associated group.")
             return User.objects.none()
     elif campaign.specific_province:
-        schools_in_province = School.objects.filter(province=campaign.specific_province)
-        valid_group_ids = [s.group_id for s in schools_in_province if s.group_id]
+        valid_group_ids = list(School.objects.filter(
+            province=campaign.specific_province, group__isnull=False
+        ).values_list('group_id', flat=True))
         if valid_group_ids:
-            base_query = base_query.filter(groups__id__in=valid_group_ids)
+            # JOIN-оор бус дэд query-гээр: олон группт байгаа хэрэглэгч давхардахгүй
+            base_query = base_query.filter(id__in=User.groups.through.objects.filter(
+                group_id__in=valid_group_ids
+            ).values('user_id'))
         else:
             logger.warning(f"No schools with groups found in province {campaign.specific_province.id}.")
             return User.objects.none()
-    return base_query.distinct()
+    return base_query
 
 
 @shared_task
@@ -61,46 +65,14 @@ def create_recipients_from_filters(campaign_id):
     try:
         campaign = EmailCampaign.objects.get(id=campaign_id)
         campaign.status = 'queued'; campaign.save()
-        users = get_users_by_filters(campaign)
-        total_users = users.count()
+        # Нэг INSERT ... SELECT: татгалзсан, bounce, unique_per_email SQL дотор хасагдана
+        materialize_from_users(campaign, get_users_by_filters(campaign))
+        campaign.total_recipients = campaign.recipients.filter(is_test=False).count()
 
-        if total_users == 0:
-            campaign.total_recipients = 0
+        if campaign.total_recipients == 0:
             campaign.status = 'draft'; campaign.save()
             return "No users found"
 
-        # unique_per_email = True бол нэг имэйл хаяг руу 1 л удаа явуулна
-        if campaign.unique_per_email:
-            seen_emails = set()
-            recipients = []
-            for user in users.iterator():
-                email_lower = user.email.lower()
-                if email_lower not in seen_emails:
-                    seen_emails.add(email_lower)
-                    recipients.append(
-                        EmailRecipient(campaign=campaign, email=user.email, name=user.get_full_name() or user.username, user=user)
-                    )
-                    # Batch-ээр хадгалах
-                    if len(recipients) >= 2000:
-                        EmailRecipient.objects.bulk_create(recipients, batch_size=1000, ignore_conflicts=True)
-                        recipients = []
-            # Үлдсэнийг хадгалах
-            if recipients:
-                EmailRecipient.objects.bulk_create(recipients, batch_size=1000, ignore_conflicts=True)
-            campaign.total_recipients = len(seen_emails)
-        else:
-            # Хэрэглэгч бүрт илгээнэ (ижил имэйлтэй хэрэглэгчид бүгдэд очно)
-            campaign.total_recipients = total_users
-            batch_size = 2000
-            for i in range(0, total_users, batch_size):
-                batch_users = users[i:i + batch_size]
-                recipients = [
-                    EmailRecipient(campaign=campaign, email=user.email, name=user.get_full_name() or user.username, user=user)
-                    for user in batch_users
-                ]
-                if recipients:
-                    EmailRecipient.objects.bulk_create(recipients, batch_size=1000, ignore_conflicts=True)
-
         campaign.status = 'draft'; campaign.save()
     except Exception as e:
         logger.error(f"Error creating recipients for campaign {campaign_id}: {e}")
@@ -125,17 +97,11 @@ def create_recipients_from_email_list(campaign_id, email_list_text):
             campaign.status = 'draft'; campaign.total_recipients = 0; campaign.save()
             return "No valid emails found in list"
 
-        recipients = []
-        for email in unique_emails:
-            user = User.objects.filter(email=email).first()
-            name = user.get_full_name() or user.username if user else email.split('@')[0]
-            recipients.append(EmailRecipient(campaign=campaign, email=email, name=name, user=user))
-
-        if recipients:
-            EmailRecipient.objects.bulk_create(recipients, batch_size=1000, ignore_conflicts=True)
+        created = materialize_from_emails(campaign, unique_emails)
 
-        campaign.total_recipients = len(recipients); campaign.status = 'draft'; campaign.save()
-        return f"Created {len(recipients)} recipients from email list"
+        campaign.total_recipients = campaign.recipients.filter(is_test=False).count()
+        campaign.status = 'draft'; campaign.save()
+        return f"Created {created} recipients from email list"
     except Exception as e:
         logger.error(f"Error creating from email list for campaign {campaign_id}: {e}")
         if campaign:
@@ -143,65 +109,17 @@ def create_recipients_from_email_list(campaign_id, email_list_text):
         raise
 
 
-def check_daily_limit(campaign):
-    """Өдрийн лимит шалгах ба reset хийх"""
-    today = date.today()
-    if campaign.last_reset_date < today:
-        campaign.emails_sent_today = 0
-        campaign.last_reset_date = today
-        campaign.save(update_fields=['emails_sent_today', 'last_reset_date'])
-    return campaign.daily_limit - campaign.emails_sent_today
-
-
 @shared_task
 def send_email_batch_ses(campaign_id, recipient_ids):
-    """Имэйл багцыг илгээх"""
+    """Имэйл багцыг нэг холболтоор илгээх (emails/sender.py).
+
+    Campaign-ууд одоо run_campaign_driver-ээр явна; өмнө нь дараалалд орсон багцуудад үлдээв.
+    """
     try:
         campaign = EmailCampaign.objects.get(id=campaign_id)
-        recipients = EmailRecipient.objects.filter(id__in=recipient_ids, status='pending').select_related('user')
-
-        unsubscribed_user_ids = set(EmailUnsubscribe.objects.values_list('user_id', flat=True))
-        bounced_emails = set(EmailBounce.objects.filter(bounce_type__in=['hard', 'complaint']).values_list('email', flat=True))
-
-        for recipient in recipients:
-            if (recipient.user and recipient.user.id in unsubscribed_user_ids) or (recipient.email in bounced_emails):
-                recipient.status = 'failed'; recipient.error_message = 'User unsubscribed or bounced'; recipient.save()
-                continue
-
-            try:
-                signer = signing.Signer()
-                token_value = recipient.user.id if recipient.user else recipient.email
-                token = signer.sign(str(token_value))
-                unsubscribe_url = f"{settings.SITE_URL}{reverse('email_unsubscribe')}?token={token}"
-
-                context = Context({'name': recipient.name or 'User', 'unsubscribe_url': unsubscribe_url})
-                text_template = Template(campaign.message + "\n\n---\nТатгалзах: {{ unsubscribe_url }}")
-                personalized_message = text_template.render(context)
-
-                msg = EmailMultiAlternatives(
-                    subject=campaign.subject,
-                    body=personalized_message,
-                    from_email=campaign.from_email,  # --- ШИНЭЧЛЭЛ: Campaign-аас from_email-г ашиглах ---
-                    to=[recipient.email]
-                )
-                if campaign.html_message:
-                    html_template = Template(campaign.html_message + '<hr><p style="font-size:12px;text-align:center;">Татгалзах: <a href="{{ unsubscribe_url }}">энд дарна уу</a></p>')
-                    msg.attach_alternative(html_template.render(context), "text/html")
-
-                msg.send()
-
-                recipient.status = 'sent'; recipient.sent_at = timezone.now()
-                if hasattr(msg, 'anymail_status'): recipient.message_id = msg.anymail_status.message_id
-                recipient.save()
-
-                EmailCampaign.objects.filter(pk=campaign.id).update(
-                    sent_count=F('sent_count') + 1,
-                    emails_sent_today=F('emails_sent_today') + 1
-                )
-            except Exception as e:
-                recipient.status = 'failed'; recipient.error_message = str(e)[:500]; recipient.save()
-                EmailCampaign.objects.filter(pk=campaign.id).update(failed_count=F('failed_count') + 1)
-                logger.error(f"Failed to send to {recipient.email}: {e}")
+        recipients = EmailRecipient.objects.filter(id__in=recipient_ids, status='pending')
+        sent, failed, throttled = send_campaign_batch(campaign, recipients)
+        return {'sent': sent, 'failed': failed, 'throttled': throttled}
     except Exception as e:
         logger.error(f"Campaign {campaign_id}: Batch send error: {e}")
         raise
@@ -209,34 +127,20 @@ def send_email_batch_ses(campaign_id, recipient_ids):
 
 @shared_task
 def send_campaign_async(campaign_id):
-    """Campaign-ийг rate limit-тэй batch-аар явуулах"""
+    """Campaign-ийг token bucket-тай driver-уудаар илгээж эхлүүлэх (emails/scheduler.py)"""
     try:
         campaign = EmailCampaign.objects.get(id=campaign_id)
         if campaign.status in ['sent', 'sending']: return f"Campaign already {campaign.status}"
 
-        campaign.status = 'sending'; campaign.save()
-        remaining = check_daily_limit(campaign)
-        if remaining <= 0:
+        campaign.status = 'sending'; campaign.heartbeat_at = timezone.now(); campaign.save()
+        if check_daily_limit(campaign) <= 0:
             campaign.status = 'paused'; campaign.save()
             return "Daily limit reached, campaign paused"
 
-        pending_recipients = campaign.recipients.filter(status='pending', is_test=False)
-        to_send_count = min(pending_recipients.count(), remaining)
-        if to_send_count == 0:
-            check_campaign_completion.delay(campaign.id)
+        if complete_if_drained(campaign.id):
             return "No pending recipients to send"
 
-        recipient_ids = list(pending_recipients.values_list('id', flat=True)[:to_send_count])
-        batch_size, delay = 60, 5
-        batch_count = 0
-        for i in range(0, len(recipient_ids), batch_size):
-            batch_ids = recipient_ids[i:i + batch_size]
-            send_email_batch_ses.apply_async(args=[campaign_id, batch_ids], countdown=batch_count * delay)
-            batch_count += 1
-
-        total_time = batch_count * delay + 60
-        check_campaign_completion.apply_async(args=[campaign_id], countdown=total_time)
-        logger.info(f"Campaign {campaign_id}: Queued {to_send_count} emails in {batch_count} batches.")
+        start_drivers(campaign_id)
     except Exception as e:
         if 'campaign' in locals() and campaign:
             campaign.status = 'failed'; campaign.save()
@@ -244,6 +148,23 @@ def send_campaign_async(campaign_id):
         raise
 
 
+def start_drivers(campaign_id):
+    drivers = driver_count()
+    for _ in range(drivers):
+        run_campaign_driver.delay(campaign_id)
+    logger.info(f"Campaign {campaign_id}: Started {drivers} send drivers.")
+
+
+@shared_task
+def run_campaign_driver(campaign_id):
+    """Хуваалцсан token bucket-аар recipient-уудыг DB-ээс хэсэгчлэн татаж илгээх"""
+    outcome, countdown = run_driver(campaign_id)
+    if outcome == 'continue':
+        # Worker-ийг чөлөөлж, дараагийн ээлжийг дараалалд оруулна (backoff бол хүлээлттэй)
+        run_campaign_driver.apply_async(args=[campaign_id], countdown=countdown or 0)
+    return outcome
+
+
 @shared_task
 def check_campaign_completion(campaign_id):
     """Campaign бүрэн илгээгдсэн эсэхийг шалгах"""
@@ -251,15 +172,10 @@ def check_campaign_completion(campaign_id):
         campaign = EmailCampaign.objects.get(id=campaign_id)
         if campaign.status not in ['sending', 'paused']: return
 
-        pending_count = campaign.recipients.filter(status='pending', is_test=False).count()
-        if pending_count == 0:
-            campaign.status = 'sent'; campaign.sent_at = timezone.now(); campaign.save()
-            logger.info(f"Campaign {campaign_id} completed!")
-        elif check_daily_limit(campaign) <= 0:
-            campaign.status = 'paused'; campaign.save()
-            logger.info(f"Campaign {campaign_id}: Paused due to daily limit.")
-        else:
-            check_campaign_completion.apply_async(args=[campaign_id], countdown=60)
+        if complete_if_drained(campaign_id):
+            return
+        if check_daily_limit(campaign) <= 0:
+            pause_campaign(campaign_id, 'daily limit')
     except Exception as e:
         logger.error(f"Campaign {campaign_id}: Error checking completion: {e}")
 
@@ -273,6 +189,16 @@ def resume_paused_campaigns():
             send_campaign_async.delay(campaign.id)
 
 
+@shared_task
+def restart_stalled_campaigns():
+    """Celery Beat: driver нь унасан (heartbeat-гүй) 'sending' campaign-уудыг дахин эхлүүлэх"""
+    for campaign_id in claim_stalled_campaigns():
+        if complete_if_drained(campaign_id):
+            continue
+        logger.warning(f"Campaign {campaign_id}: Send drivers stalled, restarting.")
+        start_drivers(campaign_id)
+
+
 @shared_task
 def send_test_email_task(campaign_id, recipient_id):
     """Тест имэйл илгээх task"""
@@ -280,25 +206,15 @@ def send_test_email_task(campaign_id, recipient_id):
         recipient = EmailRecipient.objects.get(id=recipient_id, is_test=True)
         campaign = recipient.campaign
 
-        signer = signing.Signer()
-        token = signer.sign(str(recipient.user_id) if recipient.user else recipient.email)
-        unsubscribe_url = f"{settings.SITE_URL}{reverse('email_unsubscribe')}?token={token}"
-
-        context = Context({'name': recipient.name or 'Test User', 'unsubscribe_url': unsubscribe_url})
-        text_template = Template("[ТЕСТ ИМЭЙЛ]\n\n" + campaign.message + "\n\n---\nТатгалзах: {{ unsubscribe_url }}")
-        personalized_message = text_template.render(context)
-
-        msg = EmailMultiAlternatives(
-            subject=f"[ТЕСТ] {campaign.subject}",
-            body=personalized_message,
-            from_email=campaign.from_email, # --- ШИНЭЧЛЭЛ: Campaign-аас from_email-г ашиглах ---
-            to=[recipient.email]
+        renderer = CampaignRenderer(
+            campaign,
+            subject_prefix="[ТЕСТ] ",
+            text_prefix="[ТЕСТ ИМЭЙЛ]\n\n",
+            html_prefix='''<div style="background:#fff3cd;padding:15px;margin-bottom:20px;"><strong>ТЕСТ ИМЭЙЛ</strong></div>''',
+            html_footer='''
+            <hr><p><a href="{{ unsubscribe_url }}">Татгалзах</a></p>''',
         )
-        if campaign.html_message:
-            html_template = Template('''<div style="background:#fff3cd;padding:15px;margin-bottom:20px;"><strong>ТЕСТ ИМЭЙЛ</strong></div>''' + campaign.html_message + '''
-            <hr><p><a href="{{ unsubscribe_url }}">Татгалзах</a></p>''')
-            msg.attach_alternative(html_template.render(context), "text/html")
-
+        msg = renderer.message(recipient, default_name='Test User')
         msg.send()
 
         recipient.status = 'sent'; recipient.sent_at = timezone.now()
@@ -1,3 +1,44 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import Province, Zone
+from schools.models import School
+
+from .models import EmailCampaign
+from .recipients import materialize_from_users
+from .tasks import create_recipients_from_filters
+
+
+class MaterializeRecipientsTests(TestCase):
+    """recipients.materialize_from_users: хоосон шүүлтүүр ба давхардалгүй хаяг."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', email='author@example.com')
+        zone = Zone.objects.create(name='Төв')
+        cls.school = School.objects.create(name='Сургууль', province=Province.objects.create(name='Аймаг', zone=zone))
+
+    def campaign(self, **kwargs):
+        return EmailCampaign.objects.create(
+            name='Туршилт', subject='Гарчиг', message='Мессеж', created_by=self.author, **kwargs
+        )
+
+    def test_empty_queryset_creates_nothing(self):
+        campaign = self.campaign()
+        self.assertEqual(materialize_from_users(campaign, User.objects.none()), 0)
+        self.assertEqual(materialize_from_users(campaign, User.objects.filter(id__in=[])), 0)
+        self.assertFalse(campaign.recipients.exists())
+
+    def test_school_without_group_keeps_campaign_in_draft(self):
+        # get_users_by_filters нь группгүй сургуульд User.objects.none() буцаана
+        campaign = self.campaign(specific_school=self.school)
+        self.assertEqual(create_recipients_from_filters(campaign.id), 'No users found')
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.total_recipients), ('draft', 0))
+
+    def test_one_recipient_per_email(self):
+        User.objects.create(username='a', email='Same@example.com')
+        User.objects.create(username='b', email='same@example.com')
+        campaign = self.campaign(unique_per_email=True)
+        self.assertEqual(materialize_from_users(campaign, User.objects.exclude(pk=self.author.pk)), 1)
+        self.assertEqual(materialize_from_users(campaign, User.objects.exclude(pk=self.author.pk)), 0)
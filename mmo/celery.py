@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 # Django төслийн settings.py файлыг Celery-д зааж өгөх
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mmo.settings')
@@ -19,4 +20,28 @@ app.conf.beat_schedule = {
         'task': 'emails.tasks.resume_paused_campaigns',
         'schedule': 3600.0,  # Цаг бүр шалгах
     },
+    'restart-stalled-campaigns': {
+        'task': 'emails.tasks.restart_stalled_campaigns',
+        'schedule': 300.0,  # 5 минут тутам: driver нь унасан 'sending' campaign-уудыг сэргээх
+    },
+    'flush-answer-buffers': {
+        'task': 'olympiad.tasks.flush_answer_buffers',
+        'schedule': 5.0,  # Auto-save хариултуудыг 5 секунд тутам DB-д бичих
+    },
+    'provision-upcoming-results': {
+        'task': 'olympiad.tasks.provision_upcoming_results',
+        'schedule': 600.0,  # 10 минут тутам: группт шинээр нэмэгдсэн сурагчдад Result үүсгэх
+    },
+    'prune-excel-parse-cache': {
+        'task': 'olympiad.tasks.prune_excel_parse_cache',
+        'schedule': crontab(hour=3, minute=30),  # Өдөр бүр хуучирсан Excel parse cache устгах
+    },
+    'prune-export-jobs': {
+        'task': 'olympiad.tasks.prune_export_jobs',
+        'schedule': crontab(hour=4, minute=0),  # Өдөр бүр хуучирсан экспортын файлуудыг устгах
+    },
+    'detect-duplicate-users': {
+        'task': 'accounts.tasks.detect_duplicate_users_task',
+        'schedule': crontab(hour=2, minute=0),  # Шөнө бүр давхардсан хэрэглэгч илрүүлэх
+    },
 }
\ No newline at end of file
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 
-from .models import Olympiad, SchoolYear, Topic, Problem, AnswerChoice, Award, Result, Solution, Team, Upload, Tag, RoundGuideline, OlympiadTimeline
+from .models import Olympiad, SchoolYear, Topic, Problem, AnswerChoice, Award, Result, Solution, Team, Upload, Tag, RoundGuideline, OlympiadTimeline, ExportJob
 
 class SchoolYearAdmin(admin.ModelAdmin):
     list_display = ("name", "start", "end", "guideline_post")
@@ -28,6 +28,14 @@ class OlympiadTimelineAdmin(admin.ModelAdmin):
 
 admin.site.register(OlympiadTimeline, OlympiadTimelineAdmin)
 
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "progress", "total", "requested_by", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("params_hash", "data_version", "started_at", "finished_at")
+
+admin.site.register(ExportJob, ExportJobAdmin)
+
 admin.site.register(Topic)
 admin.site.register(AnswerChoice)
 admin.site.register(Team)
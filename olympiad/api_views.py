@@ -2,13 +2,26 @@
 API endpoints for external systems to access olympiad data
 Requires API key authentication
 """
-from django.http import JsonResponse
+import json
+
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User
-from olympiad.models import Olympiad, Problem, AnswerChoice, Topic, ScoreSheet
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+from olympiad.models import Olympiad, Problem, AnswerChoice, Topic
+from olympiad.utils.achievements import (
+    achievement_etag, achievement_stats, achievement_versions, changed_users, encode_cursor, users_achievements,
+)
+from olympiad.utils.achievements import user_achievements as load_user_achievements
+
+# achievements_batch-ийн нэг дуудлагад авах хэрэглэгчийн дээд тоо
+BATCH_SIZE = getattr(settings, 'MMO_API_BATCH_SIZE', 500)
+# Хариуг хэсэгчлэн урсгахдаа нэг удаад уншах хэрэглэгчийн тоо
+STREAM_CHUNK = 200
 
 
 def check_api_key(request):
@@ -184,6 +197,7 @@ def user_achievements(request, user_id):
     GET /api/users/{user_id}/achievements/
     Headers:
     - X-API-Key: API key for authentication
+    - If-None-Match / If-Modified-Since: өмнөх хариуны ETag / Last-Modified (өөрчлөгдөөгүй бол 304)
 
     Response:
     {
@@ -220,64 +234,147 @@ def user_achievements(request, user_id):
     except User.DoesNotExist:
         return JsonResponse({'error': 'Хэрэглэгч олдсонгүй'}, status=404)
 
-    # Хэрэглэгчийн бүх ScoreSheet-үүдийг авах
-    scoresheets = ScoreSheet.objects.filter(
-        user=user,
-        olympiad__is_open=True
-    ).select_related(
-        'olympiad',
-        'olympiad__level',
-        'olympiad__school_year',
-        'school'
-    ).order_by('olympiad_id', '-id').distinct('olympiad_id')
-
-    achievements = []
-    first_round_count = 0
-    total_score = 0
-    prizes_count = 0
-
-    for sheet in scoresheets:
-        olympiad = sheet.olympiad
-
-        # Бодлого шийдсэн тоо тоолох (0-ээс их оноотой)
-        problems_solved = sum(
-            1 for i in range(1, 21)
-            if getattr(sheet, f's{i}', 0) and getattr(sheet, f's{i}', 0) > 0
-        )
-
-        # 1-р даваа эсэхийг шалгах
-        if olympiad.round == 1:
-            first_round_count += 1
-
-        # Нийт оноо
-        score = sheet.total or 0
-        total_score += score
-
-        # Шагнал
-        has_prize = bool(sheet.prizes and sheet.prizes.strip())
-        if has_prize:
-            prizes_count += 1
-
-        achievements.append({
-            'olympiad_id': olympiad.id,
-            'olympiad_name': str(olympiad),
-            'round': olympiad.round,
-            'round_name': _get_round_name(olympiad.round),
-            'school_year': olympiad.school_year.name if olympiad.school_year else None,
-            'level_name': olympiad.level.name if olympiad.level else None,
-            'total_score': score,
-            'problems_solved': problems_solved,
-            'prizes': sheet.prizes or None
-        })
+    # Өөрчлөгдөөгүй бол 304
+    last_modified, txid = achievement_versions([user.id])[user.id]
+    etag = quote_etag(achievement_etag(user.id, user.username, txid))
+    last_modified = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
 
-    return JsonResponse({
+    # Урьдчилан бичсэн Achievement мөрүүдээс (нэг индекстэй query)
+    rows, stats = load_user_achievements(user.id)
+
+    response = JsonResponse({
         'user_id': user.id,
         'username': user.username,
-        'achievements': achievements,
-        'statistics': {
-            'total_olympiads': len(achievements),
-            'total_score': total_score,
-            'prizes_count': prizes_count,
-            'first_round_count': first_round_count
-        }
+        'achievements': [_achievement_json(a) for a in rows],
+        'statistics': stats
     })
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _achievement_json(achievement):
+    return {
+        'olympiad_id': achievement.olympiad_id,
+        'olympiad_name': achievement.olympiad_name,
+        'round': achievement.round,
+        'round_name': _get_round_name(achievement.round),
+        'school_year': achievement.school_year_name,
+        'level_name': achievement.level_name,
+        'total_score': achievement.total,
+        'problems_solved': achievement.problems_solved,
+        'prizes': achievement.prizes or None
+    }
+
+
+def _unquote_etag(etag):
+    etag = etag.strip()
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    return etag.strip('"')
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def achievements_batch(request):
+    """
+    Олон хэрэглэгчийн олимпиадын түүх нэг дуудлагаар (MathMinds-ийн incremental sync)
+    GET  /api/achievements/?user_ids=1,2,3
+    GET  /api/achievements/?cursor=<next_cursor>&limit=500
+    POST /api/achievements/  {"user_ids": [1, 2, 3], "etags": ["...", ...]}
+    Headers:
+    - X-API-Key: API key for authentication (batch бүрт нэг удаа)
+    - If-None-Match: хэрэглэгч бүрийн өмнөх ETag-ууд (таслалаар)
+
+    user_ids: заасан хэрэглэгчид (дээд тал нь MMO_API_BATCH_SIZE).
+    cursor: өмнөх хариуны next_cursor-оос хойш амжилт (эсвэл нэр) нь өөрчлөгдсөн хэрэглэгчид
+            (эхний удаа cursor=0). has_more=false бол дараагийн sync хүртэл хүлээнэ.
+            Сүүлийн амжилт нь эсвэл өөрөө устсан хэрэглэгч хоосон achievements-тэй ирнэ
+            (устсан бол username null).
+    ETag нь таарсан хэрэглэгчийн амжилтыг дахин илгээхгүй ("not_modified": true);
+    user_ids-ийн бүх хэрэглэгч өөрчлөгдөөгүй бол 304.
+
+    Response (compact JSON, хэсэгчлэн урсгана):
+    {
+        "users": [
+            {"user_id": 1, "username": "student1", "etag": "...",
+             "last_modified": "Sat, 17 Oct 2026 10:00:00 GMT", "achievements": [...], "statistics": {...}},
+            {"user_id": 2, "username": "student2", "etag": "...", "last_modified": "...", "not_modified": true}
+        ],
+        "next_cursor": "48213377-2",
+        "has_more": false
+    }
+    """
+    # API key шалгах
+    if not check_api_key(request):
+        return JsonResponse({'error': 'Invalid or missing API key'}, status=401)
+
+    known_etags = {_unquote_etag(etag) for etag in parse_etags(request.headers.get('If-None-Match', ''))}
+    try:
+        if request.method == 'POST':
+            params = json.loads(request.body or b'{}')
+            user_ids = params.get('user_ids')
+            known_etags.update(_unquote_etag(str(etag)) for etag in params.get('etags') or [])
+        else:
+            params = request.GET
+            user_ids = params['user_ids'].split(',') if params.get('user_ids') else None
+        limit = max(1, min(int(params.get('limit', BATCH_SIZE)), BATCH_SIZE))
+        if user_ids is not None:
+            user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    except (TypeError, ValueError, AttributeError):
+        return JsonResponse({'error': 'user_ids, limit эсвэл JSON буруу'}, status=400)
+
+    next_cursor = None
+    has_more = False
+    if user_ids is not None:
+        if len(user_ids) > BATCH_SIZE:
+            return JsonResponse({'error': f'Нэг дуудлагад {BATCH_SIZE}-аас ихгүй хэрэглэгч'}, status=400)
+    elif 'cursor' in params:
+        try:
+            changed = changed_users(str(params['cursor']), limit)
+        except ValueError:
+            return JsonResponse({'error': 'cursor буруу'}, status=400)
+        user_ids = [user_id for user_id, _ in changed]
+        next_cursor = encode_cursor(changed[-1][1], changed[-1][0]) if changed else str(params['cursor'])
+        has_more = len(changed) == limit
+    else:
+        return JsonResponse({'error': 'user_ids эсвэл cursor шаардлагатай'}, status=400)
+
+    versions = achievement_versions(user_ids)
+    usernames = dict(User.objects.filter(id__in=user_ids).values_list('id', 'username'))
+    etags = {
+        user_id: achievement_etag(user_id, usernames.get(user_id), txid)
+        for user_id, (_, txid) in versions.items()
+    }
+    if next_cursor is None and user_ids and all(etag in known_etags for etag in etags.values()):
+        return HttpResponseNotModified()
+
+    def stream():
+        yield '{"users":['
+        separator = ''
+        for start in range(0, len(user_ids), STREAM_CHUNK):
+            chunk = user_ids[start:start + STREAM_CHUNK]
+            loaded = users_achievements([user_id for user_id in chunk if etags[user_id] not in known_etags])
+            for user_id in chunk:
+                last_modified = versions[user_id][0]
+                entry = {
+                    'user_id': user_id,
+                    'username': usernames.get(user_id),
+                    'etag': etags[user_id],
+                    'last_modified': http_date(last_modified.timestamp()) if last_modified else None,
+                }
+                if user_id in loaded:
+                    rows = loaded[user_id]
+                    entry['achievements'] = [_achievement_json(a) for a in rows]
+                    entry['statistics'] = achievement_stats(rows)
+                else:
+                    entry['not_modified'] = True
+                yield separator + json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+                separator = ','
+        yield '],"next_cursor":{},"has_more":{}}}'.format(json.dumps(next_cursor), json.dumps(has_more))
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class OlympiadConfig(AppConfig):
     name = 'olympiad'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -3,6 +3,7 @@ import numpy as np
 from itertools import combinations
 from sklearn.cluster import AgglomerativeClustering
 from django.core.cache import cache
+from olympiad.utils.caching import olympiad_cache_key
 
 # ------------------------------
 # CHEATING INDEX FUNCTIONS
@@ -227,7 +228,7 @@ def analyze_olympiad_cheating_cached(olympiad_id, refresh=False, cache_timeout=3
     Returns:
         List of dicts with school cheating analysis results
     """
-    cache_key = f'cheating_analysis_{olympiad_id}'
+    cache_key = olympiad_cache_key(olympiad_id, 'cheating_analysis')
 
     # Check cache first
     if not refresh:
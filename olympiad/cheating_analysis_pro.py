@@ -8,6 +8,7 @@ cheating_analysis.py (see source). Implements:
   - Weighted Wrong-Match (WWM) and Weighted Correct-Match (WCM)
   - Omega index (standardized statistic)
   - Composite Cheating Index (CI) combining omega, WWM, WCM
+  - Vectorized pairwise kernel (pairwise_components) for whole schools
   - Memory-aware school/olympiad analysis functions
   - Updated print_cheating_matrix
 
@@ -22,9 +23,9 @@ Notes:
 import math
 import numpy as np
 import pandas as pd
-from itertools import combinations
 from sklearn.cluster import AgglomerativeClustering
 from django.core.cache import cache
+from olympiad.utils.caching import olympiad_cache_key
 
 # ------------------------------
 # Helpers: infer correct answers, compute difficulty
@@ -175,6 +176,78 @@ def cheating_index_pro(a: dict, b: dict, questions, correct, p, w):
     return float(min(max(ci, 0.0), 1.0))
 
 
+# ------------------------------
+# Vectorized pairwise kernel
+# ------------------------------
+
+def pairwise_components(students_df, questions, correct, p, w):
+    """Compute all pairwise components at once with matrix products.
+
+    Equivalent to calling weighted_wrong_match, weighted_correct_match,
+    omega_index and cheating_index_pro for every pair, but each answer
+    column is one-hot encoded so that every statistic is a single
+    ``A @ diag(weights) @ B.T`` product over all students.
+
+    Returns:
+        dict of (n, n) arrays: 'wwm', 'wcm', 'omega' (all normalized to
+        [0, 1] like cheating_index_pro) and 'ci'. Diagonals are meaningless.
+    """
+    n = len(students_df)
+    values = students_df[questions]
+    valid = values.notna().to_numpy()                       # (n, Q)
+    w_vec = np.array([w[q] for q in questions], dtype=float)
+    p_vec = np.array([p[q] for q in questions], dtype=float)
+
+    correct_hit = np.zeros((n, len(questions)), dtype=float)
+    wrong_blocks, wrong_weights = [], []
+    for k, q in enumerate(questions):
+        key = correct.get(q)
+        if key is None:
+            continue
+        col = values[q]
+        is_correct = (valid[:, k] & (col == key).to_numpy())
+        correct_hit[:, k] = is_correct
+
+        # One-hot over the distinct wrong answers of this question
+        wrong_mask = valid[:, k] & ~is_correct
+        codes, uniques = pd.factorize(col.where(wrong_mask))
+        if len(uniques) == 0:
+            continue
+        block = np.zeros((n, len(uniques)), dtype=float)
+        rows = np.nonzero(codes >= 0)[0]
+        block[rows, codes[rows]] = 1.0
+        wrong_blocks.append(block)
+        wrong_weights.append(np.full(len(uniques), w_vec[k]))
+
+    if wrong_blocks:
+        wrong = np.hstack(wrong_blocks)
+        wrong_w = np.concatenate(wrong_weights)
+        wwm = (wrong * wrong_w) @ wrong.T
+        wm_count = wrong @ wrong.T
+    else:
+        wwm = np.zeros((n, n))
+        wm_count = np.zeros((n, n))
+
+    wcm = (correct_hit * p_vec) @ correct_hit.T
+
+    # omega: expected wrong matches over items both students answered
+    valid_f = valid.astype(float)
+    prob = (1.0 - p_vec) ** 2
+    expected = (valid_f * prob) @ valid_f.T
+    variance = (valid_f * (prob * (1.0 - prob))) @ valid_f.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        omega = np.where(variance > 0, (wm_count - expected) / np.sqrt(variance), 0.0)
+
+    max_wwm = float(w_vec.sum()) or 1.0
+    max_wcm = float(p_vec.sum()) or 1.0
+    wwm_norm = wwm / max_wwm
+    wcm_norm = wcm / max_wcm
+    omega_norm = 1.0 / (1.0 + np.exp(-omega))
+
+    ci = np.clip(0.4 * omega_norm + 0.4 * wwm_norm + 0.2 * wcm_norm, 0.0, 1.0)
+    return {'wwm': wwm_norm, 'wcm': wcm_norm, 'omega': omega_norm, 'ci': ci}
+
+
 # ------------------------------
 # School-level analysis (memory-aware)
 # ------------------------------
@@ -203,66 +276,29 @@ def analyze_school_pro(students_df, questions=None, correct_answers=None, min_st
     # compute difficulties and (possibly infer) correct answers
     p, w, correct = compute_item_difficulty_and_weights(students_df, correct_answers)
 
-    # Convert to dicts for faster row access
-    students = students_df.to_dict('index')
-    ids = list(students.keys())
+    ids = list(students_df.index)
+    n_ids = len(ids)
 
-    CI_values = []
-    # pairwise loop
-    for i_idx in range(len(ids)):
-        for j_idx in range(i_idx + 1, len(ids)):
-            a = students[ids[i_idx]]
-            b = students[ids[j_idx]]
-            ci = cheating_index_pro(a, b, questions, correct, p, w)
-            CI_values.append(ci)
+    # All pairwise statistics in one pass
+    components = pairwise_components(students_df, questions, correct, p, w)
+    upper = np.triu_indices(n_ids, k=1)
 
-    CI_values = np.array(CI_values) if CI_values else np.array([0.0])
+    CI_values = components['ci'][upper]
+    if CI_values.size == 0:
+        CI_values = np.array([0.0])
 
     CPS = float(np.mean(CI_values))
     HRP = float(np.mean(CI_values > 0.85))  # threshold for high-risk pair
     Integrity = float(1.0 - CPS)
 
     # Calculate average component scores for the school
-    omega_vals = []
-    wwm_vals = []
-    wcm_vals = []
-
-    for i_idx in range(len(ids)):
-        for j_idx in range(i_idx + 1, len(ids)):
-            a = students[ids[i_idx]]
-            b = students[ids[j_idx]]
-
-            # Raw components
-            wwm = weighted_wrong_match(a, b, questions, correct, w)
-            wcm = weighted_correct_match(a, b, questions, correct, p)
-            omg = omega_index(a, b, questions, correct, p)
-
-            # Normalize
-            max_wwm = sum(w[q] for q in questions) or 1.0
-            max_wcm = sum(p[q] for q in questions) or 1.0
+    avg_omega = float(np.mean(components['omega'][upper])) if n_ids > 1 else 0.0
+    avg_wwm = float(np.mean(components['wwm'][upper])) if n_ids > 1 else 0.0
+    avg_wcm = float(np.mean(components['wcm'][upper])) if n_ids > 1 else 0.0
 
-            wwm_norm = wwm / max_wwm
-            wcm_norm = wcm / max_wcm
-            omg_norm = 1.0 / (1.0 + math.exp(-omg))
-
-            omega_vals.append(omg_norm)
-            wwm_vals.append(wwm_norm)
-            wcm_vals.append(wcm_norm)
-
-    avg_omega = float(np.mean(omega_vals)) if omega_vals else 0.0
-    avg_wwm = float(np.mean(wwm_vals)) if wwm_vals else 0.0
-    avg_wcm = float(np.mean(wcm_vals)) if wcm_vals else 0.0
-
-    # Build CI matrix for clustering (small n ok)
-    n_ids = len(ids)
-    CI_matrix = np.eye(n_ids)
-    for i in range(n_ids):
-        for j in range(i + 1, n_ids):
-            a = students[ids[i]]
-            b = students[ids[j]]
-            v = cheating_index_pro(a, b, questions, correct, p, w)
-            CI_matrix[i, j] = v
-            CI_matrix[j, i] = v
+    # CI matrix for clustering
+    CI_matrix = components['ci'].copy()
+    np.fill_diagonal(CI_matrix, 1.0)
 
     # Cluster: convert to distance
     dist = 1.0 - CI_matrix
@@ -302,8 +338,8 @@ def analyze_school_pro(students_df, questions=None, correct_answers=None, min_st
 def analyze_olympiad_cheating(olympiad_id, top_n=10):
     """Analyzes top N students from each school for an olympiad.
 
-    Uses database queries to construct per-school pivot tables and calls
-    analyze_school_pro on each.
+    Loads the top students of every school and their answers in two
+    queries, pivots once and calls analyze_school_pro on each school.
 
     Args:
         olympiad_id: Olympiad ID
@@ -323,9 +359,45 @@ def analyze_olympiad_cheating(olympiad_id, top_n=10):
         'contestant__data__school__province__name'
     ).distinct()
 
+    schools_data = list(schools_data)
     if not schools_data:
         return pd.DataFrame()
 
+    # Top N students of every school in one query
+    school_ids = [school['contestant__data__school_id'] for school in schools_data]
+    top_by_school = {}
+    for school_id, user_id in ScoreSheet.objects.filter(
+        olympiad_id=olympiad_id,
+        school_id__in=school_ids
+    ).order_by('school_id', '-total').values_list('school_id', 'user_id'):
+        top_ids = top_by_school.setdefault(school_id, [])
+        if len(top_ids) < top_n:
+            top_ids.append(user_id)
+
+    all_top_ids = [uid for ids in top_by_school.values() if len(ids) >= 5 for uid in ids]
+    if not all_top_ids:
+        return pd.DataFrame()
+
+    # Answers of all selected students in one query, pivoted once
+    df = pd.DataFrame(list(Result.objects.filter(
+        olympiad_id=olympiad_id,
+        contestant_id__in=all_top_ids
+    ).values(
+        'contestant_id',
+        'problem__order',
+        'answer'
+    )))
+    if df.empty:
+        return pd.DataFrame()
+
+    students_with_results = set(df['contestant_id'].unique())
+    full_pivot = df.pivot_table(
+        index='contestant_id',
+        columns='problem__order',
+        values='answer',
+        aggfunc='first'
+    )
+
     results_list = []
 
     for school in schools_data:
@@ -334,43 +406,16 @@ def analyze_olympiad_cheating(olympiad_id, top_n=10):
         province_id = school['contestant__data__school__province_id'] or 0
         province_name = school['contestant__data__school__province__name'] or 'Тодорхойгүй'
 
-        # Get top N students by score
-        top_students = ScoreSheet.objects.filter(
-            olympiad_id=olympiad_id,
-            school_id=school_id
-        ).order_by('-total').values_list('user_id', flat=True)[:top_n]
-
-        top_student_ids = list(top_students)
-
+        top_student_ids = top_by_school.get(school_id, [])
         if len(top_student_ids) < 5:
             continue
 
-        # Get results for top students only
-        school_results = Result.objects.filter(
-            olympiad_id=olympiad_id,
-            contestant_id__in=top_student_ids
-        ).values(
-            'contestant_id',
-            'problem__order',
-            'answer'
-        )
-
-        if not school_results:
+        if len(students_with_results.intersection(top_student_ids)) < 5:
             continue
 
-        # Convert to DataFrame
-        df = pd.DataFrame(list(school_results))
-
-        if df.empty or len(df['contestant_id'].unique()) < 5:
-            continue
-
-        # Pivot
-        pivot_df = df.pivot_table(
-            index='contestant_id',
-            columns='problem__order',
-            values='answer',
-            aggfunc='first'
-        )
+        # Same shape as a per-school pivot_table (all-NaN rows/columns dropped)
+        pivot_df = full_pivot.loc[full_pivot.index.intersection(top_student_ids)]
+        pivot_df = pivot_df.dropna(how='all').dropna(how='all', axis=1)
 
         # Get questions
         questions = [f'Q{int(c):02d}' for c in pivot_df.columns]
@@ -398,7 +443,7 @@ def analyze_olympiad_cheating(olympiad_id, top_n=10):
 
 
 def analyze_olympiad_cheating_cached(olympiad_id, refresh=False, cache_timeout=3600):
-    cache_key = f'cheating_analysis_pro_{olympiad_id}'
+    cache_key = olympiad_cache_key(olympiad_id, 'cheating_analysis_pro')
     if not refresh:
         cached = cache.get(cache_key)
         if cached is not None:
@@ -440,18 +485,13 @@ def print_cheating_matrix(olympiad_id, school_id, top_n=10):
     questions = [f'Q{int(c):02d}' for c in pivot_df.columns]
     pivot_df.columns = questions
 
-    students = pivot_df.to_dict('index')
-    student_ids = list(students.keys())
+    student_ids = list(pivot_df.index)
     n = len(student_ids)
 
-    CI_matrix = np.eye(n)
     # compute symmetric CI matrix
-    for i in range(n):
-        for j in range(i + 1, n):
-            v = cheating_index_pro(students[student_ids[i]], students[student_ids[j]], questions,
-                                    *compute_item_difficulty_and_weights(pivot_df))
-            CI_matrix[i, j] = v
-            CI_matrix[j, i] = v
+    p, w, correct = compute_item_difficulty_and_weights(pivot_df)
+    CI_matrix = pairwise_components(pivot_df, questions, correct, p, w)['ci']
+    np.fill_diagonal(CI_matrix, 1.0)
 
     print(f"\n{'='*60}")
     print(f"Хуулалтын индекс матриц - Олимпиад: {olympiad_id}, Сургууль: {school_id}")
@@ -1,43 +1,28 @@
 from django.core.management.base import BaseCommand
-from django.db import connection
+
+from olympiad.utils.scoring import score_olympiad
 
 
 class Command(BaseCommand):
-    help = 'Тестийн олимпиадын оноог тооцох'
+    help = 'Тестийн олимпиадын оноо, онооны хуудас, эрэмбийг тооцох'
 
     def add_arguments(self, parser):
         parser.add_argument('olympiad_ids', nargs='+', type=int, help='Олимпиадын ID-ууд')
 
     def handle(self, *args, **options):
         olympiad_ids = options['olympiad_ids']
-        ids_str = ','.join(map(str, olympiad_ids))
 
         self.stdout.write(f'Олимпиадууд: {olympiad_ids}')
 
-        with connection.cursor() as cursor:
-            # Зөв хариултын оноог тооцох (хоёр хариултын аль нэгийг шалгах)
-            cursor.execute(f'''
-                UPDATE olympiad_result r
-                SET score = CASE
-                    WHEN r.answer IS NOT NULL AND (
-                        r.answer = p.numerical_answer OR
-                        r.answer = p.numerical_answer2
-                    )
-                    THEN p.max_score
-                    ELSE 0
-                END
-                FROM olympiad_problem p
-                WHERE r.problem_id = p.id
-                AND r.olympiad_id IN ({ids_str})
-            ''')
-            updated = cursor.rowcount
-
-            # Статистик
-            cursor.execute(f'''
-                SELECT COUNT(*) FROM olympiad_result
-                WHERE olympiad_id IN ({ids_str}) AND score > 0
-            ''')
-            correct = cursor.fetchone()[0]
+        correct = updated = 0
+        for olympiad_id in olympiad_ids:
+            stats = score_olympiad(olympiad_id)
+            correct += stats['correct']
+            updated += stats['scored']
+            self.stdout.write(
+                f"  ID={olympiad_id}: {stats['scored']} хариулт, "
+                f"онооны хуудас {stats['sheets_updated']} шинэчлэгдэж {stats['sheets_created']} үүслээ"
+            )
 
         self.stdout.write(self.style.SUCCESS(
             f'Дууслаа! Зөв хариулт: {correct}, Шинэчлэгдсэн: {updated}'
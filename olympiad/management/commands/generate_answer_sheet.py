@@ -1,11 +1,9 @@
-import pandas as pd
 import random
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from schools.models import School
 from olympiad.models import Olympiad
-# Excel-г загварчлахад ашиглах сангууд
-from openpyxl.styles import Border, Side, Font, Alignment
+from olympiad.utils.excel_export import answer_sheet_workbook, column_widths
 
 class Command(BaseCommand):
     help = 'Сонгосон олимпиад, сургуулийн дагуу 2 sheet-тэй Excel загвар бэлдэнэ.'
@@ -57,71 +55,32 @@ class Command(BaseCommand):
 
         problems = olympiad.problem_set.all().order_by('order')
 
-        # --- 1-р Sheet: Хариулт ---
-        answers_data = []
-        for contestant in contestants:
-            user_data = {
-                'ID': contestant.id,
-                'Овог': contestant.last_name,
-                'Нэр': contestant.first_name,
-            }
-            for problem in problems:
-                answer = ''
-                # --- ТУРШИЛТЫН ФАЙЛ ҮҮСГЭХ ЛОГИК ---
-                if is_test_mode:
-                    # 1-ээс 1000-ийн хооронд санамсаргүй натурал тоо оноох
-                    answer = random.randint(1, 1000)
-                user_data[f'№{problem.order}'] = answer
-            answers_data.append(user_data)
-
-        header = ['ID', 'Овог', 'Нэр'] + [f'№{p.order}' for p in problems]
-        answers_df = pd.DataFrame(answers_data, columns=header)
+        # --- 1-р Sheet: Хариулт (мөрүүдийг DB-ээс урсгалаар бичнэ) ---
+        fields = ['id', 'last_name', 'first_name']
+        headers = ['ID', 'Овог', 'Нэр']
+        widths = column_widths(contestants, fields, headers)
 
-        # --- 2-р Sheet: Info ---
-        info_data = {
-            'Түлхүүр': ['olympiad_id', 'olympiad_name', 'school_id', 'school_name', 'level_id', 'level_name'],
-            'Утга': [olympiad.id, olympiad.name, school.id, school.name, level.id, level.name]
-        }
-        info_df = pd.DataFrame(info_data)
+        # --- ТУРШИЛТЫН ФАЙЛ ҮҮСГЭХ ЛОГИК ---
+        # 1-ээс 1000-ийн хооронд санамсаргүй натурал тоо оноох
+        answer = (lambda: random.randint(1, 1000)) if is_test_mode else None
 
+        # --- 2-р Sheet: Info ---
+        info_items = [
+            ('olympiad_id', olympiad.id),
+            ('olympiad_name', olympiad.name),
+            ('school_id', school.id),
+            ('school_name', school.name),
+            ('level_id', level.id),
+            ('level_name', level.name),
+        ]
 
         try:
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                answers_df.to_excel(writer, sheet_name='Хариулт', index=False)
-                info_df.to_excel(writer, sheet_name='Мэдээлэл', index=False)
-
-                workbook = writer.book
-                worksheet = writer.sheets['Хариулт']
-
-                thin_border = Border(left=Side(style='thin'),
-                                     right=Side(style='thin'),
-                                     top=Side(style='thin'),
-                                     bottom=Side(style='thin'))
-                bold_font = Font(bold=True)
-                center_align = Alignment(horizontal='center', vertical='center')
-
-                for cell in worksheet["1:1"]:
-                    cell.font = bold_font
-                    cell.border = thin_border
-                    cell.alignment = center_align
-
-                for row in worksheet.iter_rows(min_row=2,
-                                               max_row=worksheet.max_row,
-                                               max_col=worksheet.max_column):
-                    for cell in row:
-                        cell.border = thin_border
-                # Баганын өргөнийг тохируулах
-                for i, column_cells in enumerate(worksheet.columns):
-                    column_letter = column_cells[0].column_letter
-                    # Эхний 3 баганыг (ID, Овог, Нэр) автоматаар тохируулах
-                    if i < 3:
-                        length = max(len(str(cell.value)) for cell in column_cells)
-                        worksheet.column_dimensions[column_letter].width = length + 2
-                    # Бусад (хариултын) багануудыг тогтмол хэмжээтэй болгох
-                    else:
-                        # 1 инч нь ойролцоогоор 5 нэгж өргөнтэй тэнцүү
-                        worksheet.column_dimensions[column_letter].width = 10
-
+            # Хариултын багана: 1 инч нь ойролцоогоор 5 нэгж өргөнтэй тэнцүү
+            workbook = answer_sheet_workbook(
+                contestants, fields, headers, widths, problems, info_items,
+                answer_width=10, answer=answer,
+            )
+            workbook.save(output_file)
         except Exception as e:
             raise CommandError(f"Файл хадгалахад алдаа гарлаа: {e}")
 
@@ -1,20 +1,17 @@
 # olympiad/management/commands/generate_scoresheets.py
 
 from datetime import datetime
-from django.core.cache import cache
 from django.core.management.base import BaseCommand, CommandError
 from django.db.models import Case, When, Value, IntegerField, OuterRef, Subquery, BooleanField
 from olympiad.models import ScoreSheet, Award, Olympiad
+from olympiad.utils.caching import invalidate_olympiad_cache
 from olympiad.utils.data import to_scoresheet
-from olympiad.utils.ranking import (
-    update_rankings_a, update_rankings_b,
-    update_rankings_a_p, update_rankings_b_p,
-    update_rankings_a_p_all, update_rankings_b_p_all,
-    update_rankings_a_p_u, update_rankings_b_p_u,
-    update_rankings_a_z, update_rankings_b_z,
-    update_rankings_a_z_all, update_rankings_b_z_all,
-    update_rankings_a_z_u, update_rankings_b_z_u
-)
+from olympiad.utils.ranking import update_olympiad_rankings
+from olympiad.utils.snapshots import publish_results_snapshot
+from olympiad.utils.achievements import refresh_achievements
+from olympiad.utils.answer_matrix import publish_answer_matrix
+from olympiad.utils.participation import refresh_school_participation
+from olympiad.utils.stats_cube import warm_stats_cube
 from schools.models import School
 
 class Command(BaseCommand):
@@ -70,6 +67,9 @@ class Command(BaseCommand):
                 self.process_olympiad(olympiad_id, force_delete, total_stats, olympiad_detail)
                 if clear_cache:
                     self.clear_olympiad_cache(olympiad_id)
+                # Snapshot нь cache-ийн шинэ хувилбарыг агуулах ёстой тул cache солисны дараа
+                self.publish_snapshot(olympiad_id)
+                self.warm_stats(olympiad_id)
                 total_stats['processed'] += 1
                 olympiad_detail['success'] = True
                 self.stdout.write(self.style.SUCCESS(f'✅ Олимпиад ID={olympiad_id} амжилттай боловсруулагдлаа.'))
@@ -118,11 +118,16 @@ class Command(BaseCommand):
         # 1. Сайжруулсан to_scoresheet функцийг дуудах
         self.stdout.write('  Онооны хуудсыг үүсгэж/шинэчилж байна...')
         try:
-            to_scoresheet(olympiad_id)
+            touched = to_scoresheet(olympiad_id)
             scoresheet_count = ScoreSheet.objects.filter(olympiad_id=olympiad_id).count()
             total_stats['total_scoresheets'] += scoresheet_count
             olympiad_detail['scoresheets_created'] = scoresheet_count
-            self.stdout.write(self.style.SUCCESS(f'  {scoresheet_count} онооны хуудас үүслээ.'))
+            olympiad_detail['scoresheets_inserted'] = touched['created']
+            olympiad_detail['scoresheets_updated'] = touched['updated']
+            self.stdout.write(self.style.SUCCESS(
+                f"  {scoresheet_count} онооны хуудас ({touched['created']} шинээр үүссэн, "
+                f"{touched['updated']} шинэчлэгдсэн)."
+            ))
         except Exception as e:
             raise CommandError(f'Онооны хуудас үүсгэхэд алдаа гарлаа: {e}')
 
@@ -157,43 +162,19 @@ class Command(BaseCommand):
         # 3. Эрэмбийг тооцоолох
         self.stdout.write('  Эрэмбэ тооцоолж байна...')
 
-        # Нийт эрэмбэ
-        update_rankings_a(olympiad_id)
-        update_rankings_b(olympiad_id)
-        self.stdout.write(self.style.SUCCESS('  Улсын нийт эрэмбэ шинэчлэгдлээ.'))
+        # Улс, аймаг, бүсийн бүх эрэмбийг нэг дор тооцоолох
+        ranked_count = update_olympiad_rankings(olympiad_id)
+        olympiad_detail['ranked_count'] = ranked_count
 
-        # Зөвхөн оролцогчид байгаа аймаг, бүсүүдийг олж авах
         active_provinces = ScoreSheet.objects.filter(olympiad_id=olympiad_id, school__province__isnull=False).values_list('school__province_id', flat=True).distinct()
         active_zones = ScoreSheet.objects.filter(olympiad_id=olympiad_id, school__province__zone__isnull=False).values_list('school__province__zone_id', flat=True).distinct()
 
         olympiad_detail['province_count'] = len(active_provinces)
         olympiad_detail['zone_count'] = len(active_zones)
-
-        # Аймгийн эрэмбэ (зөвхөн оролцогчтой аймгуудаар)
-        for province_id in active_provinces:
-            # Official only
-            update_rankings_a_p(olympiad_id, province_id)
-            update_rankings_b_p(olympiad_id, province_id)
-            # All students
-            update_rankings_a_p_all(olympiad_id, province_id)
-            update_rankings_b_p_all(olympiad_id, province_id)
-            # Unofficial only
-            update_rankings_a_p_u(olympiad_id, province_id)
-            update_rankings_b_p_u(olympiad_id, province_id)
-        self.stdout.write(self.style.SUCCESS(f'  {len(active_provinces)} аймгийн эрэмбэ шинэчлэгдлээ.'))
-
-        # Бүсийн эрэмбэ (зөвхөн оролцогчтой бүсүүдээр)
-        for zone_id in active_zones:
-            # Official only
-            update_rankings_a_z(olympiad_id, zone_id)
-            update_rankings_b_z(olympiad_id, zone_id)
-            # All students
-            update_rankings_a_z_all(olympiad_id, zone_id)
-            update_rankings_b_z_all(olympiad_id, zone_id)
-            # Unofficial only
-            update_rankings_a_z_u(olympiad_id, zone_id)
-            update_rankings_b_z_u(olympiad_id, zone_id)
-        self.stdout.write(self.style.SUCCESS(f'  {len(active_zones)} бүсийн эрэмбэ шинэчлэгдлээ.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'  Улс, {len(active_provinces)} аймаг, {len(active_zones)} бүсийн эрэмбэ шинэчлэгдлээ '
+            f'({ranked_count} онооны хуудас өөрчлөгдсөн).'
+        ))
 
         # --- ШАГНАЛ ОЛГОХ ШИНЭ ХЭСЭГ (ОНОВЧЛОГДСОН) ---
         self.stdout.write('  Шагналын мэдээллийг онооны хуудсанд нэмж байна...')
@@ -234,26 +215,40 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'  {len(updates)} хүнд шагналын мэдээлэл нэмэгдлээ.'))
 
     def clear_olympiad_cache(self, olympiad_id):
-        """Олимпиадтай холбоотой бүх cache-г устгах"""
-        cache_keys = [
-            f'olympiad_stats_{olympiad_id}',
-            f'cheating_analysis_{olympiad_id}',
-            f'cheating_analysis_pro_{olympiad_id}',
-        ]
-
-        # scores_ prefix-тэй cache key-үүдийг устгах
-        # scores_{olympiad_id}_{province_id}_{zone_id}_{page}_{show_all}_{official}_{show_zero}
-        # LocMemCache нь key pattern-аар устгах боломжгүй тул бүх cache-г устгана
-        cache.delete_many(cache_keys)
-
-        # scores_ cache нь олон parameter-тэй учир бүгдийг нь тодорхойлох боломжгүй
-        # Тиймээс бүх cache-г цэвэрлэнэ
+        """Олимпиадтай холбоотой cache-г (дүн, статистик, шинжилгээ, квотын хүснэгт) хүчингүй болгох.
+
+        Бүх түлхүүр олимпиадын хувилбарын тоолуурыг агуулдаг тул зөвхөн тоолуурыг солино -
+        бусад олимпиадын cache хэвээр үлдэнэ.
+        """
         try:
-            cache.clear()
+            school_year_id = Olympiad.objects.filter(pk=olympiad_id).values_list('school_year_id', flat=True).first()
+            invalidate_olympiad_cache(olympiad_id, school_year_id)
             self.stdout.write(self.style.SUCCESS(f'  🗑️ Олимпиад ID={olympiad_id}-ийн cache амжилттай устгагдлаа.'))
         except Exception as e:
             self.stdout.write(self.style.WARNING(f'  ⚠️ Cache устгахад алдаа: {e}'))
 
+    def publish_snapshot(self, olympiad_id):
+        """Нэгдсэн дүнгийн хуудсуудыг snapshot болгон бичих (алдаа гарвал view нь DB-ээс уншина)."""
+        try:
+            combo_count = publish_results_snapshot(olympiad_id)
+            self.stdout.write(self.style.SUCCESS(f'  📦 {combo_count} жагсаалтын snapshot бичигдлээ.'))
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'  ⚠️ Snapshot бичихэд алдаа: {e}'))
+
+    def warm_stats(self, olympiad_id):
+        """Статистикийн cube, оролцооны тойм, хариултын матриц, сурагчдын амжилтыг шинэчлэх."""
+        try:
+            warm_stats_cube(olympiad_id)
+            schools = refresh_school_participation(olympiad_id)
+            contestants = publish_answer_matrix(olympiad_id)
+            achievements = refresh_achievements(olympiad_id=olympiad_id)
+            self.stdout.write(self.style.SUCCESS(
+                f'  📊 Статистикийн cube, {schools} сургуулийн оролцооны тойм, '
+                f'{contestants} оролцогчийн хариултын матриц, {achievements} амжилтын мөр шинэчлэгдлээ.'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'  ⚠️ Статистикийн cube барихад алдаа: {e}'))
+
     def write_log_file(self, log_file, olympiad_ids, total_stats, force_delete):
         """Log файл бичих"""
         try:
@@ -288,9 +283,11 @@ class Command(BaseCommand):
                         if 'deleted_scoresheets' in detail:
                             f.write(f"  Устгасан ScoreSheet: {detail.get('deleted_scoresheets', 0)}\n")
                         f.write(f"  Үүссэн ScoreSheet: {detail.get('scoresheets_created', 0)}\n")
+                        f.write(f"  Шинээр нэмэгдсэн / шинэчлэгдсэн: {detail.get('scoresheets_inserted', 0)} / {detail.get('scoresheets_updated', 0)}\n")
                         f.write(f"  Official ScoreSheet: {detail.get('official_count', 0)}\n")
                         f.write(f"  Аймаг: {detail.get('province_count', 0)}\n")
                         f.write(f"  Бүс: {detail.get('zone_count', 0)}\n")
+                        f.write(f"  Эрэмбэ өөрчлөгдсөн: {detail.get('ranked_count', 0)}\n")
                         f.write(f"  Шагналтай: {detail.get('awards_count', 0)}\n")
                     else:
                         f.write(f"  Алдаа: {detail.get('error', 'Тодорхойгүй')}\n")
@@ -5,6 +5,8 @@ from django.db import transaction
 from django.contrib.auth.models import User
 from olympiad.models import Olympiad, Problem, Result
 from schools.models import School
+from olympiad.utils.excel_cache import cached_workbook
+from olympiad.utils.participation import schedule_participation_refresh
 
 class Command(BaseCommand):
     help = 'Заасан хавтас доторх бүх Excel файлаас олимпиадын хариултыг импортолно.'
@@ -31,7 +33,8 @@ class Command(BaseCommand):
             self.stdout.write(f"\n--- '{filename}' файлыг боловсруулж байна ---")
 
             try:
-                df_info = pd.read_excel(file_path, sheet_name='Мэдээлэл')
+                workbook = cached_workbook(file_path)
+                df_info = workbook.parse('Мэдээлэл')
                 info_dict = pd.Series(df_info.Утга.values,index=df_info.Түлхүүр).to_dict()
                 olympiad_id = int(info_dict['olympiad_id'])
                 school_id = int(info_dict['school_id'])
@@ -43,7 +46,7 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.ERROR(f"Алдаа: '{school.name}' сургуульд групп оноогоогүй тул файлыг алгасаж байна."))
                     continue
 
-                df = pd.read_excel(file_path, sheet_name='Хариулт')
+                df = workbook.parse('Хариулт')
                 problems_map = {problem.order: problem for problem in Problem.objects.filter(olympiad=olympiad)}
 
                 if 'ID' not in df.columns:
@@ -55,6 +58,7 @@ class Command(BaseCommand):
                 skipped_rows = 0
                 # --- ӨӨРЧЛӨЛТ 1: ШИНЭ ТООЛУУР НЭМЭХ ---
                 invalid_format_count = 0
+                imported_ids = set()
 
                 for index, row in df.iterrows():
                     user_id = row.get('ID')
@@ -82,6 +86,7 @@ class Command(BaseCommand):
                         skipped_rows += 1
                         continue
 
+                    imported_ids.add(user.id)
                     with transaction.atomic():
                         for order, problem in problems_map.items():
                             column_name = f'№{order}'
@@ -116,6 +121,8 @@ class Command(BaseCommand):
                                 else:
                                     updated_count += 1
 
+                schedule_participation_refresh(olympiad.id, imported_ids)
+
                 # --- ӨӨРЧЛӨЛТ 3: ҮР ДҮНГИЙН МЭДЭЭЛЭЛД ШИНЭ ТООЛУУРЫГ НЭМЭХ ---
                 self.stdout.write(self.style.SUCCESS(
                     f"'{filename}' файл амжилттай боловсруулагдлаа. "
@@ -9,6 +9,7 @@ from django.contrib.auth.models import User, Group
 from olympiad.models import Olympiad, Problem, Result, ScoreSheet
 from schools.models import School
 from accounts.models import UserMeta, Province, Grade, Level
+from olympiad.utils.excel_cache import cached_workbook
 
 class Command(BaseCommand):
     help = 'Заасан хавтас доторх бүх Excel файлаас олимпиадын оноог импортолно.'
@@ -321,14 +322,14 @@ class Command(BaseCommand):
 
             try:
                 # Мэдээлэл sheet уншиж олимпиад, province олох
-                excel_file = pd.ExcelFile(file_path)
+                excel_file = cached_workbook(file_path)
 
                 # Check for Мэдээлэл sheet
                 if 'Мэдээлэл' not in excel_file.sheet_names:
                     self.stdout.write(self.style.ERROR("Алдаа: 'Мэдээлэл' sheet олдсонгүй. Файлыг алгасаж байна."))
                     continue
 
-                df_info = pd.read_excel(file_path, sheet_name='Мэдээлэл')
+                df_info = excel_file.parse('Мэдээлэл')
 
                 # Parse metadata - flexible structure
                 olympiad = None
@@ -381,7 +382,7 @@ class Command(BaseCommand):
 
                     self.stdout.write(f"\n--- Sheet: '{sheet_name}' ---")
 
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
+                    df = excel_file.parse(sheet_name)
 
                     if 'ID' not in df.columns and 'Овог' not in df.columns:
                         self.stdout.write(self.style.WARNING(f"  'ID' эсвэл 'Овог' багана олдсонгүй, алгасаж байна."))
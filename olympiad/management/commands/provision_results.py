@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from olympiad.utils.provisioning import PROVISION_BATCH_SIZE, provision_results, upcoming_olympiad_ids
+
+
+class Command(BaseCommand):
+    help = 'Олимпиад эхлэхээс өмнө группийн бүх гишүүнд Result-уудыг урьдчилан үүсгэнэ.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('olympiad_ids', nargs='*', type=int, help='Олимпиадын ID-ууд')
+        parser.add_argument(
+            '--upcoming',
+            type=int,
+            metavar='HOURS',
+            help='Ойрын HOURS цагт эхлэх (эсвэл явагдаж буй) бүх групптэй олимпиадыг бэлтгэх'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PROVISION_BATCH_SIZE,
+            help=f'Нэг INSERT-ийн мөрийн тоо (default: {PROVISION_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        olympiad_ids = list(options['olympiad_ids'])
+        if options['upcoming'] is not None:
+            olympiad_ids += [oid for oid in upcoming_olympiad_ids(options['upcoming']) if oid not in olympiad_ids]
+
+        if not olympiad_ids:
+            self.stdout.write(self.style.WARNING('Бэлтгэх олимпиад олдсонгүй.'))
+            return
+
+        for olympiad_id in olympiad_ids:
+            created, members = provision_results(olympiad_id, batch_size=options['batch_size'])
+            if not members:
+                self.stdout.write(self.style.WARNING(f'  Олимпиад ID={olympiad_id}: групп эсвэл гишүүд алга.'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'  Олимпиад ID={olympiad_id}: {members} гишүүн, {created} шинэ Result үүслээ.'
+            ))
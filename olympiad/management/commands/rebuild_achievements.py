@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from olympiad.models import Olympiad
+from olympiad.utils.achievements import refresh_achievements
+
+
+class Command(BaseCommand):
+    help = 'Сурагчдын амжилтын проекцийг (Achievement) ScoreSheet-ээс дахин бичнэ.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('olympiad_ids', nargs='*', type=int, help='Олимпиадын ID-ууд (өгөхгүй бол бүгд)')
+
+    def handle(self, *args, **options):
+        olympiad_ids = options['olympiad_ids'] or list(
+            Olympiad.objects.filter(score_sheets__isnull=False).distinct().values_list('id', flat=True)
+        )
+        total = 0
+        for olympiad_id in olympiad_ids:
+            written = refresh_achievements(olympiad_id=olympiad_id)
+            total += written
+            self.stdout.write(f'  Олимпиад ID={olympiad_id}: {written} мөр')
+        self.stdout.write(self.style.SUCCESS(f'{len(olympiad_ids)} олимпиад, нийт {total} амжилтын мөр бичигдлээ.'))
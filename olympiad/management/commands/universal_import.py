@@ -10,7 +10,9 @@ from olympiad.models import Olympiad, Problem, Result
 from accounts.models import Province, UserMeta
 from schools.models import School
 from rapidfuzz import fuzz
-import unicodedata
+from schools.matcher import get_school_matcher, normalize_school_name
+from olympiad.utils.import_pipeline import ImportPipelineMixin
+from olympiad.utils.excel_cache import cached_workbook
 
 User = get_user_model()
 
@@ -27,7 +29,7 @@ CYRILLIC_TO_LATIN = {
 }
 
 
-class Command(BaseCommand):
+class Command(ImportPipelineMixin, BaseCommand):
     help = 'Оноо импортлох универсал тушаал - Excel/CSV файлуудаас оноог автоматаар импортлоно'
 
     """
@@ -58,6 +60,7 @@ class Command(BaseCommand):
         parser.add_argument('--dry-run', action='store_true', help='Зөвхөн харах горим (өгөгдөл хадгалахгүй)')
         parser.add_argument('--log-file', type=str, default='import_log.txt', help='Log файлын нэр')
         parser.add_argument('--move-to-processed', action='store_true', help='Амжилттай импортолсон файлуудыг processed фолдерт хуулах')
+        parser.add_argument('--workers', type=int, default=1, help='Файл уншиж бүтэц таних процессын тоо (DB-д нэг процесс бичнэ)')
 
     # Ангиллын pattern - sheet нэрээс ангилал таних
     CATEGORY_PATTERNS = {
@@ -87,6 +90,7 @@ class Command(BaseCommand):
             'olympiad_errors': [],
             'missing_groups': [],  # Устсан группын мэдээлэл
             'processed_files': [],  # Амжилттай импортолсон файлууд
+            'file_errors': [],  # Rollback хийгдсэн файлууд
             'start_time': datetime.now(),
             'current_province_id': None,
             'current_province_name': None,
@@ -104,68 +108,59 @@ class Command(BaseCommand):
         all_files = sorted([f for f in os.listdir(data_path) if f.endswith(('.xlsx', '.csv'))])
         self.stats['total_files'] = len([f for f in all_files if "Мэдээлэл" not in f])
 
-        # 2. Файлуудыг боловсруулах
-        for filename in all_files:
-
-            filepath = os.path.join(data_path, filename)
-            self.stdout.write("\n" + "=" * 80)
-            self.stdout.write(self.style.MIGRATE_HEADING(f"📄 ФАЙЛ: {filename}"))
-            self.stdout.write("=" * 80)
-
-            # Файл тус бүрээс province_id шалгах
-            current_file_province_id = None  # Default - нийтлэг province_id
-            file_processed_successfully = True  # Файл амжилттай боловсруулагдсан эсэх
-
-            try:
-                if filename.endswith('.xlsx'):
-                    excel = pd.ExcelFile(filepath)
-
-                    try:
-                        info_df = pd.read_excel(filepath, sheet_name="Мэдээлэл")
-                        file_specific_province = self.extract_province_id(info_df)
-                        if file_specific_province:
-                            current_file_province_id = file_specific_province
-                            province = Province.objects.filter(id=file_specific_province).first()
-                            province_name = province.name if province else "Тодорхойгүй"
-                            self.stats['current_province_id'] = file_specific_province
-                            self.stats['current_province_name'] = province_name
-                            self.stdout.write(self.style.SUCCESS(f"📍 Файл аймаг: {province_name} (ID: {file_specific_province})"))
-                    except Exception as e:
-                        self.stdout.write(self.style.WARNING(f"⚠️ Файлын Мэдээлэл sheet уншихад алдаа: {e}"))
-
-                    for sheet_name in excel.sheet_names:
-                        if "Мэдээлэл" in sheet_name:
-                            continue
-                        df = pd.read_excel(filepath, sheet_name=sheet_name)
-                        self.process_target(df, sheet_name, filename, config_map, current_file_province_id, dry_run)
-                else:
-                    df = pd.read_csv(filepath)
-                    self.process_target(df, filename, filename, config_map, current_file_province_id, dry_run)
-
-                # Файл амжилттай боловсруулагдсан
-                if file_processed_successfully:
-                    self.stats['processed_files'].append(filepath)
-
-            except Exception as e:
-                import traceback
-                self.stdout.write(self.style.ERROR(f"❌ Файл боловсруулахад алдаа: {e}"))
-                self.stdout.write(self.style.ERROR(f"   Traceback: {traceback.format_exc()}"))
-                file_processed_successfully = False
-                continue
+        # 2. Файлуудыг боловсруулах: уншилт/бүтэц таних (--workers > 1 бол зэрэг), файл бүр тусдаа transaction
+        filepaths = [os.path.join(data_path, filename) for filename in all_files]
+        self.run_import_pipeline(filepaths, config_map, None, dry_run, options['workers'])
 
         # 3. Эцсийн тайлан
         self.print_summary(dry_run)
 
         # 4. Log файл бичих
         if (self.stats['users_not_found'] or self.stats['olympiad_errors'] or
-            self.stats['missing_groups']):
+            self.stats['missing_groups'] or self.stats['file_errors']):
             self.write_log_file(log_file, dry_run)
 
         # 5. Файлуудыг processed фолдерт хуулах
         if options.get('move_to_processed') and not dry_run and self.stats['processed_files']:
             self.move_files_to_processed(data_path)
 
-    def process_target(self, df, identifier, filename, config_map, province_id, dry_run):
+    def parse_file(self, filepath, log):
+        """
+        Файлыг уншиж sheet бүрийн бүтцийг таньна (DB-д хандахгүй тул worker процесст ажиллана).
+        log: командын stdout болох io.StringIO (sheet бүрийн мессежийг тусад нь авна).
+        Бүтэц: olympiad.utils.import_pipeline.
+        """
+        parsed = {'filepath': filepath, 'province_id': None, 'sheets': []}
+
+        if filepath.endswith('.xlsx'):
+            excel = cached_workbook(filepath)
+
+            if "Мэдээлэл" in excel.sheet_names:
+                try:
+                    info_df = excel.parse("Мэдээлэл")
+                    parsed['province_id'] = self.extract_province_id(info_df)
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"⚠️ Файлын Мэдээлэл sheet уншихад алдаа: {e}"))
+
+            sheets = [
+                (sheet_name, excel.parse(sheet_name))
+                for sheet_name in excel.sheet_names if "Мэдээлэл" not in sheet_name
+            ]
+        else:
+            sheets = [(os.path.basename(filepath), pd.read_csv(filepath))]
+
+        parsed['log'] = log.getvalue()
+        for sheet_name, df in sheets:
+            log.seek(0)
+            log.truncate()
+            category = self.identify_category(sheet_name)
+            detected = self.detect_data_structure(df, category) if category else None
+            parsed['sheets'].append({
+                'name': sheet_name, 'df': df, 'detected': detected, 'log': log.getvalue(), 'error': None,
+            })
+        return parsed
+
+    def process_target(self, df, identifier, filename, config_map, province_id, dry_run, detected=None):
         category = self.identify_category(identifier)
         self.stats['total_sheets'] += 1
 
@@ -196,7 +191,10 @@ class Command(BaseCommand):
                 return
 
             # Шинэ ухаалаг бүтэц таних систем ашиглах
-            data_df, column_map = self.detect_data_structure(df, category)
+            # detected: parse_file-д (worker процесст) таньсан бүтэц
+            if detected is None:
+                detected = self.detect_data_structure(df, category)
+            data_df, column_map = detected
             if data_df is not None and column_map is not None:
                 # Province_id олдоогүй бол эхний сурагчдаас олох оролдоно
                 if not province_id:
@@ -784,41 +782,8 @@ class Command(BaseCommand):
         return new_school
 
     def normalize_school_name(self, name):
-        """
-        Сургуулийн нэрийг нэг хэлбэрт оруулна:
-        - Юникод normalize
-        - Латин үсгийг кирилл рүү хөрвүүлэх
-        - Түгээмэл үгсийг арилгах
-        - Тоог жигд болгох
-        """
-        if not name:
-            return ''
-        n = unicodedata.normalize('NFKD', name).lower()
-
-        # кирилл үсгийн ижилтгэл
-        n = n.replace('ё', 'е').replace('ү', 'у').replace('ө', 'о')
-
-        # латин үсгийг кирилл рүү ойролцоогоор хөрвүүлэх
-        latin_map = {
-            'a': 'а', 'b': 'б', 'v': 'в', 'g': 'г', 'd': 'д', 'e': 'е',
-            'j': 'ж', 'z': 'з', 'i': 'и', 'k': 'к', 'l': 'л', 'm': 'м',
-            'n': 'н', 'o': 'о', 'p': 'п', 'r': 'р', 's': 'с', 't': 'т',
-            'u': 'у', 'f': 'ф', 'h': 'х', 'c': 'ц', 'y': 'й'
-        }
-        for latin, cyr in latin_map.items():
-            n = re.sub(rf'\b{latin}\b', cyr, n)
-
-        # '1-р', '2-р' гэх мэт илэрхийллийг жигд болгох
-        n = re.sub(r'(\d+)(-р)?', r'\1', n)
-
-        # түгээмэл үгсийг арилгах
-        stop_words = ['ебс', 'ebs', 'school', 'surguuli', 'surguul', 'сургууль',
-                      'дугаар', 'dugaar', '-', 'нийслэл', 'niislel', 'цогцолбор']
-        for w in stop_words:
-            n = n.replace(w, '')
-
-        n = re.sub(r'\s+', ' ', n)
-        return n.strip()
+        """Сургуулийн нэрийг нэг хэлбэрт оруулна (schools.matcher.normalize_school_name)."""
+        return normalize_school_name(name)
 
     def find_school_by_name(self, school_name, province_id=None):
         """
@@ -835,35 +800,25 @@ class Command(BaseCommand):
         Returns: (School, similarity_score) эсвэл (None, 0)
         """
         n1 = self.normalize_school_name(school_name)
+        # School хүснэгтийг мөр бүрд уншихгүй: хэвшүүлсэн нэрсийн индекс (School өөрчлөгдөхөд шинэчлэгдэнэ)
+        matcher = get_school_matcher()
 
         # 1-р шат: province_id таарсан сургуулиудаас хайх
         if province_id:
-            candidates = School.objects.filter(province_id=province_id)
-            best, best_score = self._find_best_school_match(n1, candidates)
+            best, best_score = matcher.match(n1, int(province_id), normalized=True)
 
             # Хэрэв сайн тохирол олдвол буцаах
             if best and best_score >= 70:
                 return best, best_score
 
         # 2-р шат: province үл харгалзан хайх
-        candidates = School.objects.all()
-        best, best_score = self._find_best_school_match(n1, candidates)
+        best, best_score = matcher.match(n1, normalized=True)
 
         if best and best_score >= 70:
             return best, best_score
 
         return None, 0
 
-    def _find_best_school_match(self, normalized_name, queryset):
-        """Тухайн нэртэй хамгийн төстэй сургуулийг буцаана."""
-        best, best_score = None, 0
-        for school in queryset:
-            n2 = self.normalize_school_name(school.name)
-            score = fuzz.token_sort_ratio(normalized_name, n2)
-            if score > best_score:
-                best, best_score = school, score
-        return best, best_score
-
     def infer_province_from_data(self, df, column_map):
         """
         Province_id олдохгүй бол эхний 3-5 сурагчийн province-ийг шалгах.
@@ -1534,7 +1489,16 @@ class Command(BaseCommand):
                 f.write(f"Нийт хэрэглэгч олдоогүй: {len(self.stats['users_not_found'])}\n")
                 f.write(f"Нийт олимпиад алдаа: {len(self.stats['olympiad_errors'])}\n")
                 f.write(f"Нийт устсан групп: {len(self.stats['missing_groups'])}\n")
-                f.write(f"Нийт province шинэчилсэн: {self.stats['province_updated']}\n\n")
+                f.write(f"Нийт province шинэчилсэн: {self.stats['province_updated']}\n")
+                f.write(f"Нийт алдаатай файл: {len(self.stats['file_errors'])}\n\n")
+
+                # Rollback хийгдсэн файлууд
+                if self.stats['file_errors']:
+                    f.write(f"Алдаатай файлууд (импортлогдоогүй):\n")
+                    f.write(f"{'='*80}\n")
+                    for err in self.stats['file_errors']:
+                        f.write(f"  - {err['file']} ({err['province_name']}): {err['error']}\n")
+                    f.write("\n")
 
                 f.write(f"Province бүрийн алдаануудын тоо:\n")
                 f.write(f"{'='*80}\n")
@@ -1,16 +1,22 @@
 import os
 import re
+import uuid
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
 from django.db import transaction
+from django.db.models.functions import Lower
 from olympiad.models import Olympiad, Problem, Result
 from accounts.models import Province, UserMeta
 from schools.models import School
 from rapidfuzz import fuzz
-import unicodedata
+from schools.matcher import get_school_matcher, normalize_school_name
+from olympiad.utils.import_pipeline import ImportPipelineMixin
+from olympiad.utils.excel_cache import cached_workbook
+from olympiad.utils.participation import schedule_participation_refresh
 
 User = get_user_model()
 
@@ -27,7 +33,7 @@ CYRILLIC_TO_LATIN = {
 }
 
 
-class Command(BaseCommand):
+class Command(ImportPipelineMixin, BaseCommand):
     help = 'Оноо импортлох универсал тушаал - Excel/CSV файлуудаас оноог автоматаар импортлоно'
 
     """
@@ -58,6 +64,7 @@ class Command(BaseCommand):
         parser.add_argument('--dry-run', action='store_true', help='Зөвхөн харах горим (өгөгдөл хадгалахгүй)')
         parser.add_argument('--log-file', type=str, default='import_log.txt', help='Log файлын нэр')
         parser.add_argument('--move-to-processed', action='store_true', help='Амжилттай импортолсон файлуудыг processed фолдерт хуулах')
+        parser.add_argument('--workers', type=int, default=1, help='Файл уншиж бүтэц таних процессын тоо (DB-д нэг процесс бичнэ)')
         parser.add_argument('--force-import', action='store_true', help='Зөвхөн ID-аар хэрэглэгч олох, сургууль аймгийн шалгалтыг алгасах')
 
     # Ангиллын pattern - sheet нэрээс ангилал таних
@@ -97,6 +104,7 @@ class Command(BaseCommand):
             'olympiad_errors': [],
             'missing_groups': [],  # Устсан группын мэдээлэл
             'processed_files': [],  # Амжилттай импортолсон файлууд
+            'file_errors': [],  # Rollback хийгдсэн файлууд
             'start_time': datetime.now(),
             'current_province_id': None,
             'current_province_name': None,
@@ -133,86 +141,77 @@ class Command(BaseCommand):
             except Exception as e:
                 self.stdout.write(self.style.WARNING(f"⚠️ Мэдээлэл файл уншихад алдаа: {e}"))
 
-        # 2. Файлуудыг боловсруулах
-        for filename in all_files:
-            filepath = os.path.join(data_path, filename)
-            self.stdout.write("\n" + "=" * 80)
-            self.stdout.write(self.style.MIGRATE_HEADING(f"📄 ФАЙЛ: {filename}"))
-            self.stdout.write("=" * 80)
-
-            # Файл тус бүрээс province_id шалгах
-            current_file_province_id = file_province_id  # Default - нийтлэг province_id
-            file_processed_successfully = True  # Файл амжилттай боловсруулагдсан эсэх
-
-            try:
-                if filename.endswith('.xlsx'):
-                    excel = pd.ExcelFile(filepath)
-
-                    # Файл дотроос "Мэдээлэл" sheet хайх
-                    info_sheets = [s for s in excel.sheet_names if "Мэдээлэл" in s or "МЭДЭЭЛЭЛ" in s]
-                    if info_sheets:
-                        try:
-                            info_df = pd.read_excel(filepath, sheet_name=info_sheets[0])
-                            file_specific_province = self.extract_province_id(info_df)
-                            if file_specific_province:
-                                current_file_province_id = file_specific_province
-                                province = Province.objects.filter(id=file_specific_province).first()
-                                province_name = province.name if province else "Тодорхойгүй"
-                                self.stats['current_province_id'] = file_specific_province
-                                self.stats['current_province_name'] = province_name
-                                self.stdout.write(self.style.SUCCESS(f"📍 Файл аймаг: {province_name} (ID: {file_specific_province})"))
-                        except Exception as e:
-                            self.stdout.write(self.style.WARNING(f"⚠️ Файлын Мэдээлэл sheet уншихад алдаа: {e}"))
-
-                    for sheet_name in excel.sheet_names:
-                        if "Мэдээлэл" in sheet_name or "МЭДЭЭЛЭЛ" in sheet_name:
-                            continue
-                        try:
-                            df = pd.read_excel(filepath, sheet_name=sheet_name)
-                            self.process_target(df, sheet_name, filename, config_map, current_file_province_id, dry_run)
-                        except ValueError as ve:
-                            if "does not match pattern" in str(ve):
-                                self.stdout.write(self.style.ERROR(
-                                    f"❌ Excel файлын формат буруу байна: {filename} → {sheet_name}\n"
-                                    f"   Шалтгаан: Excel файлд буруу autofilter эсвэл cell range байна.\n"
-                                    f"   Шийдэл: Excel файлыг нээж, Data → Clear эсвэл Format → Clear хийгээд дахин хадгалаарай."
-                                ))
-                                continue
-                            else:
-                                raise
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(
-                                f"❌ Sheet уншихад алдаа: {filename} → {sheet_name}: {e}"
-                            ))
-                            continue
-                else:
-                    df = pd.read_csv(filepath)
-                    self.process_target(df, filename, filename, config_map, current_file_province_id, dry_run)
-
-                # Файл амжилттай боловсруулагдсан
-                if file_processed_successfully:
-                    self.stats['processed_files'].append(filepath)
-
-            except Exception as e:
-                import traceback
-                self.stdout.write(self.style.ERROR(f"❌ Файл боловсруулахад алдаа: {e}"))
-                self.stdout.write(self.style.ERROR(f"   Traceback: {traceback.format_exc()}"))
-                file_processed_successfully = False
-                continue
+        # 2. Файлуудыг боловсруулах: уншилт/бүтэц таних (--workers > 1 бол зэрэг), файл бүр тусдаа transaction
+        filepaths = [os.path.join(data_path, filename) for filename in all_files]
+        self.run_import_pipeline(filepaths, config_map, file_province_id, dry_run, options['workers'])
 
         # 3. Эцсийн тайлан
         self.print_summary(dry_run)
 
         # 4. Log файл бичих
         if (self.stats['users_not_found'] or self.stats['olympiad_errors'] or
-            self.stats['missing_groups']):
+            self.stats['missing_groups'] or self.stats['file_errors']):
             self.write_log_file(log_file, dry_run)
 
         # 5. Файлуудыг processed фолдерт хуулах
         if options.get('move_to_processed') and not dry_run and self.stats['processed_files']:
             self.move_files_to_processed(data_path)
 
-    def process_target(self, df, identifier, filename, config_map, province_id, dry_run):
+    def parse_file(self, filepath, log):
+        """
+        Файлыг уншиж sheet бүрийн бүтцийг таньна (DB-д хандахгүй тул worker процесст ажиллана).
+        log: командын stdout болох io.StringIO (sheet бүрийн мессежийг тусад нь авна).
+        Бүтэц: olympiad.utils.import_pipeline.
+        """
+        parsed = {'filepath': filepath, 'province_id': None, 'sheets': []}
+
+        if not filepath.endswith('.xlsx'):
+            df = pd.read_csv(filepath)
+            name = os.path.basename(filepath)
+            category = self.identify_category(name)
+            detected = self.detect_data_structure(df, category) if category else None
+            parsed['sheets'].append({'name': name, 'df': df, 'detected': detected, 'log': log.getvalue(), 'error': None})
+            parsed['log'] = ''
+            return parsed
+
+        excel = cached_workbook(filepath)
+
+        # Файл дотроос "Мэдээлэл" sheet хайх
+        info_sheets = [s for s in excel.sheet_names if "Мэдээлэл" in s or "МЭДЭЭЛЭЛ" in s]
+        if info_sheets:
+            try:
+                info_df = excel.parse(info_sheets[0])
+                parsed['province_id'] = self.extract_province_id(info_df)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"⚠️ Файлын Мэдээлэл sheet уншихад алдаа: {e}"))
+        parsed['log'] = log.getvalue()
+
+        for sheet_name in excel.sheet_names:
+            if "Мэдээлэл" in sheet_name or "МЭДЭЭЛЭЛ" in sheet_name:
+                continue
+            log.seek(0)
+            log.truncate()
+            sheet = {'name': sheet_name, 'df': None, 'detected': None, 'error': None}
+            try:
+                sheet['df'] = excel.parse(sheet_name)
+                category = self.identify_category(sheet_name)
+                if category:
+                    sheet['detected'] = self.detect_data_structure(sheet['df'], category)
+            except ValueError as ve:
+                if "does not match pattern" not in str(ve):
+                    raise
+                sheet['error'] = (
+                    f"Excel файлын формат буруу байна.\n"
+                    f"   Шалтгаан: Excel файлд буруу autofilter эсвэл cell range байна.\n"
+                    f"   Шийдэл: Excel файлыг нээж, Data → Clear эсвэл Format → Clear хийгээд дахин хадгалаарай."
+                )
+            except Exception as e:
+                sheet['error'] = str(e)
+            sheet['log'] = log.getvalue()
+            parsed['sheets'].append(sheet)
+        return parsed
+
+    def process_target(self, df, identifier, filename, config_map, province_id, dry_run, detected=None):
         category = self.identify_category(identifier)
         self.stats['total_sheets'] += 1
 
@@ -243,7 +242,10 @@ class Command(BaseCommand):
                 return
 
             # Шинэ ухаалаг бүтэц таних систем ашиглах
-            data_df, column_map = self.detect_data_structure(df, category)
+            # detected: parse_file-д (worker процесст) таньсан бүтэц
+            if detected is None:
+                detected = self.detect_data_structure(df, category)
+            data_df, column_map = detected
             if data_df is not None and column_map is not None:
                 # Province_id олдоогүй бол эхний сурагчдаас олох оролдоно
                 if not province_id:
@@ -262,12 +264,17 @@ class Command(BaseCommand):
         """
         Шинэ ухаалаг мөр боловсруулах систем - column_map ашиглах
         category: Sheet-ийн ангилал (C, D, E, F, S, T) - Grade/Level тодорхойлоход ашиглана
+
+        Sheet-ийг багцаар боловсруулна: ID, овог нэрийг DataFrame-ээр цэвэрлэж, хэрэглэгч,
+        UserMeta, аймгийн нэр дээр хайх нэрсийг цөөн IN query-ээр урьдчилан ачаалаад,
+        мөр бүрийг санах ойн индексээр тодорхойлно. Шинэ хэрэглэгч, UserMeta, Result-уудыг
+        эцэст нь bulk_create/bulk_update-ээр нэг transaction-д бичнэ.
         """
         try:
             olympiad = Olympiad.objects.get(id=olympiad_id)
-            problems = Problem.objects.filter(olympiad=olympiad).order_by('order')
+            problems = list(Problem.objects.filter(olympiad=olympiad).order_by('order'))
 
-            if not problems.exists():
+            if not problems:
                 self.stdout.write(self.style.WARNING(f"      ⚠️ Олимпиадад асуулт байхгүй байна!"))
                 return 0
 
@@ -300,50 +307,41 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING(f"      ⚠️ Хүчинтэй оноо багана олдсонгүй"))
             return 0
 
-        # Мөр бүрийг боловсруулах
+        # 1. Мөрүүдийг багцаар цэвэрлэх
+        uids = self.extract_uids(df, id_col)
+        last_names = self.text_column(df, last_name_col)
+        first_names = self.text_column(df, first_name_col)
+        school_names = self.text_column(df, school_col) if school_col else pd.Series(None, index=df.index, dtype=object)
+        score_frame = df.reindex(columns=[col_name for col_name, _, _ in valid_score_cols])
+        has_any_score = score_frame.notna().any(axis=1).tolist()
+        score_rows = score_frame.to_numpy(dtype=object)
+
+        # 2. Хэрэглэгчид, нэрээр хайх нэр дэвшигчдийг урьдчилан ачаалах
+        self.prefetch_users(uids, last_names, first_names, province_id)
+        self.pending_users = []
+        self.pending_metas = {}
+        self.meta_updates = {}
+
+        # 3. Мөр бүрийг санах ойн индексээр тодорхойлох
         row_count = 0
-        scores_saved = 0
+        row_scores = []  # (user, [(prob, score_val), ...])
         total_rows = len(df)
 
-        for idx, row in df.iterrows():
+        for position, (idx, uid, ovog, ner, school_name) in enumerate(
+            zip(df.index, uids, last_names, first_names, school_names.tolist())
+        ):
             # Progress
-            if total_rows > 100 and (idx + 1) % 50 == 0:
-                self.stdout.write(f"      ⏳ Явц: {idx + 1}/{total_rows} мөр...", ending='\r')
-
-            # ID, Овог, Нэр, Сургууль авах
-            try:
-                # ID багана optional - None байж болно
-                uid = row.get(id_col) if id_col else None
-                if pd.isna(uid):
-                    # ID байхгүй бол fallback column-үүдээс хайх
-                    uid = row.get('ID', row.get('User ID', row.get('MMO ID')))
-
-                # Овог/Нэр: NaN утгыг зөв боловсруулах
-                ovog_raw = row.get(last_name_col, '')
-                ovog = str(ovog_raw).strip() if pd.notna(ovog_raw) else ''
-
-                ner_raw = row.get(first_name_col, '')
-                ner = str(ner_raw).strip() if pd.notna(ner_raw) else ''
+            if total_rows > 100 and (position + 1) % 50 == 0:
+                self.stdout.write(f"      ⏳ Явц: {position + 1}/{total_rows} мөр...", ending='\r')
 
-                school_name = str(row.get(school_col, '')).strip() if school_col else None
-            except Exception as e:
-                # Багана олдсонгүй гэх мэт алдаа
-                continue
-
-            # Хэрэглэгч олох/үүсгэх
-            user_before_count = User.objects.count() if not dry_run else 0
             user = self.get_user_smart(uid, ovog, ner, school_name, province_id, dry_run, category)
 
-            # Шинэ хэрэглэгч үүсгэсэн эсэхийг шалгах
-            if not dry_run and user and User.objects.count() > user_before_count:
-                self.stats['users_created'] += 1
-
             if not user:
                 error_info = {
                     'file': filename,
                     'sheet': source,
                     'row': idx + 2,
-                    'id': uid if pd.notna(uid) else 'N/A',
+                    'id': uid if uid is not None else 'N/A',
                     'name': f"{ovog} {ner}".strip(),
                     'province_id': province_id,
                     'province_name': self.stats.get('current_province_name', 'Тодорхойгүй')
@@ -352,13 +350,7 @@ class Command(BaseCommand):
                 continue
 
             # Бүх оноо хоосон эсэхийг шалгах
-            has_any_score = False
-            for col_name, prob_num, prob in valid_score_cols:
-                if pd.notna(row.get(col_name)):
-                    has_any_score = True
-                    break
-
-            if not has_any_score:
+            if not has_any_score[position]:
                 self.stdout.write(self.style.WARNING(
                     f"      ⚠️ Бүх оноо хоосон: {user.username} ({ovog} {ner}) - мөр алгасагдлаа"
                 ))
@@ -366,63 +358,263 @@ class Command(BaseCommand):
 
             row_count += 1
 
-            # UserMeta шалгах ба шаардлагатай бол үүсгэх
-            if not dry_run:
-                # UserMeta байхгүй бол үүсгэх (province мэдээлэл нөхөх)
-                if not hasattr(user, 'data') or user.data is None:
-                    # Province мэдээлэл байвал нөхөх
-                    meta_province_id = province_id if province_id else None
-                    meta = UserMeta.objects.create(
-                        user=user,
-                        reg_num='',  # default утга
-                        province_id=meta_province_id
-                    )
-                    self.stdout.write(self.style.WARNING(
-                        f"      ⚠️ UserMeta үүсгэв: {user.username} (Province: {meta_province_id})"
-                    ))
-                elif province_id and hasattr(user, 'data') and user.data and not user.data.province_id:
-                    # UserMeta байгаа ч province байхгүй бол нөхөх
-                    user.data.province_id = province_id
-                    user.data.save(update_fields=['province_id'])
-                    self.stdout.write(self.style.WARNING(
-                        f"      ⚠️ Province нөхөв: {user.username} → {province_id}"
-                    ))
+            if dry_run:
+                continue
 
-            # Оноо хадгалах
-            if not dry_run:
-                with transaction.atomic():
-                    for col_name, prob_num, prob in valid_score_cols:
-                        score = row.get(col_name)
-                        if pd.notna(score):
-                            try:
-                                score_val = float(score)
-                                # Оноо хэт их эсэхийг шалгах
-                                if score_val > prob.max_score:
-                                    self.stdout.write(self.style.WARNING(
-                                        f"      ⚠️ Оноо хэт их: {user.username}, Б{prob_num}: {score_val} > {prob.max_score}"
-                                    ))
-                                    score_val = prob.max_score  # Max score-оор солих
-
-                                Result.objects.update_or_create(
-                                    contestant=user,
-                                    olympiad=olympiad,
-                                    problem=prob,
-                                    defaults={
-                                        'score': score_val,
-                                        'state': Result.States.approved
-                                    }
-                                )
-                                scores_saved += 1
-                            except (ValueError, TypeError) as e:
-                                self.stdout.write(self.style.WARNING(
-                                    f"      ⚠️ Оноо хөрвүүлэх алдаа: {user.username}, Б{prob_num}: '{score}'"
-                                ))
+            # UserMeta байхгүй бол үүсгэх, province байхгүй бол нөхөх (эцэст нь багцаар)
+            self.ensure_user_meta(user, province_id)
+
+            scores = []
+            for (col_name, prob_num, prob), score in zip(valid_score_cols, score_rows[position]):
+                if pd.notna(score):
+                    try:
+                        score_val = float(score)
+                        # Оноо хэт их эсэхийг шалгах
+                        if score_val > prob.max_score:
+                            self.stdout.write(self.style.WARNING(
+                                f"      ⚠️ Оноо хэт их: {user.username}, Б{prob_num}: {score_val} > {prob.max_score}"
+                            ))
+                            score_val = prob.max_score  # Max score-оор солих
+                        scores.append((prob, score_val))
+                    except (ValueError, TypeError) as e:
+                        self.stdout.write(self.style.WARNING(
+                            f"      ⚠️ Оноо хөрвүүлэх алдаа: {user.username}, Б{prob_num}: '{score}'"
+                        ))
+            row_scores.append((user, scores))
+
+        # 4. Шинэ хэрэглэгч, UserMeta, оноог багцаар хадгалах
+        scores_saved = 0
+        if not dry_run:
+            with transaction.atomic():
+                self.create_pending_users()
+                self.save_user_metas()
+                scores_saved = self.save_results(olympiad, row_scores)
 
         self.stats['total_rows_processed'] += row_count
         self.stats['total_scores_saved'] += scores_saved
 
         return row_count
 
+    def text_column(self, df, col):
+        """Баганыг цэвэрлэсэн текст болгох (NaN эсвэл багана байхгүй бол '')."""
+        if not col or col not in df.columns:
+            return pd.Series('', index=df.index, dtype=object)
+        values = df[col]
+        return values.where(values.notna(), '').astype(str).str.strip()
+
+    def extract_uids(self, df, id_col):
+        """
+        ID баганыг багцаар int болгох. "U231632", 231632.0 зэрэг форматыг дэмжинэ.
+        ".", "N/A" гэх мэт утга эсвэл хоосон бол None.
+        """
+        uids = df[id_col] if id_col and id_col in df.columns else pd.Series(np.nan, index=df.index)
+        # ID байхгүй бол fallback column-үүдээс хайх
+        fallback = next((c for c in ('ID', 'User ID', 'MMO ID') if c in df.columns), None)
+        if fallback:
+            uids = uids.where(uids.notna(), df[fallback])
+
+        text = uids.where(uids.notna()).astype('string').str.strip().str.upper()
+        text = text.str.replace(r'^U', '', regex=True)
+        numbers = pd.to_numeric(text, errors='coerce')
+        numbers = numbers.where(numbers >= 1)
+        return [int(n) if pd.notna(n) else None for n in numbers]
+
+    def prefetch_users(self, uids, last_names, first_names, province_id):
+        """
+        Sheet-ийн бүх ID-тай хэрэглэгч (UserMeta, level-тэй нь) болон province дотор
+        овог нэрээр таарах нэр дэвшигчдийг хоёр query-ээр ачаална.
+        """
+        self.user_cache = {}
+        self.name_cache = {}
+
+        ids = {uid for uid in uids if uid}
+        if ids:
+            users = User.objects.select_related('data', 'data__level').in_bulk(ids)
+            for uid in ids:
+                self.user_cache[uid] = users.get(uid)
+
+        if province_id:
+            keys = {
+                (ovog.lower(), ner.lower())
+                for ovog, ner in zip(last_names, first_names)
+                if ovog and ner
+            }
+            for key in keys:
+                self.name_cache[(province_id, *key)] = []
+            if keys:
+                candidates = (
+                    User.objects.annotate(ln=Lower('last_name'), fn=Lower('first_name'))
+                    .filter(
+                        data__province_id=province_id,
+                        ln__in={ln for ln, _ in keys},
+                        fn__in={fn for _, fn in keys},
+                    )
+                    .select_related('data', 'data__level')
+                    .order_by('id')
+                )
+                for user in candidates:
+                    key = (province_id, user.ln, user.fn)
+                    if key in self.name_cache:
+                        self.name_cache[key].append(user)
+
+    def lookup_user(self, uid):
+        """ID-аар хэрэглэгч (урьдчилан ачаалаагүй бол DB-ээс нэг удаа уншиж cache-лэнэ)."""
+        cache = getattr(self, 'user_cache', None)
+        if cache is None:
+            cache = self.user_cache = {}
+        if uid not in cache:
+            cache[uid] = User.objects.select_related('data', 'data__level').filter(id=uid).first()
+        return cache[uid]
+
+    def name_candidates(self, last_name, first_name, province_id):
+        """Province дотор овог нэр нь (том жижиг үсэг үл хамааран) таарах хэрэглэгчид, ID-ийн дарааллаар."""
+        cache = getattr(self, 'name_cache', None)
+        if cache is None:
+            cache = self.name_cache = {}
+        key = (province_id, last_name.lower(), first_name.lower())
+        if key not in cache:
+            cache[key] = list(User.objects.filter(
+                last_name__iexact=last_name,
+                first_name__iexact=first_name,
+                data__province_id=province_id
+            ).select_related('data', 'data__level').order_by('id'))
+        return cache[key]
+
+    def province_name(self, province_id):
+        """Аймгийн нэр (Province хүснэгтийг нэг удаа уншина)."""
+        if not hasattr(self, 'province_names'):
+            self.province_names = dict(Province.objects.values_list('id', 'name'))
+        return self.province_names.get(int(province_id), str(province_id))
+
+    def ensure_user_meta(self, user, province_id):
+        """UserMeta үүсгэх эсвэл province нөхөхийг багцад нэмнэ."""
+        if user.pk is None:
+            return  # Шинэ хэрэглэгчийн UserMeta-г create_pending_users үүсгэнэ
+        if not hasattr(user, 'data') or user.data is None:
+            if user.pk not in self.pending_metas:
+                # Province мэдээлэл байвал нөхөх
+                meta_province_id = province_id if province_id else None
+                meta = UserMeta(user=user, reg_num='', province_id=meta_province_id)
+                self.pending_metas[user.pk] = meta
+                self.stdout.write(self.style.WARNING(
+                    f"      ⚠️ UserMeta үүсгэнэ: {user.username} (Province: {meta_province_id})"
+                ))
+        elif province_id and not user.data.province_id:
+            # UserMeta байгаа ч province байхгүй бол нөхөх
+            user.data.province_id = province_id
+            self.meta_updates[user.pk] = user.data
+            self.stdout.write(self.style.WARNING(
+                f"      ⚠️ Province нөхөв: {user.username} → {province_id}"
+            ))
+
+    def save_user_metas(self):
+        if self.pending_metas:
+            UserMeta.objects.bulk_create(self.pending_metas.values(), batch_size=1000)
+        if self.meta_updates:
+            UserMeta.objects.bulk_update(self.meta_updates.values(), ['province_id'], batch_size=1000)
+        self.pending_metas = {}
+        self.meta_updates = {}
+
+    def create_pending_users(self):
+        """
+        get_user_smart-ийн дараалуулсан шинэ хэрэглэгчдийг багцаар үүсгэнэ:
+        User (түр username → u+ID), UserMeta, сургуулийн группийн гишүүнчлэл.
+        """
+        pending = self.pending_users
+        self.pending_users = []
+        if not pending:
+            return
+
+        users = [user for user, _ in pending]
+        User.objects.bulk_create(users, batch_size=1000)
+
+        # ID авсны дараа username-ийг u+ID болгон шинэчлэх
+        for user in users:
+            user.username = f"u{user.id}"
+        User.objects.bulk_update(users, ['username'], batch_size=1000)
+
+        metas = []
+        for user, meta in pending:
+            meta.user_id = user.id
+            metas.append(meta)
+        UserMeta.objects.bulk_create(metas, batch_size=1000)
+
+        # Сургуулийн group-д хэрэглэгчдийг нэмэх
+        group_ids = {meta.school.group_id for meta in metas if meta.school and meta.school.group_id}
+        existing_groups = set(Group.objects.filter(id__in=group_ids).values_list('id', flat=True))
+        memberships = []
+        for user, meta in pending:
+            school = meta.school
+            if not school:
+                continue
+            if school.group_id in existing_groups:
+                memberships.append(User.groups.through(user_id=user.id, group_id=school.group_id))
+            elif school.group_id:
+                # Устсан группын мэдээллийг статистикт нэмэх (давхардахгүйгээр)
+                if not any(g['school_id'] == school.id for g in self.stats['missing_groups']):
+                    self.stats['missing_groups'].append({
+                        'school_id': school.id,
+                        'school_name': school.name,
+                        'province_id': meta.province_id,
+                        'province_name': self.stats.get('current_province_name', 'Тодорхойгүй'),
+                        'error': f"Group {school.group_id} олдсонгүй",
+                    })
+        User.groups.through.objects.bulk_create(memberships, batch_size=1000, ignore_conflicts=True)
+
+        for user, meta in pending:
+            province_info = f", Аймаг: {self.province_name(meta.province_id)}" if meta.province_id else ""
+            self.stdout.write(self.style.SUCCESS(
+                f"      ✅ Шинэ хэрэглэгч үүсгэлээ: {user.last_name} {user.first_name} ({user.username}, ID: {user.id})" +
+                (f", Сургууль: {meta.school.name}" if meta.school else "") +
+                province_info
+            ))
+        self.stats['users_created'] += len(pending)
+
+    def save_results(self, olympiad, row_scores):
+        """
+        Оноог Result-д бичнэ: байгаа Result-уудыг нэг query-ээр уншиж bulk_update,
+        байхгүйг нь bulk_create. Нэг хэрэглэгч олон мөрөнд байвал сүүлийнх нь үлдэнэ.
+        """
+        scores = {}
+        for user, user_scores in row_scores:
+            for prob, score_val in user_scores:
+                scores[(user.id, prob.id)] = score_val
+        if not scores:
+            return 0
+
+        user_ids = {user_id for user_id, _ in scores}
+        existing = {}
+        for result_id, user_id, problem_id in Result.objects.filter(
+            olympiad=olympiad, contestant_id__in=user_ids
+        ).values_list('id', 'contestant_id', 'problem_id'):
+            existing.setdefault((user_id, problem_id), []).append(result_id)
+
+        to_update, to_create = [], []
+        for (user_id, problem_id), score_val in scores.items():
+            result_ids = existing.get((user_id, problem_id))
+            if result_ids:
+                to_update.extend(
+                    Result(id=result_id, score=score_val, state=Result.States.approved)
+                    for result_id in result_ids
+                )
+            else:
+                to_create.append(Result(
+                    contestant_id=user_id,
+                    olympiad=olympiad,
+                    problem_id=problem_id,
+                    score=score_val,
+                    state=Result.States.approved,
+                ))
+
+        Result.objects.bulk_update(to_update, ['score', 'state'], batch_size=1000)
+        # Энэ хооронд үүссэн (жиш: оролцогч хуудсаа нээсэн) мөрийг оноогоор нь шинэчилнэ
+        Result.objects.bulk_create(
+            to_create, batch_size=1000,
+            update_conflicts=True, unique_fields=['contestant', 'problem'], update_fields=['score', 'state'],
+        )
+        schedule_participation_refresh(olympiad.id, user_ids)
+        return len(scores)
+
     def romanize_name(self, name):
         """Кирилл үсгийг латинаар romanize хийх"""
         if not name:
@@ -471,10 +663,12 @@ class Command(BaseCommand):
     def get_user_smart(self, uid, last_name, first_name, school_name=None, province_id=None, dry_run=False, category=None):
         """
         Хэрэглэгч олох - ID, овог нэр, олон янзын форматыг дэмжинэ
-        Хэрэв олдохгүй бол шинэ хэрэглэгч үүсгэнэ (dry_run=False үед)
+        Хэрэв олдохгүй бол шинэ хэрэглэгч үүсгэх дараалалд нэмнэ (dry_run=False үед,
+        create_pending_users багцаар үүсгэнэ)
         category: Sheet-ийн ангилал (C, D, E, F, S, T) - Grade/Level тодорхойлоход ашиглана
+
+        Хэрэглэгч, нэр дэвшигчдийг prefetch_users-ийн индексээс авна.
         """
-        User = get_user_model()
 
         # Force-import горим: Зөвхөн ID-аар олох, сургууль/аймгийн шалгалтыг алгасах
         force_import = getattr(self, 'force_import', False)
@@ -500,7 +694,9 @@ class Command(BaseCommand):
             if uid and pd.notna(uid):
                 try:
                     uid_int = int(float(uid))
-                    user = User.objects.get(id=uid_int)
+                    user = self.lookup_user(uid_int)
+                    if user is None:
+                        raise User.DoesNotExist
 
                     # Force-import горим: ID-аар олдсон бол шууд буцаах
                     if force_import:
@@ -521,10 +717,8 @@ class Command(BaseCommand):
 
                         # Province зөрвөл логд бичих, гэхдээ хэрэглэгчийг хүлээн авна
                         if province_id and user_province and int(user_province) != int(province_id):
-                            old_province = Province.objects.filter(id=user_province).first()
-                            new_province = Province.objects.filter(id=province_id).first()
-                            old_prov_name = old_province.name if old_province else str(user_province)
-                            new_prov_name = new_province.name if new_province else str(province_id)
+                            old_prov_name = self.province_name(user_province)
+                            new_prov_name = self.province_name(province_id)
 
                             self.stdout.write(self.style.WARNING(
                                 f"      ⚠️ Дүүрэг зөрч байна: {old_prov_name} ≠ {new_prov_name} (ID-аар олдсон учир хүлээн авна)"
@@ -548,14 +742,15 @@ class Command(BaseCommand):
                                 ))
 
                                 if not dry_run:
-                                    old_province = Province.objects.filter(id=user_province).first()
                                     new_province = Province.objects.filter(id=province_id).first()
 
                                     user.data.province_id = province_id
                                     user.data.save(update_fields=['province_id'])
+                                    # Дараагийн мөрүүд шинэ province дотор нэрээр нь олно
+                                    self.name_candidates(user.last_name, user.first_name, province_id).append(user)
 
-                                    old_prov_name = old_province.name if old_province else str(user_province)
-                                    new_prov_name = new_province.name if new_province else str(province_id)
+                                    old_prov_name = self.province_name(user_province)
+                                    new_prov_name = self.province_name(province_id)
 
                                     self.stdout.write(self.style.SUCCESS(
                                         f"      🔄 Province шинэчлэгдлээ: {old_prov_name} → {new_prov_name}"
@@ -589,7 +784,7 @@ class Command(BaseCommand):
                                 if province_id and not user_province:
                                     if not dry_run:
                                         user.data.province_id = province_id
-                                        user.data.save(update_fields=['province_id'])
+                                        self.meta_updates[user.pk] = user.data
                                         self.stdout.write(self.style.SUCCESS(
                                             f"      ✅ Province нөхөгдлөө: {province_id}"
                                         ))
@@ -605,13 +800,9 @@ class Command(BaseCommand):
                         # Province-д овог нэрээр хайх (case 1 болон case 2-ын <85% тохиолдол)
                         if similarity < 85:
                             if province_id and last_name and first_name:
-                                candidates = User.objects.filter(
-                                    last_name__iexact=last_name,
-                                    first_name__iexact=first_name,
-                                    data__province_id=province_id
-                                ).select_related('data', 'data__level')
+                                candidates = self.name_candidates(last_name, first_name, province_id)
 
-                                if candidates.exists():
+                                if candidates:
                                     # Ангилал (level) шалгах
                                     if category:
                                         # Category-аас level олох
@@ -632,18 +823,18 @@ class Command(BaseCommand):
                                                 return selected_user
                                             else:
                                                 self.stdout.write(self.style.WARNING(
-                                                    f"      ⚠️ Province-д {candidates.count()} хэрэглэгч олдсон ч level таарахгүй (хүсч буй level_id: {expected_level_id})"
+                                                    f"      ⚠️ Province-д {len(candidates)} хэрэглэгч олдсон ч level таарахгүй (хүсч буй level_id: {expected_level_id})"
                                                 ))
                                         else:
                                             # Category-аас level олдсонгүй - анхны хэрэглэгчийг авах
-                                            selected_user = candidates.first()
+                                            selected_user = candidates[0]
                                             self.stdout.write(self.style.SUCCESS(
                                                 f"      ✅ Province-д ижил нэртэй хэрэглэгч олдлоо: {selected_user.username} (ID: {selected_user.id})"
                                             ))
                                             return selected_user
                                     else:
                                         # Category байхгүй - анхны хэрэглэгчийг авах
-                                        selected_user = candidates.first()
+                                        selected_user = candidates[0]
                                         self.stdout.write(self.style.SUCCESS(
                                             f"      ✅ Province-д ижил нэртэй хэрэглэгч олдлоо: {selected_user.username} (ID: {selected_user.id})"
                                         ))
@@ -679,13 +870,9 @@ class Command(BaseCommand):
         # 2. Овог нэрээр хайх (force_import горимд энд орохгүй)
         if last_name and first_name:
             if province_id:
-                candidates = User.objects.filter(
-                    last_name__iexact=last_name,
-                    first_name__iexact=first_name,
-                    data__province_id=province_id
-                ).select_related('data', 'data__level')
+                candidates = self.name_candidates(last_name, first_name, province_id)
 
-                if candidates.exists():
+                if candidates:
                     # Ангилал (level) шалгах
                     if category:
                         # Category-аас level олох
@@ -702,104 +889,12 @@ class Command(BaseCommand):
                                 return matching_users[0]
 
                     # Category байхгүй эсвэл level таарахгүй бол эхний хэрэглэгчийг буцаах
-                    return candidates.first()
+                    return candidates[0]
 
         # 3. Хэрэглэгч олдоогүй - шинэ хэрэглэгч үүсгэх
         # Овог хоосон байсан ч зөвхөн нэр байвал хэрэглэгч үүсгэх
         if first_name and not dry_run:
-            # Түр username-тэй хэрэглэгч үүсгэх (ID авахын тулд)
-            import time
-            temp_username = f"temp_{int(time.time() * 1000000)}"
-
-            user = User.objects.create(
-                username=temp_username,
-                first_name=first_name,
-                last_name=last_name,
-                email='auto-user@mmo.mn',  # Fixed email хаяг
-                is_active=True
-            )
-
-            # ID авсны дараа username-ийг u+ID болгон шинэчлэх
-            user.username = f"u{user.id}"
-            user.save(update_fields=['username'])
-
-            # Сургууль олох (хэрэв school_name байвал)
-            school = None
-            similarity = 0
-            if school_name and pd.notna(school_name) and str(school_name).strip():
-                school, similarity = self.find_school_by_name(str(school_name).strip(), province_id)
-
-            # Сургууль олдоогүй бол province-ийн "Бусад" сургуульд бүртгэх
-            if not school and province_id:
-                busad_school = School.objects.filter(
-                    province_id=province_id,
-                    name="Бусад"
-                ).first()
-
-                if busad_school:
-                    school = busad_school
-                    similarity = 100  # "Бусад" сургууль гэдгийг тэмдэглэх
-                    self.stdout.write(self.style.WARNING(
-                        f"      ⚠️ Сургууль тодорхойлогдоогүй, '{busad_school.province.name}' аймгийн 'Бусад' сургуульд бүртгэгдлээ"
-                    ))
-                else:
-                    self.stdout.write(self.style.WARNING(
-                        f"      ⚠️ 'Бусад' сургууль олдсонгүй province_id={province_id}"
-                    ))
-
-            # Grade болон Level тодорхойлох (category-оос)
-            grade_id, level_id = self.get_grade_and_level_from_category(category)
-
-            # UserMeta үүсгэх
-            # Province нь эхлээд файлаас, файлд байхгүй бол эхний хэрэглэгчдээс inference хийгдсэн
-            # Сургуулийн province-ээс АВАХГҮЙ (сургууль province дотор хайгдсан)
-            UserMeta.objects.create(
-                user=user,
-                reg_num='',  # Default утга
-                province_id=province_id,  # Зөвхөн параметрээс авсан province
-                school=school,
-                grade_id=grade_id,
-                level_id=level_id
-            )
-
-            # Сургуулийн group-д хэрэглэгчийг нэмэх
-            if school:
-                try:
-                    if school.group:
-                        school.group.user_set.add(user)
-                        self.stdout.write(self.style.SUCCESS(
-                            f"      ✅ Хэрэглэгчийг сургуулийн группд нэмлээ: {school.group.name}"
-                        ))
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(
-                        f"      ⚠️ Группд нэмэхэд алдаа ({school.name}): {e}"
-                    ))
-                    # Устсан группын мэдээллийг статистикт нэмэх
-                    missing_group_info = {
-                        'school_id': school.id,
-                        'school_name': school.name,
-                        'province_id': province_id,
-                        'province_name': self.stats.get('current_province_name', 'Тодорхойгүй'),
-                        'error': str(e)
-                    }
-                    # Давхардахгүй байхын тулд school_id-аар шалгах
-                    if not any(g['school_id'] == school.id for g in self.stats['missing_groups']):
-                        self.stats['missing_groups'].append(missing_group_info)
-
-            # Province мэдээлэл нэмэх
-            province_info = ""
-            if province_id:
-                prov = Province.objects.filter(id=province_id).first()
-                province_info = f", Аймаг: {prov.name if prov else province_id}"
-
-            self.stdout.write(self.style.SUCCESS(
-                f"      ✅ Шинэ хэрэглэгч үүсгэлээ: {last_name} {first_name} ({user.username}, ID: {user.id})" +
-                (f", Сургууль: {school.name} ({similarity:.0f}%)" if school else "") +
-                province_info
-            ))
-
-            self.stats['users_created'] += 1
-            return user
+            return self.queue_new_user(last_name, first_name, school_name, province_id, category)
 
         # Dry_run горимд эсвэл овог нэр байхгүй үед None буцаах
         if dry_run and first_name:
@@ -811,6 +906,77 @@ class Command(BaseCommand):
 
         return None
 
+    def queue_new_user(self, last_name, first_name, school_name, province_id, category):
+        """
+        Шинэ хэрэглэгчийг (хадгалаагүй User + UserMeta) үүсгэх дараалалд нэмнэ.
+        Ижил province-д ижил нэртэй дараагийн мөрүүд энэ хэрэглэгчийг ашиглана.
+        """
+        # Түр username (create_pending_users нь ID авсны дараа u+ID болгоно)
+        user = User(
+            username=f"temp_{uuid.uuid4().hex}",
+            first_name=first_name,
+            last_name=last_name,
+            email='auto-user@mmo.mn',  # Fixed email хаяг
+            is_active=True
+        )
+
+        # Сургууль олох (хэрэв school_name байвал)
+        school = None
+        similarity = 0
+        if school_name and pd.notna(school_name) and str(school_name).strip():
+            school, similarity = self.find_school_by_name(str(school_name).strip(), province_id)
+
+        # Сургууль олдоогүй бол province-ийн "Бусад" сургуульд бүртгэх
+        if not school and province_id:
+            busad_school = self.busad_school(province_id)
+
+            if busad_school:
+                school = busad_school
+                similarity = 100  # "Бусад" сургууль гэдгийг тэмдэглэх
+                self.stdout.write(self.style.WARNING(
+                    f"      ⚠️ Сургууль тодорхойлогдоогүй, '{self.province_name(province_id)}' аймгийн 'Бусад' сургуульд бүртгэгдэнэ"
+                ))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"      ⚠️ 'Бусад' сургууль олдсонгүй province_id={province_id}"
+                ))
+
+        # Grade болон Level тодорхойлох (category-оос)
+        grade_id, level_id = self.get_grade_and_level_from_category(category)
+
+        # UserMeta
+        # Province нь эхлээд файлаас, файлд байхгүй бол эхний хэрэглэгчдээс inference хийгдсэн
+        # Сургуулийн province-ээс АВАХГҮЙ (сургууль province дотор хайгдсан)
+        meta = UserMeta(
+            user=user,
+            reg_num='',  # Default утга
+            province_id=province_id,  # Зөвхөн параметрээс авсан province
+            school=school,
+            grade_id=grade_id,
+            level_id=level_id
+        )
+        self.pending_users.append((user, meta))
+
+        if province_id and last_name:
+            self.name_candidates(last_name, first_name, province_id).append(user)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"      ✅ Шинэ хэрэглэгч үүсгэнэ: {last_name} {first_name}" +
+            (f", Сургууль: {school.name} ({similarity:.0f}%)" if school else "")
+        ))
+        return user
+
+    def busad_school(self, province_id):
+        """Province-ийн "Бусад" сургууль (province тус бүрд нэг удаа хайна)."""
+        if not hasattr(self, 'busad_schools'):
+            self.busad_schools = {}
+        if province_id not in self.busad_schools:
+            self.busad_schools[province_id] = School.objects.filter(
+                province_id=province_id,
+                name="Бусад"
+            ).first()
+        return self.busad_schools[province_id]
+
     def get_grade_and_level_from_category(self, category):
         """
         Sheet ангилалаас Grade болон Level тодорхойлох
@@ -843,6 +1009,11 @@ class Command(BaseCommand):
         if not category or category not in CATEGORY_MAPPING:
             return None, None
 
+        if not hasattr(self, 'category_levels'):
+            self.category_levels = {}
+        if category in self.category_levels:
+            return self.category_levels[category]
+
         grade_search, level_id = CATEGORY_MAPPING[category]
 
         # Grade олох - нэрээр хайна
@@ -851,7 +1022,8 @@ class Command(BaseCommand):
         # Level олох - ID-аар шууд
         level = Level.objects.filter(id=level_id).first()
 
-        return grade.id if grade else None, level.id if level else None
+        self.category_levels[category] = (grade.id if grade else None, level.id if level else None)
+        return self.category_levels[category]
 
     def get_or_create_busad_school(self, province):
         """Тухайн дүүргийн 'Бусад' сургууль олох эсвэл үүсгэх"""
@@ -908,41 +1080,8 @@ class Command(BaseCommand):
         return new_school
 
     def normalize_school_name(self, name):
-        """
-        Сургуулийн нэрийг нэг хэлбэрт оруулна:
-        - Юникод normalize
-        - Латин үсгийг кирилл рүү хөрвүүлэх
-        - Түгээмэл үгсийг арилгах
-        - Тоог жигд болгох
-        """
-        if not name:
-            return ''
-        n = unicodedata.normalize('NFKD', name).lower()
-
-        # кирилл үсгийн ижилтгэл
-        n = n.replace('ё', 'е').replace('ү', 'у').replace('ө', 'о')
-
-        # латин үсгийг кирилл рүү ойролцоогоор хөрвүүлэх
-        latin_map = {
-            'a': 'а', 'b': 'б', 'v': 'в', 'g': 'г', 'd': 'д', 'e': 'е',
-            'j': 'ж', 'z': 'з', 'i': 'и', 'k': 'к', 'l': 'л', 'm': 'м',
-            'n': 'н', 'o': 'о', 'p': 'п', 'r': 'р', 's': 'с', 't': 'т',
-            'u': 'у', 'f': 'ф', 'h': 'х', 'c': 'ц', 'y': 'й'
-        }
-        for latin, cyr in latin_map.items():
-            n = re.sub(rf'\b{latin}\b', cyr, n)
-
-        # '1-р', '2-р' гэх мэт илэрхийллийг жигд болгох
-        n = re.sub(r'(\d+)(-р)?', r'\1', n)
-
-        # түгээмэл үгсийг арилгах
-        stop_words = ['ебс', 'ebs', 'school', 'surguuli', 'surguul', 'сургууль',
-                      'дугаар', 'dugaar', '-', 'нийслэл', 'niislel', 'цогцолбор']
-        for w in stop_words:
-            n = n.replace(w, '')
-
-        n = re.sub(r'\s+', ' ', n)
-        return n.strip()
+        """Сургуулийн нэрийг нэг хэлбэрт оруулна (schools.matcher.normalize_school_name)."""
+        return normalize_school_name(name)
 
     def find_school_by_name(self, school_name, province_id=None):
         """
@@ -959,35 +1098,25 @@ class Command(BaseCommand):
         Returns: (School, similarity_score) эсвэл (None, 0)
         """
         n1 = self.normalize_school_name(school_name)
+        # School хүснэгтийг мөр бүрд уншихгүй: хэвшүүлсэн нэрсийн индекс (School өөрчлөгдөхөд шинэчлэгдэнэ)
+        matcher = get_school_matcher()
 
         # 1-р шат: province_id таарсан сургуулиудаас хайх
         if province_id:
-            candidates = School.objects.filter(province_id=province_id)
-            best, best_score = self._find_best_school_match(n1, candidates)
+            best, best_score = matcher.match(n1, int(province_id), normalized=True)
 
             # Хэрэв сайн тохирол олдвол буцаах
             if best and best_score >= 70:
                 return best, best_score
 
         # 2-р шат: province үл харгалзан хайх
-        candidates = School.objects.all()
-        best, best_score = self._find_best_school_match(n1, candidates)
+        best, best_score = matcher.match(n1, normalized=True)
 
         if best and best_score >= 70:
             return best, best_score
 
         return None, 0
 
-    def _find_best_school_match(self, normalized_name, queryset):
-        """Тухайн нэртэй хамгийн төстэй сургуулийг буцаана."""
-        best, best_score = None, 0
-        for school in queryset:
-            n2 = self.normalize_school_name(school.name)
-            score = fuzz.token_sort_ratio(normalized_name, n2)
-            if score > best_score:
-                best, best_score = school, score
-        return best, best_score
-
     def infer_province_from_data(self, df, column_map):
         """
         Province_id олдохгүй бол эхний 3-5 сурагчийн province-ийг шалгах.
@@ -1708,7 +1837,16 @@ class Command(BaseCommand):
                 f.write(f"Нийт хэрэглэгч олдоогүй: {len(self.stats['users_not_found'])}\n")
                 f.write(f"Нийт олимпиад алдаа: {len(self.stats['olympiad_errors'])}\n")
                 f.write(f"Нийт устсан групп: {len(self.stats['missing_groups'])}\n")
-                f.write(f"Нийт province шинэчилсэн: {self.stats['province_updated']}\n\n")
+                f.write(f"Нийт province шинэчилсэн: {self.stats['province_updated']}\n")
+                f.write(f"Нийт алдаатай файл: {len(self.stats['file_errors'])}\n\n")
+
+                # Rollback хийгдсэн файлууд
+                if self.stats['file_errors']:
+                    f.write(f"Алдаатай файлууд (импортлогдоогүй):\n")
+                    f.write(f"{'='*80}\n")
+                    for err in self.stats['file_errors']:
+                        f.write(f"  - {err['file']} ({err['province_name']}): {err['error']}\n")
+                    f.write("\n")
 
                 f.write(f"Province бүрийн алдаануудын тоо:\n")
                 f.write(f"{'='*80}\n")
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0015_alter_olympiadtimeline_school_year'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scoresheet',
+            index=models.Index(fields=['olympiad', 'total'], name='olympiad_sc_olympia_fe8961_idx'),
+        ),
+    ]
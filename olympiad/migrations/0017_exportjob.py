@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0016_scoresheet_olympiad_total_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='Төрөл')),
+                ('params', models.JSONField(default=dict, verbose_name='Параметр')),
+                ('params_hash', models.CharField(max_length=64, verbose_name='Параметрийн hash')),
+                ('data_version', models.CharField(max_length=100, verbose_name='Өгөгдлийн хувилбар')),
+                ('status', models.CharField(choices=[('pending', 'Хүлээгдэж буй'), ('running', 'Боловсруулж буй'), ('done', 'Бэлэн'), ('failed', 'Амжилтгүй')], default='pending', max_length=20, verbose_name='Төлөв')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='Бичсэн мөр')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Нийт мөр')),
+                ('file', models.FileField(blank=True, upload_to='exports/%Y/%m/', verbose_name='Файл')),
+                ('filename', models.CharField(blank=True, default='', max_length=255, verbose_name='Файлын нэр')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Алдаа')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Хүсэлт гаргасан')),
+            ],
+            options={
+                'verbose_name': 'Экспорт',
+                'verbose_name_plural': 'Экспортууд',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['kind', 'params_hash', 'data_version'], name='olympiad_ex_kind_759c20_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0017_exportjob'),
+        ('schools', '0004_fix_user_fk_cascade_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolParticipation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contestant_count', models.PositiveIntegerField(default=0, verbose_name='Оролцогч')),
+                ('empty_count', models.PositiveIntegerField(default=0, verbose_name='Оноо аваагүй')),
+                ('sample', models.JSONField(blank=True, default=dict, verbose_name='Жишээ хариултууд')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('olympiad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='school_participations', to='olympiad.olympiad')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='olympiad_participations', to='schools.school')),
+            ],
+            options={
+                'verbose_name': 'Сургуулийн оролцоо',
+                'verbose_name_plural': 'Сургуулийн оролцоо',
+                'constraints': [models.UniqueConstraint(fields=('olympiad', 'school'), name='unique_school_participation')],
+            },
+        ),
+    ]
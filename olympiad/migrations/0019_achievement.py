@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0018_schoolparticipation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Achievement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scoresheet_id', models.IntegerField()),
+                ('olympiad_name', models.CharField(max_length=120)),
+                ('round', models.IntegerField(default=0)),
+                ('school_year_name', models.CharField(blank=True, max_length=10, null=True)),
+                ('level_name', models.CharField(blank=True, max_length=60, null=True)),
+                ('school_name', models.CharField(blank=True, max_length=200, null=True)),
+                ('total', models.FloatField(default=0)),
+                ('ranking_a', models.IntegerField(default=0)),
+                ('ranking_b', models.IntegerField(default=0)),
+                ('problems_solved', models.PositiveSmallIntegerField(default=0)),
+                ('prizes', models.CharField(blank=True, max_length=512, null=True)),
+                ('is_official', models.BooleanField(default=False)),
+                ('is_public', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('olympiad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to='olympiad.olympiad')),
+                ('school_year', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='olympiad.schoolyear')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Амжилт',
+                'verbose_name_plural': 'Амжилтууд',
+                'indexes': [models.Index(fields=['user', 'is_public'], name='olympiad_ac_user_id_568ee3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'olympiad'), name='unique_user_achievement')],
+            },
+        ),
+    ]
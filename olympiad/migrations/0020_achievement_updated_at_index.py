@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0019_achievement'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='achievement',
+            index=models.Index(fields=['updated_at'], name='olympiad_ac_updated_68cb2b_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0020_achievement_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultsVersion',
+            fields=[
+                ('olympiad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='results_version', serialize=False, to='olympiad.olympiad')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+# (contestant, problem) бүрт нэг Result үлдээнэ: хариулт/оноотой, төлөв нь ахисан, хамгийн
+# сүүлийн мөрийг. Бусад мөрийн upload, comment-уудыг үлдэх мөр рүү шилжүүлнэ.
+DEDUPLICATE_SQL = [
+    """
+    CREATE TEMPORARY TABLE result_duplicates AS
+    SELECT id, keep_id FROM (
+        SELECT id, FIRST_VALUE(id) OVER (
+            PARTITION BY contestant_id, problem_id
+            ORDER BY (answer IS NULL AND score IS NULL), state DESC, id DESC
+        ) AS keep_id
+        FROM olympiad_result
+        WHERE contestant_id IS NOT NULL AND problem_id IS NOT NULL
+    ) ranked
+    WHERE id <> keep_id
+    """,
+    "UPDATE olympiad_upload u SET result_id = d.keep_id FROM result_duplicates d WHERE u.result_id = d.id",
+    "UPDATE olympiad_comment c SET result_id = d.keep_id FROM result_duplicates d WHERE c.result_id = d.id",
+    "DELETE FROM olympiad_result r USING result_duplicates d WHERE r.id = d.id",
+    "DROP TABLE result_duplicates",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0021_resultsversion'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPLICATE_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='result',
+            constraint=models.UniqueConstraint(fields=('contestant', 'problem'), name='unique_contestant_problem_result'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0022_result_unique_contestant_problem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resultsversion',
+            name='answers_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
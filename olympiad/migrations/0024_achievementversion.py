@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import migrations, models
+
+# Achievement-ийн мөр нэмэгдэх/өөрчлөгдөх/устах statement бүрийн дараа тухайн сурагчдын
+# хувилбарт одоогийн transaction-ийн ID-г бичнэ. Устгал ORM-ийн cascade (олимпиад, хэрэглэгч)
+# эсвэл refresh_achievements-ийн DELETE-ээс ирсэн ч ялгаагүй барина.
+TRIGGERS_SQL = """
+CREATE FUNCTION olympiad_achievement_touch_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO olympiad_achievementversion (user_id, txid, updated_at)
+    SELECT DISTINCT user_id, pg_current_xact_id()::text::bigint, NOW() FROM changed_rows
+    ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET txid = EXCLUDED.txid, updated_at = EXCLUDED.updated_at
+    WHERE olympiad_achievementversion.txid <> EXCLUDED.txid;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER olympiad_achievement_version_insert AFTER INSERT ON olympiad_achievement
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION olympiad_achievement_touch_version();
+CREATE TRIGGER olympiad_achievement_version_update AFTER UPDATE ON olympiad_achievement
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION olympiad_achievement_touch_version();
+CREATE TRIGGER olympiad_achievement_version_delete AFTER DELETE ON olympiad_achievement
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION olympiad_achievement_touch_version();
+
+-- Нэр нь API-ийн хариунд (ба ETag-т) ордог тул хувилбартай сурагчийн нэр солигдоход ч
+CREATE FUNCTION olympiad_user_touch_achievement_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE olympiad_achievementversion
+    SET txid = pg_current_xact_id()::text::bigint, updated_at = NOW()
+    WHERE user_id = NEW.id;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER olympiad_achievement_version_username AFTER UPDATE OF username ON auth_user
+    FOR EACH ROW WHEN (OLD.username IS DISTINCT FROM NEW.username)
+    EXECUTE FUNCTION olympiad_user_touch_achievement_version();
+
+INSERT INTO olympiad_achievementversion (user_id, txid, updated_at)
+SELECT user_id, pg_current_xact_id()::text::bigint, MAX(updated_at) FROM olympiad_achievement
+GROUP BY user_id;
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS olympiad_achievement_version_username ON auth_user;
+DROP FUNCTION IF EXISTS olympiad_user_touch_achievement_version();
+DROP TRIGGER IF EXISTS olympiad_achievement_version_insert ON olympiad_achievement;
+DROP TRIGGER IF EXISTS olympiad_achievement_version_update ON olympiad_achievement;
+DROP TRIGGER IF EXISTS olympiad_achievement_version_delete ON olympiad_achievement;
+DROP FUNCTION IF EXISTS olympiad_achievement_touch_version();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('olympiad', '0023_resultsversion_answers_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AchievementVersion',
+            fields=[
+                ('user_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Амжилтын хувилбар',
+                'verbose_name_plural': 'Амжилтын хувилбарууд',
+                'indexes': [models.Index(fields=['txid', 'user_id'], name='olympiad_ac_txid_9b18db_idx')],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='achievement',
+            name='olympiad_ac_updated_68cb2b_idx',
+        ),
+        migrations.RunSQL(TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
@@ -1,7 +1,9 @@
 from django.contrib import messages
-from django.shortcuts import redirect, get_object_or_404
+from django.http import Http404
+from django.shortcuts import redirect
 from django.db import transaction
-from .models import Olympiad, Result
+from .models import Result
+from .utils.manifest import get_contest_manifest, get_participant_state, update_participant_state, is_group_member
 
 
 class OlympiadAccessMixin:
@@ -9,10 +11,12 @@ class OlympiadAccessMixin:
 
     def dispatch(self, request, *args, **kwargs):
         olympiad_id = kwargs.get('olympiad_id')
-        self.olympiad = get_object_or_404(
-            Olympiad.objects.select_related('group', 'level', 'school_year'),
-            pk=olympiad_id
-        )
+        # Олимпиад, бодлогуудын жагсаалтыг cache-ээс (олимпиад эхлэх үеийн ачааллыг DB-д хүргэхгүй)
+        manifest = get_contest_manifest(olympiad_id)
+        if manifest is None:
+            raise Http404('Олимпиад олдсонгүй')
+        self.olympiad = manifest['olympiad']
+        self.problem_ids = manifest['problem_ids']
 
         access_denied = self.check_access()
         if access_denied:
@@ -24,7 +28,7 @@ class OlympiadAccessMixin:
         """Групп ба цагийн шалгалтууд."""
         user = self.request.user
         olympiad = self.olympiad
-        status = olympiad.get_access_status(user)
+        status = olympiad.get_access_status(user, is_member=is_group_member(olympiad, user))
 
         if status['code'] == 'no_access':
             messages.info(
@@ -65,6 +69,10 @@ class ResultsEnsureMixin:
         user = self.request.user
         olympiad = self.olympiad
 
+        # Өмнө нь үүсгэсэн бол дахин шалгахгүй (бодлого нэмэгдэхэд тэмдэг хүчингүй болно)
+        if get_participant_state(olympiad.id, user.id).get('results'):
+            return
+
         # Одоо байгаа Result-үүдийн problem_id жагсаалтыг авна
         existing_problem_ids = set(
             Result.objects.filter(
@@ -72,15 +80,19 @@ class ResultsEnsureMixin:
             ).values_list('problem_id', flat=True)
         )
 
-        problems = olympiad.problem_set.all().order_by('order')
+        problem_ids = getattr(self, 'problem_ids', None)
+        if problem_ids is None:
+            problem_ids = olympiad.problem_set.order_by('order').values_list('id', flat=True)
 
         results_to_create = [
-            Result(contestant=user, olympiad=olympiad, problem=problem)
-            for problem in problems
-            if problem.id not in existing_problem_ids
+            Result(contestant=user, olympiad=olympiad, problem_id=problem_id)
+            for problem_id in problem_ids
+            if problem_id not in existing_problem_ids
         ]
 
         if results_to_create:
             # Аюулгүй байдлаар нэг дор үүсгэнэ
             with transaction.atomic():
                 Result.objects.bulk_create(results_to_create, ignore_conflicts=True)
+
+        update_participant_state(olympiad.id, user.id, results=True)
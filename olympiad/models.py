@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User, Group
 from accounts.models import Author, Province, Zone, Grade, Level
 from django.utils import timezone
@@ -120,9 +120,14 @@ class Olympiad(models.Model):
         threshold = timezone.now() - timedelta(seconds=300)
         return bool(self.end_time and self.end_time < threshold)
 
-    def get_access_status(self, user):
-        """Тухайн хэрэглэгчийн энэ олимпиадад оролцох төлөв (OlympiadAccessMixin-тэй ижил дүрэм)."""
-        if self.group and not self.group.user_set.filter(id=user.id).exists():
+    def get_access_status(self, user, is_member=None):
+        """Тухайн хэрэглэгчийн энэ олимпиадад оролцох төлөв (OlympiadAccessMixin-тэй ижил дүрэм).
+
+        is_member: группийн гишүүнчлэл урьдчилан мэдэгдэж байвал (cache-ээс) дахин query хийхгүй.
+        """
+        if is_member is None:
+            is_member = not self.group_id or self.group.user_set.filter(id=user.id).exists()
+        if self.group_id and not is_member:
             return {'code': 'no_access', 'label': f"Зөвхөн '{self.group.name}' бүлгийн сурагчид", 'css': 'secondary'}
         if not self.is_started():
             return {'code': 'not_started', 'label': 'Эхлээгүй байна', 'css': 'warning'}
@@ -376,6 +381,10 @@ class Result(models.Model):
             models.Index(fields=['contestant', 'olympiad', 'problem']),
             models.Index(fields=['olympiad', 'state']),
         ]
+        constraints = [
+            # Урьдчилан үүсгэх (provisioning) ба ResultsEnsureMixin зэрэг ажиллахад давхардахгүй
+            models.UniqueConstraint(fields=['contestant', 'problem'], name='unique_contestant_problem_result'),
+        ]
 
 
 class Upload(models.Model):
@@ -533,10 +542,18 @@ class ScoreSheet(models.Model):
     is_official = models.BooleanField(default=False)
     total = models.FloatField(default=0, blank=True, null=True)
 
+    RANKING_INPUT_FIELDS = {'total', 'school', 'school_id', 'is_official'} | {f's{i}' for i in range(1, 21)}
+
     def __str__(self):
         return "{} олимпиад, {}".format(self.olympiad.name, self.user)
 
-    def save(self, *args, **kwargs):
+    class Meta:
+        indexes = [
+            # Эрэмбийн хэсэгчилсэн шинэчлэлийг хурдасгах
+            models.Index(fields=['olympiad', 'total']),
+        ]
+
+    def save(self, *args, update_rankings=True, **kwargs):
         # зөвхөн анх үүсэх үед school-г онооно
         # (UserMeta байхгүй бол сургуулийг тодорхойгүй буюу None-ээр үлдээнэ)
         if not self.pk and not self.school:
@@ -544,7 +561,19 @@ class ScoreSheet(models.Model):
 
         # нийт оноо тооцох
         self.total = sum(getattr(self, f"s{i+1}") or 0 for i in range(20))
-        super().save(*args, **kwargs)
+
+        # total, school, is_official өөрчлөгдвөл зөвхөн хамаарах эрэмбийг шинэчилнэ
+        update_fields = kwargs.get('update_fields')
+        if update_rankings and (update_fields is None or set(update_fields) & self.RANKING_INPUT_FIELDS):
+            from .utils.ranking import save_with_rankings
+            save_with_rankings(self, lambda: super(ScoreSheet, self).save(*args, **kwargs))
+        else:
+            super().save(*args, **kwargs)
+
+        # Оноо, эрэмбэ, шагнал зэрэг бүх талбар дүнгийн хуудсанд харагддаг
+        from .utils.caching import invalidate_olympiad_cache
+        olympiad_id = self.olympiad_id
+        transaction.on_commit(lambda: invalidate_olympiad_cache(olympiad_id))
 
 
 class OlympiadTimeline(models.Model):
@@ -575,4 +604,145 @@ class OlympiadTimeline(models.Model):
         verbose_name_plural = 'Олимпиадын түүх (timeline)'
 
     def __str__(self):
-        return f'ММО-{self.number}'
\ No newline at end of file
+        return f'ММО-{self.number}'
+
+class ExportJob(models.Model):
+    """Ард талд (Celery) үүсгэгдэх экспорт файл (olympiad/utils/export_jobs.py).
+
+    Ижил төрөл, параметр, өгөгдлийн хувилбартай хүсэлтүүд нэг ажлыг хуваалцана.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Хүлээгдэж буй'
+        RUNNING = 'running', 'Боловсруулж буй'
+        DONE = 'done', 'Бэлэн'
+        FAILED = 'failed', 'Амжилтгүй'
+
+    kind = models.CharField(max_length=50, verbose_name='Төрөл')
+    params = models.JSONField(default=dict, verbose_name='Параметр')
+    params_hash = models.CharField(max_length=64, verbose_name='Параметрийн hash')
+    data_version = models.CharField(max_length=100, verbose_name='Өгөгдлийн хувилбар')
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING, verbose_name='Төлөв')
+    progress = models.PositiveIntegerField(default=0, verbose_name='Бичсэн мөр')
+    total = models.PositiveIntegerField(default=0, verbose_name='Нийт мөр')
+    file = models.FileField(upload_to='exports/%Y/%m/', blank=True, verbose_name='Файл')
+    filename = models.CharField(max_length=255, blank=True, default='', verbose_name='Файлын нэр')
+    error = models.TextField(blank=True, default='', verbose_name='Алдаа')
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='export_jobs', verbose_name='Хүсэлт гаргасан'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['kind', 'params_hash', 'data_version'])]
+        verbose_name = 'Экспорт'
+        verbose_name_plural = 'Экспортууд'
+
+    def __str__(self):
+        return f'{self.kind} #{self.id} ({self.get_status_display()})'
+
+
+class ResultsVersion(models.Model):
+    """Олимпиадын дүнгийн өгөгдлийн хувилбар (olympiad/utils/caching.py).
+
+    Cache нь процесс бүрт тусдаа байж болох тул snapshot, хариултын матриц хуучирсан эсэхийг
+    DB дахь энэ тоолуураар шалгана. invalidate_olympiad_cache бүр нэмэгдүүлж, дахин бичилтийг
+    ард талд товлоно. answers_version нь auto-save буферийн flush бүрд нэмэгдэх ба зөвхөн
+    хариултын матрицад нөлөөлнө (дүнгийн snapshot хүчингүй болохгүй).
+    """
+    olympiad = models.OneToOneField(Olympiad, on_delete=models.CASCADE, primary_key=True, related_name='results_version')
+    version = models.BigIntegerField(default=0)
+    answers_version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.olympiad_id}: v{self.version}'
+
+
+class SchoolParticipation(models.Model):
+    """Олимпиад × сургуулийн оролцооны тойм (olympiad/utils/participation.py).
+
+    Дүн оруулах, оноо тооцох бүрт тухайн сургуулиудын мөр шинэчлэгдэнэ;
+    province_summary_view үүнээс шууд уншина.
+    """
+    olympiad = models.ForeignKey(Olympiad, on_delete=models.CASCADE, related_name='school_participations')
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='olympiad_participations')
+    contestant_count = models.PositiveIntegerField(default=0, verbose_name='Оролцогч')
+    empty_count = models.PositiveIntegerField(default=0, verbose_name='Оноо аваагүй')
+    sample = models.JSONField(default=dict, blank=True, verbose_name='Жишээ хариултууд')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['olympiad', 'school'], name='unique_school_participation'),
+        ]
+        verbose_name = 'Сургуулийн оролцоо'
+        verbose_name_plural = 'Сургуулийн оролцоо'
+
+    def __str__(self):
+        return f'{self.olympiad_id} / {self.school_id}: {self.contestant_count}'
+
+
+class Achievement(models.Model):
+    """Сурагчийн олимпиадын амжилт - ScoreSheet-ийн проекц (olympiad/utils/achievements.py).
+
+    (user, olympiad) бүрт нэг мөр; student_achievements хуудас болон API үүнээс нэг
+    query-гээр уншина. ScoreSheet, Award, Olympiad өөрчлөгдөхөд шинэчлэгдэнэ.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievements')
+    olympiad = models.ForeignKey(Olympiad, on_delete=models.CASCADE, related_name='achievements')
+    scoresheet_id = models.IntegerField()
+    olympiad_name = models.CharField(max_length=120)
+    round = models.IntegerField(default=0)
+    school_year = models.ForeignKey(SchoolYear, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    school_year_name = models.CharField(max_length=10, null=True, blank=True)
+    level_name = models.CharField(max_length=60, null=True, blank=True)
+    school_name = models.CharField(max_length=200, null=True, blank=True)
+    total = models.FloatField(default=0)
+    ranking_a = models.IntegerField(default=0)
+    ranking_b = models.IntegerField(default=0)
+    problems_solved = models.PositiveSmallIntegerField(default=0)
+    prizes = models.CharField(max_length=512, null=True, blank=True)
+    is_official = models.BooleanField(default=False)
+    is_public = models.BooleanField(default=True)  # Olympiad.is_open
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'olympiad'], name='unique_user_achievement'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'is_public']),
+        ]
+        verbose_name = 'Амжилт'
+        verbose_name_plural = 'Амжилтууд'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.olympiad_name}'
+
+
+class AchievementVersion(models.Model):
+    """Сурагчийн амжилтын хувилбар - API-ийн ETag ба changed-since cursor (olympiad/utils/achievements.py).
+
+    Achievement хүснэгтийн trigger (0024 migration) нь мөр нэмэгдэх, өөрчлөгдөх, устах бүрд
+    (олимпиад, хэрэглэгч cascade-аар устахад ч) тухайн сурагчийн мөрт бичсэн transaction-ийн
+    ID-г тавина; хэрэглэгчийн нэр солигдоход ч мөн. User-тэй FK-гүй тул хэрэглэгч эсвэл түүний
+    сүүлийн мөр устсан ч tombstone болж үлдэнэ.
+    """
+    user_id = models.IntegerField(primary_key=True)
+    txid = models.BigIntegerField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'user_id']),  # changed-since cursor
+        ]
+        verbose_name = 'Амжилтын хувилбар'
+        verbose_name_plural = 'Амжилтын хувилбарууд'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.txid}'
@@ -28,10 +28,11 @@ from django.shortcuts import redirect
 from django.db.models import Count, Avg, Max, Min
 
 from django.core.cache import cache
+from olympiad.utils.caching import olympiad_cache_key, RESULTS_CACHE_TIMEOUT
 
 @staff_member_required
 def olympiad_problem_stats(request, olympiad_id):
-    cache_key = f"olympiad_stats_{olympiad_id}"
+    cache_key = olympiad_cache_key(olympiad_id, 'stats')
     data = cache.get(cache_key)
     if not data:
         olympiad = get_object_or_404(Olympiad, pk=olympiad_id)
@@ -68,7 +69,7 @@ def olympiad_problem_stats(request, olympiad_id):
             "olympiad": olympiad,
             "problem_stats": problem_stats,
         }
-        cache.set(cache_key, data, timeout=None)  # хугацаагүй хадгална
+        cache.set(cache_key, data, timeout=RESULTS_CACHE_TIMEOUT)  # олимпиадын хувилбар солигдтол хүчинтэй
 
     return render(request, "olympiad/stats/olympiad_problem_stats.html", data)
 
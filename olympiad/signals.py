@@ -0,0 +1,148 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.models import Level, UserMeta
+from schools.models import School
+
+from .models import Award, Olympiad, Problem, Result, SchoolYear, ScoreSheet
+from .utils.achievements import (
+    OLYMPIAD_FIELDS, SCORESHEET_FIELDS, refresh_user_achievement_on_commit, schedule_achievements_rename,
+    schedule_achievements_refresh,
+)
+from .utils.caching import invalidate_contest_cache, invalidate_users_cache
+from .utils.participation import schedule_participation_refresh
+
+
+@receiver([post_save, post_delete], sender=Olympiad)
+def olympiad_changed(sender, instance, **kwargs):
+    # Хугацаа, групп өөрчлөгдөхөд оролцооны хуудсуудын manifest-ийг шинэчлэх
+    invalidate_contest_cache(instance.id)
+
+
+def _remember_previous(instance, attnames, update_fields):
+    """pre_save: амжилтад хуулагдсан талбаруудын DB дахь өмнөх утгыг instance дээр хадгална."""
+    if update_fields is not None and not {
+        name for attname in attnames for name in (attname, attname.removesuffix('_id'))
+    } & set(update_fields):
+        instance._achievement_previous = {attname: getattr(instance, attname) for attname in attnames}
+        return
+    instance._achievement_previous = (
+        type(instance).objects.filter(pk=instance.pk).values(*attnames).first() if instance.pk else None
+    )
+
+
+def _copied_fields_changed(instance, attnames):
+    previous = getattr(instance, '_achievement_previous', None)
+    return previous is None or any(previous[attname] != getattr(instance, attname) for attname in attnames)
+
+
+@receiver(pre_save, sender=Olympiad)
+def olympiad_before_save(sender, instance, update_fields=None, **kwargs):
+    _remember_previous(instance, OLYMPIAD_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=Olympiad)
+def olympiad_saved(sender, instance, created, **kwargs):
+    # Нэр, шат, жил, түвшин, нээлттэй эсэх нь сурагчдын амжилтын мөрүүдэд хуулагдсан
+    # (is_grading гэх мэт бусад талбарын засварт шинэчлэхгүй)
+    if not created and _copied_fields_changed(instance, OLYMPIAD_FIELDS):
+        schedule_achievements_refresh(instance.id)
+
+
+@receiver(pre_save, sender=School)
+@receiver(pre_save, sender=Level)
+@receiver(pre_save, sender=SchoolYear)
+def named_before_save(sender, instance, update_fields=None, **kwargs):
+    _remember_previous(instance, ('name',), update_fields)
+
+
+@receiver(post_save, sender=School)
+@receiver(post_save, sender=Level)
+@receiver(post_save, sender=SchoolYear)
+def named_saved(sender, instance, created, **kwargs):
+    # Амжилтын мөрүүдэд хуулагдсан нэрийг шинэчлэх
+    if not created and _copied_fields_changed(instance, ('name',)):
+        kind = {School: 'school', Level: 'level', SchoolYear: 'school_year'}[sender]
+        schedule_achievements_rename(kind, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ScoreSheet)
+def scoresheet_changed(sender, instance, signal, update_fields=None, **kwargs):
+    # Эрэмбэ өөрчлөгдсөн бол олимпиадын бүх мөр шинэчлэгдэнэ (ranking.save_with_rankings)
+    if signal is post_save and getattr(instance, '_refresh_olympiad_achievements', False):
+        return
+    if update_fields is not None and not SCORESHEET_FIELDS & set(update_fields):
+        return
+    refresh_user_achievement_on_commit(instance.user_id, instance.olympiad_id)
+
+
+@receiver([post_save, post_delete], sender=Award)
+def award_changed(sender, instance, **kwargs):
+    refresh_user_achievement_on_commit(instance.contestant_id, instance.olympiad_id)
+
+
+@receiver([post_save, post_delete], sender=Problem)
+def problem_changed(sender, instance, **kwargs):
+    # Бодлого нэмэгдэх/устахад сурагчдын Result-уудыг дахин шалгуулах
+    if instance.olympiad_id:
+        invalidate_contest_cache(instance.olympiad_id)
+
+
+@receiver([post_save, pre_delete], sender=User)
+@receiver([post_save, pre_delete], sender=UserMeta)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Нэвтрэх бүрт (last_login) экспортын файлуудыг хүчингүй болгохгүй
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    # Зөвхөн энэ хэрэглэгчийн группуудын экспорт (устгахаас өмнө гишүүнчлэл нь байсаар)
+    user_id = instance.pk if sender is User else instance.user_id
+    invalidate_users_cache(User.groups.through.objects.filter(user_id=user_id).values_list('group_id', flat=True))
+
+
+@receiver(pre_save, sender=UserMeta)
+def usermeta_school_before_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'school', 'school_id'} & set(update_fields):
+        instance._previous_school_id = instance.school_id
+        return
+    instance._previous_school_id = (
+        UserMeta.objects.filter(pk=instance.pk).values_list('school_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=UserMeta)
+def usermeta_school_changed(sender, instance, **kwargs):
+    # Сургуулиа сольсон сурагч хуучин сургуулийнхаа оролцооны тоймд тоологдсоор байхгүйн тулд
+    previous = getattr(instance, '_previous_school_id', instance.school_id)
+    if previous == instance.school_id:
+        return
+    school_ids = {school_id for school_id in (previous, instance.school_id) if school_id}
+    olympiad_ids = (
+        Result.objects.filter(contestant_id=instance.user_id, olympiad__school_participations__isnull=False)
+        .values_list('olympiad_id', flat=True).distinct()
+    )
+    for olympiad_id in olympiad_ids:
+        schedule_participation_refresh(olympiad_id, school_ids=school_ids)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # post_clear-д pk_set байхгүй тул цэвэрлэхээс өмнө группуудыг авна
+        instance._cleared_group_ids = [instance.pk] if reverse else list(instance.groups.values_list('id', flat=True))
+        return
+    if action in ('post_add', 'post_remove'):
+        group_ids = [instance.pk] if reverse else pk_set
+    elif action == 'post_clear':
+        group_ids = getattr(instance, '_cleared_group_ids', [])
+    else:
+        return
+
+    # Группын гишүүнчлэл өөрчлөгдөхөд тухайн группуудын оролцогчдын жагсаалтын экспортууд хүчингүй болно
+    invalidate_users_cache(group_ids)
+    if action == 'post_add':
+        return
+
+    # Олимпиадын группээс хасагдсан сурагчийн cache-лэгдсэн "member" төлөв (manifest.is_group_member)
+    for olympiad_id in Olympiad.objects.filter(group_id__in=group_ids).values_list('id', flat=True):
+        invalidate_contest_cache(olympiad_id)
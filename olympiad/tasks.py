@@ -0,0 +1,83 @@
+# olympiad/tasks.py
+from celery import shared_task
+
+from .utils.achievements import rename_achievements, refresh_scheduled_achievements
+from .utils.answer_buffer import flush_all_answers
+from .utils.answer_matrix import republish_answer_matrix
+from .utils.excel_cache import prune_excel_cache
+from .utils.export_jobs import prune_jobs, run_job
+from .utils.participation import refresh_buffered, refresh_for_contestants
+from .utils.provisioning import provision_results, upcoming_olympiad_ids
+from .utils.snapshots import republish_results
+
+
+@shared_task
+def flush_answer_buffers():
+    """Auto-save буферийн хариултуудыг Result руу багцаар бичих (Celery beat)"""
+    return flush_all_answers()
+
+
+@shared_task
+def provision_olympiad_results(olympiad_id):
+    """Нэг олимпиадын группийн гишүүдэд Result-уудыг урьдчилан үүсгэх"""
+    created, members = provision_results(olympiad_id)
+    return {'olympiad_id': olympiad_id, 'created': created, 'members': members}
+
+
+@shared_task
+def provision_upcoming_results():
+    """Ойрын 24 цагт эхлэх олимпиадуудад Result бэлтгэх (группт сүүлд нэмэгдсэн сурагчид мөн)"""
+    return [provision_olympiad_results(olympiad_id) for olympiad_id in upcoming_olympiad_ids()]
+
+
+@shared_task
+def prune_excel_parse_cache():
+    """Удаан ашиглагдаагүй Excel parse cache-ийг устгах (Celery beat)"""
+    return prune_excel_cache()
+
+
+@shared_task
+def run_export_job(job_id):
+    """Экспортын файлыг ард талд үүсгэх (export_jobs.request_export)"""
+    return run_job(job_id)
+
+
+@shared_task
+def prune_export_jobs():
+    """Хуучирсан экспортын файлуудыг устгах (Celery beat)"""
+    return prune_jobs()
+
+
+@shared_task
+def refresh_school_participation_task(olympiad_id, contestant_ids=None, school_ids=None):
+    """Дүн оруулсан сурагчдын (ба school_ids) сургуулиудын оролцооны тоймыг шинэчлэх"""
+    schools = refresh_for_contestants(olympiad_id, contestant_ids, school_ids)
+    return {'olympiad_id': olympiad_id, 'schools': schools}
+
+
+@shared_task
+def refresh_buffered_participation_task(olympiad_id):
+    """Auto-save буферээс бичигдсэн сурагчдын сургуулиудын оролцооны тоймыг шинэчлэх (answer_buffer.py)"""
+    return {'olympiad_id': olympiad_id, 'schools': refresh_buffered(olympiad_id)}
+
+
+@shared_task
+def refresh_olympiad_achievements(olympiad_id):
+    """Олимпиадын бүх сурагчийн амжилтын мөрийг шинэчлэх (achievements.py)"""
+    return refresh_scheduled_achievements(olympiad_id)
+
+
+@shared_task
+def rename_olympiad_achievements(kind, object_id):
+    """Сургууль, түвшин, хичээлийн жилийн шинэ нэрийг амжилтын мөрүүдэд тавих (achievements.py)"""
+    return rename_achievements(kind, object_id)
+
+
+@shared_task
+def publish_results_task(olympiad_id):
+    """Дүн, хариулт засагдсаны дараа хуучирсан дүнгийн snapshot, хариултын матрицыг дахин бичих"""
+    return {
+        'olympiad_id': olympiad_id,
+        'combos': republish_results(olympiad_id),
+        'contestants': republish_answer_matrix(olympiad_id),
+    }
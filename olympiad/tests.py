@@ -1 +1,346 @@
-from django.test import TestCase
\ No newline at end of file
+import io
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import Group, User
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from accounts.models import Province, UserMeta, Zone
+from schools.models import School
+
+from .models import Achievement, AnswerChoice, ExportJob, Olympiad, Problem, Result, ScoreSheet
+from .utils.achievements import (
+    achievement_etag, achievement_versions, changed_users, encode_cursor, refresh_achievements,
+)
+from .utils.excel_cache import CachedWorkbook, _read_parquet, _write_parquet
+from .utils.provisioning import provision_results
+from .utils.ranking import RANK_FIELDS, grouped_ranks, update_olympiad_rankings
+from .utils.scoring import score_olympiad
+from .views_exports import TOKEN_SALT
+
+
+class GroupedRanksTests(SimpleTestCase):
+    """ranking.grouped_ranks-ийн тэнцэл, бүлэг, mask-ийн дүрэм."""
+
+    def ranks(self, groups, totals, ids=None, mask=None):
+        n = len(totals)
+        ids = np.arange(1, n + 1) if ids is None else np.asarray(ids)
+        mask = np.ones(n, dtype=bool) if mask is None else np.asarray(mask)
+        return [r.tolist() for r in grouped_ranks(np.asarray(groups), np.asarray(totals, dtype=float), ids, mask)]
+
+    def test_ties_take_best_and_worst_place(self):
+        list_rank, rank_a, rank_b = self.ranks([0, 0, 0, 0], [10, 7, 7, 3])
+        self.assertEqual(list_rank, [1, 2, 3, 4])
+        self.assertEqual(rank_a, [1, 2, 2, 4])
+        self.assertEqual(rank_b, [1, 3, 3, 4])
+
+    def test_list_rank_breaks_ties_by_id(self):
+        list_rank, rank_a, rank_b = self.ranks([0, 0, 0], [5, 5, 5], ids=[30, 10, 20])
+        self.assertEqual(list_rank, [3, 1, 2])
+        self.assertEqual(rank_a, [1, 1, 1])
+        self.assertEqual(rank_b, [3, 3, 3])
+
+    def test_groups_are_ranked_independently(self):
+        list_rank, rank_a, rank_b = self.ranks([1, 2, 1, 2, 1], [4, 9, 8, 9, 4])
+        self.assertEqual(list_rank, [2, 1, 1, 2, 3])
+        self.assertEqual(rank_a, [2, 1, 1, 1, 2])
+        self.assertEqual(rank_b, [3, 2, 1, 2, 3])
+
+    def test_masked_rows_are_zero_and_do_not_count(self):
+        list_rank, rank_a, rank_b = self.ranks([0, 0, 0], [9, 8, 7], mask=[True, False, True])
+        self.assertEqual(list_rank, [1, 0, 2])
+        self.assertEqual(rank_a, [1, 0, 2])
+        self.assertEqual(rank_b, [1, 0, 2])
+
+    def test_empty_mask(self):
+        self.assertEqual(self.ranks([0, 0], [1, 2], mask=[False, False]), [[0, 0], [0, 0], [0, 0]])
+
+
+class OlympiadRankingTests(TestCase):
+    """Бүрэн (update_olympiad_rankings) ба хэсэгчилсэн (ScoreSheet.save) эрэмбэ ижил үр дүн өгөх."""
+
+    @classmethod
+    def setUpTestData(cls):
+        zone = Zone.objects.create(name='Төв')
+        cls.provinces = [Province.objects.create(name=f'Аймаг {i}', zone=zone) for i in range(2)]
+        cls.schools = [School.objects.create(name=f'Сургууль {i}', province=cls.provinces[i % 2]) for i in range(3)]
+        cls.olympiad = Olympiad.objects.create(name='Туршилт')
+
+    def make_sheets(self, specs):
+        sheets = []
+        for i, (total, school, official) in enumerate(specs):
+            user = User.objects.create(username=f'u{self.id()}{i}')
+            sheets.append(ScoreSheet.objects.create(
+                user=user, olympiad=self.olympiad, school=self.schools[school], is_official=official,
+                s1=total,
+            ))
+        return sheets
+
+    def stored(self):
+        return {
+            row[0]: row[1:]
+            for row in ScoreSheet.objects.filter(olympiad=self.olympiad).values_list('id', *RANK_FIELDS)
+        }
+
+    def assert_matches_full_recompute(self):
+        incremental = self.stored()
+        update_olympiad_rankings(self.olympiad.id)
+        self.assertEqual(incremental, self.stored())
+
+    def test_full_recompute_with_ties(self):
+        sheets = self.make_sheets([(10, 0, True), (7, 1, True), (7, 2, False), (3, 0, True)])
+        update_olympiad_rankings(self.olympiad.id)
+        ranks = {s.id: s for s in ScoreSheet.objects.filter(olympiad=self.olympiad)}
+        self.assertEqual([ranks[s.id].ranking_a for s in sheets], [1, 2, 2, 4])
+        self.assertEqual([ranks[s.id].ranking_b for s in sheets], [1, 3, 3, 4])
+        # Аймаг 0 (сургууль 0, 2) official: 10, 3 -> 1, 2; unofficial мөр 0
+        self.assertEqual([ranks[s.id].ranking_a_p for s in sheets], [1, 1, 0, 2])
+
+    def test_incremental_updates_match_full_recompute(self):
+        sheets = self.make_sheets([(10, 0, True), (7, 1, True), (7, 2, False), (3, 0, True), (5, 1, True)])
+        update_olympiad_rankings(self.olympiad.id)
+
+        sheets[3].s1 = 7  # тэнцэл рүү дээшлэх
+        sheets[3].save()
+        self.assert_matches_full_recompute()
+
+        sheets[0].s1 = 1  # хамгийн доош буух
+        sheets[0].save()
+        self.assert_matches_full_recompute()
+
+        sheets[4].school = self.schools[0]  # аймаг солих
+        sheets[4].is_official = False
+        sheets[4].save()
+        self.assert_matches_full_recompute()
+
+        self.make_sheets([(7, 2, True)])  # шинэ хуудас
+        self.assert_matches_full_recompute()
+
+
+# Auto-save буфер (Redis) ашиглахгүй
+@override_settings(ANSWER_BUFFER_REDIS_URL='', CELERY_BROKER_URL='')
+class ScoreOlympiadTests(TestCase):
+    """scoring.score_olympiad: тоон/сонголттой бодлого, онооны хуудас үүсгэх ба шинэчлэх."""
+
+    @classmethod
+    def setUpTestData(cls):
+        zone = Zone.objects.create(name='Төв')
+        cls.school = School.objects.create(name='Сургууль', province=Province.objects.create(name='Аймаг', zone=zone))
+        cls.olympiad = Olympiad.objects.create(name='Тест', type=1)
+        cls.numeric = Problem.objects.create(
+            olympiad=cls.olympiad, order=1, type=Problem.ProblemTypes.fill, max_score=7,
+            numerical_answer=42, numerical_answer2=43,
+        )
+        cls.selection = Problem.objects.create(olympiad=cls.olympiad, order=2, type=Problem.ProblemTypes.selection)
+        for order, points in ((1, 0), (2, 5), (3, 1)):
+            AnswerChoice.objects.create(problem=cls.selection, order=order, label=str(order), points=points)
+        cls.fill = Problem.objects.create(
+            olympiad=cls.olympiad, order=3, type=Problem.ProblemTypes.fill, max_score=2, numerical_answer=15,
+        )
+        # Нөхөх бодлогын сонголт тоон хариултаас их оноотой
+        AnswerChoice.objects.create(problem=cls.fill, order=1, label='A', value=' 15 ', points=4)
+        AnswerChoice.objects.create(problem=cls.fill, order=2, label='B', value='16', points=1)
+
+    def contestant(self, name, answers):
+        user = User.objects.create(username=name)
+        UserMeta.objects.create(user=user, reg_num=name[:12], school=self.school)
+        for problem, answer in zip((self.numeric, self.selection, self.fill), answers):
+            Result.objects.create(contestant=user, olympiad=self.olympiad, problem=problem, answer=answer)
+        return user
+
+    def scores(self, user):
+        return dict(Result.objects.filter(contestant=user).values_list('problem__order', 'score'))
+
+    def test_numerical_and_choice_scoring(self):
+        first = self.contestant('first', [42, 2, 15])
+        second = self.contestant('second', [43, 3, 16])
+        third = self.contestant('third', [41, None, 17])
+        score_olympiad(self.olympiad.id)
+
+        self.assertEqual(self.scores(first), {1: 7, 2: 5, 3: 4})
+        self.assertEqual(self.scores(second), {1: 7, 2: 1, 3: 1})
+        self.assertEqual(self.scores(third), {1: 0, 2: 0, 3: 0})
+
+        sheet = ScoreSheet.objects.get(olympiad=self.olympiad, user=first)
+        self.assertEqual((sheet.s1, sheet.s2, sheet.s3, sheet.s4, sheet.total), (7, 5, 4, 0, 16))
+        self.assertEqual(sheet.school_id, self.school.id)
+
+    def test_existing_sheets_are_updated_and_missing_ones_created(self):
+        existing = self.contestant('existing', [42, 1, None])
+        ScoreSheet.objects.create(user=existing, olympiad=self.olympiad, school=None, prizes='Алт')
+        new = self.contestant('new', [42, 2, 15])
+
+        outcome = score_olympiad(self.olympiad.id)
+        self.assertEqual((outcome['sheets_updated'], outcome['sheets_created']), (1, 1))
+        self.assertEqual(ScoreSheet.objects.filter(olympiad=self.olympiad).count(), 2)
+
+        updated = ScoreSheet.objects.get(olympiad=self.olympiad, user=existing)
+        self.assertEqual((updated.total, updated.prizes, updated.school_id), (7, 'Алт', self.school.id))
+        created = ScoreSheet.objects.get(olympiad=self.olympiad, user=new)
+        self.assertEqual((created.total, created.ranking_a, created.is_official), (16, 1, False))
+        self.assertEqual(updated.ranking_a, 2)
+
+        # Дахин ажиллуулахад шинээр үүсэхгүй
+        again = score_olympiad(self.olympiad.id)
+        self.assertEqual((again['sheets_updated'], again['sheets_created']), (2, 0))
+
+    def test_duplicate_results_are_rejected(self):
+        user = self.contestant('dup', [42, None, None])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Result.objects.create(contestant=user, olympiad=self.olympiad, problem=self.numeric, answer=1)
+
+        # Зэрэг үүсгэхэд (provisioning, ResultsEnsureMixin) давхардахгүй
+        Result.objects.bulk_create(
+            [Result(contestant=user, olympiad=self.olympiad, problem=self.numeric)], ignore_conflicts=True,
+        )
+        self.assertEqual(Result.objects.filter(contestant=user, problem=self.numeric).count(), 1)
+        score_olympiad(self.olympiad.id)
+        self.assertEqual(ScoreSheet.objects.get(olympiad=self.olympiad, user=user).total, 7)
+
+    def test_provisioning_creates_missing_pairs_once(self):
+        group = Group.objects.create(name='Оролцогчид')
+        self.olympiad.group = group
+        self.olympiad.save()
+        members = [User.objects.create(username=f'member{i}') for i in range(2)]
+        group.user_set.add(*members)
+        Result.objects.create(contestant=members[0], olympiad=self.olympiad, problem=self.numeric)
+
+        provision_results(self.olympiad.id)
+        provision_results(self.olympiad.id)
+        self.assertEqual(Result.objects.filter(olympiad=self.olympiad).count(), 6)
+
+
+class ExcelCacheTests(SimpleTestCase):
+    """excel_cache: холимог төрлийн багана Parquet-ээр төрлөө алдахгүй дамжих."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Хариултын хуудасны 'Мэдээлэл' sheet: 'Утга' баганад int ба str холилдоно
+        self.info = pd.DataFrame({
+            'Түлхүүр': ['olympiad_id', 'olympiad_name', 'level_id', 'level_name'],
+            'Утга': [12, 'Тест', 3, 'Ахлах'],
+        })
+
+    def test_mixed_object_column_round_trip(self):
+        path = Path(self.tmp.name) / 'info.parquet'
+        _write_parquet(self.info, path)
+        df = _read_parquet(path)
+        self.assertEqual(list(df.columns), ['Түлхүүр', 'Утга'])
+        self.assertEqual(df['Утга'].tolist(), [12, 'Тест', 3, 'Ахлах'])
+        self.assertEqual([type(v) for v in df['Утга']], [int, str, int, str])
+
+    def test_reupload_does_not_open_workbook(self):
+        source = io.BytesIO()
+        self.info.to_excel(source, sheet_name='Мэдээлэл', index=False)
+        with override_settings(EXCEL_PARSE_CACHE_DIR=Path(self.tmp.name)):
+            first = CachedWorkbook(source).parse('Мэдээлэл')
+            again = CachedWorkbook(source)
+            with mock.patch.object(CachedWorkbook, '_open', side_effect=AssertionError('openpyxl')):
+                cached = again.parse('Мэдээлэл')
+        self.assertEqual(cached['Утга'].tolist(), first['Утга'].tolist())
+
+
+class ExportJobAccessTests(TestCase):
+    """Экспортын төлөв, татах хуудас token-оос гадна тухайн төрлийн эрхийг шалгах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='Экспорт')
+        cls.job = ExportJob.objects.create(
+            kind='group_users', params={'group_id': cls.group.id, 'province_id': 0, 'zone_id': 0},
+            params_hash='-', data_version='-',
+        )
+        cls.student = User.objects.create_user(username='student', password='x')
+        cls.staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+
+    def get(self, user, name):
+        self.client.force_login(user)
+        return self.client.get(reverse(name, args=[signing.dumps(self.job.id, salt=TOKEN_SALT)]))
+
+    def test_token_alone_is_not_enough(self):
+        self.assertEqual(self.get(self.student, 'export_job_status').status_code, 403)
+        self.assertEqual(self.get(self.student, 'export_job_download').status_code, 403)
+
+    def test_staff_can_follow_the_link(self):
+        self.assertEqual(self.get(self.staff, 'export_job_status').status_code, 200)
+        # Файл бэлэн болоогүй тул төлвийн хуудас руу
+        self.assertEqual(self.get(self.staff, 'export_job_download').status_code, 302)
+
+
+# Cursor нь дууссан transaction-уудын өөрчлөлтийг л харуулдаг тул TestCase-ийн нэг
+# transaction дотор биш, statement бүрийг commit хийж шалгана.
+@override_settings(ANSWER_BUFFER_REDIS_URL='', CELERY_BROKER_URL='')
+class AchievementCursorTests(TransactionTestCase):
+    """Амжилтын changed-since cursor: хуудаслалт, устгал (cascade), нэр солих ба ETag."""
+
+    def setUp(self):
+        self.olympiads = [Olympiad.objects.create(name=f'Олимпиад {i}') for i in range(2)]
+        self.users = [User.objects.create(username=f'cursor{i}') for i in range(5)]
+        # bulk_create: ScoreSheet.save-ийн эрэмбэ, signal-ыг алгасна
+        ScoreSheet.objects.bulk_create([
+            ScoreSheet(user=user, olympiad=olympiad, total=i)
+            for i, user in enumerate(self.users) for olympiad in self.olympiads
+        ])
+        refresh_achievements()
+
+    def drain(self, cursor='0', limit=2):
+        """cursor-оос эхлэн хоосон хуудас хүртэл уншина: (user_id-ууд, сүүлийн cursor)."""
+        seen = []
+        while True:
+            page = changed_users(cursor, limit)
+            if not page:
+                return seen, cursor
+            self.assertLessEqual(len(page), limit)
+            seen.extend(user_id for user_id, _ in page)
+            cursor = encode_cursor(page[-1][1], page[-1][0])
+
+    def test_pages_cover_every_user_once(self):
+        seen, cursor = self.drain()
+        self.assertEqual(sorted(seen), [user.id for user in self.users])
+        self.assertEqual(changed_users(cursor, 2), [])
+
+        # Утга өөрчлөгдөөгүй шинэчлэл cursor-ийг ахиулахгүй
+        refresh_achievements()
+        self.assertEqual(self.drain(cursor)[0], [])
+
+    def test_updated_user_appears_after_cursor(self):
+        _, cursor = self.drain()
+        ScoreSheet.objects.filter(user=self.users[1]).update(total=50)
+        refresh_achievements()
+        self.assertEqual(self.drain(cursor)[0], [self.users[1].id])
+
+    def test_deleting_last_row_leaves_tombstone(self):
+        _, cursor = self.drain()
+        user = self.users[2]
+        ScoreSheet.objects.filter(user=user).delete()
+        refresh_achievements(user_id=user.id)
+        self.assertFalse(Achievement.objects.filter(user=user).exists())
+        self.assertEqual(self.drain(cursor)[0], [user.id])
+        self.assertGreater(achievement_versions([user.id])[user.id][1], 0)
+
+    def test_cascade_deletes_are_visible(self):
+        _, cursor = self.drain()
+        self.olympiads[0].delete()
+        seen, cursor = self.drain(cursor)
+        self.assertEqual(sorted(seen), [user.id for user in self.users])
+
+        user_id = self.users[3].id
+        self.users[3].delete()
+        self.assertEqual(self.drain(cursor)[0], [user_id])
+
+    def test_username_change_changes_etag(self):
+        _, cursor = self.drain()
+        user = self.users[0]
+        before = achievement_etag(user.id, user.username, achievement_versions([user.id])[user.id][1])
+        user.username = 'renamed'
+        user.save()
+        after = achievement_etag(user.id, user.username, achievement_versions([user.id])[user.id][1])
+        self.assertNotEqual(before, after)
+        self.assertEqual(self.drain(cursor)[0], [user.id])
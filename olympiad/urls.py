@@ -6,6 +6,7 @@ from . import (
     views_admin,
     views_contest,
     result_views,
+    views_exports,
 )
 from .views_contest_cbv import (
     StudentQuizView,
@@ -67,6 +68,8 @@ urlpatterns = [
     path('summary/round2/', views_results.round2_summary_view, name='round2_summary'),
     path('stats/first-round/', views_results.first_round_stats, name='first_round_stats'),
     path('cheating/<int:olympiad_id>/', views_results.cheating_analysis_view, name='cheating_analysis'),
+    path('exports/<str:token>/', views_exports.export_job_status, name='export_job_status'),
+    path('exports/<str:token>/download/', views_exports.export_job_download, name='export_job_download'),
     # --- ШИНЭ МӨР ДУУСАВ ---
 
     # === IV. Бодлого ба агуулга ===
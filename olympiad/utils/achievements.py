@@ -0,0 +1,273 @@
+"""
+Сурагчийн амжилтын проекц (Achievement).
+
+student_achievements хуудас ба user_achievements API нь ScoreSheet-ээс дөрвөн join-той
+distinct('olympiad_id') query ажиллуулж, problems_solved-ийг 20 getattr-аар тооцдог байсан.
+Энд (user, olympiad) бүрт нэг мөрийг бүх талбартай нь урьдчилан бичиж, хоёулаа
+user_achievements()-ээр нэг индекстэй query-гээр уншина.
+
+Шинэчлэх:
+    - ScoreSheet (хуулагдсан талбар нь), Award хадгалагдах/устахад (signals.py) тухайн сурагчийн
+      мөр commit-ийн дараа,
+    - score_olympiad, generate_scoresheets, эрэмбийн хэсэгчилсэн шинэчлэл, Olympiad-ийн нэр/шат/
+      жил/түвшин/нээлттэй эсэх засвар нь олимпиадын бүх мөрийг (Celery). Олимпиад тутамд
+      ACHIEVEMENTS_REFRESH_DELAY секундэд нэг task л товлогдоно (олон дүн засварыг нэгтгэнэ),
+    - School, Level, SchoolYear-ийн нэр солигдоход rename_achievements нь зөвхөн нэрийг.
+Мөр зөвхөн утга нь өөрчлөгдөхөд бичигдэнэ. Achievement-ийн trigger (0024 migration) бичсэн,
+устгасан statement бүрийн дараа сурагчийн AchievementVersion-д transaction-ийн ID-г тавих тул
+API (api_views.py) түүгээр сурагч бүрийн ETag/Last-Modified ба changed-since cursor-ийг тооцно.
+Анх нэвтрүүлэхэд: python manage.py rebuild_achievements
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from accounts.models import Level
+from schools.models import School
+
+from ..models import Achievement, AchievementVersion, Award, Olympiad, SchoolYear, ScoreSheet
+
+PROBLEM_COUNT = 20
+REFRESH_DELAY = getattr(settings, 'ACHIEVEMENTS_REFRESH_DELAY', 30)
+
+# Achievement-д хуулагддаг ScoreSheet-ийн талбарууд (эдгээр өөрчлөгдөөгүй save-д шинэчлэхгүй)
+SCORESHEET_FIELDS = frozenset([
+    'user', 'user_id', 'olympiad', 'olympiad_id', 'school', 'school_id',
+    'total', 'ranking_a', 'ranking_b', 'prizes', 'is_official',
+    *(f's{i}' for i in range(1, PROBLEM_COUNT + 1)),
+])
+# Achievement-д хуулагддаг Olympiad-ийн талбарууд (attname)
+OLYMPIAD_FIELDS = ('name', 'round', 'school_year_id', 'level_id', 'is_open')
+
+# generate_scoresheets-ийн шагналын дараалалтай ижил: алт, мөнгө, хүрэл, бусад
+AWARD_ORDER_SQL = (
+    "CASE WHEN a.place ILIKE '%%алт%%' THEN 1 WHEN a.place ILIKE '%%мөнгө%%' THEN 2 "
+    "WHEN a.place ILIKE '%%хүрэл%%' THEN 3 ELSE 4 END"
+)
+
+UPSERT_SQL = """
+    INSERT INTO {achievement} (
+        user_id, olympiad_id, scoresheet_id, olympiad_name, round, school_year_id, school_year_name,
+        level_name, school_name, total, ranking_a, ranking_b, problems_solved, prizes,
+        is_official, is_public, updated_at
+    )
+    SELECT DISTINCT ON (s.user_id, s.olympiad_id)
+        s.user_id, s.olympiad_id, s.id, o.name, o.round, o.school_year_id, y.name,
+        l.name, sc.name, COALESCE(s.total, 0), s.ranking_a, s.ranking_b, {solved},
+        COALESCE(
+            (SELECT string_agg(a.place, ', ' ORDER BY {award_order}, a.place) FROM {award} a
+             WHERE a.olympiad_id = s.olympiad_id AND a.contestant_id = s.user_id),
+            s.prizes
+        ),
+        s.is_official, o.is_open, NOW()
+    FROM {scoresheet} s
+    JOIN {olympiad} o ON o.id = s.olympiad_id
+    LEFT JOIN {school_year} y ON y.id = o.school_year_id
+    LEFT JOIN {level} l ON l.id = o.level_id
+    LEFT JOIN {school} sc ON sc.id = s.school_id
+    WHERE s.user_id IS NOT NULL AND {where}
+    ORDER BY s.user_id, s.olympiad_id, s.id DESC
+    ON CONFLICT (user_id, olympiad_id) DO UPDATE SET
+        scoresheet_id = EXCLUDED.scoresheet_id, olympiad_name = EXCLUDED.olympiad_name,
+        round = EXCLUDED.round, school_year_id = EXCLUDED.school_year_id,
+        school_year_name = EXCLUDED.school_year_name, level_name = EXCLUDED.level_name,
+        school_name = EXCLUDED.school_name, total = EXCLUDED.total, ranking_a = EXCLUDED.ranking_a,
+        ranking_b = EXCLUDED.ranking_b, problems_solved = EXCLUDED.problems_solved,
+        prizes = EXCLUDED.prizes, is_official = EXCLUDED.is_official, is_public = EXCLUDED.is_public,
+        updated_at = EXCLUDED.updated_at
+    WHERE ({achievement}.scoresheet_id, {achievement}.olympiad_name, {achievement}.round,
+           {achievement}.school_year_id, {achievement}.school_year_name, {achievement}.level_name,
+           {achievement}.school_name, {achievement}.total, {achievement}.ranking_a, {achievement}.ranking_b,
+           {achievement}.problems_solved, {achievement}.prizes, {achievement}.is_official, {achievement}.is_public)
+        IS DISTINCT FROM
+          (EXCLUDED.scoresheet_id, EXCLUDED.olympiad_name, EXCLUDED.round,
+           EXCLUDED.school_year_id, EXCLUDED.school_year_name, EXCLUDED.level_name,
+           EXCLUDED.school_name, EXCLUDED.total, EXCLUDED.ranking_a, EXCLUDED.ranking_b,
+           EXCLUDED.problems_solved, EXCLUDED.prizes, EXCLUDED.is_official, EXCLUDED.is_public)
+"""
+
+DELETE_SQL = """
+    DELETE FROM {achievement} x
+    WHERE {where} AND NOT EXISTS (
+        SELECT 1 FROM {scoresheet} s WHERE s.user_id = x.user_id AND s.olympiad_id = x.olympiad_id
+    )
+"""
+
+# Нэр солигдсон сургууль / түвшин / хичээлийн жилийн нэрийг хуулбар мөрүүдэд тавих
+RENAME_SQL = {
+    'school': """
+        UPDATE {achievement} x SET school_name = sc.name, updated_at = NOW()
+        FROM {scoresheet} s JOIN {school} sc ON sc.id = s.school_id
+        WHERE s.id = x.scoresheet_id AND sc.id = %s AND x.school_name IS DISTINCT FROM sc.name
+    """,
+    'level': """
+        UPDATE {achievement} x SET level_name = l.name, updated_at = NOW()
+        FROM {olympiad} o JOIN {level} l ON l.id = o.level_id
+        WHERE o.id = x.olympiad_id AND l.id = %s AND x.level_name IS DISTINCT FROM l.name
+    """,
+    'school_year': """
+        UPDATE {achievement} x SET school_year_name = y.name, updated_at = NOW()
+        FROM {school_year} y
+        WHERE y.id = x.school_year_id AND y.id = %s AND x.school_year_name IS DISTINCT FROM y.name
+    """,
+}
+
+
+def _tables():
+    return {
+        'achievement': Achievement._meta.db_table,
+        'award': Award._meta.db_table,
+        'scoresheet': ScoreSheet._meta.db_table,
+        'olympiad': Olympiad._meta.db_table,
+        'school_year': SchoolYear._meta.db_table,
+        'level': Level._meta.db_table,
+        'school': School._meta.db_table,
+    }
+
+
+def refresh_achievements(olympiad_id=None, user_id=None):
+    """Олимпиадын (эсвэл сурагчийн, эсвэл хоёулангийн) мөрүүдийг ScoreSheet-ээс дахин бичнэ.
+
+    Хоёулаа None бол бүх мөрийг. Утга нь өөрчлөгдсөн мөрийг л бичдэг тул өөрчлөгдөөгүй
+    сурагчийн хувилбар (ETag, cursor) хэвээр үлдэнэ. Бичигдсэн мөрийн тоог буцаана.
+    """
+    conditions, params = [], []
+    for column, value in (('olympiad_id', olympiad_id), ('user_id', user_id)):
+        if value is not None:
+            conditions.append(f'{{alias}}.{column} = %s')
+            params.append(value)
+    conditions = ' AND '.join(conditions) or 'TRUE'
+
+    solved = ' + '.join(f'(CASE WHEN s.s{i} > 0 THEN 1 ELSE 0 END)' for i in range(1, PROBLEM_COUNT + 1))
+    tables = _tables()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(where=conditions.format(alias='s'), solved=solved, award_order=AWARD_ORDER_SQL, **tables),
+            params,
+        )
+        written = cursor.rowcount
+        cursor.execute(DELETE_SQL.format(where=conditions.format(alias='x'), **tables), params)
+    return written
+
+
+def _pending_key(olympiad_id):
+    return f'achievements_refresh_pending_{olympiad_id}'
+
+
+def schedule_achievements_refresh(olympiad_id):
+    """Олимпиадын бүх мөрийг commit-ийн дараа ард талд (Celery) шинэчилнэ.
+
+    Хүлээгдэж буй task байвал дахин товлохгүй: дүн засах бүрд биш, REFRESH_DELAY-д нэг удаа.
+    """
+    from ..tasks import refresh_olympiad_achievements
+
+    def schedule():
+        if cache.add(_pending_key(olympiad_id), 1, REFRESH_DELAY + 600):
+            refresh_olympiad_achievements.apply_async((olympiad_id,), countdown=REFRESH_DELAY)
+
+    transaction.on_commit(schedule)
+
+
+def refresh_scheduled_achievements(olympiad_id):
+    """Товлогдсон шинэчлэл. Түгжээг эхэндээ чөлөөлдөг тул энэ хооронд орсон засвар шинэ task товлоно."""
+    cache.delete(_pending_key(olympiad_id))
+    return refresh_achievements(olympiad_id=olympiad_id)
+
+
+def rename_achievements(kind, object_id):
+    """kind ('school', 'level', 'school_year')-ийн одоогийн нэрийг мөрүүдэд тавина. Шинэчлэгдсэн тоо."""
+    with connection.cursor() as cursor:
+        cursor.execute(RENAME_SQL[kind].format(**_tables()), [object_id])
+        return cursor.rowcount
+
+
+def schedule_achievements_rename(kind, object_id):
+    from ..tasks import rename_olympiad_achievements
+
+    transaction.on_commit(lambda: rename_olympiad_achievements.delay(kind, object_id))
+
+
+def refresh_user_achievement_on_commit(user_id, olympiad_id):
+    """Нэг сурагчийн нэг олимпиадын мөрийг commit-ийн дараа шинэчилнэ (signals.py)."""
+    if user_id and olympiad_id:
+        transaction.on_commit(lambda: refresh_achievements(olympiad_id=olympiad_id, user_id=user_id))
+
+
+def _ordered(queryset):
+    return queryset.order_by(F('school_year_id').desc(nulls_last=True), '-round', 'olympiad_name')
+
+
+def achievement_stats(achievements):
+    stats = {
+        'total_olympiads': len(achievements),
+        'total_score': sum(a.total for a in achievements),
+        'prizes_count': sum(1 for a in achievements if a.prizes and a.prizes.strip()),
+        'first_round_count': sum(1 for a in achievements if a.round == 1),
+    }
+    return stats
+
+
+def user_achievements(user_id):
+    """Сурагчийн нээлттэй олимпиадуудын амжилт (шинэ хичээлийн жил, өндөр шат эхэнд) ба статистик."""
+    achievements = list(_ordered(Achievement.objects.filter(user_id=user_id, is_public=True)))
+    return achievements, achievement_stats(achievements)
+
+
+def users_achievements(user_ids):
+    """Олон сурагчийн амжилт нэг query-гээр: {user_id: [Achievement, ...]}."""
+    by_user = {user_id: [] for user_id in user_ids}
+    for achievement in _ordered(Achievement.objects.filter(user_id__in=list(by_user), is_public=True)):
+        by_user[achievement.user_id].append(achievement)
+    return by_user
+
+
+# --- API-ийн conditional GET (ETag / Last-Modified) ба changed-since cursor ---
+
+# Эхэлсэн ч дуусаагүй хамгийн эртний transaction-ийн ID. Үүнээс бага ID-тай бүх transaction
+# дууссан тул cursor-ийг зөвхөн тэдгээрээр ахиулна: удаан commit болох transaction-ийн ID
+# cursor-оос хойш үлдэж, дараагийн дуудлагад гарч ирнэ.
+HORIZON_SQL = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+
+def achievement_versions(user_ids):
+    """{user_id: (хамгийн сүүлд өөрчлөгдсөн хугацаа, txid)} - хувилбаргүй сурагч (None, 0)."""
+    versions = {user_id: (None, 0) for user_id in user_ids}
+    rows = AchievementVersion.objects.filter(user_id__in=list(versions)).values_list('user_id', 'updated_at', 'txid')
+    for user_id, updated_at, txid in rows:
+        versions[user_id] = (updated_at, txid)
+    return versions
+
+
+def achievement_etag(user_id, username, txid):
+    """Сурагчийн амжилтын ETag (хашлагагүй). Хэрэглэгчийн ID-г агуулдаг тул batch-д давхцахгүй."""
+    return hashlib.md5(f'{user_id}:{username}:{txid}'.encode()).hexdigest()[:20]
+
+
+def encode_cursor(txid, user_id):
+    return f'{txid}-{user_id}'
+
+
+def decode_cursor(cursor):
+    """'<txid>-<user_id>' -> (txid, user_id). Хоосон/'0' бол эхнээс. Буруу бол ValueError."""
+    if cursor in ('', '0'):
+        return 0, 0
+    txid, user_id = cursor.split('-')
+    return int(txid), int(user_id)
+
+
+def changed_users(cursor, limit):
+    """cursor-оос хойш амжилт нь өөрчлөгдсөн (устсан ч) сурагчид [(user_id, txid), ...], transaction-ийн дарааллаар."""
+    after_txid, after_user_id = decode_cursor(cursor)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(HORIZON_SQL)
+        horizon = db_cursor.fetchone()[0]
+    rows = (
+        AchievementVersion.objects.filter(Q(txid__gt=after_txid) | Q(txid=after_txid, user_id__gt=after_user_id))
+        .filter(txid__lt=horizon)
+        .order_by('txid', 'user_id')
+        .values_list('user_id', 'txid')[:limit]
+    )
+    return list(rows)
@@ -0,0 +1,305 @@
+"""
+Тест олимпиадын auto-save хариултуудын write-behind буфер.
+
+SaveAnswerAPIView товчлуур дарах бүрд PostgreSQL руу бичихийн оронд хариултыг Redis hash-д
+хадгалж (нэг Result-ийн сүүлийн утга л үлдэнэ), flush_answer_buffers Celery task богино
+интервалаар олимпиад тус бүрийн буферийг нэг bulk_update-ээр Result руу бичнэ.
+
+Redis бүтэц (olympiad_id бүрээр):
+    answers:buffer:<id>    - result_id -> хариулт ('' = хоосон)
+    answers:flushing:<id>  - flush хийгдэж буй буфер. Worker унасан ч устгагдахгүй тул
+                             дараагийн flush эхлээд үүнийг дахин бичнэ (давтахад аюулгүй).
+    answers:dirty          - буфертэй олимпиадуудын ID-ийн set
+    answers:owner:<user>   - хэрэглэгчийн result_id -> olympiad_id (эрх шалгах cache)
+    answers:end:<id>       - олимпиадын end_time (timestamp, '' = хязгааргүй)
+    answers:flushed:<id>   - DB-д бичигдсэн хариултуудын сурагчид (participation.refresh_buffered
+                             сургуулиудын оролцооны тоймыг шинэчлэхдээ авч устгана)
+
+Redis тохируулаагүй эсвэл холбогдохгүй бол хариулт шууд DB-д бичигдэнэ (хуучин горим).
+Redis өөрөө restart хийгдэхэд хариулт алдагдахгүйн тулд Redis-ийн persistence (AOF) асаалттай байх ёстой.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Olympiad, Result
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = 'answers:dirty'
+OWNER_TTL = 12 * 3600
+FLUSHED_TTL = 24 * 3600
+END_TIME_TTL = 60  # end_time сунгагдсаныг хамгийн ихдээ 1 минутын дотор мэднэ
+FLUSH_BATCH_SIZE = 2000
+LOCK_TIMEOUT = 120
+LOCK_WAIT = 30
+
+# Олимпиад хаагдсанаас хойш хариулт авах хугацаа (Olympiad.is_closed-тэй ижил)
+CLOSE_GRACE_SECONDS = 300
+
+_client_cache = {}
+
+
+class AnswerBufferError(Exception):
+    """Буферийг DB-д бичиж чадсангүй (Redis холбогдохгүй эсвэл түгжээ авч чадаагүй)."""
+
+
+def _client():
+    """Буферийн Redis client. Тохиргоо байхгүй бол None."""
+    url = getattr(settings, 'ANSWER_BUFFER_REDIS_URL', None) or getattr(settings, 'CELERY_BROKER_URL', '')
+    if not url or not url.startswith(('redis://', 'rediss://', 'unix://')):
+        return None
+    if url not in _client_cache:
+        import redis
+        _client_cache[url] = redis.Redis.from_url(url, decode_responses=True)
+    return _client_cache[url]
+
+
+def _buffer_key(olympiad_id):
+    return f'answers:buffer:{olympiad_id}'
+
+
+def _flushing_key(olympiad_id):
+    return f'answers:flushing:{olympiad_id}'
+
+
+def _owner_olympiad(client, user_id, result_id):
+    """result_id нь хэрэглэгчийнх бол olympiad_id, үгүй бол None."""
+    owner_key = f'answers:owner:{user_id}'
+    olympiad_id = client.hget(owner_key, result_id)
+    if olympiad_id:
+        return int(olympiad_id)
+
+    olympiad_id = Result.objects.filter(pk=result_id, contestant_id=user_id).values_list('olympiad_id', flat=True).first()
+    if olympiad_id is None:
+        return None
+    # Тухайн олимпиадын бүх Result-ийг нэг дор cache-лэх (дараагийн бодлогууд DB-д хандахгүй)
+    mapping = {
+        rid: olympiad_id
+        for rid in Result.objects.filter(contestant_id=user_id, olympiad_id=olympiad_id).values_list('id', flat=True)
+    }
+    pipe = client.pipeline()
+    pipe.hset(owner_key, mapping=mapping)
+    pipe.expire(owner_key, OWNER_TTL)
+    pipe.execute()
+    return olympiad_id
+
+
+def _is_closed(client, olympiad_id):
+    end_key = f'answers:end:{olympiad_id}'
+    end_ts = client.get(end_key)
+    if end_ts is None:
+        end_time = Olympiad.objects.filter(pk=olympiad_id).values_list('end_time', flat=True).first()
+        end_ts = str(end_time.timestamp()) if end_time else ''
+        client.set(end_key, end_ts, ex=END_TIME_TTL)
+    return bool(end_ts) and float(end_ts) < time.time() - CLOSE_GRACE_SECONDS
+
+
+def buffer_answer(user_id, result_id, answer):
+    """Хариултыг буферт хадгална.
+
+    Буцаана: 'saved', 'not_found', 'closed', эсвэл буфер ашиглах боломжгүй бол None
+    (тэр үед дуудагч шууд DB-д бичнэ).
+    """
+    client = _client()
+    if client is None:
+        return None
+    try:
+        olympiad_id = _owner_olympiad(client, user_id, result_id)
+        if olympiad_id is None:
+            return 'not_found'
+        if _is_closed(client, olympiad_id):
+            # Хаагдсан олимпиадын буферт үлдсэн хариултыг beat-ийг хүлээлгүй бичнэ
+            if client.sismember(DIRTY_KEY, olympiad_id):
+                try:
+                    flush_answers(olympiad_id)
+                except AnswerBufferError:
+                    pass  # beat дахин оролдоно
+            return 'closed'
+        pipe = client.pipeline(transaction=True)
+        pipe.hset(_buffer_key(olympiad_id), result_id, '' if answer is None else str(answer))
+        pipe.sadd(DIRTY_KEY, olympiad_id)
+        pipe.execute()
+        return 'saved'
+    except Exception as e:
+        logger.warning(f'Answer buffer unavailable, writing directly: {e}')
+        return None
+
+
+def apply_buffered_answers(olympiad_id, results):
+    """DB-д хараахан бичигдээгүй хариултуудыг Result объектууд дээр тавина (хуудсыг дахин ачаалахад)."""
+    client = _client()
+    results = list(results)
+    if client is None or not results:
+        return results
+    result_ids = [r.id for r in results]
+    try:
+        pipe = client.pipeline()
+        pipe.hmget(_flushing_key(olympiad_id), result_ids)
+        pipe.hmget(_buffer_key(olympiad_id), result_ids)
+        flushing, buffered = pipe.execute()
+    except Exception as e:
+        logger.warning(f'Answer buffer unavailable: {e}')
+        return results
+    for result, old_value, new_value in zip(results, flushing, buffered):
+        value = new_value if new_value is not None else old_value
+        if value is not None:
+            result.answer = int(value) if value else None
+    return results
+
+
+def _lock(client, olympiad_id):
+    return client.lock(f'answers:lock:{olympiad_id}', timeout=LOCK_TIMEOUT, blocking_timeout=LOCK_WAIT)
+
+
+def _flushed_key(olympiad_id):
+    return f'answers:flushed:{olympiad_id}'
+
+
+def _write_entries(client, olympiad_id, entries):
+    results = [
+        Result(id=int(result_id), answer=int(value) if value else None)
+        for result_id, value in entries.items()
+    ]
+    with transaction.atomic():
+        Result.objects.bulk_update(results, ['answer'], batch_size=FLUSH_BATCH_SIZE)
+    _record_flushed(client, olympiad_id, [r.id for r in results])
+    return len(results)
+
+
+def _record_flushed(client, olympiad_id, result_ids):
+    """Бичигдсэн хариултуудын сурагчдыг тэмдэглэж, оролцооны тойм, хариултын матрицын шинэчлэлийг товлоно."""
+    from .caching import bump_answers_version
+    from .participation import schedule_buffered_refresh
+
+    bump_answers_version(olympiad_id)
+    contestant_ids = set(Result.objects.filter(id__in=result_ids).values_list('contestant_id', flat=True))
+    if not contestant_ids:
+        return
+    try:
+        pipe = client.pipeline()
+        pipe.sadd(_flushed_key(olympiad_id), *contestant_ids)
+        pipe.expire(_flushed_key(olympiad_id), FLUSHED_TTL)
+        pipe.execute()
+    except Exception as e:
+        # Хариулт аль хэдийн DB-д: тойм дараагийн бүтэн шинэчлэлээр засагдана
+        logger.warning(f'Answer buffer unavailable, participation not refreshed: {e}')
+        return
+    schedule_buffered_refresh(olympiad_id)
+
+
+def pop_flushed_contestants(olympiad_id):
+    """Сүүлд авснаас хойш хариулт нь DB-д бичигдсэн сурагчдын ID-ууд (авахад set хоосорно)."""
+    client = _client()
+    if client is None:
+        return []
+    try:
+        pipe = client.pipeline(transaction=True)
+        pipe.smembers(_flushed_key(olympiad_id))
+        pipe.delete(_flushed_key(olympiad_id))
+        members, _ = pipe.execute()
+    except Exception as e:
+        logger.warning(f'Answer buffer unavailable: {e}')
+        return []
+    return sorted(int(member) for member in members)
+
+
+def flush_answers(olympiad_id):
+    """Нэг олимпиадын буферийг Result руу бичнэ. Бичигдсэн хариултын тоог буцаана.
+
+    Оноо тооцохоос өмнө дуудаж буфер дэх хариултуудыг тооцоонд оруулна. Бичиж чадаагүй бол
+    AnswerBufferError (буфер хэвээр үлдэж, beat дахин оролдоно).
+    """
+    client = _client()
+    if client is None:
+        return 0
+    buffer_key, flushing_key = _buffer_key(olympiad_id), _flushing_key(olympiad_id)
+    try:
+        with _lock(client, olympiad_id):
+            # Энэ хооронд ирсэн хариулт dirty-г дахин нэмнэ
+            client.srem(DIRTY_KEY, olympiad_id)
+            flushed = 0
+            # Хамгийн ихдээ 2 удаа: дутуу үлдсэн flush, дараа нь одоогийн буфер
+            for _ in range(2):
+                # Өмнөх flush дутуу үлдсэн бол эхлээд түүнийг бичнэ
+                if not client.exists(flushing_key):
+                    if not client.exists(buffer_key):
+                        break
+                    client.rename(buffer_key, flushing_key)
+                try:
+                    flushed += _write_entries(client, olympiad_id, client.hgetall(flushing_key))
+                except Exception:
+                    client.sadd(DIRTY_KEY, olympiad_id)
+                    raise
+                client.delete(flushing_key)
+            return flushed
+    except Exception as e:
+        logger.error(f'Answer buffer flush failed for olympiad {olympiad_id}: {e}')
+        raise AnswerBufferError(str(e)) from e
+
+
+def flush_user_answers(olympiad_id, result_ids):
+    """Нэг сурагчийн (result_ids) буферт байгаа хариултуудыг DB-д бичиж буферээс хасна.
+
+    Хариултын форм хадгалахаас өмнө дуудаж буфер дэх хуучин утга шинэ хариултыг хожим дарж
+    бичихээс сэргийлнэ. Бусад сурагчдын буферт хүрэхгүй тул түгжээг богино хугацаанд л авна
+    (олимпиадын flush эдгээр утгыг уншсан бол түүнийг бичиж дуусахыг хүлээнэ).
+    Буферийг ашиглаж чадаагүй бол AnswerBufferError - дуудагч хадгалалтыг зогсооно.
+    """
+    client = _client()
+    result_ids = [str(result_id) for result_id in result_ids]
+    if client is None or not result_ids:
+        return 0
+    buffer_key, flushing_key = _buffer_key(olympiad_id), _flushing_key(olympiad_id)
+    try:
+        with _lock(client, olympiad_id):
+            pipe = client.pipeline(transaction=True)
+            pipe.hmget(flushing_key, result_ids)
+            pipe.hmget(buffer_key, result_ids)
+            pipe.hdel(flushing_key, *result_ids)
+            pipe.hdel(buffer_key, *result_ids)
+            flushing, buffered, _, _ = pipe.execute()
+    except Exception as e:
+        logger.error(f'Answer buffer unavailable for olympiad {olympiad_id}: {e}')
+        raise AnswerBufferError(str(e)) from e
+
+    entries = {
+        result_id: new_value if new_value is not None else old_value
+        for result_id, old_value, new_value in zip(result_ids, flushing, buffered)
+        if new_value is not None or old_value is not None
+    }
+    if not entries:
+        return 0
+    try:
+        return _write_entries(client, olympiad_id, entries)
+    except Exception:
+        # Буферт буцааж тавина (энэ хооронд ирсэн шинэ хариултыг дарахгүй)
+        pipe = client.pipeline()
+        for result_id, value in entries.items():
+            pipe.hsetnx(buffer_key, result_id, value)
+        pipe.sadd(DIRTY_KEY, olympiad_id)
+        pipe.execute()
+        raise
+
+
+def flush_all_answers():
+    """Буфертэй бүх олимпиадын хариултыг бичнэ (Celery beat-ээс)."""
+    client = _client()
+    if client is None:
+        return 0
+    try:
+        olympiad_ids = client.smembers(DIRTY_KEY)
+        # Worker flush дундуур унасан олимпиадууд
+        olympiad_ids |= {key.rsplit(':', 1)[1] for key in client.scan_iter('answers:flushing:*')}
+    except Exception as e:
+        logger.error(f'Answer buffer unavailable: {e}')
+        return 0
+    flushed = 0
+    for olympiad_id in olympiad_ids:
+        try:
+            flushed += flush_answers(int(olympiad_id))
+        except AnswerBufferError:
+            continue  # бусад олимпиадыг үргэлжлүүлнэ, энэ нь dirty хэвээр
+    return flushed
@@ -0,0 +1,236 @@
+"""
+Олимпиадын хариулт/онооны матриц (answers_view).
+
+answers_view нь хүсэлт бүрт Result-уудаас хоёр pandas pivot_table үүсгэж, хэрэглэгчидтэй
+merge хийгээд Styler-ээр мөр мөрөөр будаж байсан. Энд олимпиадын оролцогч × бодлогын
+хариулт ба онооны матрицыг оноо тооцсоны дараа нэг удаа NumPy массив болгон local диск
+дээр бичиж, хуудас бүр memory-map хийн уншина. Сургууль, аймаг, top-N хэсгүүдийг SQL-гүйгээр
+шүүж, HTML-ийг шууд мөр залгаж үүсгэнэ.
+
+Бүтэц (snapshots.py-тэй ижил):
+    <ANSWER_MATRIX_DIR>/<olympiad_id>/CURRENT             - идэвхтэй хувилбар (JSON)
+    <ANSWER_MATRIX_DIR>/<olympiad_id>/<stamp>/<нэр>.npy   - contestants, schools, provinces,
+                                                            answers, scores
+    <ANSWER_MATRIX_DIR>/<olympiad_id>/<stamp>/meta.json   - бодлогын гарчиг, оролцогчдын нэрс
+
+Матриц нь DB дахь хувилбарыг (caching.answer_matrix_version: дүн + auto-save хариулт) агуулна.
+load_answer_matrix нь хүсэлтийн дотор хэзээ ч дахин барихгүй: хувилбар солигдсон бол сүүлд
+бичигдсэн матрицыг харуулж, publish_results_task (snapshots.schedule_results_publish-ээр
+нэгтгэгдсэн) нь ард талд republish_answer_matrix-ээр дахин бичнэ. Хэзээ ч бичигдээгүй бол
+олимпиадын хавтсыг үүсгэж (хүсэлт ирснийг тэмдэглэж) None буцаана.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+from html import escape
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from ..models import Problem, Result
+from .caching import answer_matrix_version
+from .snapshots import schedule_results_publish
+
+logger = logging.getLogger(__name__)
+
+KEEP_VERSIONS = 2  # уншиж байгаа хүсэлтүүдэд зориулж өмнөх хувилбарыг үлдээнэ
+ARRAYS = ('contestants', 'schools', 'provinces', 'answers', 'scores')
+CORRECT_STYLE = 'background-color: #d4edda'
+
+# Worker дотор memory-map хийсэн матрицууд: {olympiad_id: (stamp, AnswerMatrix)}
+_loaded = {}
+
+
+def _root():
+    return Path(getattr(settings, 'ANSWER_MATRIX_DIR', settings.BASE_DIR / 'snapshots' / 'answers'))
+
+
+class AnswerMatrix:
+    """Оролцогч × бодлогын матриц. Мөрүүд contestants-ийн дарааллаар, баганууд бодлогын order-оор."""
+
+    def __init__(self, contestants, schools, provinces, answers, scores, problems, names):
+        self.contestants = contestants  # int64, User ID
+        self.schools = schools          # int64, -1 = сургуульгүй
+        self.provinces = provinces      # int64, -1 = аймаггүй
+        self.answers = answers          # float64 [n, p], NaN = хариулаагүй
+        self.scores = scores            # float64 [n, p], NaN = оноогүй
+        self.problems = problems        # ['№01', ...]
+        self.names = names              # [[овог, нэр], ...]
+
+    def select(self, school_id=None, province_id=None, top_n=None):
+        """Шүүсэн мөрүүдийн индексийг нийт оноо буурахаар, дараа нь овог, нэрээр эрэмбэлж буцаана."""
+        mask = np.ones(len(self.contestants), dtype=bool)
+        if school_id:
+            mask &= self.schools == school_id
+        if province_id:
+            mask &= self.provinces == province_id
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return rows, np.zeros(0)
+
+        totals = np.nansum(self.scores[rows], axis=1)
+        order = sorted(range(len(rows)), key=lambda i: (-totals[i], *(v or '' for v in self.names[rows[i]])))
+        if top_n and top_n > 0:
+            order = order[:top_n]
+        return rows[order], totals[order]
+
+
+def _build(olympiad_id):
+    """Result-уудаас матрицыг барина (нэг Result query, нэг User query)."""
+    problems = list(Problem.objects.filter(olympiad_id=olympiad_id).order_by('order').values_list('id', 'order'))
+    column = {problem_id: i for i, (problem_id, _) in enumerate(problems)}
+
+    rows = list(
+        Result.objects.filter(olympiad_id=olympiad_id, contestant__isnull=False, problem_id__in=list(column))
+        .values_list('contestant_id', 'problem_id', 'answer', 'score')
+        .iterator(chunk_size=10000)
+    )
+    users = {
+        user_id: (last_name, first_name, school_id, province_id)
+        for user_id, last_name, first_name, school_id, province_id in User.objects.filter(
+            pk__in={row[0] for row in rows}
+        ).values_list('id', 'last_name', 'first_name', 'data__school_id', 'data__province_id')
+    }
+    rows = [row for row in rows if row[0] in users]
+
+    contestants, row_index = np.unique(np.array([row[0] for row in rows], dtype=np.int64), return_inverse=True)
+    col_index = np.array([column[row[1]] for row in rows], dtype=np.int64)
+    shape = (len(contestants), len(problems))
+
+    def pivot(values):
+        # pivot_table(aggfunc='sum')-тэй адил: давхардсан мөрүүдийг нэмж, утгагүй нүдийг NaN үлдээнэ
+        values = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        present = ~np.isnan(values)
+        total = np.zeros(shape)
+        count = np.zeros(shape, dtype=np.int32)
+        np.add.at(total, (row_index[present], col_index[present]), values[present])
+        np.add.at(count, (row_index[present], col_index[present]), 1)
+        total[count == 0] = np.nan
+        return total
+
+    meta = [users[int(cid)] for cid in contestants]
+    return AnswerMatrix(
+        contestants=contestants,
+        schools=np.array([m[2] if m[2] is not None else -1 for m in meta], dtype=np.int64),
+        provinces=np.array([m[3] if m[3] is not None else -1 for m in meta], dtype=np.int64),
+        answers=pivot([row[2] for row in rows]),
+        scores=pivot([row[3] for row in rows]),
+        problems=[f'№{order:02d}' for _, order in problems],
+        names=[[m[0], m[1]] for m in meta],
+    )
+
+
+def publish_answer_matrix(olympiad_id):
+    """Матрицыг барьж диск дээр бичнэ (оноо тооцсоны дараа). Оролцогчдын тоог буцаана.
+
+    Хувилбарыг өгөгдлөөс ӨМНӨ уншина: бичих явцад засвар орвол матриц хуучирсанд тооцогдоно.
+    """
+    version = answer_matrix_version(olympiad_id)
+    matrix = _build(olympiad_id)
+
+    olympiad_dir = _root() / str(olympiad_id)
+    stamp = f'{int(time.time() * 1000)}'
+    target = olympiad_dir / stamp
+    target.mkdir(parents=True, exist_ok=True)
+    for name in ARRAYS:
+        np.save(target / f'{name}.npy', getattr(matrix, name))
+    (target / 'meta.json').write_text(
+        json.dumps({'problems': matrix.problems, 'names': matrix.names}, ensure_ascii=False)
+    )
+
+    # CURRENT-ийг атомаар солих
+    current = olympiad_dir / 'CURRENT'
+    tmp = olympiad_dir / f'CURRENT.{stamp}.tmp'
+    tmp.write_text(json.dumps({'dir': stamp, 'version': version}))
+    os.replace(tmp, current)
+
+    # Хуучин хувилбаруудыг цэвэрлэх
+    versions = sorted((p for p in olympiad_dir.iterdir() if p.is_dir()), key=lambda p: p.name)
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    _loaded.pop(olympiad_id, None)
+    return len(matrix.contestants)
+
+
+def _current(olympiad_id):
+    try:
+        return json.loads((_root() / str(olympiad_id) / 'CURRENT').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _read(olympiad_id, current):
+    """Идэвхтэй матрицыг memory-map хийж уншина (хувилбарыг шалгахгүй). Уншиж чадаагүй бол None."""
+    loaded = _loaded.get(olympiad_id)
+    if loaded and loaded[0] == current['dir']:
+        return loaded[1]
+
+    target = _root() / str(olympiad_id) / current['dir']
+    try:
+        arrays = {name: np.load(target / f'{name}.npy', mmap_mode='r') for name in ARRAYS}
+        meta = json.loads((target / 'meta.json').read_text())
+    except (OSError, ValueError):
+        return None
+    matrix = AnswerMatrix(problems=meta['problems'], names=meta['names'], **arrays)
+    _loaded[olympiad_id] = (current['dir'], matrix)
+    return matrix
+
+
+def load_answer_matrix(olympiad_id):
+    """Сүүлд бичигдсэн матриц (хуучирсан байж болно). Бэлэн биш бол None.
+
+    Хуучирсан эсвэл байхгүй бол дахин бичилтийг ард талд товлоно.
+    """
+    current = _current(olympiad_id)
+    matrix = _read(olympiad_id, current) if current else None
+    if matrix is None or current.get('version') != answer_matrix_version(olympiad_id):
+        try:
+            # Хавтас нь "энэ олимпиадын матриц хэрэгтэй" гэсэн тэмдэг (republish_answer_matrix)
+            (_root() / str(olympiad_id)).mkdir(parents=True, exist_ok=True)
+        except OSError:
+            logger.exception(f'Answer matrix directory for olympiad {olympiad_id} could not be created')
+        schedule_results_publish(olympiad_id)
+    return matrix
+
+
+def republish_answer_matrix(olympiad_id):
+    """Хүсэгдсэн (хавтастай) олимпиадын матриц хуучирсан эсвэл байхгүй бол дахин бичнэ.
+
+    Бичигдсэн оролцогчдын тоо, шаардлагагүй бол 0.
+    """
+    if not (_root() / str(olympiad_id)).is_dir():
+        return 0
+    current = _current(olympiad_id)
+    if current is not None and current.get('version') == answer_matrix_version(olympiad_id):
+        return 0
+    return publish_answer_matrix(olympiad_id)
+
+
+def _answer_cell(answer, score):
+    style = f' style="{CORRECT_STYLE}"' if score > 0 else ''
+    if answer != answer:  # NaN
+        return f'<td{style}>-</td>'
+    return f'<td{style}>{answer:.0f}</td>' if answer > 0 else f'<td{style}>---</td>'
+
+
+def render_answers_table(matrix, rows, totals):
+    """Сонгосон мөрүүдийн хариултын хүснэгт (хуучин Styler-ийн HTML-тэй ижил харагдац)."""
+    header = ''.join(f'<th>{escape(name)}</th>' for name in ['Овог', 'Нэр', *matrix.problems, 'Нийт'])
+    body = []
+    for position, (row, total) in enumerate(zip(rows, totals), 1):
+        last_name, first_name = matrix.names[row]
+        answers, scores = matrix.answers[row], matrix.scores[row]
+        cells = ''.join(_answer_cell(answers[i], scores[i]) for i in range(len(matrix.problems)))
+        body.append(
+            f'<tr><th>{position}</th><td>{escape(last_name or "")}</td><td>{escape(first_name or "")}</td>'
+            f'{cells}<td>{total:.1f}</td></tr>'
+        )
+    return (
+        '<table class="table table-bordered table-hover">'
+        f'<thead><tr><th>№</th>{header}</tr></thead><tbody>{"".join(body)}</tbody></table>'
+    )
@@ -0,0 +1,148 @@
+"""
+Олимпиадын дүн, статистик, шударга байдлын шинжилгээний cache-ийн түлхүүрүүд.
+
+Түлхүүр бүр олимпиадын "хувилбарын тоолуур"-ыг агуулна. Олимпиадын өгөгдөл өөрчлөгдөхөд
+тоолуурыг нэмэгдүүлэхэд (O(1)) хуучин түлхүүрүүд автоматаар хэрэглэгдэхээ больж, хугацаа
+нь дуусахад cache-ээс устна. Ингэснээр cache.clear() дуудахгүй, бусад олимпиадын cache хэвээр үлдэнэ.
+
+Квотын хүснэгтүүд (round2/round3) нь тухайн жил болон өмнөх 3 жилийн дүнгээс хамаардаг тул
+хичээлийн жилийн тоолуураар тусад нь ялгагдана.
+
+Экспортын файлууд (export_jobs) нь олимпиадын болон группын гишүүдийн тоолуурыг өгөгдлийн
+хувилбар болгон ашиглана. Гишүүдийн тоолуур групп бүрт тусдаа тул нэг сурагчийн мэдээлэл
+өөрчлөгдөхөд зөвхөн түүний группуудын экспорт хүчингүй болно.
+
+Cache нь процесс бүрт тусдаа (LocMemCache) байж болох тул диск дээрх snapshot, хариултын
+матриц нь DB дахь ResultsVersion-оор хуучирсан эсэхээ шалгана. invalidate_olympiad_cache нь
+үүнийг мөн нэмэгдүүлж, дахин бичилтийг ард талд товлоно.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+# Хуучин хувилбарын түлхүүрүүд хэзээ нэгэн цагт цэвэрлэгдэхийн тулд "хугацаагүй" оронд
+RESULTS_CACHE_TIMEOUT = 7 * 24 * 3600
+
+# Квотын тооцоо өмнөх 3 жилийн дүнг ашигладаг (round2_quota, round3_quota)
+QUOTA_HISTORY_YEARS = 3
+
+
+def _version(version_key):
+    version = cache.get(version_key)
+    if version is None:
+        # Тоолуур cache-ээс шахагдсан ч өмнөх түлхүүрүүдтэй давхцахгүйн тулд цагаар эхлүүлнэ
+        cache.add(version_key, int(time.time() * 1000), None)
+        version = cache.get(version_key)
+    return version
+
+
+def _bump(version_key):
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, int(time.time() * 1000), None)
+
+
+def olympiad_cache_version(olympiad_id):
+    """Олимпиадын cache-ийн одоогийн хувилбар."""
+    return _version(f'olympiad_cache_version_{olympiad_id}')
+
+
+def olympiad_cache_key(olympiad_id, name, *parts):
+    """Олимпиадын хувилбартай cache түлхүүр үүсгэнэ.
+
+    Жиш: olympiad_cache_key(5, 'scores', province_id, zone_id, page) ->
+    'olympiad_5_v1760000000000_scores_0_0_1'
+    """
+    version = olympiad_cache_version(olympiad_id)
+    return '_'.join(str(p) for p in (f'olympiad_{olympiad_id}_v{version}', name) + parts)
+
+
+def school_year_cache_key(school_year_id, name, *parts):
+    """Хичээлийн жилийн хувилбартай cache түлхүүр (квотын хүснэгтүүдэд)."""
+    version = _version(f'school_year_cache_version_{school_year_id}')
+    return '_'.join(str(p) for p in (f'school_year_{school_year_id}_v{version}', name) + parts)
+
+
+def contest_cache_key(olympiad_id, name, *parts):
+    """Оролцоход хэрэглэгдэх (manifest, оролцогчийн төлөв) cache түлхүүр.
+
+    Дүнгийн cache-ээс тусдаа тоолууртай: олимпиад/бодлого засахад дүнгийн snapshot хүчингүй болохгүй.
+    """
+    version = contest_cache_version(olympiad_id)
+    return '_'.join(str(p) for p in (f'contest_{olympiad_id}_v{version}', name) + parts)
+
+
+def contest_cache_version(olympiad_id):
+    """Олимпиад, бодлогын өгөгдлийн одоогийн хувилбар (экспортын файлуудад)."""
+    return _version(f'contest_cache_version_{olympiad_id}')
+
+
+def users_cache_version(group_id):
+    """Группын гишүүнчлэл, гишүүдийн User/UserMeta-ийн хувилбар (экспортын файлуудад)."""
+    return _version(f'group_users_cache_version_{group_id}')
+
+
+def invalidate_users_cache(group_ids):
+    """Эдгээр группын гишүүдийн жагсаалтаас хамаарах экспортуудыг хүчингүй болгоно."""
+    for group_id in set(group_ids):
+        _bump(f'group_users_cache_version_{group_id}')
+
+
+def invalidate_contest_cache(olympiad_id):
+    """Олимпиадын manifest болон оролцогчдын төлвийг хүчингүй болгоно."""
+    _bump(f'contest_cache_version_{olympiad_id}')
+
+
+def results_version(olympiad_id):
+    """Олимпиадын дүнгийн өгөгдлийн DB дахь хувилбар (snapshot, хариултын матрицад)."""
+    from ..models import ResultsVersion
+
+    return ResultsVersion.objects.filter(pk=olympiad_id).values_list('version', flat=True).first() or 0
+
+
+def answer_matrix_version(olympiad_id):
+    """Хариултын матрицын хувилбар: [дүнгийн хувилбар, auto-save хариултын хувилбар]."""
+    from ..models import ResultsVersion
+
+    versions = ResultsVersion.objects.filter(pk=olympiad_id).values_list('version', 'answers_version').first()
+    return list(versions or (0, 0))
+
+
+def _bump_db_version(olympiad_id, column):
+    from ..models import ResultsVersion
+    from .snapshots import schedule_results_publish
+
+    table = ResultsVersion._meta.db_table
+    initial = [int(column == 'version'), int(column == 'answers_version')]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (olympiad_id, version, answers_version, updated_at) VALUES (%s, %s, %s, NOW()) "
+            f"ON CONFLICT (olympiad_id) DO UPDATE SET {column} = {table}.{column} + 1, updated_at = NOW()",
+            [olympiad_id, *initial],
+        )
+    schedule_results_publish(olympiad_id)
+
+
+def bump_results_version(olympiad_id):
+    """DB дахь хувилбарыг нэмэгдүүлж, snapshot/матрицын дахин бичилтийг commit-ийн дараа товлоно."""
+    _bump_db_version(olympiad_id, 'version')
+
+
+def bump_answers_version(olympiad_id):
+    """Auto-save хариулт DB-д бичигдсэнийг тэмдэглэж, зөвхөн хариултын матрицыг дахин бичүүлнэ."""
+    _bump_db_version(olympiad_id, 'answers_version')
+
+
+def invalidate_olympiad_cache(olympiad_id, school_year_id=None):
+    """Нэг олимпиадын бүх cache-ийг хүчингүй болгоно.
+
+    school_year_id өгвөл тухайн жил болон дараагийн 3 жилийн квотын хүснэгтүүдийг мөн
+    хүчингүй болгоно (эдгээр нь энэ олимпиадын эрэмбийг ашигладаг).
+    """
+    _bump(f'olympiad_cache_version_{olympiad_id}')
+    bump_results_version(olympiad_id)
+    if school_year_id:
+        for year_id in range(school_year_id, school_year_id + QUOTA_HISTORY_YEARS + 1):
+            _bump(f'school_year_cache_version_{year_id}')
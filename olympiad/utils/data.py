@@ -1,7 +1,6 @@
 from ..models import Olympiad, Result, ScoreSheet
 from django.contrib.auth.models import User
 import json
-from itertools import groupby
 
 
 def adjusted_int_name(number, size=2):
@@ -42,80 +41,48 @@ def prepare_json_results(olympiad_id):
 def to_scoresheet(olympiad_id):
     """
     Generates or updates ScoreSheets from Results.
-    This version is highly optimized to reduce database queries.
-    """
-    # 1. Шаардлагатай бүх Result-ийг нэг дор татах
-    all_results = Result.objects.filter(olympiad_id=olympiad_id, contestant_id__isnull=False).select_related(
-        'contestant__data', 'problem'
-    ).order_by('contestant_id')
-
-    # 2. Одоо байгаа ScoreSheet-үүдийг олох
-    existing_sheets = {
-        sheet.user_id: sheet
-        for sheet in ScoreSheet.objects.filter(olympiad_id=olympiad_id)
-    }
-
-    to_create = []
-    to_update = []
-
-    # 3. Оролцогч тус бүрээр нь үр дүнг бүлэглэх
-    for contestant_id, results_group in groupby(all_results, key=lambda r: r.contestant_id):
-        results_list = list(results_group)
-        contestant = results_list[0].contestant
-
-        # UserMeta шалгах ба шаардлагатай бол үүсгэх
-        if not hasattr(contestant, 'data') or contestant.data is None:
-            # UserMeta үүсгэх (хамгийн суурь мэдээллээр)
-            from accounts.models import UserMeta
-            try:
-                UserMeta.objects.create(
-                    user=contestant,
-                    reg_num='',  # default утга
-                )
-                # Дахин уншиж авах (relation cache шинэчлэх)
-                contestant.refresh_from_db()
-                print(f"⚠️ {contestant.id} ({contestant.username}): UserMeta үүсгэв")
-            except Exception as e:
-                print(f"❌ {contestant.id} ({contestant.username}): UserMeta үүсгэх алдаа - {e}")
-                continue
-
-        school_obj = contestant.data.school
 
-        # Онооны талбаруудыг тэглэх
-        score_data = {f's{i}': 0 for i in range(1, 21)}
-
-        for result in results_list:
-            if result.score is not None and result.problem:
-                score_data[f's{result.problem.order}'] = result.score
+    Оноог бодлогын дугаараар DB дотор pivot хийж, онооны хуудсуудыг set-based
+    UPDATE/INSERT-ээр бичнэ (scoring.upsert_scoresheets). Result-уудыг Python руу
+    татахгүй тул сая мөртэй олимпиадад ч санах ой тогтмол.
+    Буцаана: {'updated': ..., 'created': ..., 'usermeta_created': ...}
+    """
+    from accounts.models import UserMeta
+    from .scoring import upsert_scoresheets
+
+    # UserMeta-гүй оролцогчид цөөн тул зөвхөн тэднийг Python-оор үүсгэнэ
+    usermeta_created = 0
+    missing_meta = User.objects.filter(
+        contest_results__olympiad_id=olympiad_id, data__isnull=True
+    ).distinct()
+    for contestant in missing_meta.iterator():
+        try:
+            UserMeta.objects.create(
+                user=contestant,
+                reg_num='',  # default утга
+            )
+            usermeta_created += 1
+            print(f"⚠️ {contestant.id} ({contestant.username}): UserMeta үүсгэв")
+        except Exception as e:
+            print(f"❌ {contestant.id} ({contestant.username}): UserMeta үүсгэх алдаа - {e}")
 
-        # Нийт оноог тооцоолох
-        total = sum(score_data.values())
+    # Тухайн үеийн сургуулийг хадгална: school аль хэдийн бичигдсэн бол дахин бичихгүй
+    updated, created = upsert_scoresheets(olympiad_id)
+    return {'updated': updated, 'created': created, 'usermeta_created': usermeta_created}
 
-        if contestant_id in existing_sheets:
-            # Update existing
-            sheet = existing_sheets[contestant_id]
-            if sheet.school_id is None:
-                # Тухайн үеийн сургуулийг хадгална: сурагч дараа нь сургууль шилжсэн ч
-                # аль хэдийн бичигдсэн school-г одоогийн профайлаар дахин бичихгүй.
-                sheet.school = school_obj
-            sheet.total = total
-            for key, value in score_data.items():
-                setattr(sheet, key, value)
-            to_update.append(sheet)
-        else:
-            # Create new
-            to_create.append(ScoreSheet(
-                user_id=contestant_id,
-                olympiad_id=olympiad_id,
-                school=school_obj,
-                total=total,
-                **score_data
-            ))
 
-    # 4. Bulk operations
-    if to_create:
-        ScoreSheet.objects.bulk_create(to_create, batch_size=1000)
+def sync_scoresheet_score(result):
+    """Засагдсан Result-ийн оноог тухайн сурагчийн онооны хуудсанд тусгана.
 
-    if to_update:
-        update_fields = ['school', 'total'] + [f's{i}' for i in range(1, 21)]
-        ScoreSheet.objects.bulk_update(to_update, update_fields, batch_size=1000)
\ No newline at end of file
+    ScoreSheet.save нь эрэмбийг хэсэгчлэн шинэчилдэг тул generate_scoresheets-ийг
+    дахин ажиллуулах шаардлагагүй. Онооны хуудас үүсээгүй бол юу ч хийхгүй.
+    """
+    if not result.problem or not 1 <= result.problem.order <= 20:
+        return None
+    sheet = ScoreSheet.objects.filter(olympiad_id=result.olympiad_id, user_id=result.contestant_id).first()
+    if sheet is None:
+        return None
+    field = f's{result.problem.order}'
+    setattr(sheet, field, result.score or 0)
+    sheet.save(update_fields=[field, 'total'])
+    return sheet
@@ -0,0 +1,267 @@
+"""
+Upload хийсэн Excel файлуудын parse cache.
+
+Аймаг/сургуулийн менежерүүд нэг файлыг алдаа засах явцдаа хэд хэдэн удаа оруулдаг ба
+openpyxl-ээр parse хийх нь хамгийн удаан алхам. Файлын агуулгын sha256-аар түлхүүрлэж,
+parse хийсэн sheet бүрийг local диск дээр Parquet хэлбэрээр хадгална (pickle ашиглахгүй тул
+cache-ийн файл код ажиллуулж чадахгүй). Дахин оруулсан эсвэл давтан уншсан үед openpyxl огт
+ажиллахгүй. Холимог төрлийн (жишээ нь 'Мэдээлэл' sheet-ийн 'Утга': int ба str) object
+баганыг текст болгон бичиж, нүд бүрийн Python төрлийг metadata-д хадгалан уншихдаа сэргээнэ.
+Parquet-д багтахгүй sheet (MultiIndex толгой, танигдаагүй төрлийн нүд)-ийг cache-лэхгүй,
+тухай бүр openpyxl-ээр уншина.
+
+Бүтэц:
+    <EXCEL_PARSE_CACHE_DIR>/<sha256>/sheets.json           - sheet-үүдийн нэрс
+    <EXCEL_PARSE_CACHE_DIR>/<sha256>/<sheet+kwargs hash>.parquet
+
+cached_workbook() нь pandas.ExcelFile-тэй ижил (sheet_names, parse) интерфэйстэй.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, time as dt_time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE = 7 * 24 * 3600  # prune_excel_cache: 7 хоногоос өмнө ашиглагдаагүйг устгана
+HASH_CHUNK = 1024 * 1024
+COLUMNS_KEY = b'mmo_columns'  # Parquet schema metadata: DataFrame-ийн жинхэнэ баганын нэрс (JSON)
+TYPES_KEY = b'mmo_types'  # {байрлал: нүд бүрийн төрлийн код} - текст болгож бичсэн object баганууд
+
+# Нүдний төрлийн код -> текстээс сэргээх функц
+_DECODERS = {
+    'n': lambda value: None,
+    'N': lambda value: pd.NaT,
+    'b': lambda value: value == 'True',
+    'i': int,
+    'f': float,
+    's': str,
+    'T': pd.Timestamp,
+    'd': datetime.fromisoformat,
+    't': dt_time.fromisoformat,
+}
+
+
+def _root():
+    return Path(getattr(settings, 'EXCEL_PARSE_CACHE_DIR', settings.BASE_DIR / 'cache' / 'excel'))
+
+
+def _content_hash(source):
+    """Файлын зам, Django UploadedFile эсвэл file-like объектын агуулгын sha256."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    if hasattr(source, 'chunks'):
+        for chunk in source.chunks(HASH_CHUNK):
+            digest.update(chunk)
+    else:
+        for chunk in iter(lambda: source.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, write):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _cell_code(value):
+    """Object баганын нүдний төрлийн код (_DECODERS). Танигдаагүй төрөлд TypeError."""
+    if value is None:
+        return 'n'
+    if value is pd.NaT:
+        return 'N'
+    if isinstance(value, (bool, np.bool_)):
+        return 'b'
+    if isinstance(value, (int, np.integer)):
+        return 'i'
+    if isinstance(value, (float, np.floating)):
+        return 'f'
+    if isinstance(value, str):
+        return 's'
+    if isinstance(value, pd.Timestamp):
+        return 'T'
+    if isinstance(value, datetime):
+        return 'd'
+    if isinstance(value, dt_time):
+        return 't'
+    raise TypeError(f'{type(value).__name__} төрлийн нүд')
+
+
+def _encode_cell(code, value):
+    if code in ('n', 'N'):
+        return None
+    if code == 'b':
+        return str(bool(value))
+    if code == 'f':
+        return repr(float(value))
+    if code in ('T', 'd', 't'):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_object_columns(df):
+    """Цэвэр текст биш object баганыг текст болгоно: (DataFrame, {байрлал: төрлийн кодууд})."""
+    types = {}
+    columns = {}
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if column.dtype != object:
+            continue
+        codes = [_cell_code(value) for value in column.tolist()]
+        if set(codes) <= {'s', 'n'}:
+            continue
+        types[str(position)] = ''.join(codes)
+        columns[str(position)] = pd.Series(
+            [_encode_cell(code, value) for code, value in zip(codes, column.tolist())], index=df.index, dtype=object,
+        )
+    return (df.assign(**columns) if columns else df), types
+
+
+def _decode_object_columns(df, types):
+    for position, codes in types.items():
+        values = df[position].tolist()
+        df[position] = pd.Series(
+            [_DECODERS[code](value) for code, value in zip(codes, values)], index=df.index, dtype=object,
+        )
+    return df
+
+
+def _write_parquet(df, path):
+    """Баганын нэрийг (int, NaN гэх мэт) байршлаар нь сольж, жинхэнэ нэрсийг metadata-д хадгална.
+
+    Холимог object баганууд текст болж, нүдний төрлүүд нь TYPES_KEY-д хадгалагдана.
+    """
+    labels = json.dumps(list(df.columns), ensure_ascii=False).encode('utf-8')
+    df, types = _encode_object_columns(df.set_axis([str(i) for i in range(df.shape[1])], axis=1))
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}), COLUMNS_KEY: labels, TYPES_KEY: json.dumps(types).encode('utf-8'),
+    })
+    pq.write_table(table, path)
+
+
+def _read_parquet(path):
+    table = pq.read_table(path)
+    metadata = table.schema.metadata
+    df = _decode_object_columns(table.to_pandas(), json.loads(metadata.get(TYPES_KEY, b'{}')))
+    df.columns = json.loads(metadata[COLUMNS_KEY])
+    return df
+
+
+class CachedWorkbook:
+    """Агуулгын hash-аар cache-лэгдсэн workbook (pandas.ExcelFile-ийн оронд)."""
+
+    def __init__(self, source):
+        self.source = source
+        self.digest = _content_hash(source)
+        self.path = _root() / self.digest
+        self._excel = None
+        self._sheet_names = None
+
+    def _open(self):
+        # openpyxl-ээр зөвхөн cache-д байхгүй sheet хэрэгтэй үед нэг удаа нээнэ
+        if self._excel is None:
+            if hasattr(self.source, 'seek'):
+                self.source.seek(0)
+            self._excel = pd.ExcelFile(self.source)
+        return self._excel
+
+    @property
+    def sheet_names(self):
+        if self._sheet_names is None:
+            manifest = self.path / 'sheets.json'
+            try:
+                self._sheet_names = json.loads(manifest.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                self._sheet_names = list(self._open().sheet_names)
+                try:
+                    self.path.mkdir(parents=True, exist_ok=True)
+                    _write_atomic(manifest, lambda tmp: Path(tmp).write_text(
+                        json.dumps(self._sheet_names, ensure_ascii=False), encoding='utf-8'
+                    ))
+                except OSError as e:
+                    logger.warning(f'Excel parse cache write failed: {e}')
+        return self._sheet_names
+
+    def _entry(self, sheet_name, kwargs):
+        key = json.dumps([sheet_name, sorted(kwargs.items())], ensure_ascii=False, default=str)
+        return self.path / hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+    def parse(self, sheet_name=0, **kwargs):
+        """pandas.read_excel(source, sheet_name, **kwargs)-тэй ижил DataFrame."""
+        path = self._entry(sheet_name, kwargs).with_suffix('.parquet')
+        if path.exists():
+            try:
+                df = _read_parquet(path)
+                os.utime(path)  # prune_excel_cache-д сүүлд ашигласан хугацаа
+                return df
+            except Exception as e:
+                logger.warning(f'Excel parse cache read failed ({path}): {e}')
+
+        df = self._open().parse(sheet_name, **kwargs)
+        self._store(df, path)
+        return df
+
+    def _store(self, df, path):
+        if not isinstance(df, pd.DataFrame) or isinstance(df.columns, pd.MultiIndex):
+            return
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            _write_atomic(path, lambda tmp: _write_parquet(df, tmp))
+        except (TypeError, ValueError, pa.ArrowException) as e:
+            # Танигдаагүй төрлийн нүд г.м. Parquet-д багтахгүй: cache-лэхгүй
+            logger.debug(f'Excel parse cache skipped ({path}): {e}')
+        except OSError as e:
+            logger.warning(f'Excel parse cache write failed: {e}')
+
+
+def cached_workbook(source):
+    """Файлын зам эсвэл upload хийсэн файлын cache-тэй workbook."""
+    return CachedWorkbook(source)
+
+
+def read_excel_cached(source, sheet_name=0, **kwargs):
+    """pandas.read_excel-ийн cache-тэй хувилбар (нэг sheet)."""
+    return cached_workbook(source).parse(sheet_name, **kwargs)
+
+
+def prune_excel_cache(max_age=MAX_AGE):
+    """max_age секундээс өмнө ашиглагдаагүй workbook-уудын cache-ийг устгана."""
+    root = _root()
+    if not root.exists():
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in root.iterdir():
+        try:
+            last_used = max((p.stat().st_mtime for p in path.iterdir()), default=path.stat().st_mtime)
+        except OSError:
+            continue
+        if last_used < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,126 @@
+"""
+Excel экспортын нэгдсэн engine (хариултын хуудас, хэрэглэгчдийн жагсаалт).
+
+DataFrame → pd.ExcelWriter → нүд бүрийг дахин гүйж загварчлах хуучин аргын оронд openpyxl-ийн
+write-only горимыг ашиглана: мөрүүд DB iterator-оос шууд бичигдэж, загвар (хүрээ, тод
+толгой) мөр бичих үед оноогдоно. Баганын өргөнийг DB-ийн нэг aggregate query-ээр
+(column_widths) урьдчилан тооцно. Workbook-ийг export_jobs түр файлд хадгалж MEDIA-д бичих тул
+10k+ мөртэй хуудас ч санах ойд бүтнээрээ ачаалагдахгүй.
+"""
+from django.db.models import CharField, Max
+from django.db.models.functions import Cast, Length
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+ITERATOR_CHUNK = 2000
+PROGRESS_EVERY = 500
+
+THIN_BORDER = Border(
+    left=Side(style='thin'), right=Side(style='thin'),
+    top=Side(style='thin'), bottom=Side(style='thin')
+)
+BOLD_FONT = Font(bold=True)
+CENTER_ALIGN = Alignment(horizontal='center', vertical='center')
+
+
+def new_workbook():
+    return Workbook(write_only=True)
+
+
+def column_widths(queryset, fields, headers=None, cap=None, padding=2):
+    """Талбар бүрийн хамгийн урт утгаар баганын өргөн (нэг aggregate query).
+
+    headers өгвөл толгойн уртыг мөн тооцно. cap: дээд хязгаар.
+    """
+    if not fields:
+        return []
+    lengths = queryset.order_by().aggregate(**{
+        f'w{i}': Max(Length(Cast(field, CharField()))) for i, field in enumerate(fields)
+    })
+    widths = []
+    for i, field in enumerate(fields):
+        width = lengths[f'w{i}'] or 0
+        if headers:
+            width = max(width, len(str(headers[i])))
+        width += padding
+        widths.append(min(width, cap) if cap else width)
+    return widths
+
+
+def write_sheet(workbook, title, headers, widths, rows, bordered=True, progress=None):
+    """Write-only sheet бичнэ: тод толгой, (bordered бол) нүд бүр хүрээтэй.
+
+    widths: багана бүрийн өргөн (None бол тохируулахгүй).
+    rows: мөрүүдийн iterator (жагсаалт/tuple).
+    progress: өгвөл PROGRESS_EVERY мөр тутам бичсэн мөрийн тоогоор дуудагдана.
+    """
+    ws = workbook.create_sheet(title=title)
+    for index, width in enumerate(widths, 1):
+        if width:
+            ws.column_dimensions[get_column_letter(index)].width = width
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = BOLD_FONT
+        if bordered:
+            cell.border = THIN_BORDER
+            cell.alignment = CENTER_ALIGN
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    written = 0
+    for row in rows:
+        if bordered:
+            cells = []
+            for value in row:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.border = THIN_BORDER
+                cells.append(cell)
+            ws.append(cells)
+        else:
+            ws.append(list(row))
+        written += 1
+        if progress and written % PROGRESS_EVERY == 0:
+            progress(written)
+    if progress:
+        progress(written)
+    return ws
+
+
+def write_info_sheet(workbook, items, title='Мэдээлэл'):
+    """Импортод ашиглагддаг 'Түлхүүр' / 'Утга' sheet."""
+    ws = workbook.create_sheet(title=title)
+    ws.append(['Түлхүүр', 'Утга'])
+    for key, value in items:
+        ws.append([key, value])
+    return ws
+
+
+def answer_sheet_workbook(contestants, fields, headers, widths, problems, info_items,
+                          answer_width=5, answer=None, progress=None):
+    """Хариултын хуудасны workbook ('Хариулт' + 'Мэдээлэл').
+
+    contestants: queryset - fields-ийн утгууд values_list-ээр урсгалаар уншигдана
+    headers / widths: fields-тэй харгалзах толгой, өргөн
+    answer: өгвөл хариултын нүдийг бөглөх функц (туршилтын файл), эс бөгөөс хоосон
+    progress: write_sheet-д дамжина
+    """
+    problem_headers = [f'№{p.order}' for p in problems]
+    blanks = [''] * len(problem_headers)
+
+    def rows():
+        for values in contestants.values_list(*fields).iterator(chunk_size=ITERATOR_CHUNK):
+            values = ['Тодорхойгүй' if v is None else v for v in values]
+            yield values + ([answer() for _ in problem_headers] if answer else blanks)
+
+    workbook = new_workbook()
+    write_sheet(
+        workbook, 'Хариулт', headers + problem_headers,
+        list(widths) + [answer_width] * len(problem_headers), rows(), progress=progress,
+    )
+    write_info_sheet(workbook, info_items)
+    return workbook
+
@@ -0,0 +1,314 @@
+"""
+Ард талд (Celery) үүсгэгдэх экспорт файлууд.
+
+Хүсэлтийн дотор Excel үүсгэхийн оронд view нь request_export()-ээр ExportJob үүсгэж,
+olympiad.tasks.run_export_job task файлыг бичиж (MEDIA_ROOT/exports/), явцыг хадгална.
+Хэрэглэгч төлвийн хуудсаар (views_exports) явцыг хянаж, бэлэн болмогц татна. Төлөв ба
+татах хуудас бүр тухайн төрлийн can_access(user, params)-аар эрхийг дахин шалгана.
+
+Давхардал: (kind, params) -ийн hash ба өгөгдлийн хувилбараар (caching.py-ийн тоолуурууд)
+ижил хүсэлтүүд нэг ажлыг хуваалцана. Өгөгдөл өөрчлөгдөхөд тоолуур нэмэгдэж шинэ файл
+үүснэ. bulk_create гэх мэт signal-гүй өөрчлөлтөд зориулж бэлэн файлыг EXPORT_MAX_AGE-ээс
+удаан дахин ашиглахгүй.
+
+Шинэ төрөл нэмэх:
+    @register_export('kind', version=lambda params: ..., can_access=lambda user, params: ...)
+    def build(params, progress):
+        ...
+        return workbook, filename
+"""
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import Province, Zone
+from schools.models import School
+
+from ..models import ExportJob, Olympiad
+from .caching import contest_cache_version, users_cache_version
+from .excel_export import (
+    ITERATOR_CHUNK, answer_sheet_workbook, column_widths, new_workbook, write_sheet,
+)
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MAX_AGE = timedelta(hours=1)     # бэлэн файлыг дахин ашиглах хугацаа
+JOB_STALE_AFTER = timedelta(minutes=15)  # үүнээс удаан дуусаагүй ажлыг унасан гэж үзнэ
+EXPORT_RETENTION = timedelta(days=2)     # prune_export_jobs: үүнээс хуучин ажлууд устна
+
+EXPORTS = {}
+
+
+def register_export(kind, version, can_access):
+    """Экспортын төрөл бүртгэнэ.
+
+    version(params): өгөгдлийн хувилбар (өөрчлөгдөхөд шинэ файл үүснэ).
+    can_access(user, params): экспорт эхлүүлэх view-ийн шалгадагтай ижил эрх (файл хувийн
+    мэдээлэлтэй тул token-оос гадна төлөв, татах хуудас бүрт шалгана).
+    Builder нь (params, progress) авч (workbook, filename) буцаана.
+    """
+    def decorator(builder):
+        EXPORTS[kind] = (builder, version, can_access)
+        return builder
+    return decorator
+
+
+def user_can_access(user, kind, params):
+    """Хэрэглэгч (kind, params) экспортыг үзэж, татах эрхтэй эсэх. Бүртгэлгүй төрөлд False."""
+    if kind not in EXPORTS:
+        return False
+    _, _, can_access = EXPORTS[kind]
+    return can_access(user, params)
+
+
+def params_hash(kind, params):
+    return hashlib.sha256(
+        json.dumps([kind, params], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+
+
+def request_export(kind, params, user=None):
+    """Ижил бэлэн/явагдаж буй ажил байвал түүнийг, эс бөгөөс шинэ ажил үүсгэж буцаана."""
+    from ..tasks import run_export_job
+
+    _, version, _ = EXPORTS[kind]
+    data_version = str(version(params))
+    digest = params_hash(kind, params)
+    now = timezone.now()
+
+    job = (
+        ExportJob.objects.filter(
+            kind=kind, params_hash=digest, data_version=data_version,
+            created_at__gte=now - EXPORT_MAX_AGE,
+        )
+        .filter(
+            Q(status=ExportJob.Status.DONE)
+            | Q(status__in=[ExportJob.Status.PENDING, ExportJob.Status.RUNNING], created_at__gte=now - JOB_STALE_AFTER)
+        )
+        .order_by('-created_at').first()
+    )
+    if job:
+        return job
+
+    job = ExportJob.objects.create(
+        kind=kind, params=params, params_hash=digest, data_version=data_version, requested_by=user,
+    )
+    transaction.on_commit(lambda: run_export_job.delay(job.id))
+    return job
+
+
+class JobProgress:
+    """Builder-т дамжих явцын callback: DB-д PROGRESS_EVERY мөр тутам бичигдэнэ."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def set_total(self, total):
+        ExportJob.objects.filter(pk=self.job.pk).update(total=total)
+
+    def __call__(self, done):
+        ExportJob.objects.filter(pk=self.job.pk).update(progress=done)
+
+
+def run_job(job_id):
+    """Экспортын файлыг үүсгэж хадгална (Celery task-аас)."""
+    job = ExportJob.objects.filter(pk=job_id).first()
+    if job is None or job.status == ExportJob.Status.DONE:
+        return None
+
+    job.status = ExportJob.Status.RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    try:
+        builder, _, _ = EXPORTS[job.kind]
+        workbook, filename = builder(job.params, JobProgress(job))
+        with tempfile.TemporaryFile() as output:
+            workbook.save(output)
+            output.seek(0)
+            job.file.save(filename, File(output), save=False)
+    except Exception as e:
+        logger.exception(f'Export job {job_id} ({job.kind}) failed')
+        job.status = ExportJob.Status.FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job.status
+
+    job.filename = filename
+    job.status = ExportJob.Status.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'filename', 'status', 'finished_at'])
+    return job.status
+
+
+def prune_jobs(max_age=EXPORT_RETENTION):
+    """Хуучирсан ажлууд болон тэдгээрийн файлуудыг устгана."""
+    removed = 0
+    for job in ExportJob.objects.filter(created_at__lt=timezone.now() - max_age).iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        removed += 1
+    return removed
+
+
+# --- Экспортын төрлүүд ---
+
+def _answer_sheet_version(params, group_id):
+    return f"{contest_cache_version(params['olympiad_id'])}.{users_cache_version(group_id)}"
+
+
+def _school_answer_sheet_version(params):
+    # Сургуулийн группын гишүүд
+    group_id = School.objects.filter(pk=params['school_id']).values_list('group_id', flat=True).first()
+    return _answer_sheet_version(params, group_id)
+
+
+def _olympiad_answer_sheet_version(params):
+    # Олимпиадын группын гишүүд
+    group_id = Olympiad.objects.filter(pk=params['olympiad_id']).values_list('group_id', flat=True).first()
+    return _answer_sheet_version(params, group_id)
+
+
+def _can_access_school(user, params):
+    # schools.views.generate_school_answer_sheet
+    school = School.objects.select_related('province').filter(pk=params['school_id']).first()
+    return school is not None and school.user_has_access(user)
+
+
+def _can_access_province(user, params):
+    # provinces.views.generate_province_answer_sheet
+    from provinces.views import user_can_manage_province
+
+    province = Province.objects.filter(pk=params['province_id']).first()
+    return province is not None and user_can_manage_province(user, province)
+
+
+def _can_access_zone(user, params):
+    # provinces.views.zone_generate_answer_sheet
+    from provinces.views import user_can_manage_zone
+
+    zone = Zone.objects.filter(pk=params['zone_id']).first()
+    return zone is not None and user_can_manage_zone(user, zone)
+
+
+def _can_access_group_users(user, params):
+    # accounts.views.display.group_users_excel (staff_member_required)
+    return user.is_active and user.is_staff
+
+
+def _answer_sheet(olympiad, contestants, fields, headers, info_items, progress, cap=None):
+    problems = olympiad.problem_set.all().order_by('order')
+    widths = column_widths(contestants, fields, headers, cap=cap)
+    progress.set_total(contestants.count())
+    return answer_sheet_workbook(contestants, fields, headers, widths, problems, info_items, progress=progress)
+
+
+def _level_items(level):
+    return [('level_id', level.id if level else ''), ('level_name', level.name if level else '')]
+
+
+@register_export('school_answer_sheet', version=_school_answer_sheet_version, can_access=_can_access_school)
+def school_answer_sheet(params, progress):
+    """Сургуулийн хариултын хуудас (schools.views.generate_school_answer_sheet)."""
+    school = School.objects.get(pk=params['school_id'])
+    olympiad = Olympiad.objects.select_related('level').get(pk=params['olympiad_id'])
+    contestants = User.objects.filter(
+        groups=school.group, data__level=olympiad.level
+    ).order_by('last_name', 'first_name')
+
+    info_items = [
+        ('olympiad_id', olympiad.id),
+        ('olympiad_name', olympiad.name),
+        ('school_id', school.id),
+        ('school_name', school.name),
+    ] + _level_items(olympiad.level)
+    workbook = _answer_sheet(olympiad, contestants, ['id', 'last_name', 'first_name'], ['ID', 'Овог', 'Нэр'],
+                             info_items, progress)
+    return workbook, f"answer_sheet_{olympiad.id}_{school.id}.xlsx"
+
+
+@register_export('province_answer_sheet', version=_olympiad_answer_sheet_version, can_access=_can_access_province)
+def province_answer_sheet(params, progress):
+    """Аймгийн хариултын хуудас (provinces.views.generate_province_answer_sheet)."""
+    province = Province.objects.get(pk=params['province_id'])
+    olympiad = Olympiad.objects.select_related('level', 'group').get(pk=params['olympiad_id'])
+    contestants = olympiad.group.user_set.order_by('data__school__name', 'last_name', 'first_name')
+
+    info_items = [
+        ('olympiad_id', olympiad.id),
+        ('olympiad_name', olympiad.name),
+        ('province_id', province.id),
+        ('province_name', province.name),
+    ] + _level_items(olympiad.level)
+    workbook = _answer_sheet(
+        olympiad, contestants,
+        ['id', 'last_name', 'first_name', 'data__school__name'], ['ID', 'Овог', 'Нэр', 'Сургууль'],
+        info_items, progress, cap=30,
+    )
+    return workbook, f"province_{province.id}_olympiad_{olympiad.id}.xlsx"
+
+
+@register_export('zone_answer_sheet', version=_olympiad_answer_sheet_version, can_access=_can_access_zone)
+def zone_answer_sheet(params, progress):
+    """Бүсийн хариултын хуудас (provinces.views.zone_generate_answer_sheet)."""
+    zone = Zone.objects.get(pk=params['zone_id'])
+    olympiad = Olympiad.objects.select_related('level', 'group').get(pk=params['olympiad_id'])
+    contestants = olympiad.group.user_set.all()
+    if zone.id != 5:
+        contestants = contestants.filter(data__province__zone=zone)
+    contestants = contestants.order_by('data__province__name', 'data__school__name', 'last_name', 'first_name')
+
+    info_items = [
+        ('olympiad_id', olympiad.id),
+        ('olympiad_name', olympiad.name),
+        ('zone_id', zone.id),
+        ('zone_name', zone.name),
+    ] + _level_items(olympiad.level)
+    workbook = _answer_sheet(
+        olympiad, contestants,
+        ['id', 'last_name', 'first_name', 'data__province__name', 'data__school__name'],
+        ['ID', 'Овог', 'Нэр', 'Аймаг', 'Сургууль'],
+        info_items, progress, cap=30,
+    )
+    return workbook, f"zone_{zone.id}_olympiad_{olympiad.id}.xlsx"
+
+
+@register_export(
+    'group_users', version=lambda params: users_cache_version(params['group_id']), can_access=_can_access_group_users,
+)
+def group_users(params, progress):
+    """Группын хэрэглэгчдийн жагсаалт (accounts.views.display.group_users_excel)."""
+    group = Group.objects.get(pk=params['group_id'])
+    users = group.user_set.all().order_by('data__province', 'data__school__name', 'first_name', 'last_name')
+    if params.get('province_id'):
+        users = users.filter(data__province_id=params['province_id'])
+    elif params.get('zone_id'):
+        users = users.filter(data__province__zone_id=params['zone_id'])
+
+    headers = ['№', 'ID', 'Хэрэглэгчийн нэр', 'Овог', 'Нэр', 'Аймаг/Дүүрэг', 'Сургууль', 'Анги', 'Регистр', 'Утас', 'И-мэйл']
+    fields = [
+        'id', 'username', 'last_name', 'first_name', 'data__province__name', 'data__school__name',
+        'data__grade__name', 'data__reg_num', 'data__mobile', 'email',
+    ]
+    total = users.count()
+    progress.set_total(total)
+    # '№' баганын өргөн нь мөрийн тоогоор, бусад нь DB-ийн нэг aggregate-ээр
+    widths = [min(len(str(total)) + 2, 40)] + column_widths(users, fields, headers[1:], cap=40)
+
+    def rows():
+        for i, values in enumerate(users.values_list(*fields).iterator(chunk_size=ITERATOR_CHUNK), 1):
+            yield [i] + [value if value not in (None, '') else '-' for value in values]
+
+    workbook = new_workbook()
+    write_sheet(workbook, group.name[:31], headers, widths, rows(), progress=progress)
+    return workbook, f"group_{group.id}_users.xlsx"
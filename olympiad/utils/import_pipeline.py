@@ -0,0 +1,146 @@
+"""
+Олон файлын импортын pipeline (universal_import, universal_import_scores).
+
+Файл унших, бүтэц таних (pandas, detect_data_structure) нь CPU их шаарддаг боловч DB-д
+хандахгүй тул --workers > 1 үед процессын pool-д зэрэг ажиллана. DB-д бичих нь үндсэн
+процесст ганц writer-ээр, файл бүр тусдаа transaction-д хийгдэнэ: алдаатай файл бүхэлдээ
+rollback болж, бусад файлууд үргэлжилнэ. Алдаатай файлуудыг эцсийн log-д нэгтгэнэ.
+
+Команд нь parse_file(filepath, log)-ийг хэрэгжүүлж (log: командын stdout болох io.StringIO)
+дараах бүтэцтэй dict буцаана:
+    {'filepath', 'province_id', 'log',
+     'sheets': [{'name', 'df', 'detected': (data_df, column_map) | None, 'log', 'error'}]}
+"""
+import copy
+import io
+import os
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from importlib import import_module
+
+import django
+from django.apps import apps
+from django.db import connections, transaction
+
+from accounts.models import Province
+
+
+def _init_worker():
+    # spawn/forkserver горимд Django-г дахин ачаална (fork үед аль хэдийн бэлэн)
+    if not apps.ready:
+        django.setup()
+
+
+def parse_import_file(command_module, filepath):
+    """Worker: файлыг уншиж sheet бүрийн бүтцийг таньна. Алдааг үр дүнд буцаана."""
+    log = io.StringIO()
+    command = import_module(command_module).Command(stdout=log)
+    try:
+        return command.parse_file(filepath, log)
+    except Exception as e:
+        return {'filepath': filepath, 'error': f"{e}\n{traceback.format_exc()}"}
+
+
+def iter_parsed_files(command_module, filepaths, workers=1):
+    """Файлуудыг уншиж бүтцийг таньсан үр дүнг буцаана.
+
+    workers > 1 бол процессын pool-д, дууссан дарааллаар. Санах ойг хязгаарлахын тулд
+    нэг зэрэг workers * 2-оос ихгүй файл уншигдана.
+    """
+    if workers <= 1:
+        for filepath in filepaths:
+            yield parse_import_file(command_module, filepath)
+        return
+
+    # Fork хийхээс өмнө DB холболтуудыг хаах (worker-ууд DB ашиглахгүй)
+    connections.close_all()
+    remaining = iter(filepaths)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = {}
+
+        def submit():
+            filepath = next(remaining, None)
+            if filepath is not None:
+                pending[pool.submit(parse_import_file, command_module, filepath)] = filepath
+
+        for _ in range(workers * 2):
+            submit()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filepath = pending.pop(future)
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    # Worker процесс унасан гэх мэт
+                    parsed = {'filepath': filepath, 'error': f"{e}\n{traceback.format_exc()}"}
+                submit()
+                yield parsed
+
+
+class ImportPipelineMixin:
+    """universal_import* командуудын файл боловсруулах writer."""
+
+    STATS_KEPT_ON_ROLLBACK = ('start_time', 'total_files', 'file_errors')
+
+    def run_import_pipeline(self, filepaths, config_map, default_province_id, dry_run, workers=1):
+        self.stats.setdefault('file_errors', [])
+        for parsed in iter_parsed_files(self.__module__, filepaths, workers):
+            self.apply_parsed_file(parsed, config_map, default_province_id, dry_run)
+
+    def apply_parsed_file(self, parsed, config_map, default_province_id, dry_run):
+        """Нэг файлын sheet-үүдийг нэг transaction-д импортлоно. Амжилттай бол True."""
+        filepath = parsed['filepath']
+        filename = os.path.basename(filepath)
+        self.stdout.write("\n" + "=" * 80)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"📄 ФАЙЛ: {filename}"))
+        self.stdout.write("=" * 80)
+
+        if parsed.get('error'):
+            return self._file_failed(filepath, parsed['error'])
+        if parsed.get('log'):
+            self.stdout.write(parsed['log'], ending='')
+
+        # Файл тус бүрээс province_id шалгах
+        province_id = parsed.get('province_id') or default_province_id
+        if parsed.get('province_id'):
+            province = Province.objects.filter(id=province_id).first()
+            province_name = province.name if province else "Тодорхойгүй"
+            self.stats['current_province_id'] = province_id
+            self.stats['current_province_name'] = province_name
+            self.stdout.write(self.style.SUCCESS(f"📍 Файл аймаг: {province_name} (ID: {province_id})"))
+
+        # Rollback болбол статистикийг буцаана
+        snapshot = {
+            key: copy.deepcopy(value) for key, value in self.stats.items()
+            if key not in self.STATS_KEPT_ON_ROLLBACK
+        }
+        try:
+            with transaction.atomic():
+                for sheet in parsed['sheets']:
+                    if sheet.get('log'):
+                        self.stdout.write(sheet['log'], ending='')
+                    if sheet.get('error'):
+                        self.stdout.write(self.style.ERROR(
+                            f"❌ Sheet уншихад алдаа: {filename} → {sheet['name']}: {sheet['error']}"
+                        ))
+                        continue
+                    self.process_target(
+                        sheet['df'], sheet['name'], filename, config_map, province_id, dry_run,
+                        detected=sheet.get('detected'),
+                    )
+        except Exception as e:
+            self.stats.update(snapshot)
+            return self._file_failed(filepath, f"{e}\n{traceback.format_exc()}")
+
+        self.stats['processed_files'].append(filepath)
+        return True
+
+    def _file_failed(self, filepath, error):
+        self.stdout.write(self.style.ERROR(f"❌ Файл боловсруулахад алдаа (rollback хийгдлээ): {error}"))
+        self.stats['file_errors'].append({
+            'file': os.path.basename(filepath),
+            'error': error.splitlines()[0] if error else '',
+            'province_name': self.stats.get('current_province_name', 'Тодорхойгүй'),
+        })
+        return False
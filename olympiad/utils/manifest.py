@@ -0,0 +1,90 @@
+"""
+Оролцооны хуудсуудын (quiz, exam, upload) олимпиадын manifest ба оролцогчийн төлөв.
+
+Олимпиад эхлэх мөчид бүх сурагч нэг хуудсыг нэг минутад ачаалдаг тул олимпиадыг (group,
+level, school_year-тэй нь) болон бодлогуудын эрэмбэлсэн жагсаалтыг процесс дотор болон
+shared cache-д хадгална. Оролцогч бүрийн "группийн гишүүн", "Result-ууд үүссэн" тэмдэг
+тусдаа хадгалагдах тул тогтвортой үед mixin-ууд DB-д хандахгүй.
+
+Olympiad, Problem хадгалагдах/устахад signals.py нь invalidate_contest_cache-ийг дуудна.
+queryset.update()-ээр өөрчилбөл түүнийг гараар дуудна.
+"""
+import copy
+import time
+
+from django.core.cache import cache
+
+from ..models import Olympiad
+from .caching import contest_cache_key
+
+# LocMem cache-тэй үед өөр процесст хийсэн засвар хамгийн ихдээ энэ хугацаанд хоцорно
+MANIFEST_TIMEOUT = 60
+PARTICIPANT_TIMEOUT = 6 * 3600
+
+_local_manifests = {}  # cache_key -> (expires_at, manifest)
+
+
+def get_contest_manifest(olympiad_id):
+    """Олимпиадын manifest: {'olympiad': Olympiad, 'problem_ids': [...]} эсвэл олдохгүй бол None.
+
+    Olympiad объект нь хуулбар тул view дээр өөрчлөхөд cache-д нөлөөлөхгүй.
+    """
+    key = contest_cache_key(olympiad_id, 'manifest')
+    local = _local_manifests.get(key)
+    if local and local[0] > time.monotonic():
+        manifest = local[1]
+    else:
+        manifest = cache.get(key)
+        if manifest is None:
+            olympiad = Olympiad.objects.select_related('group', 'level', 'school_year').filter(pk=olympiad_id).first()
+            if olympiad is None:
+                return None
+            manifest = {
+                'olympiad': olympiad,
+                'problem_ids': list(olympiad.problem_set.order_by('order').values_list('id', flat=True)),
+            }
+            cache.set(key, manifest, MANIFEST_TIMEOUT)
+        now = time.monotonic()
+        for stale_key in [k for k, (expires_at, _) in _local_manifests.items() if expires_at <= now]:
+            _local_manifests.pop(stale_key, None)
+        _local_manifests[key] = (now + MANIFEST_TIMEOUT, manifest)
+    return {'olympiad': copy.copy(manifest['olympiad']), 'problem_ids': manifest['problem_ids']}
+
+
+def get_participant_state(olympiad_id, user_id):
+    """Оролцогчийн cache-лэгдсэн төлөв: {'member': True, 'results': True} гэх мэт."""
+    return cache.get(contest_cache_key(olympiad_id, 'participant', user_id)) or {}
+
+
+def update_participant_state(olympiad_id, user_id, **changes):
+    key = contest_cache_key(olympiad_id, 'participant', user_id)
+    state = cache.get(key) or {}
+    state.update(changes)
+    cache.set(key, state, PARTICIPANT_TIMEOUT)
+
+
+def mark_participants(olympiad_id, user_ids, **changes):
+    """Олон оролцогчийн төлвийг нэг дор шинэчилнэ (get_many/set_many)."""
+    keys = {contest_cache_key(olympiad_id, 'participant', user_id): user_id for user_id in user_ids}
+    states = cache.get_many(list(keys))
+    updated = {}
+    for key in keys:
+        state = states.get(key) or {}
+        state.update(changes)
+        updated[key] = state
+    cache.set_many(updated, PARTICIPANT_TIMEOUT)
+
+
+def is_group_member(olympiad, user):
+    """Олимпиадын группт хэрэглэгч багтах эсэх. Зөвхөн эерэг хариуг cache-лэнэ
+    (олимпиадын өмнөхөн группт нэмэгдсэн сурагч хүлээхгүйн тулд)."""
+    if not olympiad.group_id:
+        return True
+    if not user.is_authenticated:
+        return False
+    if get_participant_state(olympiad.id, user.id).get('member'):
+        return True
+    is_member = olympiad.group.user_set.filter(id=user.id).exists()
+    if is_member:
+        update_participant_state(olympiad.id, user.id, member=True)
+    return is_member
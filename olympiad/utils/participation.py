@@ -0,0 +1,196 @@
+"""
+Олимпиад × сургуулийн оролцооны тойм (SchoolParticipation).
+
+province_summary_view нь сургууль бүрт Result-аас оролцогч, хоосон мөр, 5 сурагчийн
+жишээ хариултыг тоолж, pandas pivot/Styler-ээр HTML үүсгэдэг байсан. Одоо эдгээр нь
+SchoolParticipation-д хадгалагдаж, хуудас нэг query-гээр уншина.
+
+Шинэчлэх:
+    - Дүн/хариулт оруулсны дараа schedule_participation_refresh(olympiad_id, contestant_ids)
+      нь зөвхөн тэдгээр сурагчдын сургуулиудыг ард талд (Celery) дахин тооцно.
+    - score_olympiad, generate_scoresheets, provision_results нь олимпиадыг бүхэлд нь шинэчилнэ.
+    - Сурагч сургуулиа сольбол (signals.usermeta_school_changed) хуучин, шинэ сургуулийг хоёуланг нь.
+    - Auto-save буферийн flush-ууд бичсэн сурагчдаа answer_buffer-т цуглуулж,
+      schedule_buffered_refresh нь олимпиад тутамд REFRESH_DELAY секундэд нэг л task товлоно.
+    Хариултын матриц (answer_matrix.py) эндээс биш, дүнгийн хувилбараар publish_results_task-аар шинэчлэгдэнэ.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils.html import format_html, format_html_join
+
+from accounts.models import UserMeta
+
+from ..models import Problem, Result, SchoolParticipation
+
+SAMPLE_CONTESTANTS = 5
+REFRESH_DELAY = getattr(settings, 'PARTICIPATION_REFRESH_DELAY', 30)
+
+
+def _school_ids_for(contestant_ids):
+    return set(
+        UserMeta.objects.filter(user_id__in=contestant_ids, school__isnull=False)
+        .values_list('school_id', flat=True)
+    )
+
+
+def _samples(olympiad_id, sample_ids_by_school):
+    """Сургууль бүрийн жишээ хариултын матриц: {'problems': [...], 'rows': [[овог, нэр, [хариултууд]]]}."""
+    contestant_ids = [cid for ids in sample_ids_by_school.values() for cid in ids]
+    if not contestant_ids:
+        return {}
+    problems = list(Problem.objects.filter(olympiad_id=olympiad_id).order_by('order').values_list('id', 'order'))
+    problem_ids = {problem_id for problem_id, _ in problems}
+
+    answers = defaultdict(dict)
+    for contestant_id, problem_id, answer in Result.objects.filter(
+        olympiad_id=olympiad_id, contestant_id__in=contestant_ids, answer__isnull=False
+    ).values_list('contestant_id', 'problem_id', 'answer'):
+        if problem_id in problem_ids:
+            row = answers[contestant_id]
+            row[problem_id] = row.get(problem_id, 0) + answer
+
+    names = {
+        user_id: (last_name, first_name)
+        for user_id, last_name, first_name in User.objects.filter(pk__in=contestant_ids)
+        .values_list('id', 'last_name', 'first_name')
+    }
+
+    headers = [f'№{order:02d}' for _, order in problems]
+    samples = {}
+    for school_id, sample_ids in sample_ids_by_school.items():
+        rows = [
+            [*names.get(cid, ('', '')), [answers[cid].get(problem_id) for problem_id, _ in problems]]
+            for cid in sample_ids
+        ]
+        rows.sort(key=lambda row: (row[0] or '', row[1] or ''))
+        samples[school_id] = {'problems': headers, 'rows': rows}
+    return samples
+
+
+def refresh_school_participation(olympiad_id, school_ids=None):
+    """Олимпиадын (эсвэл зөвхөн school_ids) сургуулиудын мөрийг дахин тооцно.
+
+    Оролцогчдыг нэг grouped query, жишээ хариултыг нэг Result query-гээр уншиж,
+    мөрүүдийг нэг upsert-ээр бичнэ. Шинэчлэгдсэн сургуулийн тоог буцаана.
+    """
+    results = Result.objects.filter(olympiad_id=olympiad_id, contestant__data__school__isnull=False)
+    if school_ids is not None:
+        school_ids = list(school_ids)
+        if not school_ids:
+            return 0
+        results = results.filter(contestant__data__school_id__in=school_ids)
+
+    counts = defaultdict(lambda: {'contestants': 0, 'positive': 0, 'sample': []})
+    rows = (
+        results.values('contestant__data__school_id', 'contestant_id')
+        .annotate(best=Max('score'))
+        .order_by('contestant__data__school_id', 'contestant_id')
+    )
+    for row in rows.iterator(chunk_size=5000):
+        school = counts[row['contestant__data__school_id']]
+        school['contestants'] += 1
+        if row['best'] is not None and row['best'] > 0:
+            school['positive'] += 1
+        if len(school['sample']) < SAMPLE_CONTESTANTS:
+            school['sample'].append(row['contestant_id'])
+
+    samples = _samples(olympiad_id, {school_id: c['sample'] for school_id, c in counts.items()})
+    participations = [
+        SchoolParticipation(
+            olympiad_id=olympiad_id,
+            school_id=school_id,
+            contestant_count=c['contestants'],
+            empty_count=c['contestants'] - c['positive'],
+            sample=samples.get(school_id, {}),
+        )
+        for school_id, c in counts.items()
+    ]
+
+    with transaction.atomic():
+        SchoolParticipation.objects.bulk_create(
+            participations, batch_size=1000,
+            update_conflicts=True, unique_fields=['olympiad', 'school'],
+            update_fields=['contestant_count', 'empty_count', 'sample', 'updated_at'],
+        )
+        # Оролцогчгүй болсон сургуулиуд
+        stale = SchoolParticipation.objects.filter(olympiad_id=olympiad_id).exclude(school_id__in=list(counts))
+        if school_ids is not None:
+            stale = stale.filter(school_id__in=school_ids)
+        stale.delete()
+    return len(participations)
+
+
+def refresh_for_contestants(olympiad_id, contestant_ids=None, school_ids=None):
+    """contestant_ids-ийн одоогийн сургуулиуд ба school_ids-ийг (хоёулаа None бол бүх олимпиадыг) шинэчилнэ."""
+    if contestant_ids is None and school_ids is None:
+        return refresh_school_participation(olympiad_id)
+    schools = set(school_ids or ())
+    if contestant_ids:
+        schools |= _school_ids_for(contestant_ids)
+    return refresh_school_participation(olympiad_id, schools)
+
+
+def schedule_participation_refresh(olympiad_id, contestant_ids=None, school_ids=None):
+    """Transaction commit болсны дараа шинэчлэлийг ард талд (Celery) хийлгэнэ."""
+    from ..tasks import refresh_school_participation_task
+
+    contestant_ids = sorted(set(contestant_ids)) if contestant_ids is not None else None
+    school_ids = sorted(set(school_ids)) if school_ids is not None else None
+    transaction.on_commit(
+        lambda: refresh_school_participation_task.delay(olympiad_id, contestant_ids, school_ids)
+    )
+
+
+def _pending_key(olympiad_id):
+    return f'participation_refresh_pending_{olympiad_id}'
+
+
+def schedule_buffered_refresh(olympiad_id):
+    """Auto-save flush-ийн дараа refresh_buffered_participation_task-ийг товлоно (хүлээгдэж буй бол дахин товлохгүй)."""
+    from ..tasks import refresh_buffered_participation_task
+
+    def schedule():
+        if cache.add(_pending_key(olympiad_id), 1, REFRESH_DELAY + 600):
+            refresh_buffered_participation_task.apply_async((olympiad_id,), countdown=REFRESH_DELAY)
+
+    transaction.on_commit(schedule)
+
+
+def refresh_buffered(olympiad_id):
+    """Сүүлийн товлолтоос хойш буферээс бичигдсэн сурагчдын сургуулиудыг шинэчилнэ.
+
+    Товлолтын түгжээг эхэндээ чөлөөлдөг тул энэ хооронд бичигдсэн хариултууд шинэ task товлоно.
+    """
+    from .answer_buffer import pop_flushed_contestants
+
+    cache.delete(_pending_key(olympiad_id))
+    contestant_ids = pop_flushed_contestants(olympiad_id)
+    if not contestant_ids:
+        return 0
+    return refresh_for_contestants(olympiad_id, contestant_ids)
+
+
+def sample_table_html(sample):
+    """Жишээ хариултын матрицыг province_summary.html-д харуулах хүснэгт болгоно."""
+    def cell(value):
+        if value is None:
+            return '-'
+        return '{:.0f}'.format(value) if value > 0 else '---'
+
+    header = format_html_join('', '<th>{}</th>', ((name,) for name in ['Овог', 'Нэр', *sample.get('problems', [])]))
+    body = format_html_join(
+        '', '<tr><th>{}</th>{}</tr>',
+        (
+            (i, format_html_join('', '<td>{}</td>', ((value,) for value in [last, first, *map(cell, answers)])))
+            for i, (last, first, answers) in enumerate(sample.get('rows', []), 1)
+        ),
+    )
+    return format_html(
+        '<table class="table table-bordered table-hover"><thead><tr><th>№</th>{}</tr></thead><tbody>{}</tbody></table>',
+        header, body,
+    )
@@ -0,0 +1,75 @@
+"""
+Олимпиад эхлэхээс өмнө группийн бүх гишүүнд Result-уудыг урьдчилан үүсгэх.
+
+ResultsEnsureMixin нь сурагч анх орж ирэхэд Result үүсгэдэг тул олимпиадын эхний
+минутад мянга мянган жижиг bulk_create DB-д очдог. Энд (сурагч, бодлого) хосуудыг
+том багцаар урьдчилан үүсгэж, оролцогчийн "results" тэмдгийг тавьснаар mixin нь
+эхний хандалтад ч DB-д бичихгүй.
+
+Дахин ажиллуулахад зөвхөн дутуу хосууд үүснэ (группт сүүлд нэмэгдсэн сурагчид, шинэ бодлого).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Olympiad, Result
+from .manifest import mark_participants
+from .participation import schedule_participation_refresh
+
+PROVISION_BATCH_SIZE = 5000
+
+# Celery beat: хэдэн цагийн дотор эхлэх олимпиадуудыг бэлтгэх
+UPCOMING_HOURS = 24
+
+
+def provision_results(olympiad_id, batch_size=PROVISION_BATCH_SIZE):
+    """Олимпиадын группийн гишүүдэд дутуу Result-уудыг үүсгэнэ.
+
+    Буцаана: (үүсгэсэн Result-ийн тоо, гишүүдийн тоо). Групп эсвэл бодлогогүй бол (0, 0).
+    """
+    olympiad = Olympiad.objects.filter(pk=olympiad_id).first()
+    if olympiad is None or not olympiad.group_id:
+        return 0, 0
+
+    problem_ids = list(olympiad.problem_set.order_by('order').values_list('id', flat=True))
+    member_ids = list(olympiad.group.user_set.values_list('id', flat=True))
+    if not problem_ids or not member_ids:
+        return 0, len(member_ids)
+
+    # Одоо байгаа бүх хосыг нэг query-гээр
+    existing = set(
+        Result.objects.filter(olympiad_id=olympiad_id, contestant_id__isnull=False)
+        .values_list('contestant_id', 'problem_id')
+    )
+
+    to_create = [
+        Result(contestant_id=user_id, olympiad_id=olympiad_id, problem_id=problem_id)
+        for user_id in member_ids
+        for problem_id in problem_ids
+        if (user_id, problem_id) not in existing
+    ]
+
+    # Сурагч яг энэ үед ResultsEnsureMixin-ээр үүсгэсэн хосыг алгасна (unique_contestant_problem_result)
+    for start in range(0, len(to_create), batch_size):
+        with transaction.atomic():
+            Result.objects.bulk_create(to_create[start:start + batch_size], ignore_conflicts=True)
+
+    # Mixin-ууд эдгээр сурагчдад дахин шалгалт хийхгүй
+    mark_participants(olympiad_id, member_ids, member=True, results=True)
+    if to_create:
+        schedule_participation_refresh(olympiad_id)
+    return len(to_create), len(member_ids)
+
+
+def upcoming_olympiad_ids(hours=UPCOMING_HOURS):
+    """Ойрын хугацаанд эхлэх эсвэл явагдаж буй, групптэй олимпиадууд."""
+    now = timezone.now()
+    return list(
+        Olympiad.objects.filter(
+            group__isnull=False,
+            start_time__isnull=False,
+            start_time__lte=now + timedelta(hours=hours),
+            end_time__gte=now,
+        ).values_list('id', flat=True)
+    )
@@ -1,398 +1,293 @@
-from ..models import Olympiad, Result, ScoreSheet
-from django.db.models import Window, F
-from django.db.models.functions import DenseRank, RowNumber
-
-
-def update_rankings_a(olympiad_id):
-    """Updates rankings for each unique Olympiad using Window functions."""
-    # Бүх scoresheet-ийг нэг query-ээр авч, эрэмбийг тооцоолох
-    scores = list(ScoreSheet.objects.filter(olympiad_id=olympiad_id).order_by("-total"))
-
-    if not scores:
-        return
-
-    # Python дээр эрэмбэ тооцоолох (bulk_update-д бэлтгэх)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.list_rank = lowest_rank + score_count - 1
-        sheet.ranking_a = lowest_rank
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_a", "list_rank"], batch_size=2000)
-
-def update_rankings_a_p(olympiad_id, province_id):
-    """Updates rankings for province - official only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province_id=province_id,
-        is_official=True
-    ).order_by("-total"))
-
-    if not scores:
-        return
-
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
+"""
+ScoreSheet-ийн эрэмбийн (ranking) тооцоо.
+
+Олимпиадын бүх онооны хуудсыг НЭГ query-ээр NumPy массив болгон ачаалж, улс/аймаг/бүсийн
+бүх хувилбарыг (official / all / unofficial) бүлэглэсэн эрэмбэлэлтээр нэг дор тооцоолно.
+Өөрчлөгдсөн мөрүүдийг л нэг bulk_update-ээр буцааж бичнэ.
+
+Нэг онооны хуудас (total, school, is_official) өөрчлөгдөхөд update_sheet_rankings нь зөвхөн
+хамаарах улс/аймаг/бүсийн хүрээнд байр нь бодитоор шилжих мөрүүдийг ±1-ээр шилжүүлнэ.
+
+Талбар бүрийн утга (бүлэг дотор, нийт оноогоор буурахаар):
+  - list_rank — жагсаалтын дараалал (1, 2, 3, 4, ...); тэнцвэл ScoreSheet.id-аар.
+  - ranking_a — тэнцсэн бүлэг хамгийн САЙН байраа авна (1, 2, 2, 4).
+  - ranking_b — тэнцсэн бүлэг хамгийн МУУ байраа авна (1, 3, 3, 4).
+Тухайн хүрээнд хамаарахгүй (жиш: official-only хүрээнд unofficial, сургуульгүй) мөрүүд 0 байна.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from schools.models import School
+from ..models import Olympiad, ScoreSheet
+from .achievements import schedule_achievements_refresh
+
+
+# (талбарын дагавар, бүлэглэх түвшин, is_official шүүлт)
+RANKING_SCOPES = (
+    ('', None, None),               # Улсын хэмжээ - бүх сурагч
+    ('_p', 'province', True),       # Аймаг - official only
+    ('_p_all', 'province', None),   # Аймаг - бүх сурагч
+    ('_p_u', 'province', False),    # Аймаг - unofficial only
+    ('_z', 'zone', True),           # Бүс - official only
+    ('_z_all', 'zone', None),       # Бүс - бүх сурагч
+    ('_z_u', 'zone', False),        # Бүс - unofficial only
+)
+
+
+def scope_fields(suffix):
+    """Хүрээний (list_rank, ranking_a, ranking_b) талбаруудын нэрийг буцаана."""
+    return f'list_rank{suffix}', f'ranking_a{suffix}', f'ranking_b{suffix}'
+
+
+RANK_FIELDS = [field for suffix, _, _ in RANKING_SCOPES for field in scope_fields(suffix)]
+
+
+def _load_sheets(olympiad_id):
+    """Олимпиадын онооны хуудсуудыг нэг query-ээр багануудын массив болгон авна."""
+    rows = list(ScoreSheet.objects.filter(olympiad_id=olympiad_id).values_list(
+        'id', 'total', 'is_official', 'school__province_id', 'school__province__zone_id', *RANK_FIELDS
+    ))
+    if not rows:
+        return None
+
+    columns = list(zip(*rows))
+    data = {
+        'id': np.asarray(columns[0], dtype=np.int64),
+        # total нь NULL байж болзошгүй - 0 гэж үзнэ
+        'total': np.asarray([t or 0 for t in columns[1]], dtype=np.float64),
+        'is_official': np.asarray(columns[2], dtype=bool),
+        # аймаг/бүсгүй мөрийг -1 гэж тэмдэглэнэ
+        'province': np.asarray([p if p is not None else -1 for p in columns[3]], dtype=np.int64),
+        'zone': np.asarray([z if z is not None else -1 for z in columns[4]], dtype=np.int64),
+        'current': np.asarray(columns[5:], dtype=np.int64),  # (len(RANK_FIELDS), n)
+    }
+    return data
+
+
+def grouped_ranks(groups, totals, ids, mask):
+    """Бүлэг бүрийн дотор (list_rank, ranking_a, ranking_b)-г вектороор тооцоолно.
+
+    groups: бүлгийн түлхүүр (int), totals: нийт оноо, ids: тэнцлийг задлах ScoreSheet.id,
+    mask: тооцоонд орох мөрүүд. Хамаарахгүй мөрүүдэд 0 буцаана.
+    """
+    n = len(totals)
+    list_rank = np.zeros(n, dtype=np.int64)
+    rank_a = np.zeros(n, dtype=np.int64)
+    rank_b = np.zeros(n, dtype=np.int64)
+
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        return list_rank, rank_a, rank_b
+
+    # бүлэг -> оноо (буурахаар) -> id дарааллаар эрэмбэлэх
+    order = idx[np.lexsort((ids[idx], -totals[idx], groups[idx]))]
+    g = groups[order]
+    t = totals[order]
+    m = order.size
+    pos = np.arange(m)
+
+    group_start = np.empty(m, dtype=bool)
+    group_start[0] = True
+    group_start[1:] = g[1:] != g[:-1]
+    tie_start = group_start.copy()
+    tie_start[1:] |= t[1:] != t[:-1]
+    tie_end = np.empty(m, dtype=bool)
+    tie_end[-1] = True
+    tie_end[:-1] = tie_start[1:]
+
+    first_in_group = np.maximum.accumulate(np.where(group_start, pos, 0))
+    first_in_tie = np.maximum.accumulate(np.where(tie_start, pos, 0))
+    last_in_tie = np.minimum.accumulate(np.where(tie_end, pos, m)[::-1])[::-1]
+
+    list_rank[order] = pos - first_in_group + 1
+    rank_a[order] = first_in_tie - first_in_group + 1
+    rank_b[order] = last_in_tie - first_in_group + 1
+    return list_rank, rank_a, rank_b
+
+
+def compute_rankings(data):
+    """Бүх хүрээний эрэмбийг тооцоолж (len(RANK_FIELDS), n) хэмжээтэй массив буцаана."""
+    national = np.zeros_like(data['id'])
+    ranks = []
+    for suffix, level, official in RANKING_SCOPES:
+        groups = national if level is None else data[level]
+        mask = groups >= 0
+        if official is not None:
+            mask &= data['is_official'] == official
+        ranks.extend(grouped_ranks(groups, data['total'], data['id'], mask))
+    return np.vstack(ranks)
+
+
+def update_olympiad_rankings(olympiad_id):
+    """Олимпиадын бүх эрэмбийг (улс, аймаг, бүс × official/all/unofficial) шинэчилнэ.
+
+    Утга нь өөрчлөгдсөн мөрүүдийг л бичих тул дахин ажиллуулахад хямд.
+    Буцаана: шинэчлэгдсэн ScoreSheet-ийн тоо.
+    """
+    data = _load_sheets(olympiad_id)
+    if data is None:
+        return 0
+
+    ranks = compute_rankings(data)
+    changed = np.flatnonzero((ranks != data['current']).any(axis=0))
+    if changed.size == 0:
+        return 0
+
+    updates = [
+        ScoreSheet(id=int(data['id'][i]), **dict(zip(RANK_FIELDS, ranks[:, i].tolist())))
+        for i in changed
+    ]
+    ScoreSheet.objects.bulk_update(updates, RANK_FIELDS, batch_size=2000)
+    return len(updates)
+
+
+# --- Хэсэгчилсэн (incremental) эрэмбэ ---
+
+def _ahead(total, sheet_id):
+    """(total, id) түлхүүрээр жагсаалтад өмнө нь орох мөрүүд."""
+    return Q(total__gt=total) | Q(total=total, id__lt=sheet_id)
+
+
+def _behind(total, sheet_id):
+    """(total, id) түлхүүрээр жагсаалтад хойно нь орох мөрүүд."""
+    return Q(total__lt=total) | Q(total=total, id__gt=sheet_id)
+
+
+def _scope_group(state, level, official):
+    """Тухайн хүрээнд онооны хуудас аль бүлэгт багтахыг буцаана (багтахгүй бол None)."""
+    if state is None:
+        return None
+    if official is not None and state['is_official'] != official:
+        return None
+    if level is None:
+        return 0
+    return state[level]
+
+
+def _scope_queryset(sheet, level, official, group):
+    qs = ScoreSheet.objects.filter(olympiad_id=sheet.olympiad_id).exclude(pk=sheet.pk)
+    if level == 'province':
+        qs = qs.filter(school__province_id=group)
+    elif level == 'zone':
+        qs = qs.filter(school__province__zone_id=group)
+    if official is not None:
+        qs = qs.filter(is_official=official)
+    return qs
+
+
+def _shift(qs, field, condition, delta):
+    qs.filter(condition).update(**{field: F(field) + delta})
+
+
+def _with_location(state):
+    """state-д сургуулийн аймаг, бүсийг нэмнэ."""
+    if state is None:
+        return None
+    location = School.objects.filter(pk=state['school_id']).values_list(
+        'province_id', 'province__zone_id'
+    ).first() if state['school_id'] else None
+    state['province'], state['zone'] = location or (None, None)
+    return state
+
+
+def update_sheet_rankings(sheet, previous):
+    """Нэг онооны хуудасны өөрчлөлтөөр хамаарах хүрээнүүдийн эрэмбийг засна.
+
+    previous: өмнөх {'total', 'school_id', 'is_official'} (шинэ хуудас бол None).
+    Бусад мөрүүдийн эрэмбэ өмнө нь зөв тооцоологдсон байх ёстой (update_olympiad_rankings).
+    Буцаана: энэ хуудасны шинэ эрэмбийн талбарууд.
+    """
+    previous = _with_location(dict(previous) if previous else None)
+    current = _with_location({
+        'total': sheet.total or 0,
+        'school_id': sheet.school_id,
+        'is_official': sheet.is_official,
+    })
+    old_total = (previous or {}).get('total') or 0
+    new_total = current['total']
+
+    own_ranks = {}
+    for suffix, level, official in RANKING_SCOPES:
+        list_field, a_field, b_field = scope_fields(suffix)
+        old_group = _scope_group(previous, level, official)
+        new_group = _scope_group(current, level, official)
+
+        if old_group is not None and old_group == new_group:
+            if old_total == new_total:
+                continue
+            qs = _scope_queryset(sheet, level, official, new_group)
+            if new_total > old_total:
+                _shift(qs, a_field, Q(total__gte=old_total, total__lt=new_total), 1)
+                _shift(qs, b_field, Q(total__gt=old_total, total__lte=new_total), 1)
+                _shift(qs, list_field, _ahead(old_total, sheet.pk) & _behind(new_total, sheet.pk), 1)
+            else:
+                _shift(qs, a_field, Q(total__gte=new_total, total__lt=old_total), -1)
+                _shift(qs, b_field, Q(total__gt=new_total, total__lte=old_total), -1)
+                _shift(qs, list_field, _ahead(new_total, sheet.pk) & _behind(old_total, sheet.pk), -1)
         else:
-            score_count += 1
-
-        sheet.list_rank_p = lowest_rank + score_count - 1
-        sheet.ranking_a_p = lowest_rank
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_a_p", "list_rank_p"], batch_size=2000)
-
-def update_rankings_a_p_all(olympiad_id, province_id):
-    """Updates rankings for province - all students."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province_id=province_id
-    ).order_by("-total"))
-
-    if not scores:
-        return
-
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.list_rank_p_all = lowest_rank + score_count - 1
-        sheet.ranking_a_p_all = lowest_rank
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_a_p_all", "list_rank_p_all"], batch_size=2000)
-
-def update_rankings_a_p_u(olympiad_id, province_id):
-    """Updates rankings for province - unofficial only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province_id=province_id,
-        is_official=False
-    ).order_by("-total"))
-
-    if not scores:
+            if old_group is not None:
+                qs = _scope_queryset(sheet, level, official, old_group)
+                _shift(qs, a_field, Q(total__lt=old_total), -1)
+                _shift(qs, b_field, Q(total__lte=old_total), -1)
+                _shift(qs, list_field, _behind(old_total, sheet.pk), -1)
+            if new_group is not None:
+                qs = _scope_queryset(sheet, level, official, new_group)
+                _shift(qs, a_field, Q(total__lt=new_total), 1)
+                _shift(qs, b_field, Q(total__lte=new_total), 1)
+                _shift(qs, list_field, _behind(new_total, sheet.pk), 1)
+
+        if new_group is None:
+            own_ranks.update({list_field: 0, a_field: 0, b_field: 0})
+            continue
+        counts = _scope_queryset(sheet, level, official, new_group).aggregate(
+            ahead=Count('id', filter=_ahead(new_total, sheet.pk)),
+            better=Count('id', filter=Q(total__gt=new_total)),
+            not_worse=Count('id', filter=Q(total__gte=new_total)),
+        )
+        own_ranks.update({
+            list_field: counts['ahead'] + 1,
+            a_field: counts['better'] + 1,
+            b_field: counts['not_worse'] + 1,
+        })
+
+    if own_ranks:
+        ScoreSheet.objects.filter(pk=sheet.pk).update(**own_ranks)
+        for field, value in own_ranks.items():
+            setattr(sheet, field, value)
+    return own_ranks
+
+
+def _ranking_inputs(sheet_id):
+    return ScoreSheet.objects.filter(pk=sheet_id).values('total', 'school_id', 'is_official').first()
+
+
+def _inputs_changed(sheet, previous):
+    return previous is None or (previous['total'] or 0) != (sheet.total or 0) \
+        or previous['school_id'] != sheet.school_id or previous['is_official'] != sheet.is_official
+
+
+def save_with_rankings(sheet, save):
+    """sheet-ийг хадгалж (save - эх save функц), эрэмбийг хэсэгчлэн шинэчилнэ.
+
+    total, school, is_official өөрчлөгдөөгүй бол (жиш: зөвхөн шагнал) түгжээгүйгээр хадгална.
+    Өөрчлөгдсөн бол нэг олимпиадын зэрэг засваруудыг Olympiad мөрийг түгжиж дараалуулна.
+    Cache-ийг ScoreSheet.save хүчингүй болгоно.
+    """
+    if sheet.pk and not _inputs_changed(sheet, _ranking_inputs(sheet.pk)):
+        sheet._refresh_olympiad_achievements = False
+        save()
         return
-
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.list_rank_p_u = lowest_rank + score_count - 1
-        sheet.ranking_a_p_u = lowest_rank
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_a_p_u", "list_rank_p_u"], batch_size=2000)
-
-def update_rankings_a_z(olympiad_id, zone_id):
-    """Updates rankings for zone - official only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province__zone_id=zone_id,
-        is_official=True
-    ).order_by("-total"))
-
-    if not scores:
-        return
-
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.list_rank_z = lowest_rank + score_count - 1
-        sheet.ranking_a_z = lowest_rank
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_a_z", "list_rank_z"], batch_size=2000)
-
-def update_rankings_a_z_all(olympiad_id, zone_id):
-    """Updates rankings for zone - all students."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province__zone_id=zone_id
-    ).order_by("-total"))
-
-    if not scores:
-        return
-
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.list_rank_z_all = lowest_rank + score_count - 1
-        sheet.ranking_a_z_all = lowest_rank
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_a_z_all", "list_rank_z_all"], batch_size=2000)
-
-def update_rankings_a_z_u(olympiad_id, zone_id):
-    """Updates rankings for zone - unofficial only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province__zone_id=zone_id,
-        is_official=False
-    ).order_by("-total"))
-
-    if not scores:
-        return
-
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.list_rank_z_u = lowest_rank + score_count - 1
-        sheet.ranking_a_z_u = lowest_rank
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_a_z_u", "list_rank_z_u"], batch_size=2000)
-
-def update_rankings_b(olympiad_id):
-    """Updates rankings_b (reverse ranking)."""
-    scores = list(ScoreSheet.objects.filter(olympiad_id=olympiad_id).order_by("total"))
-
-    if not scores:
-        return
-
-    count = len(scores)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.ranking_b = count - lowest_rank + 1
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_b"], batch_size=2000)
-
-def update_rankings_b_p(olympiad_id, province_id):
-    """Updates rankings_b_p for province - official only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province_id=province_id,
-        is_official=True
-    ).order_by("total"))
-
-    if not scores:
-        return
-
-    count = len(scores)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.ranking_b_p = count - lowest_rank + 1
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_b_p"], batch_size=2000)
-
-def update_rankings_b_p_all(olympiad_id, province_id):
-    """Updates rankings_b_p_all for province - all students."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province_id=province_id
-    ).order_by("total"))
-
-    if not scores:
-        return
-
-    count = len(scores)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.ranking_b_p_all = count - lowest_rank + 1
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_b_p_all"], batch_size=2000)
-
-def update_rankings_b_p_u(olympiad_id, province_id):
-    """Updates rankings_b_p_u for province - unofficial only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province_id=province_id,
-        is_official=False
-    ).order_by("total"))
-
-    if not scores:
-        return
-
-    count = len(scores)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.ranking_b_p_u = count - lowest_rank + 1
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_b_p_u"], batch_size=2000)
-
-def update_rankings_b_z(olympiad_id, zone_id):
-    """Updates rankings_b_z for zone - official only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province__zone_id=zone_id,
-        is_official=True
-    ).order_by("total"))
-
-    if not scores:
-        return
-
-    count = len(scores)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.ranking_b_z = count - lowest_rank + 1
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_b_z"], batch_size=2000)
-
-def update_rankings_b_z_all(olympiad_id, zone_id):
-    """Updates rankings_b_z_all for zone - all students."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province__zone_id=zone_id
-    ).order_by("total"))
-
-    if not scores:
-        return
-
-    count = len(scores)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.ranking_b_z_all = count - lowest_rank + 1
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_b_z_all"], batch_size=2000)
-
-def update_rankings_b_z_u(olympiad_id, zone_id):
-    """Updates rankings_b_z_u for zone - unofficial only."""
-    scores = list(ScoreSheet.objects.filter(
-        olympiad_id=olympiad_id,
-        school__province__zone_id=zone_id,
-        is_official=False
-    ).order_by("total"))
-
-    if not scores:
-        return
-
-    count = len(scores)
-    lowest_rank = 1
-    prev_score = None
-    score_count = 0
-
-    for sheet in scores:
-        if sheet.total != prev_score:
-            lowest_rank += score_count
-            score_count = 1
-        else:
-            score_count += 1
-
-        sheet.ranking_b_z_u = count - lowest_rank + 1
-        prev_score = sheet.total
-
-    ScoreSheet.objects.bulk_update(scores, ["ranking_b_z_u"], batch_size=2000)
-
-#sets rankings
-def update_all():
-    for olympiad in olympiads:
-        update_rankings_a(olympiad)
-        update_rankings_b(olympiad)
-        for province in provinces:
-            update_rankings_a_p(olympiad,province)
-            update_rankings_b_p(olympiad,province)
-        for zone in zones:
-            update_rankings_a_z(olympiad,zone)
-            update_rankings_b_z(olympiad,zone)
+    with transaction.atomic():
+        Olympiad.objects.select_for_update().filter(pk=sheet.olympiad_id).exists()
+        # Түгжээний дараа дахин уншина - хооронд нь өөр засвар орсон байж болно
+        previous = _ranking_inputs(sheet.pk) if sheet.pk else None
+        changed = _inputs_changed(sheet, previous)
+        # Олимпиадын бүх мөр шинэчлэгдэх тул signals.scoresheet_changed энэ сурагчийнхыг тусад нь хийхгүй
+        sheet._refresh_olympiad_achievements = changed
+        save()
+        if not changed:
+            return
+        update_sheet_rankings(sheet, previous)
+        # Бусад сурагчдын эрэмбэ шилжсэн
+        schedule_achievements_refresh(sheet.olympiad_id)
@@ -28,7 +28,7 @@
 дамжин өрсөлдсөн (аймгийн сургуультай) сурагч агуулж болзошгүй.
 
 Тиймээс round=3-ийн БҮХ объектыг (нийслэл + бүс) нэгтгээд, тэднээс аль хэдийн
-тооцогдсон `ranking_b_z` талбарыг ашиглана (ranking.py: update_rankings_b_z,
+тооцогдсон `ranking_b_z` талбарыг ашиглана (ranking.py: update_olympiad_rankings,
 "тэнцвэл цөөнийг сонгоно" дүрмээр тооцогддог тул дахин тооцох шаардлагагүй) —
 ГЭХДЭЭ уг талбар олимпиадад ОРШИХ БҮХ зон (1-5) бүрд тус тусад нь тооцогддог тул
 ЗААВАЛ `school__province__zone_id=CAPITAL_ZONE_ID` шүүлттэй ХАМТ хэрэглэнэ (доор,
@@ -71,8 +71,8 @@ def round3_topn_by_district(round3_olympiads, quota_n):
     хуучин ганц хосолсон) аль хэдийн тооцогдсон `ranking_b_z` талбарыг ашиглаж,
     зөвхөн нийслэлийн дүүргийн (zone_id=5) Top N-д орсныг дүүргээр бүлэглэж тоолно.
 
-    `ranking_b_z` нь ЗОНЫ ДОТООД байр — ranking.py-ийн update_rankings_b_z(olympiad_id,
-    zone_id) олимпиадад ОРШИХ БҮХ зоны хувьд (1-5) тус тусад нь дуудагддаг тул нэг
+    `ranking_b_z` нь ЗОНЫ ДОТООД байр — ranking.py-ийн update_olympiad_rankings(olympiad_id)
+    олимпиадад ОРШИХ БҮХ зоны хувьд (1-5) тус тусад нь бүлэглэж тооцдог тул нэг
     ScoreSheet-ийн ranking_b_z нь зөвхөн ӨӨРИЙН зон дотор хэддүгээрт орсныг заана —
     өөр зоны 1-10-т орсон хүмүүс ч мөн адил ranking_b_z=1..10 утгатай байдаг. Тиймээс
     `ranking_b_z<=quota_n` шүүлтийг ЗААВАЛ `school__province__zone_id=CAPITAL_ZONE_ID`
@@ -0,0 +1,184 @@
+"""
+Тест олимпиадын оноо тооцох нэгдсэн engine (calculate_scores, views_admin.update_results).
+
+Нэг олимпиадыг нэг transaction дотор, мөр бүрээр Python руу татахгүйгээр тооцно:
+  1. Result.score - бүх бодлогыг нэг UPDATE-ээр:
+       * тоон хариулт: numerical_answer эсвэл numerical_answer2-тэй тэнцвэл max_score
+       * AnswerChoice-той бодлого: сонгох (type=1) бол answer = choice.order,
+         бусад үед answer = choice.value таарсан сонголтын points
+     Хоёулаа таарвал их оноог авна.
+  2. ScoreSheet.s1..s20, total - оролцогч бүрийн оноог нэгтгэж UPDATE, байхгүйг нь INSERT.
+  3. Эрэмбэ (update_olympiad_rankings), commit-ийн дараа cache хүчингүй болгох.
+"""
+from django.db import connection, transaction
+
+from ..models import AnswerChoice, Olympiad, Problem, Result, ScoreSheet
+from accounts.models import UserMeta
+from .answer_buffer import flush_answers
+from .achievements import schedule_achievements_refresh
+from .caching import invalidate_olympiad_cache
+from .participation import schedule_participation_refresh
+from .ranking import update_olympiad_rankings
+
+SCORE_FIELDS = [f's{i}' for i in range(1, 21)]
+
+
+def _tables():
+    return {
+        'result': Result._meta.db_table,
+        'problem': Problem._meta.db_table,
+        'choice': AnswerChoice._meta.db_table,
+        'sheet': ScoreSheet._meta.db_table,
+        'meta': UserMeta._meta.db_table,
+    }
+
+
+SCORE_RESULTS_SQL = '''
+    UPDATE {result} r
+    SET score = GREATEST(
+            CASE
+                WHEN r.answer IS NOT NULL AND (r.answer = p.numerical_answer OR r.answer = p.numerical_answer2)
+                THEN p.max_score
+                ELSE 0
+            END,
+            COALESCE((
+                SELECT MAX(c.points)
+                FROM {choice} c
+                WHERE c.problem_id = p.id
+                  AND r.answer IS NOT NULL
+                  AND ((p.type = 1 AND c."order" = r.answer)
+                       OR (p.type <> 1 AND TRIM(c.value) = r.answer::text))
+            ), 0)
+        ){state_sql}
+    FROM {problem} p
+    WHERE r.problem_id = p.id
+      AND r.olympiad_id = %s
+'''
+
+# Оролцогч бүрийн s1..s20 (давхардсан Result байвал их оноо), total
+SHEET_SCORES_CTE = '''
+    WITH per_problem AS (
+        SELECT r.contestant_id AS user_id, {per_order}
+        FROM {result} r
+        JOIN {problem} p ON p.id = r.problem_id
+        WHERE r.olympiad_id = %s AND r.contestant_id IS NOT NULL
+        GROUP BY r.contestant_id
+    ),
+    agg AS (
+        SELECT user_id, {score_columns}, {total} AS total
+        FROM per_problem
+    )
+'''
+
+UPDATE_SHEETS_SQL = '''
+    UPDATE {sheet} ss
+    SET {assignments}, total = agg.total,
+        school_id = COALESCE(ss.school_id, (SELECT m.school_id FROM {meta} m WHERE m.user_id = ss.user_id))
+    FROM agg
+    WHERE ss.olympiad_id = %s AND ss.user_id = agg.user_id
+'''
+
+INSERT_SHEETS_SQL = '''
+    INSERT INTO {sheet} (user_id, olympiad_id, school_id, {score_columns}, total{default_columns})
+    SELECT agg.user_id, %s, m.school_id, {agg_scores}, agg.total{default_placeholders}
+    FROM agg
+    LEFT JOIN {meta} m ON m.user_id = agg.user_id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {sheet} ss WHERE ss.olympiad_id = %s AND ss.user_id = agg.user_id
+    )
+'''
+
+
+def _sheet_defaults():
+    """INSERT-д тооцоогүй ScoreSheet-ийн баганууд ба тэдгээрийн default утга (эрэмбэ, prizes...)."""
+    computed = {'id', 'user', 'olympiad', 'school', 'total', *SCORE_FIELDS}
+    return [
+        (field.column, field.get_default())
+        for field in ScoreSheet._meta.concrete_fields
+        if field.name not in computed
+    ]
+
+
+def upsert_scoresheets(olympiad_id):
+    """Result.score-ийг бодлогын дугаараар DB дотор pivot хийж ScoreSheet-үүдэд бичнэ.
+
+    Байгаа онооны хуудсын s1..s20, total-ыг шинэчилж (school хоосон бол UserMeta-аас),
+    байхгүйг нь үүсгэнэ. Python руу мөр татахгүй тул санах ой оролцогчийн тооноос хамаарахгүй.
+    Буцаана: (шинэчлэгдсэн, үүссэн) онооны хуудасны тоо.
+    """
+    tables = _tables()
+    per_order = ', '.join(
+        f'MAX(r.score) FILTER (WHERE p."order" = {i}) AS s{i}' for i in range(1, 21)
+    )
+    cte = SHEET_SCORES_CTE.format(
+        per_order=per_order,
+        score_columns=', '.join(f'COALESCE({f}, 0) AS {f}' for f in SCORE_FIELDS),
+        total=' + '.join(f'COALESCE({f}, 0)' for f in SCORE_FIELDS),
+        **tables,
+    )
+    defaults = _sheet_defaults()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            cte + UPDATE_SHEETS_SQL.format(
+                assignments=', '.join(f'{f} = agg.{f}' for f in SCORE_FIELDS),
+                **tables,
+            ),
+            [olympiad_id, olympiad_id],
+        )
+        sheets_updated = cursor.rowcount
+
+        cursor.execute(
+            cte + INSERT_SHEETS_SQL.format(
+                score_columns=', '.join(SCORE_FIELDS),
+                agg_scores=', '.join(f'agg.{f}' for f in SCORE_FIELDS),
+                default_columns=''.join(f', {column}' for column, _ in defaults),
+                default_placeholders=', %s' * len(defaults),
+                **tables,
+            ),
+            [olympiad_id, olympiad_id] + [value for _, value in defaults] + [olympiad_id],
+        )
+        sheets_created = cursor.rowcount
+
+    return sheets_updated, sheets_created
+
+
+def score_olympiad(olympiad_id, state=None):
+    """Олимпиадын Result-уудын оноо, ScoreSheet, эрэмбийг нэг transaction-д тооцно.
+
+    state: өгвөл бүх Result-ийн төлвийг үүгээр солино (жиш: Result.States.finalized).
+    Буцаана: {'scored', 'correct', 'sheets_updated', 'sheets_created', 'ranked'}.
+    """
+    olympiad = Olympiad.objects.get(pk=olympiad_id)
+
+    # Auto-save буферт үлдсэн хариултуудыг эхлээд бичих
+    flush_answers(olympiad_id)
+
+    tables = _tables()
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            state_sql = ', state = %s' if state is not None else ''
+            params = ([state] if state is not None else []) + [olympiad_id]
+            cursor.execute(SCORE_RESULTS_SQL.format(state_sql=state_sql, **tables), params)
+            scored = cursor.rowcount
+
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {tables["result"]} WHERE olympiad_id = %s AND score > 0',
+                [olympiad_id],
+            )
+            correct = cursor.fetchone()[0]
+
+        sheets_updated, sheets_created = upsert_scoresheets(olympiad_id)
+        ranked = update_olympiad_rankings(olympiad_id)
+        transaction.on_commit(lambda: invalidate_olympiad_cache(olympiad_id, olympiad.school_year_id))
+        schedule_participation_refresh(olympiad_id)
+        schedule_achievements_refresh(olympiad_id)
+
+    return {
+        'scored': scored,
+        'correct': correct,
+        'sheets_updated': sheets_updated,
+        'sheets_created': sheets_created,
+        'ranked': ranked,
+    }
@@ -0,0 +1,259 @@
+"""
+Нэгдсэн дүнгийн хуудасны (olympiad_results) бэлэн snapshot-ууд.
+
+generate_scoresheets-ийн дараа олимпиадын бүх жагсаалтыг (улс / аймаг / бүс ×
+official шүүлт × 0 оноо харуулах эсэх) нэг удаа тооцоолж, local диск дээр өөрчлөгдөшгүй
+файл болгон бичнэ. Хуудас бүр нэг мөр (JSON массив) бөгөөд `.idx` файлд мөр бүрийн
+байт offset хадгалагдах тул нэг хуудсыг SQL-гүйгээр, хуудасны хэмжээтэй пропорциональ
+уншилтаар авна.
+
+Бүтэц:
+    <RESULTS_SNAPSHOT_DIR>/<olympiad_id>/CURRENT          - идэвхтэй хувилбарын мэдээлэл (JSON)
+    <RESULTS_SNAPSHOT_DIR>/<olympiad_id>/<stamp>/<combo>  - хуудаснууд (JSON мөрүүд)
+    <RESULTS_SNAPSHOT_DIR>/<olympiad_id>/<stamp>/<combo>.idx
+
+Snapshot нь олимпиадын DB дахь дүнгийн хувилбарыг (caching.results_version) агуулна. Дүн,
+эрэмбэ, шагнал засагдаж хувилбар солигдсон бол view нь ердийн замаар (DB + cache) ажиллаж,
+publish_results_task нь RESULTS_PUBLISH_DELAY секундын дараа snapshot-ийг дахин бичнэ
+(хоорондох олон засварыг нэг дахин бичилтээр).
+"""
+import json
+import os
+import shutil
+import time
+from array import array
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import Olympiad, ScoreSheet
+from .caching import results_version
+
+PAGE_SIZE = 50
+OFFICIAL_FILTERS = ('all', 'official', 'unofficial')
+KEEP_VERSIONS = 2  # уншиж байгаа хүсэлтүүдэд зориулж өмнөх хувилбарыг үлдээнэ
+PUBLISH_DELAY = getattr(settings, 'RESULTS_PUBLISH_DELAY', 30)
+
+
+def _root():
+    return Path(getattr(settings, 'RESULTS_SNAPSHOT_DIR', settings.BASE_DIR / 'snapshots' / 'results'))
+
+
+def _current(olympiad_id):
+    try:
+        return json.loads((_root() / str(olympiad_id) / 'CURRENT').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _rank_fields(scope, official_filter):
+    """olympiad_results view-тэй ижил дүрмээр (list_rank, ranking_a, ranking_b) талбарууд."""
+    if scope == 'national':
+        return 'list_rank', 'ranking_a', 'ranking_b'
+    prefix = 'p' if scope == 'province' else 'z'
+    suffix = {'official': '', 'unofficial': '_u', 'all': '_all'}[official_filter]
+    return f'list_rank_{prefix}{suffix}', f'ranking_a_{prefix}{suffix}', f'ranking_b_{prefix}{suffix}'
+
+
+def _combo_name(scope_key, official_filter, show_zero):
+    return f'{scope_key}_{official_filter}_{int(show_zero)}'
+
+
+def _write_pages(path, rows):
+    """Мөрүүдийг PAGE_SIZE-аар хуудаслаж, хуудас бүрийн offset-ийг .idx файлд бичнэ."""
+    offsets = array('q', [0])
+    with open(path, 'wb') as f:
+        for start in range(0, len(rows), PAGE_SIZE):
+            line = json.dumps(rows[start:start + PAGE_SIZE], ensure_ascii=False).encode('utf-8') + b'\n'
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    with open(f'{path}.idx', 'wb') as f:
+        offsets.tofile(f)
+
+
+def _load_rows(olympiad_id, problem_count):
+    score_fields = [f's{i}' for i in range(1, problem_count + 1)]
+    rank_fields = sorted({
+        field
+        for scope in ('national', 'province', 'zone')
+        for official_filter in OFFICIAL_FILTERS
+        for field in _rank_fields(scope, official_filter)
+    })
+    return list(ScoreSheet.objects.filter(olympiad_id=olympiad_id).values(
+        'id', 'user_id', 'user__last_name', 'user__first_name', 'school_id', 'school__name',
+        'school__province_id', 'school__province__name', 'school__province__zone_id',
+        'total', 'prizes', 'is_official', *score_fields, *rank_fields,
+    ))
+
+
+def _page_row(sheet, score_fields, list_field, a_field, b_field):
+    """olympiad_results-ийн score_data_list-ийн мөртэй ижил бүтэц."""
+    return {
+        'scoresheet_id': sheet['id'],
+        'list_rank': sheet[list_field],
+        'last_name': sheet['user__last_name'],
+        'first_name': sheet['user__first_name'],
+        'id': sheet['user_id'],
+        'province': sheet['school__province__name'] or '',
+        'school': {'id': sheet['school_id'], 'name': sheet['school__name']} if sheet['school_id'] else None,
+        'scores': [sheet[f] for f in score_fields],
+        'total': sheet['total'],
+        'ranking_a': sheet[a_field],
+        'ranking_b': sheet[b_field],
+        'prizes': sheet['prizes'],
+        'is_official': sheet['is_official'],
+    }
+
+
+def publish_results_snapshot(olympiad_id):
+    """Олимпиадын нэгдсэн дүнгийн бүх хуудсыг snapshot болгон бичнэ.
+
+    Хувилбарыг өгөгдлөөс ӨМНӨ уншина: бичих явцад засвар орвол snapshot хуучирсанд тооцогдож
+    дахин бичигдэнэ. Буцаана: бичигдсэн жагсаалтын (scope × шүүлт × show_zero) тоо.
+    """
+    version = results_version(olympiad_id)
+    olympiad = Olympiad.objects.get(pk=olympiad_id)
+    problem_count = olympiad.problem_set.count()
+    score_fields = [f's{i}' for i in range(1, problem_count + 1)]
+    sheets = _load_rows(olympiad_id, problem_count)
+
+    scopes = [('national', 'n', sheets)]
+    by_province, by_zone = {}, {}
+    for sheet in sheets:
+        if sheet['school__province_id'] is not None:
+            by_province.setdefault(sheet['school__province_id'], []).append(sheet)
+        if sheet['school__province__zone_id'] is not None:
+            by_zone.setdefault(sheet['school__province__zone_id'], []).append(sheet)
+    scopes += [('province', f'p{pid}', rows) for pid, rows in by_province.items()]
+    scopes += [('zone', f'z{zid}', rows) for zid, rows in by_zone.items()]
+
+    olympiad_dir = _root() / str(olympiad_id)
+    stamp = f'{int(time.time() * 1000)}'
+    target = olympiad_dir / stamp
+    target.mkdir(parents=True, exist_ok=True)
+
+    combo_count = 0
+    for scope, scope_key, scope_rows in scopes:
+        for official_filter in OFFICIAL_FILTERS:
+            list_field, a_field, b_field = _rank_fields(scope, official_filter)
+            rows = scope_rows
+            if official_filter != 'all':
+                rows = [s for s in rows if s['is_official'] == (official_filter == 'official')]
+            # PostgreSQL-ийн ORDER BY-тэй адил: NULL эрэмбэ сүүлд
+            rows = sorted(rows, key=lambda s: (
+                s[list_field] is None, s[list_field] or 0, -(s['total'] or 0),
+            ))
+            for show_zero in (False, True):
+                visible = rows if show_zero else [s for s in rows if s['total'] != 0]
+                page_rows = [_page_row(s, score_fields, list_field, a_field, b_field) for s in visible]
+                _write_pages(target / _combo_name(scope_key, official_filter, show_zero), page_rows)
+                combo_count += 1
+
+    # CURRENT-ийг атомаар солих
+    current = olympiad_dir / 'CURRENT'
+    tmp = olympiad_dir / f'CURRENT.{stamp}.tmp'
+    tmp.write_text(json.dumps({'dir': stamp, 'version': version, 'problem_range': problem_count + 1}))
+    os.replace(tmp, current)
+
+    # Хуучин хувилбаруудыг цэвэрлэх
+    versions = sorted((p for p in olympiad_dir.iterdir() if p.is_dir()), key=lambda p: p.name)
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    return combo_count
+
+
+def _pending_key(olympiad_id):
+    return f'results_publish_pending_{olympiad_id}'
+
+
+def schedule_results_publish(olympiad_id):
+    """Commit-ийн дараа publish_results_task-ийг товлоно (хүлээгдэж буй бол дахин товлохгүй)."""
+    from ..tasks import publish_results_task
+
+    def schedule():
+        if cache.add(_pending_key(olympiad_id), 1, PUBLISH_DELAY + 600):
+            publish_results_task.apply_async((olympiad_id,), countdown=PUBLISH_DELAY)
+
+    transaction.on_commit(schedule)
+
+
+def republish_results(olympiad_id):
+    """Өмнө нь бичигдсэн snapshot хуучирсан бол DB-ийн одоогийн хувилбараар дахин бичнэ.
+
+    Товлолтын түгжээг эхэндээ чөлөөлдөг тул бичих явцад орсон засвар шинэ task товлоно.
+    """
+    cache.delete(_pending_key(olympiad_id))
+    current = _current(olympiad_id)
+    if current is None or current.get('version') == results_version(olympiad_id):
+        return 0
+    return publish_results_snapshot(olympiad_id)
+
+
+def read_results_page(olympiad_id, province_id, zone_id, official_filter, show_zero, page_number):
+    """Snapshot-оос нэг хуудсыг уншина (olympiad_results-ийн cached_data бүтэцтэй).
+
+    Snapshot байхгүй, хуучирсан эсвэл параметр нь танигдахгүй бол None буцаана.
+    """
+    if official_filter not in OFFICIAL_FILTERS:
+        return None
+    if province_id != '0':
+        if not province_id.isdigit():
+            return None
+        scope_key = f'p{province_id}'
+    elif zone_id != '0':
+        if not zone_id.isdigit():
+            return None
+        scope_key = f'z{zone_id}'
+    else:
+        scope_key = 'n'
+
+    olympiad_dir = _root() / str(olympiad_id)
+    meta = _current(olympiad_id)
+    if meta is None:
+        return None
+    if meta.get('version') != results_version(olympiad_id):
+        # Товлолт алдагдсан ч дараагийн хүсэлтүүд snapshot-ийг дахин ашиглах боломжтой болно
+        schedule_results_publish(olympiad_id)
+        return None
+
+    path = olympiad_dir / meta['dir'] / _combo_name(scope_key, official_filter, show_zero)
+    try:
+        with open(f'{path}.idx', 'rb') as f:
+            offsets = array('q')
+            offsets.frombytes(f.read())
+        page_count = len(offsets) - 1
+        num_pages = max(page_count, 1)
+
+        # Paginator.get_page-тэй ижил: тоо биш бол 1, хязгаараас гадуур бол сүүлийн хуудас
+        try:
+            number = int(page_number)
+        except (TypeError, ValueError):
+            number = 1
+        if number < 1 or number > num_pages:
+            number = num_pages
+
+        rows = []
+        if page_count:
+            with open(path, 'rb') as f:
+                f.seek(offsets[number - 1])
+                rows = json.loads(f.read(offsets[number] - offsets[number - 1]))
+    except (OSError, ValueError):
+        # Хуучин хувилбар цэвэрлэгдсэн байж болно
+        return None
+
+    return {
+        'score_data_list': rows,
+        'number': number,
+        'has_previous': number > 1,
+        'has_next': number < num_pages,
+        'previous_page_number': number - 1 if number > 1 else None,
+        'next_page_number': number + 1 if number < num_pages else None,
+        'problem_range': meta['problem_range'],
+        'paginator': {
+            'num_pages': num_pages,
+            'page_range': list(range(1, num_pages + 1)),
+        },
+    }
@@ -0,0 +1,249 @@
+"""
+Олимпиадын статистикийн cube (first_round_stats, round2_summary_view, province_summary_view,
+olympiad_top_stats, problem_stats_view).
+
+Хуудас бүр аймаг × олимпиад, сургууль бүрээр COUNT/DISTINCT query давтахын оронд
+олимпиад бүрт нэг cube-ийг ScoreSheet ба Result дээрх цөөн grouped query-гээр барьж,
+олимпиадын хувилбартай cache түлхүүрт (caching.olympiad_cache_key) хадгална. Дүн
+өөрчлөгдөхөд (invalidate_olympiad_cache) түлхүүр солигдож cube дахин баригдана;
+generate_scoresheets-ийн дараа урьдчилан барина (warm_stats_cube).
+
+Cube-ийн бүтэц (бүх түлхүүр ID, None = тодорхойгүй):
+    sheets:        ScoreSheet-ийн мөрүүд (school_id, total, rank_a, rank_p, rank_z, count) -
+                   эрэмбийг RANK_BUCKETS-ээр бүлэглэсэн
+    schools:       {school_id: (name, province_id)}
+    provinces:     {province_id: (name, zone_id)}, zones: {zone_id: name}
+    participants:  Result-ийн оролцогчид сургууль бүрээр {school_id: {...}} ба аймаг бүрээр
+    problems:      {problem_id: {'scores': {score: count}, 'provinces': {province_id: [sum, count]}}}
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Max, Value, When
+
+from accounts.models import Province, Zone
+from schools.models import School
+
+from ..models import Result, ScoreSheet
+from .caching import RESULTS_CACHE_TIMEOUT, olympiad_cache_key, olympiad_cache_version
+
+# olympiad_top_stats-ийн босгууд: rank <= bucket
+RANK_BUCKETS = (10, 30, 50)
+
+
+def _rank_bucket(field):
+    """Эрэмбийг хамгийн бага тохирох босгоор бүлэглэнэ (0 = аль ч босгод багтахгүй)."""
+    return Case(
+        *[When(**{f'{field}__lte': bucket}, then=Value(bucket)) for bucket in RANK_BUCKETS],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def _build_sheets(olympiad_id):
+    return [
+        (row['school_id'], row['total'], row['rank_a'], row['rank_p'], row['rank_z'], row['n'])
+        for row in ScoreSheet.objects.filter(olympiad_id=olympiad_id)
+        .annotate(
+            rank_a=_rank_bucket('ranking_a'),
+            rank_p=_rank_bucket('ranking_a_p'),
+            rank_z=_rank_bucket('ranking_a_z'),
+        )
+        .values('school_id', 'total', 'rank_a', 'rank_p', 'rank_z')
+        .annotate(n=Count('id'))
+        .order_by()
+    ]
+
+
+def _build_participants(olympiad_id):
+    """Оролцогч бүрийн нэг мөр (сургууль, аймаг, хамгийн их оноо) -> сургууль, аймгийн тоонууд."""
+    by_school = defaultdict(lambda: {'students': 0, 'positive': 0})
+    by_province = defaultdict(lambda: {'students': 0, 'schools': set()})
+    total = 0
+    rows = (
+        Result.objects.filter(olympiad_id=olympiad_id)
+        .values('contestant_id', 'contestant__data__school_id', 'contestant__data__province_id')
+        .annotate(best=Max('score'))
+        .order_by()
+    )
+    for row in rows.iterator(chunk_size=5000):
+        total += 1
+        school_id = row['contestant__data__school_id']
+        province_id = row['contestant__data__province_id']
+
+        school = by_school[school_id]
+        school['students'] += 1
+        if row['best'] is not None and row['best'] > 0:
+            school['positive'] += 1
+
+        if province_id is not None:
+            province = by_province[province_id]
+            province['students'] += 1
+            if school_id is not None:
+                province['schools'].add(school_id)
+
+    return {
+        'total': total,
+        'schools': dict(by_school),
+        'provinces': {pid: {'students': p['students'], 'schools': len(p['schools'])} for pid, p in by_province.items()},
+    }
+
+
+def _build_problems(olympiad_id):
+    problems = defaultdict(lambda: {'scores': {}, 'provinces': {}})
+    rows = (
+        Result.objects.filter(olympiad_id=olympiad_id, score__isnull=False)
+        .values('problem_id', 'contestant__data__province_id', 'score')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in rows.iterator(chunk_size=5000):
+        problem = problems[row['problem_id']]
+        score, n = row['score'], row['n']
+        problem['scores'][score] = problem['scores'].get(score, 0) + n
+        province_id = row['contestant__data__province_id']
+        if province_id is not None:
+            bucket = problem['provinces'].setdefault(province_id, [0.0, 0])
+            bucket[0] += score * n
+            bucket[1] += n
+    return dict(problems)
+
+
+def build_stats_cube(olympiad_id):
+    """Cube-ийг DB-ээс барина (cache-гүй)."""
+    sheets = _build_sheets(olympiad_id)
+    participants = _build_participants(olympiad_id)
+
+    school_ids = {row[0] for row in sheets if row[0]} | {sid for sid in participants['schools'] if sid}
+    schools = {
+        s['id']: (s['name'], s['province_id'])
+        for s in School.objects.filter(id__in=school_ids).values('id', 'name', 'province_id')
+    }
+    return {
+        'version': olympiad_cache_version(olympiad_id),
+        'sheets': sheets,
+        'schools': schools,
+        'provinces': {p['id']: (p['name'], p['zone_id']) for p in Province.objects.values('id', 'name', 'zone_id')},
+        'zones': dict(Zone.objects.values_list('id', 'name')),
+        'participants': participants,
+        'problems': _build_problems(olympiad_id),
+    }
+
+
+def get_stats_cube(olympiad_id):
+    """Олимпиадын cube (cache-ээс, байхгүй бол барьж хадгална)."""
+    key = olympiad_cache_key(olympiad_id, 'stats_cube')
+    cube = cache.get(key)
+    if cube is None:
+        cube = build_stats_cube(olympiad_id)
+        cache.set(key, cube, RESULTS_CACHE_TIMEOUT)
+    return cube
+
+
+def warm_stats_cube(olympiad_id):
+    """generate_scoresheets-ийн дараа cube-ийг шинэ хувилбараар урьдчилан барина."""
+    cube = build_stats_cube(olympiad_id)
+    cache.set(olympiad_cache_key(olympiad_id, 'stats_cube'), cube, RESULTS_CACHE_TIMEOUT)
+    return cube
+
+
+# --- Унших функцууд ---
+
+def sheet_counts_by_province(cube):
+    """{province_id: ScoreSheet-ийн тоо} (сургуулийн аймгаар)."""
+    counts = defaultdict(int)
+    for school_id, _, _, _, _, n in cube['sheets']:
+        school = cube['schools'].get(school_id)
+        if school and school[1] is not None:
+            counts[school[1]] += n
+    return counts
+
+
+def top_stats(cube, province_id=None, zone_id=None, top_large=50, top_small=30):
+    """olympiad_top_stats-ийн тоонууд: province/zone-оор шүүж, харгалзах эрэмбээр."""
+    schools, provinces, zones = cube['schools'], cube['provinces'], cube['zones']
+    rank_index = 3 if province_id else 4 if zone_id else 2
+
+    large_count = small_count = 0
+    by_school, by_province, by_zone = defaultdict(int), defaultdict(int), defaultdict(int)
+    histogram = defaultdict(int)
+    for row in cube['sheets']:
+        school_id, total, n = row[0], row[1], row[5]
+        school_name, school_province = schools.get(school_id, (None, None))
+        province_name, school_zone = provinces.get(school_province, (None, None))
+        if province_id and school_province != province_id:
+            continue
+        if zone_id and school_zone != zone_id:
+            continue
+
+        histogram[total] += n
+        bucket = row[rank_index]
+        if bucket and bucket <= top_large:
+            large_count += n
+            by_school[school_name] += n
+        if bucket and bucket <= top_small:
+            small_count += n
+            by_province[province_name] += n
+            by_zone[zones.get(school_zone)] += n
+
+    def ranked(counts, key):
+        return [{key: name, 'count': count} for name, count in sorted(counts.items(), key=lambda item: -item[1])]
+
+    return {
+        'top_large_count': large_count,
+        'top_small_count': small_count,
+        'by_school': ranked(by_school, 'school__name'),
+        'by_province': ranked(by_province, 'school__province__name'),
+        'by_zone': ranked(by_zone, 'school__province__zone__name'),
+        'score_distribution': sorted(
+            ((total, count) for total, count in histogram.items() if total is not None), key=lambda item: item[0]
+        ),
+    }
+
+
+def problem_stats(cube, problem_id):
+    """problem_stats_view-ийн тоонууд."""
+    problem = cube['problems'].get(problem_id, {'scores': {}, 'provinces': {}})
+    scores = sorted(problem['scores'].items())
+    count = sum(n for _, n in scores)
+    province_stats = sorted(
+        (pid, total / n) for pid, (total, n) in problem['provinces'].items() if n
+    )
+    return {
+        'count': count,
+        'grouped': [{'score': score, 'score_count': n} for score, n in scores],
+        'stats': {
+            'avg': sum(score * n for score, n in scores) / count if count else None,
+            'max': scores[-1][0] if scores else None,
+            'min': scores[0][0] if scores else None,
+        },
+        'province_labels': [cube['provinces'].get(pid, ('',))[0] for pid, _ in province_stats],
+        'province_avg_scores': [round(avg, 2) for _, avg in province_stats],
+    }
+
+
+def round1_province_stats(olympiad_ids):
+    """1-р давааны олон олимпиадын аймаг бүрийн сургууль/сурагчийн давхардалгүй тоо.
+
+    Олимпиадууд хооронд сурагч давхардаж болох тул cube-уудыг нэмэхгүй, нэг grouped query-гээр
+    тоолно. Түлхүүр нь олимпиад бүрийн хувилбарыг агуулна.
+    """
+    olympiad_ids = sorted(olympiad_ids)
+    if len(olympiad_ids) == 1:
+        return get_stats_cube(olympiad_ids[0])['participants']['provinces']
+
+    versions = '_'.join(f'{oid}v{olympiad_cache_version(oid)}' for oid in olympiad_ids)
+    key = f'round1_province_stats_{versions}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = {
+            row['contestant__data__province_id']: {'students': row['students'], 'schools': row['schools']}
+            for row in Result.objects.filter(olympiad_id__in=olympiad_ids, contestant__data__province__isnull=False)
+            .values('contestant__data__province_id')
+            .annotate(
+                students=Count('contestant_id', distinct=True),
+                schools=Count('contestant__data__school_id', distinct=True),
+            )
+            .order_by()
+        }
+        cache.set(key, stats, RESULTS_CACHE_TIMEOUT)
+    return stats
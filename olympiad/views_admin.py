@@ -5,10 +5,13 @@ from django.db.models import Count, Avg, Max, Min, Q
 from django.core.paginator import Paginator
 from django.utils import timezone
 from django.core.cache import cache
+from .utils.caching import olympiad_cache_key, invalidate_olympiad_cache, RESULTS_CACHE_TIMEOUT
 from django.contrib.auth.models import User
 
 from .models import Olympiad, ScoreSheet, Result, SchoolYear, Upload, Problem, Topic
 from .forms import ChangeScoreSheetSchoolForm, ResultsGraderForm, UploadForm, ProblemEditForm
+from .utils.data import sync_scoresheet_score
+from .utils.scoring import score_olympiad
 
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
@@ -106,7 +109,7 @@ def problem_stats_view(request, problem_id):
 
 @login_required
 def olympiad_problem_stats(request, olympiad_id):
-    cache_key = f"olympiad_stats_{olympiad_id}"
+    cache_key = olympiad_cache_key(olympiad_id, 'stats')
     data = cache.get(cache_key)
 
     if not data:
@@ -147,7 +150,7 @@ def olympiad_problem_stats(request, olympiad_id):
             "olympiad": olympiad,
             "problem_stats": problem_stats,
         }
-        cache.set(cache_key, data, timeout=None)
+        cache.set(cache_key, data, timeout=RESULTS_CACHE_TIMEOUT)
 
     return render(request, "olympiad/results/olympiad_problem_stats.html", data)
 
@@ -164,6 +167,7 @@ def scoresheet_change_school(request, scoresheet_id):
             sheet.school = form.cleaned_data["school"]
             sheet.prizes = form.cleaned_data.get("prizes", "")
             sheet.save()
+            invalidate_olympiad_cache(sheet.olympiad_id)
             return redirect("olympiad_result_view", olympiad_id=sheet.olympiad_id)
     else:
         form = ChangeScoreSheetSchoolForm(initial={
@@ -375,6 +379,7 @@ def grade(request):
                 result.coordinator = request.user
                 result.state = 2
                 result.save()
+                sync_scoresheet_score(result)
                 url = reverse('olympiad_exam_grading', kwargs={'problem_id': result.problem.id})
                 url = url + '#result{}'.format(result.id)
                 return redirect(url)
@@ -389,15 +394,8 @@ def update_results(request, olympiad_id):
     # return HttpResponse('Edit update')
     olympiad = Olympiad.objects.filter(pk=olympiad_id, type=1).first()
     if olympiad:
-        with connection.cursor() as cursor:
-            cursor.execute("UPDATE olympiad_result SET score=0, state=5 WHERE olympiad_id=%s", [olympiad_id])
-            cursor.execute("UPDATE olympiad_result r \
-                            SET score = p.max_score \
-                            FROM olympiad_problem p \
-                            WHERE r.problem_id = p.id \
-                                AND (r.answer = p.numerical_answer OR \
-                                     (p.numerical_answer2 IS NOT NULL AND r.answer = p.numerical_answer2)) \
-                                AND p.olympiad_id = %s", [olympiad_id])
+        # Оноо, онооны хуудас, эрэмбийг нэг transaction-д
+        score_olympiad(olympiad_id, state=Result.States.finalized)
 
         # olympiad.json_results = to_json(olympiad_id)
         # olympiad.save()
@@ -11,6 +11,7 @@ import json
 from django.db import transaction
 
 from .models import Result, Olympiad
+from .utils.answer_buffer import AnswerBufferError, buffer_answer, flush_user_answers
 
 @method_decorator(csrf_exempt, name='dispatch')
 class SaveAnswerAPIView(LoginRequiredMixin, View):
@@ -23,39 +24,34 @@ class SaveAnswerAPIView(LoginRequiredMixin, View):
             result_id = data.get('result_id')
             answer = data.get('answer', '').strip()
 
-            # Result авах - зөвхөн хэрэглэгчийнхийг
-            try:
-                result = Result.objects.select_related('olympiad').get(
-                    pk=result_id,
-                    contestant=request.user
-                )
-            except Result.DoesNotExist:
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Хариулт олдсонгүй'
-                }, status=404)
-
-            # Олимпиад хаагдсан эсэхийг шалгах
-            if result.olympiad.is_closed():
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Хугацаа дууссан'
-                }, status=403)
-
-            # Хариултыг хадгалах
+            # Хариултыг шалгах
             if answer:
                 try:
-                    result.answer = int(answer)
+                    answer_value = int(answer)
                 except ValueError:
                     return JsonResponse({
                         'success': False,
                         'message': 'Зөвхөн тоо оруулна уу'
                     }, status=400)
             else:
-                result.answer = None
+                answer_value = None
+
+            # Буферт хадгалах (DB-д flush_answer_buffers task багцаар бичнэ)
+            status = buffer_answer(request.user.id, result_id, answer_value)
+            if status is None:
+                status = self.save_directly(request.user, result_id, answer_value)
+
+            if status == 'not_found':
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Хариулт олдсонгүй'
+                }, status=404)
 
-            # Зөвхөн answer талбарыг update хийх (хурдан)
-            result.save(update_fields=['answer'])
+            if status == 'closed':
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Хугацаа дууссан'
+                }, status=403)
 
             return JsonResponse({
                 'success': True,
@@ -76,6 +72,27 @@ class SaveAnswerAPIView(LoginRequiredMixin, View):
                 'message': 'Алдаа гарлаа'
             }, status=500)
 
+    @staticmethod
+    def save_directly(user, result_id, answer_value):
+        """Буфер ашиглах боломжгүй үед шууд DB-д хадгалах."""
+        # Result авах - зөвхөн хэрэглэгчийнхийг
+        try:
+            result = Result.objects.select_related('olympiad').get(
+                pk=result_id,
+                contestant=user
+            )
+        except Result.DoesNotExist:
+            return 'not_found'
+
+        # Олимпиад хаагдсан эсэхийг шалгах
+        if result.olympiad.is_closed():
+            return 'closed'
+
+        result.answer = answer_value
+        # Зөвхөн answer талбарыг update хийх (хурдан)
+        result.save(update_fields=['answer'])
+        return 'saved'
+
 # ========================================
 # БОНУС: Bulk save endpoint (нөөцөлж)
 # ========================================
@@ -107,6 +124,13 @@ class BulkSaveAnswersAPIView(LoginRequiredMixin, View):
             # Dictionary болгох (хурдан хандалт)
             results_dict = {r.id: r for r in results}
 
+            # Буфер дэх хуучин хариулт энэ хадгалалтыг дарж бичихгүйн тулд эхлээд flush хийх
+            by_olympiad = {}
+            for result in results_dict.values():
+                by_olympiad.setdefault(result.olympiad_id, []).append(result.id)
+            for olympiad_id, ids in by_olympiad.items():
+                flush_user_answers(olympiad_id, ids)
+
             # Update хийх
             updated_count = 0
             for answer_data in answers:
@@ -137,6 +161,12 @@ class BulkSaveAnswersAPIView(LoginRequiredMixin, View):
                 'message': f'{updated_count} хариулт хадгалагдлаа'
             })
 
+        except AnswerBufferError:
+            return JsonResponse({
+                'success': False,
+                'message': 'Түр алдаа гарлаа, дахин оролдоно уу'
+            }, status=503)
+
         except Exception as e:
             print(f"Error in BulkSaveAnswersAPIView: {e}")
             return JsonResponse({
@@ -12,6 +12,8 @@ from django.db import transaction
 from .models import Olympiad, Result, Upload
 from .forms import ResultsForm, UploadForm
 from .mixins import OlympiadAccessMixin, ResultsEnsureMixin
+from .utils.answer_buffer import AnswerBufferError, apply_buffered_answers, flush_user_answers
+from .utils.manifest import is_group_member
 
 
 # ----------------------------
@@ -36,12 +38,15 @@ class StudentQuizView(LoginRequiredMixin, OlympiadAccessMixin, ResultsEnsureMixi
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs['queryset'] = self.get_queryset()
+        queryset = self.get_queryset()
+        # Auto-save-ийн буферт байгаа хариултуудыг форм дээр харуулах (queryset-ийн cache дээр)
+        apply_buffered_answers(self.olympiad.id, queryset)
+        kwargs['queryset'] = queryset
         return kwargs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['items'] = self.get_queryset()
+        context['items'] = apply_buffered_answers(self.olympiad.id, self.get_queryset())
         context['olympiad'] = self.olympiad
         context['contestant'] = self.request.user
         return context
@@ -52,6 +57,13 @@ class StudentQuizView(LoginRequiredMixin, OlympiadAccessMixin, ResultsEnsureMixi
             messages.error(self.request, 'Хариулт авах хугацаа дууссан.')
             return redirect('olympiad_end', olympiad_id=self.olympiad.id)
 
+        # Энэ сурагчийн буфер дэх хариултуудыг эхлээд бичнэ (хуучин утга энэ хадгалалтыг дарахгүйн тулд)
+        try:
+            flush_user_answers(self.olympiad.id, [result_form.instance.pk for result_form in form])
+        except AnswerBufferError:
+            messages.error(self.request, 'Хариултыг хадгалж чадсангүй. Дахин илгээнэ үү.')
+            return self.render_to_response(self.get_context_data(form=form))
+
         # Өөрчлөгдсөн мөрүүдийг л нэг дор шинэчилнэ
         with transaction.atomic():
             results_to_update = []
@@ -191,7 +203,7 @@ class StudentSupplementView(OlympiadAccessMixin, LoginRequiredMixin, ResultsEnsu
         olympiad = self.olympiad  # Эцэг mixin-ийн dispatch үүнийг оноосон
 
         # 1. Групп шалгах
-        if olympiad.group and user not in olympiad.group.user_set.all():
+        if not is_group_member(olympiad, user):
             messages.info(
                 self.request,
                 f"Зөвхөн '{olympiad.group.name}' бүлгийн сурагчид оролцох боломжтой"
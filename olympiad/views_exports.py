@@ -0,0 +1,76 @@
+"""
+Ард талд үүсгэгдэх экспортын төлөв ба татах хуудсууд (olympiad/utils/export_jobs.py).
+
+Экспорт эхлүүлэх view эрхийг шалгаад гарын үсэгтэй token олгоно. Token нь зөвхөн ажлыг
+заана: төлөв ба татах хуудас тухайн төрлийн can_access-аар (export_jobs.register_export)
+хэрэглэгчийн эрхийг дахин шалгах тул холбоос бусдад дамжсан ч файл нээгдэхгүй.
+"""
+from django.contrib.auth.decorators import login_required
+from django.core import signing
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+
+from .models import ExportJob
+from .utils.export_jobs import request_export, user_can_access
+
+TOKEN_SALT = 'olympiad.export_job'
+TOKEN_MAX_AGE = 24 * 3600
+
+
+def start_export(request, kind, params):
+    """Экспортын ажлыг эхлүүлж (эсвэл бэлэн ажлыг олж) төлвийн хуудас руу шилжүүлнэ.
+
+    Дуудахаас өмнө view нь эрхийг шалгаж, ойлгомжтой мэдэгдэл харуулсан байх ёстой.
+    """
+    if not user_can_access(request.user, kind, params):
+        raise PermissionDenied
+    job = request_export(kind, params, user=request.user)
+    token = signing.dumps(job.id, salt=TOKEN_SALT)
+    return redirect('export_job_status', token=token)
+
+
+def _get_job(request, token):
+    """Token-ы ажил. Хэрэглэгч тухайн экспортын эрхгүй бол 403."""
+    try:
+        job_id = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        raise Http404
+    job = get_object_or_404(ExportJob, pk=job_id)
+    if not user_can_access(request.user, job.kind, job.params):
+        raise PermissionDenied
+    return job
+
+
+@login_required
+def export_job_status(request, token):
+    """Экспортын явц. ?format=json бол JSON (polling), эс бөгөөс автоматаар шинэчлэгдэх хуудас."""
+    job = _get_job(request, token)
+    download_url = reverse('export_job_download', args=[token]) if job.status == ExportJob.Status.DONE else None
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'status': job.status,
+            'progress': job.progress,
+            'total': job.total,
+            'download_url': download_url,
+            'error': job.error if job.status == ExportJob.Status.FAILED else '',
+        })
+
+    percent = min(100, job.progress * 100 // job.total) if job.total else 0
+    context = {
+        'job': job,
+        'download_url': download_url,
+        'percent': percent,
+        'in_progress': job.status in (ExportJob.Status.PENDING, ExportJob.Status.RUNNING),
+    }
+    return render(request, 'olympiad/export_job.html', context)
+
+
+@login_required
+def export_job_download(request, token):
+    job = _get_job(request, token)
+    if job.status != ExportJob.Status.DONE or not job.file:
+        return redirect('export_job_status', token=token)
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename)
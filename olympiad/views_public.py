@@ -7,8 +7,10 @@ from olympiad.models import SchoolYear, ScoreSheet, Olympiad, Problem, Topic, Ro
 from olympiad.utils.round2_quota import compute_school_quota_table
 from olympiad.utils.round3_quota import compute_district_quota_table, get_capital_districts
 from accounts.models import Province
-from django.db.models import Q, Count
+from django.db.models import Q
 from django.core.cache import cache
+from olympiad.utils.caching import school_year_cache_key, RESULTS_CACHE_TIMEOUT
+from olympiad.utils.stats_cube import get_stats_cube, top_stats
 
 
 def _round1_student_status(user):
@@ -85,7 +87,7 @@ def get_capital_quota_tables(selected_year, force_update=False):
     (ангилал бүрээр, D/E/F/S/T) буцаана — round3_district_quota_view (дэлгэрэнгүй
     "Хотын эрхийн дэвтэр") болон round_guideline_view (round=3 хуудасны товч
     хүснэгт) хоёулаа ашигладаг тул кэштэй хамт нэг дор."""
-    cache_key = f"round3_district_quota_{selected_year.id}"
+    cache_key = school_year_cache_key(selected_year.id, 'round3_district_quota')
     cached = None if force_update else cache.get(cache_key)
     if cached is not None:
         return cached
@@ -103,9 +105,9 @@ def get_capital_quota_tables(selected_year, force_update=False):
         if table:
             quota_tables.append({'level': o.level, **table})
 
-    # Хугацаагүй хадгална: зөвхөн generate_scoresheets команд (cache.clear() дуудна)
-    # эсвэл ?clean=1-ээр хүчээр шинэчлэгдэх үед л өөрчлөгдөнө.
-    cache.set(cache_key, quota_tables, None)
+    # generate_scoresheets команд (жилийн cache хувилбарыг солино) эсвэл ?clean=1-ээр
+    # хүчээр шинэчлэгдэх үед л өөрчлөгдөнө.
+    cache.set(cache_key, quota_tables, RESULTS_CACHE_TIMEOUT)
     return quota_tables
 
 
@@ -282,7 +284,7 @@ def round2_quota_summary_view(request):
 
     if selected_year:
         force_update = request.GET.get('clean', '0') == '1'
-        cache_key = f"round2_quota_summary_{selected_year.id}"
+        cache_key = school_year_cache_key(selected_year.id, 'round2_quota_summary')
         cached = None if force_update else cache.get(cache_key)
 
         if cached:
@@ -333,9 +335,9 @@ def round2_quota_summary_view(request):
             max_aimag = max([e['additional_total'] for e in aimags], default=0) or 1
             max_duureg = max([e['additional_total'] for e in duuregs], default=0) or 1
 
-            # Хугацаагүй хадгална: энэ өгөгдөл зөвхөн generate_scoresheets команд (cache.clear()
-            # дуудна) эсвэл ?clean=1-ээр хүчээр шинэчлэгдэх үед л өөрчлөгдөнө.
-            cache.set(cache_key, (levels, aimags, duuregs, grand, max_aimag, max_duureg), None)
+            # Энэ өгөгдөл зөвхөн generate_scoresheets команд (жилийн cache хувилбарыг солино)
+            # эсвэл ?clean=1-ээр хүчээр шинэчлэгдэх үед л өөрчлөгдөнө.
+            cache.set(cache_key, (levels, aimags, duuregs, grand, max_aimag, max_duureg), RESULTS_CACHE_TIMEOUT)
 
     context = {
         'year': selected_year,
@@ -501,60 +503,45 @@ def olympiad_top_stats(request, olympiad_id):
     province_id = request.GET.get("p", "0").strip()
     zone_id = request.GET.get("z", "0").strip()
 
-    scoresheets = ScoreSheet.objects.filter(olympiad=olympiad)
-
     # --- аль ranking багана ашиглахыг шийдэх ---
     if province_id != "0":
-        scoresheets = scoresheets.filter(school__province_id=province_id)
         rank_field = "ranking_a_p"
     elif zone_id != "0":
-        scoresheets = scoresheets.filter(school__province__zone_id=zone_id)
         rank_field = "ranking_a_z"
     else:
         rank_field = "ranking_a"
 
-    scoresheets = scoresheets.order_by(rank_field)
-
-    if olympiad.level.id in [2,3,4,5]:
+    if olympiad.level_id in [2,3,4,5]:
         # Эхний 50 ба эхний 30-г тасалж авах
-        top50 = scoresheets.filter(**{f"{rank_field}__lte": 50})
-        top30 = scoresheets.filter(**{f"{rank_field}__lte": 30})
-        top_name_50 = '50'
-        top_name_30 = '30'
+        top_large, top_small = 50, 30
     else:
-        top50 = scoresheets.filter(**{f"{rank_field}__lte": 30})
-        top30 = scoresheets.filter(**{f"{rank_field}__lte": 10})
-        top_name_50 = '30'
-        top_name_30 = '10'
-
-    # --- Нэмэлтээр нийт тоог авах ---
-    top50_count = top50.count()
-    top30_count = top30.count()
-
-    # Статистикууд
-    top50_by_school = top50.values("school__name").annotate(count=Count("id")).order_by("-count")
-    top30_by_province = top30.values("school__province__name").annotate(count=Count("id")).order_by("-count")
-    top30_by_zone = top30.values("school__province__zone__name").annotate(count=Count("id")).order_by("-count")
+        top_large, top_small = 30, 10
 
-    # Нийлбэр онооны тархалт (гистограмм)
-    score_distribution = scoresheets.values('total').annotate(count=Count('id')).order_by('total')
+    # Тоонуудыг олимпиадын статистикийн cube-ээс (DB query-гүй)
+    stats = top_stats(
+        get_stats_cube(olympiad.id),
+        province_id=int(province_id) if province_id != "0" else None,
+        zone_id=int(zone_id) if province_id == "0" and zone_id != "0" else None,
+        top_large=top_large,
+        top_small=top_small,
+    )
 
     # Chart.js-д зориулсан өгөгдөл бэлтгэх
-    score_labels = [str(int(item['total'])) for item in score_distribution]
-    score_counts = [item['count'] for item in score_distribution]
+    score_labels = [str(int(total)) for total, _ in stats['score_distribution']]
+    score_counts = [count for _, count in stats['score_distribution']]
 
     context = {
         "olympiad": olympiad,
-        "top50_by_school": top50_by_school,
-        "top30_by_province": top30_by_province,
-        "top30_by_zone": top30_by_zone,
+        "top50_by_school": stats['by_school'],
+        "top30_by_province": stats['by_province'],
+        "top30_by_zone": stats['by_zone'],
         "selected_province": province_id,
         "selected_zone": zone_id,
         "rank_field": rank_field,
-        "top50_count": top50_count,
-        "top30_count": top30_count,
-        "top_name_50": top_name_50,
-        "top_name_30": top_name_30,
+        "top50_count": stats['top_large_count'],
+        "top30_count": stats['top_small_count'],
+        "top_name_50": str(top_large),
+        "top_name_30": str(top_small),
         "score_labels": score_labels,
         "score_counts": score_counts,
     }
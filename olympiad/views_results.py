@@ -1,19 +1,25 @@
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Avg, Max, Min
 from django.core.paginator import Paginator
 from datetime import datetime, timezone
-from .models import Olympiad, Problem, Result, SchoolYear, ScoreSheet, OlympiadGroup
+from .models import Olympiad, Problem, Result, SchoolYear, ScoreSheet, OlympiadGroup, SchoolParticipation
 from django_pandas.io import read_frame
 from accounts.models import Province
 from schools.models import School
 from django.contrib.auth.models import User
 import pandas as pd
 import numpy as np
-import re
 
 from django.core.cache import cache
+from .utils.caching import olympiad_cache_key
+from .utils.achievements import user_achievements
+from .utils.answer_matrix import load_answer_matrix, render_answers_table
+from .utils.participation import refresh_school_participation, sample_table_html
+from .utils.snapshots import read_results_page
+from .utils.stats_cube import (
+    get_stats_cube, problem_stats, round1_province_stats, sheet_counts_by_province,
+)
 
 
 
@@ -77,13 +83,15 @@ def olympiad_results(request, olympiad_id):
     force_update = request.GET.get('clean', '0') == '1'
 
     # --- cache key үүсгэх ---
-    cache_key = f"scores_{olympiad_id}_{province_id}_{zone_id}_{page_number}_{show_all}_{official_filter}_{show_zero}"
+    cache_key = olympiad_cache_key(olympiad_id, 'scores', province_id, zone_id, page_number, show_all, official_filter, show_zero)
 
     cached_data = None
 
-    # --- 2. 'force_update' ХИЙГЭЭГҮЙ үед л cache-с унших ---
+    # --- 2. 'force_update' ХИЙГЭЭГҮЙ үед л snapshot, дараа нь cache-с унших ---
     if not force_update:
-        cached_data = cache.get(cache_key)
+        cached_data = read_results_page(olympiad_id, province_id, zone_id, official_filter, show_zero, page_number)
+        if not cached_data:
+            cached_data = cache.get(cache_key)
 
     # --- 3. Cache-д байхгүй ЭСВЭЛ 'force_update=1' үед ---
     if not cached_data:
@@ -240,31 +248,8 @@ def student_result_view(request, olympiad_id, contestant_id):
 @login_required
 def problem_stats_view(request, problem_id):
     problem = get_object_or_404(Problem, pk=problem_id)
-    results = Result.objects.filter(problem=problem, score__isnull=False)
-
-    grouped = (results.values('score')
-               .annotate(score_count=Count('score'))
-               .order_by('score'))
-
-    stats = results.aggregate(
-        avg=Avg('score'),
-        max=Max('score'),
-        min=Min('score')
-    )
-
-        # --- ШИНЭ ХЭСЭГ: АЙМАГ БҮРЭЭР ДУНДАЖ ОНООГ ТООЦООЛОХ ---
-    province_stats = (
-        results.values('contestant__data__province', 'contestant__data__province__name')
-        .annotate(average_score=Avg('score'))
-        .exclude(contestant__data__province__isnull=True)
-        .order_by('contestant__data__province')
-    )
-
-    province_labels = [entry['contestant__data__province__name'] for entry in province_stats]
-    province_avg_scores = [round(entry['average_score'], 2) for entry in province_stats]
-
-
-
+    # Онооны тархалт, аймгийн дундажийг олимпиадын статистикийн cube-ээс авна
+    stats = problem_stats(get_stats_cube(problem.olympiad_id), problem.id)
 
     # --- Дараагийн болон өмнөх бодлогын id олох ---
     next_problem = (Problem.objects
@@ -278,14 +263,14 @@ def problem_stats_view(request, problem_id):
 
     context = {
         'problem': problem,
-        'count': results.count(),
-        'results_grouped': grouped,
-        'stats': stats,
+        'count': stats['count'],
+        'results_grouped': stats['grouped'],
+        'stats': stats['stats'],
         'next_problem': next_problem,
         'prev_problem': prev_problem,
         # Chart.js-д зориулсан шинэ өгөгдөл
-        'province_labels': province_labels,
-        'province_avg_scores': province_avg_scores,
+        'province_labels': stats['province_labels'],
+        'province_avg_scores': stats['province_avg_scores'],
     }
     # print(context)
     return render(request, 'olympiad/stats/problem_stats.html', context)
@@ -375,6 +360,7 @@ def answers_view(request, olympiad_id):
             top_n = None
     school = None
     context_data = ''
+    preparing = False
 
     try:
         olympiad = Olympiad.objects.get(pk=olympiad_id)
@@ -390,88 +376,17 @@ def answers_view(request, olympiad_id):
         except School.DoesNotExist:
             school = None
 
-        results = Result.objects.filter(olympiad_id=olympiad_id, contestant__data__school_id=sid)
-
-        if results.exists():
-            # Хариулт болон оноог хамт авах
-            rows = list(results.values_list('contestant_id', 'problem_id', 'answer', 'score'))
-            data = pd.DataFrame(rows, columns=['contestant_id', 'problem_id', 'answer', 'score'])
-
-            # Хариултын хүснэгт
-            results_df = pd.pivot_table(data, index='contestant_id', columns='problem_id', values='answer', aggfunc='sum')
-
-            # Онооны хүснэгт (нийлбэр тооцоход)
-            score_df = pd.pivot_table(data, index='contestant_id', columns='problem_id', values='score', aggfunc='sum', fill_value=0)
-
-            problem_ids = results_df.columns.values
-            problem_orders = {p.id: f'№{p.order:02d}' for p in Problem.objects.filter(id__in=problem_ids)}
-
-            # Баганын нэрийг солих (results_df болон score_df хоёуланд)
-            col_mapping = {col: problem_orders.get(col, 'Unknown') for col in results_df.columns}
-            results_df.columns = [col_mapping[col] for col in results_df.columns]
-            score_df.columns = [col_mapping.get(col, col) for col in score_df.columns]
-
-            results_df = results_df[sorted(results_df.columns)]
-            score_df = score_df[[col for col in sorted(results_df.columns) if col in score_df.columns]]
-
-            # Нийт оноо нэмэх
-            results_df['Нийт'] = score_df.sum(axis=1)
-
-            contestant_ids = list(results_df.index)
-            contestants_data = User.objects.filter(pk__in=contestant_ids).values('id', 'last_name', 'first_name')
-            user_df = pd.DataFrame(list(contestants_data))
-            user_df.columns = ['ID', 'Овог', 'Нэр']
-
-            user_results_df = pd.merge(user_df, results_df, left_on='ID', right_index=True, how='left')
-
-            # Оноог мөн merge хийх (өнгө тодорхойлоход хэрэглэнэ)
-            score_df_merged = pd.merge(user_df[['ID']], score_df, left_on='ID', right_index=True, how='left')
-
-            # Нийт оноогоор буурахаар эрэмбэлэх
-            sorted_df = user_results_df.sort_values(
-                by=['Нийт', 'Овог', 'Нэр'],
-                ascending=[False, True, True]
-            )
-
-            # Top N сурагчаар хязгаарлах
-            if top_n and top_n > 0:
-                sorted_df = sorted_df.head(top_n)
-
-            score_df_merged = score_df_merged.loc[sorted_df.index]
-
-            score_df_merged = score_df_merged.drop(columns=['ID'])
-
-            sorted_df.index = np.arange(1, len(sorted_df) + 1)
-            score_df_merged.index = sorted_df.index
-
-            # Тоон багануудын жагсаалт
-            numeric_columns = [col for col in sorted_df.columns if str(col).startswith('№')]
-
-            # Форматчилах функц
-            formatter = lambda val: '{:.0f}'.format(val) if val > 0 else '---'
-
-            # Зөв хариултыг ногоон суурь өнгөөр тодруулах
-            def highlight_correct(val, score_val):
-                if pd.isna(score_val) or score_val == 0:
-                    return ''
-                return 'background-color: #d4edda'  # Ногоон
-
-            def apply_highlights(row):
-                styles = [''] * len(row)
-                for i, col in enumerate(row.index):
-                    if col in numeric_columns and col in score_df_merged.columns:
-                        score_val = score_df_merged.loc[row.name, col]
-                        if not pd.isna(score_val) and score_val > 0:
-                            styles[i] = 'background-color: #d4edda'
-                return styles
-
-            # HTML руу хөрвүүлэх
-            styled_df = (sorted_df.style
-                                  .apply(apply_highlights, axis=1)
-                                  .format(formatter, subset=numeric_columns, na_rep="-")
-                                  .format('{:.1f}'.format, subset=['Нийт'])
-                                  .set_table_attributes('class="table table-bordered table-hover"'))
-            context_data = styled_df.to_html()
+    # Хариултын матрицыг (olympiad/utils/answer_matrix.py) SQL-гүйгээр шүүнэ:
+    # сургууль, эсвэл top-N өгсөн үед аймаг/улсын хэмжээнд
+    if sid > 0 or (top_n and top_n > 0):
+        matrix = load_answer_matrix(olympiad_id)
+        if matrix is None:
+            # Анх удаа хүсэгдсэн: ард талд бэлтгэгдэж байна
+            preparing = True
+        else:
+            rows, totals = matrix.select(school_id=sid, province_id=pid if sid == 0 else None, top_n=top_n)
+            if len(rows):
+                context_data = render_answers_table(matrix, rows, totals)
 
     # Гарчиг болон бусад мэдээллийг бэлтгэх
     name = f"{olympiad.name}, {olympiad.level.name} ангилал"
@@ -488,7 +403,8 @@ def answers_view(request, olympiad_id):
     context = {
         'title': f"{title} - Үр дүн",
         'name': name,
-        'data': re.sub(r'&nbsp;</th>', r'№</th>', context_data),
+        'data': context_data,
+        'preparing': preparing,
         'school': school,
         'provinces': provinces,
         'schools': schools,
@@ -547,37 +463,29 @@ def province_summary_view(request, olympiad_id):
                                .select_related('user', 'user__data')
                                .order_by('name'))
 
+        # Сургууль бүрийн тойм SchoolParticipation-д бэлэн (olympiad/utils/participation.py)
+        participations = {
+            p.school_id: p for p in SchoolParticipation.objects.filter(olympiad_id=olympiad_id, school__province_id=pid)
+        }
+        if not participations and Result.objects.filter(
+            olympiad_id=olympiad_id, contestant__data__school__province_id=pid
+        ).exists():
+            # Тойм хараахан үүсээгүй (шинэчлэлээс өмнөх дүн) - энэ аймгийнхыг одоо тооцно
+            refresh_school_participation(olympiad_id, [school.id for school in schools_in_province])
+            participations = {
+                p.school_id: p
+                for p in SchoolParticipation.objects.filter(olympiad_id=olympiad_id, school__province_id=pid)
+            }
+
         for school in schools_in_province:
-            results = Result.objects.filter(olympiad_id=olympiad_id, contestant__data__school_id=school.id)
-            contestant_ids = results.values_list('contestant_id', flat=True).distinct()
-            total_count = contestant_ids.count()
-            empty_row_count = 0
-            sample_data_html = ""
-            if total_count > 0:
-                positive_scorers_count = results.filter(score__gt=0).values_list('contestant_id', flat=True).distinct().count()
-                empty_row_count = total_count - positive_scorers_count
-                sample_contestant_ids = list(contestant_ids[:5])
-                sample_results = results.filter(contestant_id__in=sample_contestant_ids)
-                rows = list(sample_results.values_list('contestant_id', 'problem_id', 'answer'))
-                data = pd.DataFrame(rows, columns=['contestant_id', 'problem_id', 'answer'])
-                results_df = pd.pivot_table(data, index='contestant_id', columns='problem_id', values='answer', aggfunc='sum')
-                problem_ids = results_df.columns.values
-                problem_orders = {p.id: f'№{p.order:02d}' for p in Problem.objects.filter(id__in=problem_ids, olympiad=olympiad)}
-                results_df.columns = [problem_orders.get(col, 'Unknown') for col in results_df.columns]
-                results_df = results_df[sorted(results_df.columns)]
-                contestants_data = User.objects.filter(pk__in=sample_contestant_ids).values('id', 'last_name', 'first_name')
-                user_df = pd.DataFrame(list(contestants_data))
-                user_df.columns = ['ID', 'Овог', 'Нэр']
-                user_results_df = pd.merge(user_df, results_df, left_on='ID', right_index=True, how='left')
-                sorted_df = user_results_df.sort_values(by=['Овог', 'Нэр']).drop(columns=['ID'])
-                sorted_df.index = np.arange(1, len(sorted_df) + 1)
-                numeric_columns = [col for col in sorted_df.columns if str(col).startswith('№')]
-                formatter = lambda val: '{:.0f}'.format(val) if val > 0 else '---'
-                styled_df = (sorted_df.style
-                                      .format(formatter, subset=numeric_columns, na_rep="-")
-                                      .set_table_attributes('class="table table-bordered table-hover"'))
-                sample_data_html = re.sub(r'&nbsp;</th>', r'№</th>', styled_df.to_html())
+            participation = participations.get(school.id)
+            if participation:
+                total_count = participation.contestant_count
+                empty_row_count = participation.empty_count
+                sample_data_html = sample_table_html(participation.sample)
             else:
+                total_count = 0
+                empty_row_count = 0
                 sample_data_html = "<p class='text-muted fst-italic'>Энэ олимпиадад оролцсон сурагч олдсонгүй.</p>"
             school_summaries.append({
                 'school': school,
@@ -589,12 +497,10 @@ def province_summary_view(request, olympiad_id):
     else:
         # --- АЙМАГ СОНГОГДООГҮЙ ҮЕД (pid == 0) ---
 
-        # 1. Сургуулийн тоон мэдээлэл
-        participating_school_ids = (Result.objects
-                                      .filter(olympiad_id=olympiad_id, contestant__data__school__isnull=False)
-                                      .values_list('contestant__data__school_id', flat=True)
-                                      .distinct())
-        participating_school_count = participating_school_ids.count()
+        # 1. Сургуулийн тоон мэдээлэл (статистикийн cube-ээс)
+        participants = get_stats_cube(olympiad_id)['participants']
+        participating_school_ids = [sid for sid in participants['schools'] if sid is not None]
+        participating_school_count = len(participating_school_ids)
         total_school_count = School.objects.count()
 
         # 2. Оролцоогүй сургуулиудын жагсаалт
@@ -624,7 +530,7 @@ def province_summary_view(request, olympiad_id):
 
 
         # "Хариулт ирүүлсэн" (Энэ хэвээрээ)
-        participating_student_count = Result.objects.filter(olympiad_id=olympiad_id).values('contestant_id').distinct().count()
+        participating_student_count = participants['total']
 
 
     # --- Контекстыг шинэчлэх ---
@@ -677,40 +583,26 @@ def first_round_stats(request):
     # Тухайн олимпиад(ууд)-аас үр дүн авах
     if olympiad_id:
         # Нэг олимпиадыг сонгосон бол
-        results_query = Result.objects.filter(olympiad_id=olympiad_id)
         selected_olympiad = Olympiad.objects.filter(pk=olympiad_id).first()
+        olympiad_ids = [selected_olympiad.id] if selected_olympiad else []
     else:
         # Сонгоогүй бол бүх 1-р даваа олимпиадыг багтаана
-        results_query = Result.objects.filter(olympiad__in=olympiads)
         selected_olympiad = None
+        olympiad_ids = list(olympiads.values_list('id', flat=True))
 
-    # Бүх аймгийг авах
-    provinces = Province.objects.all().order_by('name')
-
-    # Аймаг бүрээр статистик бэлтгэх
-    province_stats = []
+    # Аймаг бүрийн давхардалгүй сургууль, сурагчийн тоо (олимпиадын хувилбартай cache)
+    counts = round1_province_stats(olympiad_ids) if olympiad_ids else {}
 
-    for province in provinces:
-        # Энэ аймгаас оролцсон Results-үүд
-        province_results = results_query.filter(
-            contestant__data__province=province
-        )
-
-        # Сургуулийн тоо (давхардсан тоолохгүйгээр)
-        school_count = province_results.filter(
-            contestant__data__school__isnull=False
-        ).values('contestant__data__school').distinct().count()
-
-        # Сурагчдын тоо (давхардсан тоолохгүйгээр)
-        student_count = province_results.values('contestant').distinct().count()
-
-        # Хэрэв оролцсон бол жагсаалтанд нэмэх
-        if school_count > 0 or student_count > 0:
-            province_stats.append({
-                'province': province,
-                'school_count': school_count,
-                'student_count': student_count,
-            })
+    # Аймаг бүрээр статистик бэлтгэх (оролцсон аймгууд л)
+    province_stats = [
+        {
+            'province': province,
+            'school_count': counts[province.id]['schools'],
+            'student_count': counts[province.id]['students'],
+        }
+        for province in Province.objects.all().order_by('name')
+        if province.id in counts
+    ]
 
     # Нийт тоо
     total_schools = sum(s['school_count'] for s in province_stats)
@@ -803,37 +695,15 @@ def student_achievements(request, user_id=None):
         if not (request.user.id == user_id or request.user.is_staff):
             student = request.user
 
-    # Сурагчийн бүх ScoreSheet-үүдийг авах (давхардсан бичлэгийг хасах)
-    # distinct('olympiad_id') ашиглахад эхний ORDER BY талбар нь olympiad_id байх ёстой
-    scoresheets = ScoreSheet.objects.filter(
-        user=student,
-        olympiad__is_open=True
-    ).select_related(
-        'olympiad',
-        'olympiad__level',
-        'olympiad__school_year',
-        'school'
-    ).order_by('olympiad_id', '-id').distinct('olympiad_id')
-
-    # Дараа нь дахин эрэмбэлэх (хүссэн дарааллаар)
-    scoresheets = sorted(
-        scoresheets,
-        key=lambda x: (-x.olympiad.school_year_id if x.olympiad.school_year_id else 0,
-                       -x.olympiad.round,
-                       x.olympiad.name)
-    )
-
-    # Статистик
-    total_olympiads = len(scoresheets)
-    total_score = sum(sheet.total or 0 for sheet in scoresheets)
-    prizes_count = sum(1 for sheet in scoresheets if sheet.prizes and sheet.prizes.strip())
+    # Олимпиад бүрийн амжилт, статистик (Achievement проекцоос нэг query)
+    achievements, stats = user_achievements(student.id)
 
     context = {
         'student': student,
-        'scoresheets': scoresheets,
-        'total_olympiads': total_olympiads,
-        'total_score': total_score,
-        'prizes_count': prizes_count,
+        'achievements': achievements,
+        'total_olympiads': stats['total_olympiads'],
+        'total_score': stats['total_score'],
+        'prizes_count': stats['prizes_count'],
         'is_own_profile': request.user.id == student.id,
     }
 
@@ -863,32 +733,24 @@ def round2_summary_view(request):
         school_year=school_year
     ).select_related('level')
 
-    # Бүх аймаг дүүргүүдийг авах
-    provinces = Province.objects.all().order_by('name')
+    # Олимпиад бүрийн аймгийн оролцогчдын тоо (статистикийн cube-ээс)
+    counts_by_olympiad = [
+        (olympiad.level.name if olympiad.level else 'Бусад', sheet_counts_by_province(get_stats_cube(olympiad.id)))
+        for olympiad in round2_olympiads
+    ]
 
     # Мэдээлэл цуглуулах
     summary_data = []
 
-    for province in provinces:
+    for province in Province.objects.all().order_by('name'):
         province_data = {
             'province': province,
             'levels': {}
         }
 
         # Ангилал бүрээр тоолох
-        for olympiad in round2_olympiads:
-            level_name = olympiad.level.name if olympiad.level else 'Бусад'
-
-            # ScoreSheet-ээс тухайн аймаг, олимпиадын оролцогчдын тоог авах
-            participant_count = ScoreSheet.objects.filter(
-                olympiad=olympiad,
-                school__province=province
-            ).count()
-
-            if level_name not in province_data['levels']:
-                province_data['levels'][level_name] = 0
-
-            province_data['levels'][level_name] += participant_count
+        for level_name, counts in counts_by_olympiad:
+            province_data['levels'][level_name] = province_data['levels'].get(level_name, 0) + counts.get(province.id, 0)
 
         # Нийт оролцогчийн тоо
         province_data['total'] = sum(province_data['levels'].values())
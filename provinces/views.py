@@ -2,7 +2,6 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import HttpResponse
 from django.db import transaction
 from django.db.models import Q
 
@@ -10,12 +9,13 @@ from accounts.models import Province, Zone
 from olympiad.models import Olympiad, Award, ScoreSheet, Result, Problem, SchoolYear
 from olympiad.utils.group_management import ensure_olympiad_has_group, get_or_create_round2_group
 from olympiad.utils.round2_quota import compute_school_quota_table
+from olympiad.utils.excel_cache import cached_workbook
+from olympiad.utils.participation import schedule_participation_refresh
+from olympiad.views_exports import start_export
 from schools.models import School
 from django.contrib.auth.models import User, Group
 
 import pandas as pd
-import io
-from openpyxl.styles import Border, Side, Font, Alignment
 
 
 def user_can_manage_province(user, province):
@@ -1146,93 +1146,10 @@ def generate_province_answer_sheet(request, province_id, olympiad_id):
         return redirect('my_managed_provinces')
 
     # Олимпиадад бүлэг байгаа эсэхийг шалгаад, байхгүй бол үүсгэх
-    group, created = ensure_olympiad_has_group(olympiad)
-
-    # Бүртгэлтэй сурагчид
-    contestants = group.user_set.select_related('data__province', 'data__school').order_by(
-        'data__school__name', 'last_name', 'first_name'
-    )
-    problems = olympiad.problem_set.all().order_by('order')
-
-    # Excel Sheet 1: Хариулт
-    answers_data = []
-    for c in contestants:
-        school_name = c.data.school.name if hasattr(c, 'data') and c.data.school else 'Тодорхойгүй'
-        answers_data.append({
-            'ID': c.id,
-            'Овог': c.last_name,
-            'Нэр': c.first_name,
-            'Сургууль': school_name,
-            **{f'№{p.order}': '' for p in problems}
-        })
-
-    header = ['ID', 'Овог', 'Нэр', 'Сургууль'] + [f'№{p.order}' for p in problems]
-    answers_df = pd.DataFrame(answers_data, columns=header)
-
-    # Sheet 2: Мэдээлэл
-    info_data = {
-        'Түлхүүр': ['olympiad_id', 'olympiad_name', 'province_id', 'province_name', 'level_id', 'level_name'],
-        'Утга': [
-            olympiad.id,
-            olympiad.name,
-            province.id,
-            province.name,
-            olympiad.level.id if olympiad.level else '',
-            olympiad.level.name if olympiad.level else ''
-        ]
-    }
-    info_df = pd.DataFrame(info_data)
+    ensure_olympiad_has_group(olympiad)
 
-    # Excel үүсгэх
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        answers_df.to_excel(writer, sheet_name='Хариулт', index=False)
-        info_df.to_excel(writer, sheet_name='Мэдээлэл', index=False)
-
-        workbook = writer.book
-        worksheet = writer.sheets['Хариулт']
-
-        # Загвар
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-        bold_font = Font(bold=True)
-        center_align = Alignment(horizontal='center', vertical='center')
-
-        # Header
-        for cell in worksheet["1:1"]:
-            cell.font = bold_font
-            cell.border = thin_border
-            cell.alignment = center_align
-
-        # Cells
-        for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row, max_col=worksheet.max_column):
-            for cell in row:
-                cell.border = thin_border
-
-        # Column widths
-        for i, column_cells in enumerate(worksheet.columns):
-            column_letter = column_cells[0].column_letter
-            if i < 4:
-                max_length = 0
-                for cell in column_cells:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                worksheet.column_dimensions[column_letter].width = min(max_length + 2, 30)
-            else:
-                worksheet.column_dimensions[column_letter].width = 5
-
-    output.seek(0)
-
-    filename = f"province_{province.id}_olympiad_{olympiad.id}.xlsx"
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    # Файлыг Celery task үүсгэнэ (olympiad/utils/export_jobs.py)
+    return start_export(request, 'province_answer_sheet', {'province_id': province.id, 'olympiad_id': olympiad.id})
 
 
 @login_required
@@ -1253,15 +1170,15 @@ def import_province_answer_sheet(request, province_id, olympiad_id):
             excel_file = request.FILES['excel_file']
 
             try:
-                # Excel уншиж, баталгаажуулах
-                xls = pd.ExcelFile(excel_file)
+                # Excel уншиж, баталгаажуулах (агуулгын hash-аар cache-лэгдэнэ)
+                xls = cached_workbook(excel_file)
 
                 if 'Хариулт' not in xls.sheet_names or 'Мэдээлэл' not in xls.sheet_names:
                     messages.error(request, 'Excel файлд "Хариулт" болон "Мэдээлэл" sheet байх ёстой.')
                     return redirect('province_olympiad_view', province_id=province_id, olympiad_id=olympiad_id)
 
                 # Мэдээлэл шалгах
-                info_df = pd.read_excel(excel_file, sheet_name='Мэдээлэл')
+                info_df = xls.parse('Мэдээлэл')
                 info_dict = dict(zip(info_df['Түлхүүр'], info_df['Утга']))
 
                 if int(info_dict.get('olympiad_id', 0)) != olympiad_id:
@@ -1273,12 +1190,13 @@ def import_province_answer_sheet(request, province_id, olympiad_id):
                     return redirect('province_olympiad_view', province_id=province_id, olympiad_id=olympiad_id)
 
                 # Хариулт уншиж Result үүсгэх
-                answers_df = pd.read_excel(excel_file, sheet_name='Хариулт')
+                answers_df = xls.parse('Хариулт')
                 problems = olympiad.problem_set.all().order_by('order')
                 problem_dict = {f'№{p.order}': p for p in problems}
 
                 created_count = 0
                 updated_count = 0
+                imported_ids = set()
 
                 with transaction.atomic():
                     for idx, row in answers_df.iterrows():
@@ -1290,6 +1208,7 @@ def import_province_answer_sheet(request, province_id, olympiad_id):
                             # Группт байгаа эсэхийг шалгах
                             if olympiad.group and not olympiad.group.user_set.filter(id=user_id).exists():
                                 continue
+                            imported_ids.add(user.id)
 
                             # Бодлого бүрээр Result үүсгэх/шинэчлэх (оноог шууд оруулна)
                             for col_name, problem in problem_dict.items():
@@ -1317,6 +1236,8 @@ def import_province_answer_sheet(request, province_id, olympiad_id):
                         except User.DoesNotExist:
                             continue
 
+                    schedule_participation_refresh(olympiad.id, imported_ids)
+
                 messages.success(request, f'Амжилттай. Шинээр үүссэн: {created_count}, Шинэчлэгдсэн: {updated_count}')
                 return redirect('province_olympiad_view', province_id=province_id, olympiad_id=olympiad_id)
 
@@ -2150,92 +2071,10 @@ def zone_generate_answer_sheet(request, zone_id, olympiad_id):
         messages.error(request, 'Хандах эрхгүй.')
         return redirect('my_managed_zones')
 
-    group, created = ensure_olympiad_has_group(olympiad, group_name_template="Round3_Olympiad_{olympiad.id}")
-
-    if zone.id == 5:
-        contestants = group.user_set.all()
-    else:
-        zone_province_ids = Province.objects.filter(zone=zone).values_list('id', flat=True)
-        contestants = group.user_set.filter(data__province_id__in=zone_province_ids)
-    contestants = contestants.select_related('data__province', 'data__school').order_by(
-        'data__province__name', 'data__school__name', 'last_name', 'first_name'
-    )
-    problems = olympiad.problem_set.all().order_by('order')
-
-    answers_data = []
-    for c in contestants:
-        school_name = c.data.school.name if hasattr(c, 'data') and c.data.school else 'Тодорхойгүй'
-        province_name = c.data.province.name if hasattr(c, 'data') and c.data.province else 'Тодорхойгүй'
-        answers_data.append({
-            'ID': c.id,
-            'Овог': c.last_name,
-            'Нэр': c.first_name,
-            'Аймаг': province_name,
-            'Сургууль': school_name,
-            **{f'№{p.order}': '' for p in problems}
-        })
-
-    header = ['ID', 'Овог', 'Нэр', 'Аймаг', 'Сургууль'] + [f'№{p.order}' for p in problems]
-    answers_df = pd.DataFrame(answers_data, columns=header)
-
-    info_data = {
-        'Түлхүүр': ['olympiad_id', 'olympiad_name', 'zone_id', 'zone_name', 'level_id', 'level_name'],
-        'Утга': [
-            olympiad.id,
-            olympiad.name,
-            zone.id,
-            zone.name,
-            olympiad.level.id if olympiad.level else '',
-            olympiad.level.name if olympiad.level else ''
-        ]
-    }
-    info_df = pd.DataFrame(info_data)
-
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        answers_df.to_excel(writer, sheet_name='Хариулт', index=False)
-        info_df.to_excel(writer, sheet_name='Мэдээлэл', index=False)
-
-        workbook = writer.book
-        worksheet = writer.sheets['Хариулт']
-
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-        bold_font = Font(bold=True)
-        center_align = Alignment(horizontal='center', vertical='center')
-
-        for cell in worksheet["1:1"]:
-            cell.font = bold_font
-            cell.border = thin_border
-            cell.alignment = center_align
-
-        for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row, max_col=worksheet.max_column):
-            for cell in row:
-                cell.border = thin_border
-
-        for i, column_cells in enumerate(worksheet.columns):
-            column_letter = column_cells[0].column_letter
-            if i < 5:
-                max_length = 0
-                for cell in column_cells:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                worksheet.column_dimensions[column_letter].width = min(max_length + 2, 30)
-            else:
-                worksheet.column_dimensions[column_letter].width = 5
+    ensure_olympiad_has_group(olympiad, group_name_template="Round3_Olympiad_{olympiad.id}")
 
-    output.seek(0)
-
-    filename = f"zone_{zone.id}_olympiad_{olympiad.id}.xlsx"
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    # Файлыг Celery task үүсгэнэ (olympiad/utils/export_jobs.py)
+    return start_export(request, 'zone_answer_sheet', {'zone_id': zone.id, 'olympiad_id': olympiad.id})
 
 
 @login_required
@@ -2256,13 +2095,13 @@ def zone_import_answer_sheet(request, zone_id, olympiad_id):
             excel_file = request.FILES['excel_file']
 
             try:
-                xls = pd.ExcelFile(excel_file)
+                xls = cached_workbook(excel_file)
 
                 if 'Хариулт' not in xls.sheet_names or 'Мэдээлэл' not in xls.sheet_names:
                     messages.error(request, 'Excel файлд "Хариулт" болон "Мэдээлэл" sheet байх ёстой.')
                     return redirect('zone_olympiad_view', zone_id=zone_id, olympiad_id=olympiad_id)
 
-                info_df = pd.read_excel(excel_file, sheet_name='Мэдээлэл')
+                info_df = xls.parse('Мэдээлэл')
                 info_dict = dict(zip(info_df['Түлхүүр'], info_df['Утга']))
 
                 if int(info_dict.get('olympiad_id', 0)) != olympiad_id:
@@ -2273,12 +2112,13 @@ def zone_import_answer_sheet(request, zone_id, olympiad_id):
                     messages.error(request, 'Бүсийн ID таарахгүй байна.')
                     return redirect('zone_olympiad_view', zone_id=zone_id, olympiad_id=olympiad_id)
 
-                answers_df = pd.read_excel(excel_file, sheet_name='Хариулт')
+                answers_df = xls.parse('Хариулт')
                 problems = olympiad.problem_set.all().order_by('order')
                 problem_dict = {f'№{p.order}': p for p in problems}
 
                 created_count = 0
                 updated_count = 0
+                imported_ids = set()
 
                 with transaction.atomic():
                     for idx, row in answers_df.iterrows():
@@ -2289,6 +2129,7 @@ def zone_import_answer_sheet(request, zone_id, olympiad_id):
 
                             if olympiad.group and not olympiad.group.user_set.filter(id=user_id).exists():
                                 continue
+                            imported_ids.add(user.id)
 
                             for col_name, problem in problem_dict.items():
                                 if col_name in row and pd.notna(row[col_name]):
@@ -2317,6 +2158,8 @@ def zone_import_answer_sheet(request, zone_id, olympiad_id):
                         except User.DoesNotExist:
                             continue
 
+                    schedule_participation_refresh(olympiad.id, imported_ids)
+
                 messages.success(request, f'Амжилттай. Шинээр үүссэн: {created_count}, Шинэчлэгдсэн: {updated_count}')
                 return redirect('zone_olympiad_view', zone_id=zone_id, olympiad_id=olympiad_id)
 
@@ -0,0 +1,193 @@
+"""
+Сургуулийн нэрийн fuzzy хайлтын индекс (импортын командууд, сургууль таамаглах).
+
+Бүх School-ийн нэр (хүсвэл alias)-ийг нэг удаа хэвшүүлж, улсын болон аймаг тус бүрийн
+choice жагсаалтыг санах ойд хадгална. Хайлт бүр rapidfuzz.process.extractOne-оор C
+түвшинд хийгдэх тул мөр бүрд School хүснэгтийг дахин уншиж, хэвшүүлэхгүй.
+
+School хадгалагдах/устахад signals.py нь invalidate_school_matchers-ийг дуудаж, дараагийн
+get_school_matcher дуудлагад индекс дахин баригдана.
+"""
+import re
+import time
+import unicodedata
+
+from django.core.cache import cache
+from rapidfuzz import fuzz, process
+
+from .models import School
+
+VERSION_KEY = 'school_matcher_version'
+
+_matchers = {}  # (normalizer, include_aliases, join_spaces) -> SchoolMatcher
+
+
+def normalize_school_name(name):
+    """
+    Сургуулийн нэрийг нэг хэлбэрт оруулна (импортын командууд, fill_school_prediction):
+    - Юникод normalize (ё -> е, ү -> у, ө -> о гэх мэт)
+    - Латин үсгийг ойролцоогоор кирилл рүү хөрвүүлэх
+    - 'ЕБС', 'surguuli', 'school' зэрэг давтагддаг үгсийг арилгах
+    - '1-р сургууль' гэх мэт тоог жигд болгох
+    """
+    if not name:
+        return ''
+    n = unicodedata.normalize('NFKD', name).lower()
+
+    # кирилл үсгийн ижилтгэл
+    n = n.replace('ё', 'е').replace('ү', 'у').replace('ө', 'о')
+
+    # латин үсгийг кирилл рүү ойролцоогоор хөрвүүлэх
+    latin_map = {
+        'a': 'а', 'b': 'б', 'v': 'в', 'g': 'г', 'd': 'д', 'e': 'е',
+        'j': 'ж', 'z': 'з', 'i': 'и', 'k': 'к', 'l': 'л', 'm': 'м',
+        'n': 'н', 'o': 'о', 'p': 'п', 'r': 'р', 's': 'с', 't': 'т',
+        'u': 'у', 'f': 'ф', 'h': 'х', 'c': 'ц', 'y': 'й'
+    }
+    for latin, cyr in latin_map.items():
+        n = re.sub(rf'\b{latin}\b', cyr, n)
+
+    # '1-р', '2-р' гэх мэт илэрхийллийг жигд болгох
+    n = re.sub(r'(\d+)(-р)?', r'\1', n)
+
+    # түгээмэл үгсийг арилгах
+    stop_words = ['ебс', 'ebs', 'school', 'surguuli', 'surguul', 'сургууль',
+                  'дугаар', 'dugaar', '-', 'нийслэл', 'niislel', 'цогцолбор']
+    for w in stop_words:
+        n = n.replace(w, '')
+
+    n = re.sub(r'\s+', ' ', n)
+    return n.strip()
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Cache цэвэрлэгдсэн ч өөр worker-ийн хуучин индексийн хувилбартай давхцахгүйн тулд цагаар эхлүүлнэ
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_school_matchers():
+    """School өөрчлөгдсөнийг тэмдэглэнэ (индексүүд дараагийн хандалтад дахин баригдана)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+    _matchers.clear()
+
+
+class SchoolMatcher:
+    """Хэвшүүлсэн сургуулийн нэрсийн индекс.
+
+    normalizer: нэрийг хэвшүүлэх функц
+    include_aliases: School.alias (таслалаар тусгаарласан)-уудыг мөн харьцуулах эсэх
+    join_spaces: хоосон зайгүй хэлбэрийг fuzz.ratio-оор нэмж харьцуулах эсэх
+                 (accounts.school_utils.guess_school-ийн дүрэм)
+    """
+
+    def __init__(self, normalizer, include_aliases=False, join_spaces=False, version=None):
+        self.normalizer = normalizer
+        self.include_aliases = include_aliases
+        self.join_spaces = join_spaces
+        self.version = version
+
+        self.school_ids = []    # choice бүрийн School id
+        self.choices = []       # хэвшүүлсэн нэрс
+        self.joined = []        # хоосон зайгүй хэлбэр
+        self.by_province = {}   # province_id -> choice индексүүд
+        self._schools = {}      # id -> School (lazy)
+        self._province_cache = {}  # province_id(s) -> (choices, joined, indexes)
+
+        rows = School.objects.order_by('id').values_list('id', 'province_id', 'name', 'alias')
+        for school_id, province_id, name, alias in rows:
+            names = [name]
+            if include_aliases and alias:
+                names += [a.strip() for a in alias.split(',') if a.strip()]
+            for raw in names:
+                normalized = normalizer(raw)
+                self.by_province.setdefault(province_id, []).append(len(self.choices))
+                self.school_ids.append(school_id)
+                self.choices.append(normalized)
+                self.joined.append(normalized.replace(' ', ''))
+
+    def _candidates(self, province_id):
+        """province_id: None (бүгд), нэг ID эсвэл ID-уудын жагсаалт."""
+        if province_id is None:
+            return self.choices, self.joined, None
+        if isinstance(province_id, (list, tuple, set, frozenset)):
+            province_id = tuple(sorted(province_id))
+        if province_id not in self._province_cache:
+            if isinstance(province_id, tuple):
+                indexes = sorted(i for pid in province_id for i in self.by_province.get(pid, []))
+            else:
+                indexes = self.by_province.get(province_id, [])
+            self._province_cache[province_id] = (
+                [self.choices[i] for i in indexes], [self.joined[i] for i in indexes], indexes
+            )
+        return self._province_cache[province_id]
+
+    def province_ids(self):
+        return [pid for pid in self.by_province if pid is not None]
+
+    def best(self, normalized_name, province_id=None):
+        """Хэвшүүлсэн нэрд хамгийн төстэй (school_id, score)-ийг буцаана. Олдохгүй бол (None, 0)."""
+        choices, joined, indexes = self._candidates(province_id)
+        if not choices:
+            return None, 0
+
+        match = process.extractOne(normalized_name, choices, scorer=fuzz.token_sort_ratio, processor=None)
+        best_index, best_score = match[2], match[1]
+        if self.join_spaces:
+            joined_match = process.extractOne(
+                normalized_name.replace(' ', ''), joined, scorer=fuzz.ratio, processor=None
+            )
+            if joined_match[1] > best_score or (joined_match[1] == best_score and joined_match[2] < best_index):
+                best_index, best_score = joined_match[2], joined_match[1]
+
+        if best_score <= 0:
+            return None, 0
+        if indexes is not None:
+            best_index = indexes[best_index]
+        return self.school_ids[best_index], best_score
+
+    def top(self, normalized_name, province_id=None, limit=5):
+        """top-k: [(school_id, score), ...] (нэг сургууль нэг л удаа)."""
+        choices, _, indexes = self._candidates(province_id)
+        if not choices:
+            return []
+        found, seen = [], set()
+        for _, score, index in process.extract(
+            normalized_name, choices, scorer=fuzz.token_sort_ratio, processor=None, limit=limit * 3
+        ):
+            school_id = self.school_ids[indexes[index] if indexes is not None else index]
+            if school_id not in seen:
+                seen.add(school_id)
+                found.append((school_id, score))
+            if len(found) == limit:
+                break
+        return found
+
+    def school(self, school_id):
+        if school_id is None:
+            return None
+        if school_id not in self._schools:
+            self._schools[school_id] = School.objects.filter(pk=school_id).first()
+        return self._schools[school_id]
+
+    def match(self, name, province_id=None, normalized=False):
+        """Нэрд хамгийн төстэй (School, score). normalized=True бол name аль хэдийн хэвшсэн."""
+        school_id, score = self.best(name if normalized else self.normalizer(name), province_id)
+        return self.school(school_id), score
+
+
+def get_school_matcher(normalizer=normalize_school_name, include_aliases=False, join_spaces=False):
+    """Процесс дотор хуваалцах индекс. School өөрчлөгдсөн бол дахин барина."""
+    version = _current_version()
+    key = (normalizer, include_aliases, join_spaces)
+    matcher = _matchers.get(key)
+    if matcher is None or matcher.version != version:
+        matcher = SchoolMatcher(normalizer, include_aliases, join_spaces, version=version)
+        _matchers[key] = matcher
+    return matcher
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .matcher import invalidate_school_matchers
+from .models import School
+
+
+MATCHER_FIELDS = {'name', 'alias', 'province', 'province_id'}
+
+
+@receiver([post_save, post_delete], sender=School)
+def school_changed(sender, instance, update_fields=None, **kwargs):
+    # Нэр, alias, аймаг өөрчлөгдөхөд сургуулийн хайлтын индексийг дахин барих
+    if update_fields is not None and not set(update_fields) & MATCHER_FIELDS:
+        return
+    invalidate_school_matchers()
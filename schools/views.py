@@ -18,17 +18,17 @@ import logging
 logger = logging.getLogger(__name__)
 
 # Шаардлагатай import-ууд
-import io
 import re
-from django.http import HttpResponse
 from datetime import date, timedelta
-from openpyxl.styles import Border, Side, Font, Alignment
 
 from .models import School
 from .forms import UserSearchForm, AddUserForm, UserForm, UserMetaForm, UploadExcelForm
 from accounts.models import UserMeta, Level, Province
 from olympiad.models import Olympiad, SchoolYear, Problem, Result
 from olympiad.utils.round2_quota import round2_avg_quota_by_school, round2_additional_quota_by_school
+from olympiad.utils.excel_cache import cached_workbook
+from olympiad.utils.participation import schedule_participation_refresh
+from olympiad.views_exports import start_export
 
 import pandas as pd
 from django.db import transaction
@@ -486,7 +486,7 @@ def school_olympiad_view(request, school_id, olympiad_id):
 
 @login_required
 def generate_school_answer_sheet(request, school_id, olympiad_id):
-    """Сонгосон сургууль, олимпиадын хариултын хуудсыг үүсгэж, шууд download хийлгэнэ."""
+    """Сонгосон сургууль, олимпиадын хариултын хуудсыг ард талд үүсгэж, төлвийн хуудас руу шилжүүлнэ."""
     school = get_object_or_404(School, pk=school_id)
     olympiad = get_object_or_404(Olympiad, pk=olympiad_id)
 
@@ -495,81 +495,8 @@ def generate_school_answer_sheet(request, school_id, olympiad_id):
         messages.error(request, 'Та энэ үйлдлийг хийх эрхгүй.')
         return redirect('school_dashboard', school_id=school_id)
 
-    # Дата бэлдэх
-    level = olympiad.level
-    contestants = User.objects.filter(groups=school.group, data__level=level).order_by('last_name', 'first_name')
-    problems = olympiad.problem_set.all().order_by('order')
-
-    # 1-р Sheet: Хариулт
-    answers_data = []
-    for c in contestants:
-        answers_data.append({
-            'ID': c.id,
-            'Овог': c.last_name,
-            'Нэр': c.first_name,
-            **{f'№{p.order}': '' for p in problems}
-        })
-    header = ['ID', 'Овог', 'Нэр'] + [f'№{p.order}' for p in problems]
-    answers_df = pd.DataFrame(answers_data, columns=header)
-
-    # 2-р Sheet: Мэдээлэл
-    info_data = {
-        'Түлхүүр': ['olympiad_id', 'olympiad_name', 'school_id', 'school_name', 'level_id', 'level_name'],
-        'Утга': [olympiad.id, olympiad.name, school.id, school.name, level.id, level.name]
-    }
-    info_df = pd.DataFrame(info_data)
-
-    # Excel файлыг санах ойд үүсгэх
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        answers_df.to_excel(writer, sheet_name='Хариулт', index=False)
-        info_df.to_excel(writer, sheet_name='Мэдээлэл', index=False)
-
-        # Style-г тохируулах workbook болон worksheet-г авах
-        workbook = writer.book
-        worksheet = writer.sheets['Хариулт']
-
-        # Style-уудыг тодорхойлох
-        thin_border = Border(left=Side(style='thin'),
-                             right=Side(style='thin'),
-                             top=Side(style='thin'),
-                             bottom=Side(style='thin'))
-        bold_font = Font(bold=True)
-        center_align = Alignment(horizontal='center', vertical='center')
-
-        # Header буюу эхний мөрийг загварчлах
-        for cell in worksheet["1:1"]:
-            cell.font = bold_font
-            cell.border = thin_border
-            cell.alignment = center_align
-
-        # Үндсэн өгөгдлийн нүднүүдэд хүрээ нэмэх
-        for row in worksheet.iter_rows(min_row=2,
-                                       max_row=worksheet.max_row,
-                                       max_col=worksheet.max_column):
-            for cell in row:
-                cell.border = thin_border
-
-        # Баганын өргөнийг тохируулах
-        for i, column_cells in enumerate(worksheet.columns):
-            column_letter = column_cells[0].column_letter
-            if i < 3: # ID, Овог, Нэр баганууд
-                length = max(len(str(cell.value)) for cell in column_cells)
-                worksheet.column_dimensions[column_letter].width = length + 2
-            else: # Хариултын баганууд
-                worksheet.column_dimensions[column_letter].width = 5
-
-    output.seek(0)
-
-    # Хэрэглэгчид файл болгож буцаах
-    filename = f"answer_sheet_{olympiad.id}_{school.id}.xlsx"
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    # Файлыг Celery task үүсгэнэ (olympiad/utils/export_jobs.py)
+    return start_export(request, 'school_answer_sheet', {'school_id': school.id, 'olympiad_id': olympiad.id})
 
 # schools/views.py файлын дээд хэсэгт "time" модулийг импортлоно
 import time
@@ -599,8 +526,9 @@ def import_school_answer_sheet(request, school_id, olympiad_id):
             start_time = time.time()
 
             try:
-                # --- МЭДЭЭЛЭЛ sheet унших ---
-                df_info = pd.read_excel(excel_file, sheet_name='Мэдээлэл')
+                # --- МЭДЭЭЛЭЛ sheet унших --- (агуулгын hash-аар cache-лэгдэнэ)
+                workbook = cached_workbook(excel_file)
+                df_info = workbook.parse('Мэдээлэл')
                 info_dict = pd.Series(df_info.Утга.values, index=df_info.Түлхүүр).to_dict()
 
                 # Зөв сургууль, зөв олимпиад эсэхийг шалгах
@@ -609,7 +537,7 @@ def import_school_answer_sheet(request, school_id, olympiad_id):
                     return redirect('school_olympiad_view', school_id=school_id, olympiad_id=olympiad_id)
 
                 # --- Хариулт sheet унших ---
-                df = pd.read_excel(excel_file, sheet_name='Хариулт')
+                df = workbook.parse('Хариулт')
                 problems_map = {p.order: p for p in Problem.objects.filter(olympiad=olympiad)}
 
                 if 'ID' not in df.columns:
@@ -617,6 +545,7 @@ def import_school_answer_sheet(request, school_id, olympiad_id):
                     return redirect('school_dashboard', school_id=school_id)
 
                 updated_count = created_count = skipped_rows = invalid_format_count = 0
+                imported_ids = set()
 
                 for index, row in df.iterrows():
                     user_id = row.get('ID')
@@ -635,6 +564,7 @@ def import_school_answer_sheet(request, school_id, olympiad_id):
                         skipped_rows += 1
                         continue
 
+                    imported_ids.add(user.id)
                     with transaction.atomic():
                         for order, problem in problems_map.items():
                             col = f'№{order}'
@@ -667,6 +597,9 @@ def import_school_answer_sheet(request, school_id, olympiad_id):
                                 updated_count += 1
 
 
+                # Сургуулийн оролцооны тойм (province_summary_view)
+                schedule_participation_refresh(olympiad.id, imported_ids)
+
                 # --- Хугацаа хэмжиж дуусгах ---
                 elapsed_time = round(time.time() - start_time, 2)
 